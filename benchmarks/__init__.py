@@ -0,0 +1,4 @@
+"""
+性能基准
+python -m benchmarks.<名称> 方式运行
+"""
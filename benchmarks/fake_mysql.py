@@ -0,0 +1,1859 @@
+"""
+进程内的模拟MySQL服务器
+实现pymysql用到的MySQL客户端/服务器协议(握手、mysql_native_password认证、COM_QUERY、COM_PING、
+LOAD DATA LOCAL INFILE)，数据存放在SQLite中(默认内存库，也可以是文件)。导入引擎不需要任何修改，
+用pymysql连接到它即可测量批次大小、重试和回退策略，不依赖真实的MySQL:
+
+    server = FakeMySQLServer(latency=0.002, faults=["1205:INSERT:every=20"]).start()
+    result = import_file("data.csv", server.conn_info)
+    server.query("SELECT COUNT(*) FROM `data_xxx`")
+    server.stop()
+
+    python -m benchmarks.fake_mysql --port 3307 --latency 0.001 --fault 1213:INSERT:rate=0.05
+
+支持的语句: CREATE TABLE(含 LIKE)、CREATE [OR REPLACE] VIEW、DROP VIEW、ALTER TABLE(增删列和索引、MODIFY/CHANGE 列，ALGORITHM/LOCK 选项忽略)、RENAME TABLE、
+DROP/TRUNCATE TABLE、INSERT/REPLACE(含 IGNORE、PARTITION、ON DUPLICATE KEY UPDATE)、UPDATE ... JOIN、
+DELETE、SELECT(含 INFORMATION_SCHEMA.TABLES/COLUMNS/STATISTICS，以及CRC32、CONCAT_WS、BIT_XOR、FORMAT、DATE_FORMAT函数)、LOAD DATA LOCAL INFILE、SHOW VARIABLES/TABLES/WARNINGS、
+ANALYZE TABLE、SET、BEGIN/COMMIT/ROLLBACK。语句按SQLite执行，SQLite不支持的写法返回1064错误。
+严格模式下检查字符串长度和数值/日期格式，与MySQL的STRICT_TRANS_TABLES一致地拒绝整条语句。
+写入时与MySQL一样把小数舍入到DECIMAL的小数位、把非整数舍入到整数列、把浮点数按最短表示存入字符串列。
+
+故障注入 CODE[:PATTERN][:every=N|rate=P][:after=N][:limit=N][:wait=秒]，PATTERN为匹配语句的正则:
+    1205  锁等待超时，只有当前语句失败，事务保留
+    1213  死锁，整个事务回滚
+    2006  回复"MySQL server has gone away"后断开连接
+    2013  不回复直接断开连接(客户端收到 Lost connection)
+    其他错误码原样返回
+"""
+import os
+import re
+import sys
+import zlib
+import time
+import struct
+import decimal
+import random
+import hashlib
+import sqlite3
+import argparse
+import datetime
+import itertools
+import threading
+import socketserver
+
+# 协议常量
+CLIENT_LONG_PASSWORD = 0x1
+CLIENT_FOUND_ROWS = 0x2
+CLIENT_LONG_FLAG = 0x4
+CLIENT_CONNECT_WITH_DB = 0x8
+CLIENT_LOCAL_FILES = 0x80
+CLIENT_PROTOCOL_41 = 0x200
+CLIENT_TRANSACTIONS = 0x2000
+CLIENT_SECURE_CONNECTION = 0x8000
+CLIENT_MULTI_RESULTS = 0x20000
+CLIENT_PLUGIN_AUTH = 0x80000
+CLIENT_CONNECT_ATTRS = 0x100000
+CLIENT_PLUGIN_AUTH_LENENC_CLIENT_DATA = 0x200000
+SERVER_CAPABILITIES = (CLIENT_LONG_PASSWORD | CLIENT_FOUND_ROWS | CLIENT_LONG_FLAG | CLIENT_CONNECT_WITH_DB |
+                       CLIENT_LOCAL_FILES | CLIENT_PROTOCOL_41 | CLIENT_TRANSACTIONS | CLIENT_SECURE_CONNECTION |
+                       CLIENT_MULTI_RESULTS | CLIENT_PLUGIN_AUTH | CLIENT_CONNECT_ATTRS |
+                       CLIENT_PLUGIN_AUTH_LENENC_CLIENT_DATA)
+
+SERVER_STATUS_IN_TRANS = 0x1
+SERVER_STATUS_AUTOCOMMIT = 0x2
+
+COM_QUIT = 0x01
+COM_INIT_DB = 0x02
+COM_QUERY = 0x03
+COM_PING = 0x0e
+COM_RESET_CONNECTION = 0x1f
+
+# 结果集列类型
+FIELD_TYPE_DOUBLE = 5
+FIELD_TYPE_LONGLONG = 8
+FIELD_TYPE_BLOB = 252
+FIELD_TYPE_VAR_STRING = 253
+CHARSET_UTF8MB4 = 45
+CHARSET_BINARY = 63
+
+MAX_PACKET_PAYLOAD = 0xffffff
+SERVER_VERSION = "8.0.35-fake"
+
+# 错误码 -> (SQLSTATE, 默认消息)
+ERRORS = {
+    1045: ("28000", "Access denied for user '{user}'"),
+    1048: ("23000", "Column cannot be null"),
+    1050: ("42S01", "Table already exists"),
+    1051: ("42S02", "Unknown table"),
+    1054: ("42S22", "Unknown column"),
+    1061: ("42000", "Duplicate key name"),
+    1062: ("23000", "Duplicate entry"),
+    1064: ("42000", "You have an error in your SQL syntax"),
+    1091: ("42000", "Can't DROP; check that column/key exists"),
+    1105: ("HY000", "Unknown error"),
+    1136: ("21S01", "Column count doesn't match value count at row 1"),
+    1146: ("42S02", "Table doesn't exist"),
+    1153: ("08S01", "Got a packet bigger than 'max_allowed_packet' bytes"),
+    1205: ("HY000", "Lock wait timeout exceeded; try restarting transaction"),
+    1213: ("40001", "Deadlock found when trying to get lock; try restarting transaction"),
+    1235: ("42000", "This version of MySQL doesn't yet support this statement"),
+    1292: ("22007", "Incorrect datetime value"),
+    1300: ("HY000", "Invalid character string"),
+    1366: ("HY000", "Incorrect value"),
+    1406: ("22001", "Data too long for column"),
+    2006: ("HY000", "MySQL server has gone away"),
+    2013: ("HY000", "Lost connection to MySQL server during query"),
+}
+# 注入后断开连接的错误码
+DISCONNECT_CODES = (2006, 2013)
+
+# SQL词法单元，按顺序尝试；/*!40101 ... */ 中的内容与MySQL一样照常执行
+TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+|--[^\n]*|\#[^\n]*|/\*(?!!).*?\*/)
+  | (?P<cond>/\*!\d*|\*/)
+  | (?P<str>(?:_binary|_utf8mb4|_utf8|_latin1|N)?(?:'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*"))
+  | (?P<ident>`(?:[^`]|``)*`)
+  | (?P<hex>0[xX][0-9A-Fa-f]+|[xX]'[0-9A-Fa-f]*')
+  | (?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+  | (?P<word>@@?[\w.$]+|(?:[^\W\d]|\$)[\w$]*)
+  | (?P<op><=>|<<|>>|<>|!=|>=|<=|:=|\|\||&&|.)
+""", re.S | re.X)
+
+STRING_ESCAPES = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a"}
+
+# 列定义中类型之后的属性关键字
+COLUMN_ATTRIBUTES = {"NOT", "NULL", "DEFAULT", "PRIMARY", "UNIQUE", "KEY", "AUTO_INCREMENT", "COMMENT", "CHARACTER",
+                     "CHARSET", "COLLATE", "GENERATED", "AS", "ON", "CHECK", "REFERENCES", "VISIBLE", "INVISIBLE",
+                     "STORED", "VIRTUAL", "SRID", "COLUMN_FORMAT", "STORAGE"}
+
+# INFORMATION_SCHEMA中的表在SQLite中的名称和列
+CATALOG_TABLES = {
+    "TABLES": ("__information_schema_tables",
+               "TABLE_SCHEMA, TABLE_NAME, TABLE_TYPE, ENGINE, TABLE_COLLATION, CREATE_OPTIONS"),
+    "COLUMNS": ("__information_schema_columns",
+                "TABLE_SCHEMA, TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION, COLUMN_DEFAULT, IS_NULLABLE, DATA_TYPE, "
+                "COLUMN_TYPE, COLUMN_KEY, EXTRA, CHARACTER_MAXIMUM_LENGTH, NUMERIC_PRECISION, NUMERIC_SCALE, COLUMN_COMMENT"),
+    "STATISTICS": ("__information_schema_statistics",
+                   "TABLE_SCHEMA, TABLE_NAME, NON_UNIQUE, INDEX_NAME, SEQ_IN_INDEX, COLUMN_NAME, COLLATION, "
+                   "SUB_PART, INDEX_TYPE"),
+}
+
+LOAD_DATA_CHARSETS = {"utf8mb4": "utf-8", "utf8": "utf-8", "utf8mb3": "utf-8", "latin1": "latin-1",
+                      "binary": "latin-1", "gbk": "gbk", "gb18030": "gb18030", "ascii": "ascii"}
+
+
+class MySQLError(Exception):
+    """返回给客户端的错误"""
+
+    def __init__(self, code, message=None):
+        self.code = code
+        self.sqlstate, default = ERRORS.get(code, ("HY000", "Error"))
+        self.message = message or default
+        super().__init__(f"({code}) {self.message}")
+
+
+def tokenize(sql):
+    """把SQL切分为 (类型, 文本) 序列，类型为 ws/str/ident/hex/num/word/op"""
+    return [(match.lastgroup, match.group()) for match in TOKEN_RE.finditer(sql)]
+
+
+def decode_string(text):
+    """MySQL字符串字面量的值，_binary前缀的为bytes"""
+    quote = text.index("'") if "'" in text[:9] and not text.startswith('"') else text.index('"')
+    prefix, q, body = text[:quote], text[quote], text[quote + 1:-1]
+    value = re.sub(r"\\(.)|" + q + q, lambda m: STRING_ESCAPES.get(m.group(1), m.group(1)) if m.group(1) is not None else q,
+                   body, flags=re.S)
+    if prefix == "_binary":
+        return value.encode("utf-8", "surrogateescape")
+    return value
+
+
+def decode_hex(text):
+    if text[0] in "xX":
+        return bytes.fromhex(text[2:-1])
+    return bytes.fromhex(text[2:] if len(text) % 2 == 0 else "0" + text[2:])
+
+
+def identifier(token):
+    """标识符的名称(去掉反引号)"""
+    kind, text = token
+    if kind == "ident":
+        return text[1:-1].replace("``", "`")
+    return text
+
+
+def quote_sqlite(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def split_top_level(tokens, separator=","):
+    """按不在括号内的分隔符切分词法单元序列"""
+    parts = [[]]
+    depth = 0
+    for token in tokens:
+        if token[0] == "op" and token[1] == "(":
+            depth += 1
+        elif token[0] == "op" and token[1] == ")":
+            depth -= 1
+        if depth == 0 and token[0] == "op" and token[1] == separator:
+            parts.append([])
+            continue
+        parts[-1].append(token)
+    return [part for part in parts if part]
+
+
+def matching_paren(tokens, start):
+    """tokens[start] 为左括号，返回对应右括号的位置"""
+    depth = 0
+    for pos in range(start, len(tokens)):
+        if tokens[pos] == ("op", "("):
+            depth += 1
+        elif tokens[pos] == ("op", ")"):
+            depth -= 1
+            if depth == 0:
+                return pos
+    raise MySQLError(1064, "括号不匹配")
+
+
+def tokens_text(tokens):
+    return " ".join(text for _, text in tokens)
+
+
+def parse_size(text):
+    """解析 64MB、4M、1048576 等字节数"""
+    match = re.fullmatch(r"\s*(\d+)\s*([KMG]?)B?\s*", str(text), re.I)
+    if not match:
+        raise ValueError(f"无法解析的大小: {text}")
+    return int(match.group(1)) * {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}[match.group(2).upper()]
+
+
+def parse_fault(spec):
+    """
+    解析故障注入规则 CODE[:PATTERN][:every=N|rate=P][:after=N][:limit=N][:wait=秒]
+    返回规则字典；也接受已经是字典的规则
+    """
+    if isinstance(spec, dict):
+        fault = dict(spec)
+    else:
+        parts = str(spec).split(":")
+        try:
+            fault = {"code": int(parts[0])}
+        except ValueError:
+            raise ValueError(f"故障注入规则必须以错误码开头: {spec}")
+        for part in parts[1:]:
+            key, sep, value = part.partition("=")
+            if sep and key in ("every", "after", "limit"):
+                fault[key] = int(value)
+            elif sep and key in ("rate", "wait"):
+                fault[key] = float(value)
+            elif part:
+                fault["match"] = part
+    fault.setdefault("match", None)
+    fault.setdefault("every", None)
+    fault.setdefault("rate", None)
+    fault.setdefault("after", 0)
+    fault.setdefault("limit", None)
+    fault.setdefault("wait", 0.0)
+    fault["pattern"] = re.compile(fault["match"], re.I) if fault["match"] else None
+    fault["seen"] = 0
+    fault["injected"] = 0
+    return fault
+
+
+def mysql_text(value):
+    """值在MySQL中转换为字符串时的文本(DOUBLE为最短往返表示，整数不带小数点)"""
+    if isinstance(value, float):
+        text = repr(value)
+        if text.endswith(".0"):
+            return text[:-2]
+        if "e" in text:
+            mantissa, exponent = text.split("e")
+            return (mantissa[:-2] if mantissa.endswith(".0") else mantissa) + "e" + str(int(exponent))
+        return text
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "surrogateescape")
+    return str(value)
+
+
+def sql_crc32(value):
+    if value is None:
+        return None
+    return zlib.crc32(mysql_text(value).encode("utf-8", "surrogateescape"))
+
+
+def sql_concat_ws(separator, *values):
+    if separator is None:
+        return None
+    return mysql_text(separator).join(mysql_text(value) for value in values if value is not None)
+
+
+def sql_format(value, places):
+    """FORMAT(X, D): 精确数值按四舍五入，DOUBLE按放大后rint取整，千位加逗号"""
+    if value is None or places is None:
+        return None
+    places = max(int(places), 0)
+    if isinstance(value, float):
+        scale = 10 ** places
+        rounded = round(value * scale) / scale
+        return format(rounded if rounded else 0.0 * value, f",.{places}f")
+    try:
+        number = decimal.Decimal(str(value).strip()).quantize(decimal.Decimal(1).scaleb(-places), decimal.ROUND_HALF_UP)
+    except decimal.InvalidOperation:
+        number = decimal.Decimal(0).quantize(decimal.Decimal(1).scaleb(-places))
+    return format(number.copy_abs() if number.is_zero() else number, f",.{places}f")
+
+
+# DATE_FORMAT格式符 -> strftime格式符
+DATE_FORMAT_CODES = {"Y": "%Y", "y": "%y", "m": "%m", "c": "%-m", "d": "%d", "e": "%-d", "H": "%H", "h": "%I",
+                     "i": "%M", "s": "%S", "S": "%S", "f": "%f", "p": "%p", "M": "%B", "b": "%b", "W": "%A",
+                     "a": "%a", "j": "%j", "T": "%H:%M:%S", "%": "%%"}
+
+
+def sql_date_format(value, fmt):
+    if value is None or fmt is None:
+        return None
+    try:
+        moment = datetime.datetime.fromisoformat(mysql_text(value).strip())
+    except ValueError:
+        return None
+    return moment.strftime(re.sub(r"%(.)", lambda m: DATE_FORMAT_CODES.get(m.group(1), m.group(1)), fmt))
+
+
+class BitXor:
+    """BIT_XOR聚合"""
+
+    def __init__(self):
+        self.value = 0
+
+    def step(self, value):
+        if value is not None:
+            self.value ^= int(value)
+
+    def finalize(self):
+        return self.value
+
+
+def coercer(column_type):
+    """
+    写入前按列类型转换值，与MySQL存储的结果一致，不需要转换时返回None:
+    DECIMAL(p,s) 四舍五入到s位，整数列中的非整数四舍五入，字符串列中的浮点数转为MySQL的文本，
+    DATETIME/TIMESTAMP 的小数秒四舍五入到秒，DATE 去掉时间部分
+    """
+    match = re.match(r"(decimal|numeric)(?:\((\d+)(?:,(\d+))?\))?", column_type)
+    if match:
+        quantum = decimal.Decimal(1).scaleb(-int(match.group(3) or 0))
+
+        def convert(value):
+            if value is None or isinstance(value, bytes):
+                return value
+            try:
+                number = decimal.Decimal(repr(value) if isinstance(value, float) else str(value).strip())
+                return str(number.quantize(quantum, decimal.ROUND_HALF_UP))
+            except decimal.InvalidOperation:
+                return value
+        return convert
+    if re.match(r"(tiny|small|medium|big)?int|integer", column_type):
+        def convert(value):
+            if isinstance(value, float) and value == value and abs(value) != float("inf"):
+                return int(decimal.Decimal(repr(value)).quantize(decimal.Decimal(1), decimal.ROUND_HALF_UP))
+            return value
+        return convert
+    match = re.match(r"(date)(time)?|timestamp", column_type)
+    if match:
+        with_time = match.group(1) is None or match.group(2) is not None
+
+        def convert(value):
+            if not isinstance(value, (str, datetime.date)):
+                return value
+            try:
+                moment = datetime.datetime.fromisoformat(str(value).strip())
+            except ValueError:
+                return value
+            if not with_time:
+                return moment.strftime("%Y-%m-%d")
+            if moment.microsecond >= 500000:
+                moment += datetime.timedelta(seconds=1)
+            return moment.strftime("%Y-%m-%d %H:%M:%S")
+        return convert
+    if re.match(r"(var)?char|(tiny|medium|long)?text|enum|set", column_type):
+        def convert(value):
+            return mysql_text(value) if isinstance(value, float) else value
+        return convert
+    return None
+
+
+class FakeMySQLServer:
+    """
+    模拟MySQL服务器，在后台线程中监听，每个客户端连接一个线程和一个SQLite连接
+
+    参数:
+        host/port: 监听地址，port为0时自动选择空闲端口
+        database: 数据库名，客户端连接任意库名都访问同一份数据
+        user/password: password为None时接受任何用户和密码
+        store: SQLite文件路径，默认为进程内的共享内存库(服务器停止后丢弃)
+        latency: 每条命令回复前的等待秒数，模拟网络往返
+        max_allowed_packet: 超过该大小的语句返回1153并断开连接，与MySQL一致
+        faults: 故障注入规则列表，见 parse_fault
+        strict: 是否按严格模式检查写入的值
+        seed: 按比例注入故障时随机数的种子，相同种子的注入位置相同
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, database="fake", user=None, password=None, store=None,
+                 latency=0.0, max_allowed_packet=64 * 1024 * 1024, faults=None, strict=True, seed=0):
+        self.host = host
+        self.port = port
+        self.database = database
+        self.user = user
+        self.password = password
+        self.latency = latency
+        self.max_allowed_packet = max_allowed_packet
+        self.faults = [parse_fault(fault) for fault in faults or []]
+        self.strict = strict
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.connection_ids = itertools.count(1)
+        self.stats = {"connections": 0, "commands": 0, "queries": 0, "rows_inserted": 0, "bytes_received": 0,
+                      "bytes_sent": 0, "max_statement_bytes": 0, "commits": 0, "rollbacks": 0, "errors": {},
+                      "faults": {}}
+        self.variables = {
+            "version": SERVER_VERSION,
+            "version_comment": "data_importer fake server",
+            "max_allowed_packet": str(max_allowed_packet),
+            "local_infile": "ON",
+            "autocommit": "ON",
+            "character_set_server": "utf8mb4",
+            "collation_server": "utf8mb4_0900_ai_ci",
+            "sql_mode": "STRICT_TRANS_TABLES" if strict else "",
+            "innodb_lock_wait_timeout": "50",
+            "wait_timeout": "28800",
+            "net_buffer_length": "16384",
+            "bulk_insert_buffer_size": "8388608",
+            "innodb_buffer_pool_size": "134217728",
+            "lower_case_table_names": "0",
+        }
+
+        if store:
+            self.store_uri = os.path.abspath(store)
+            self.store_is_uri = False
+        else:
+            self.store_uri = f"file:fake_mysql_{id(self)}?mode=memory&cache=shared"
+            self.store_is_uri = True
+        self.keeper = None
+        self.tcp_server = None
+        self.thread = None
+        self.table_columns = {}
+
+    def connect_store(self):
+        """打开一个到存储库的SQLite连接，事务由调用方显式管理"""
+        conn = sqlite3.connect(self.store_uri, uri=self.store_is_uri, isolation_level=None,
+                               check_same_thread=False, timeout=5.0)
+        conn.create_function("CRC32", 1, sql_crc32, deterministic=True)
+        conn.create_function("CONCAT_WS", -1, sql_concat_ws, deterministic=True)
+        conn.create_function("FORMAT", 2, sql_format, deterministic=True)
+        conn.create_function("DATE_FORMAT", 2, sql_date_format, deterministic=True)
+        conn.create_aggregate("BIT_XOR", 1, BitXor)
+        if not self.store_is_uri:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+        return conn
+
+    def start(self):
+        """开始在后台线程中监听，返回自身"""
+        # 共享内存库在最后一个连接关闭时消失，由这个连接保持到服务器停止
+        self.keeper = self.connect_store()
+        for _, (table, columns) in CATALOG_TABLES.items():
+            self.keeper.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                _Session(server, self.request).run()
+
+        class TCPServer(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self.tcp_server = TCPServer((self.host, self.port), Handler)
+        self.port = self.tcp_server.server_address[1]
+        self.thread = threading.Thread(target=self.tcp_server.serve_forever, name="fake-mysql", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.tcp_server is not None:
+            self.tcp_server.shutdown()
+            self.tcp_server.server_close()
+            self.tcp_server = None
+        if self.keeper is not None:
+            self.keeper.close()
+            self.keeper = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def conn_info(self):
+        """与导入引擎的 mysql_conn_info 格式相同的连接信息"""
+        return {"host": self.host, "port": self.port, "user": self.user or "root",
+                "password": self.password or "", "database": self.database}
+
+    @property
+    def url(self):
+        return f"mysql://{self.user or 'root'}@{self.host}:{self.port}/{self.database}"
+
+    def query(self, sql, params=()):
+        """直接在存储库上执行SQLite语句并返回所有行，用于检查导入结果"""
+        conn = self.connect_store()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def count_error(self, key, code):
+        with self.lock:
+            self.stats[key][code] = self.stats[key].get(code, 0) + 1
+
+    def pick_fault(self, sql):
+        """按注入规则决定这条语句是否返回错误，返回触发的规则或None"""
+        if not self.faults:
+            return None
+        with self.lock:
+            for fault in self.faults:
+                if fault["pattern"] is not None and not fault["pattern"].search(sql):
+                    continue
+                fault["seen"] += 1
+                if fault["seen"] <= fault["after"]:
+                    continue
+                if fault["limit"] is not None and fault["injected"] >= fault["limit"]:
+                    continue
+                if fault["every"]:
+                    hit = (fault["seen"] - fault["after"]) % fault["every"] == 0
+                elif fault["rate"] is not None:
+                    hit = self.random.random() < fault["rate"]
+                else:
+                    hit = True
+                if hit:
+                    fault["injected"] += 1
+                    self.stats["faults"][fault["code"]] = self.stats["faults"].get(fault["code"], 0) + 1
+                    return fault
+        return None
+
+    def columns_of(self, conn, table):
+        """表的 [(列名, 小写的列类型, 可否为NULL)]，按列顺序；表不存在时返回None"""
+        with self.lock:
+            cached = self.table_columns.get(table)
+        if cached is not None:
+            return cached
+        rows = conn.execute(
+            "SELECT COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE FROM __information_schema_columns "
+            "WHERE TABLE_NAME = ? ORDER BY ORDINAL_POSITION", (table,)).fetchall()
+        if not rows:
+            return None
+        columns = [(name, column_type, nullable == "YES") for name, column_type, nullable in rows]
+        with self.lock:
+            self.table_columns[table] = columns
+        return columns
+
+    def invalidate(self):
+        """DDL之后清除列定义缓存"""
+        with self.lock:
+            self.table_columns.clear()
+
+
+class _Session:
+    """一个客户端连接：收发协议包、管理事务，把语句翻译为SQLite执行"""
+
+    def __init__(self, server, sock):
+        self.server = server
+        self.sock = sock
+        self.rfile = sock.makefile("rb")
+        self.seq = 0
+        self.connection_id = next(server.connection_ids)
+        self.store = None
+        self.autocommit = True
+        self.variables = {}
+        self.warnings = 0
+        self.closed = False
+
+    # ---- 协议包 ----
+
+    def read_packet(self):
+        """读取一个完整的协议包(超过16MB的包由多个分片组成)"""
+        payload = b""
+        while True:
+            header = self.rfile.read(4)
+            if len(header) < 4:
+                raise ConnectionError("客户端断开连接")
+            length = header[0] | header[1] << 8 | header[2] << 16
+            self.seq = (header[3] + 1) & 0xff
+            data = self.rfile.read(length)
+            if len(data) < length:
+                raise ConnectionError("客户端断开连接")
+            payload += data
+            if length < MAX_PACKET_PAYLOAD:
+                break
+        self.server.count("bytes_received", len(payload) + 4)
+        return payload
+
+    def pack(self, payload):
+        """把一个包编码为带包头的字节串，超过16MB时分片"""
+        chunks = []
+        while True:
+            part = payload[:MAX_PACKET_PAYLOAD]
+            payload = payload[MAX_PACKET_PAYLOAD:]
+            chunks.append(struct.pack("<I", len(part))[:3] + bytes([self.seq]) + part)
+            self.seq = (self.seq + 1) & 0xff
+            if len(part) < MAX_PACKET_PAYLOAD:
+                break
+        return b"".join(chunks)
+
+    def send(self, *payloads):
+        data = b"".join(self.pack(payload) for payload in payloads)
+        self.server.count("bytes_sent", len(data))
+        self.sock.sendall(data)
+
+    @staticmethod
+    def lenenc_int(value):
+        if value < 251:
+            return bytes([value])
+        if value < 1 << 16:
+            return b"\xfc" + struct.pack("<H", value)
+        if value < 1 << 24:
+            return b"\xfd" + struct.pack("<I", value)[:3]
+        return b"\xfe" + struct.pack("<Q", value)
+
+    @staticmethod
+    def lenenc_str(value):
+        if isinstance(value, str):
+            value = value.encode("utf-8", "surrogateescape")
+        return _Session.lenenc_int(len(value)) + value
+
+    def status(self):
+        flags = SERVER_STATUS_AUTOCOMMIT if self.autocommit else 0
+        if self.store is not None and self.store.in_transaction:
+            flags |= SERVER_STATUS_IN_TRANS
+        return flags
+
+    def ok_packet(self, affected_rows=0, insert_id=0, info=""):
+        return (b"\x00" + self.lenenc_int(affected_rows) + self.lenenc_int(insert_id) +
+                struct.pack("<HH", self.status(), min(self.warnings, 0xffff)) + info.encode("utf-8"))
+
+    def eof_packet(self):
+        return b"\xfe" + struct.pack("<HH", min(self.warnings, 0xffff), self.status())
+
+    def error_packet(self, error):
+        return (b"\xff" + struct.pack("<H", error.code) + b"#" + error.sqlstate.encode("ascii") +
+                error.message.encode("utf-8"))
+
+    def send_result_set(self, names, rows):
+        """按文本协议发送结果集，列类型由第一个非空值决定"""
+        packets = [self.lenenc_int(len(names))]
+        for pos, name in enumerate(names):
+            sample = next((row[pos] for row in rows if row[pos] is not None), None)
+            if isinstance(sample, bool) or isinstance(sample, int):
+                field_type, charset, length = FIELD_TYPE_LONGLONG, CHARSET_BINARY, 20
+            elif isinstance(sample, float):
+                field_type, charset, length = FIELD_TYPE_DOUBLE, CHARSET_BINARY, 22
+            elif isinstance(sample, bytes):
+                field_type, charset, length = FIELD_TYPE_BLOB, CHARSET_BINARY, 65535
+            else:
+                field_type, charset, length = FIELD_TYPE_VAR_STRING, CHARSET_UTF8MB4, 1024
+            packets.append(b"".join([
+                self.lenenc_str("def"), self.lenenc_str(self.server.database), self.lenenc_str(""),
+                self.lenenc_str(""), self.lenenc_str(str(name)), self.lenenc_str(str(name)), b"\x0c",
+                struct.pack("<HIBHB", charset, length, field_type, 0, 31 if field_type == FIELD_TYPE_DOUBLE else 0),
+                b"\x00\x00"]))
+        packets.append(self.eof_packet())
+        for row in rows:
+            packets.append(b"".join(b"\xfb" if value is None else self.lenenc_str(
+                value if isinstance(value, bytes) else repr(value) if isinstance(value, float) else str(value))
+                for value in row))
+        packets.append(self.eof_packet())
+        self.send(*packets)
+
+    # ---- 连接 ----
+
+    def run(self):
+        try:
+            if not self.handshake():
+                return
+            self.store = self.server.connect_store()
+            self.server.count("connections")
+            while not self.closed:
+                payload = self.read_packet()
+                if not payload:
+                    continue
+                self.dispatch(payload)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            if self.store is not None:
+                try:
+                    if self.store.in_transaction:
+                        self.store.execute("ROLLBACK")
+                    self.store.close()
+                except sqlite3.Error:
+                    pass
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+
+    def handshake(self):
+        """发送握手包并校验客户端的认证响应"""
+        salt = bytes(random.randrange(1, 128) for _ in range(20))
+        payload = (b"\x0a" + SERVER_VERSION.encode() + b"\x00" + struct.pack("<I", self.connection_id) +
+                   salt[:8] + b"\x00" + struct.pack("<H", SERVER_CAPABILITIES & 0xffff) + bytes([CHARSET_UTF8MB4]) +
+                   struct.pack("<H", SERVER_STATUS_AUTOCOMMIT) + struct.pack("<H", SERVER_CAPABILITIES >> 16) +
+                   bytes([21]) + b"\x00" * 10 + salt[8:] + b"\x00" + b"mysql_native_password\x00")
+        self.seq = 0
+        self.send(payload)
+
+        response = self.read_packet()
+        capabilities = struct.unpack("<I", response[:4])[0]
+        pos = 32
+        end = response.index(b"\x00", pos)
+        user = response[pos:end].decode("utf-8", "replace")
+        pos = end + 1
+        if capabilities & CLIENT_PLUGIN_AUTH_LENENC_CLIENT_DATA:
+            length = response[pos]
+            pos += 1
+        else:
+            length = response[pos]
+            pos += 1
+        auth = response[pos:pos + length]
+
+        if self.server.password is not None:
+            stage1 = hashlib.sha1(self.server.password.encode("utf-8")).digest()
+            expected = bytes(a ^ b for a, b in zip(
+                stage1, hashlib.sha1(salt + hashlib.sha1(stage1).digest()).digest())) if self.server.password else b""
+            if (self.server.user and user != self.server.user) or auth != expected:
+                self.send(self.error_packet(MySQLError(1045, f"Access denied for user '{user}'")))
+                return False
+        self.send(self.ok_packet())
+        return True
+
+    def dispatch(self, payload):
+        command = payload[0]
+        self.server.count("commands")
+        if command == COM_QUIT:
+            self.closed = True
+            return
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if command in (COM_PING, COM_INIT_DB, COM_RESET_CONNECTION):
+            self.send(self.ok_packet())
+            return
+        if command != COM_QUERY:
+            self.send(self.error_packet(MySQLError(1235, f"Command {command} is not supported by the fake server")))
+            return
+
+        self.server.count("queries")
+        size = len(payload) - 1
+        with self.server.lock:
+            self.server.stats["max_statement_bytes"] = max(self.server.stats["max_statement_bytes"], size)
+        if size > self.server.max_allowed_packet:
+            self.send(self.error_packet(MySQLError(1153)))
+            self.closed = True
+            return
+
+        sql = payload[1:].decode("utf-8", "surrogateescape").strip().rstrip(";")
+        self.warnings = 0
+        fault = self.server.pick_fault(sql)
+        if fault:
+            self.inject(fault)
+            return
+        try:
+            self.execute(sql)
+        except MySQLError as error:
+            self.server.count_error("errors", error.code)
+            self.send(self.error_packet(error))
+
+    def inject(self, fault):
+        code = fault["code"]
+        if fault["wait"]:
+            time.sleep(fault["wait"])
+        if code == 1213 and self.store.in_transaction:
+            self.store.execute("ROLLBACK")
+        if code == 2013:
+            self.closed = True
+            return
+        self.send(self.error_packet(MySQLError(code)))
+        if code in DISCONNECT_CODES:
+            self.closed = True
+
+    # ---- 语句执行 ----
+
+    def execute(self, sql):
+        tokens = [token for token in tokenize(sql) if token[0] not in ("ws", "cond")]
+        if not tokens:
+            raise MySQLError(1064, "Query was empty")
+        words = [text.upper() if kind == "word" else None for kind, text in tokens[:4]]
+        first = words[0]
+
+        if first in ("BEGIN", "START"):
+            self.commit()
+            self.store.execute("BEGIN")
+            self.send(self.ok_packet())
+        elif first == "COMMIT":
+            self.commit()
+            self.send(self.ok_packet())
+        elif first == "ROLLBACK":
+            if self.store.in_transaction:
+                self.store.execute("ROLLBACK")
+                self.server.count("rollbacks")
+            self.send(self.ok_packet())
+        elif first == "SET":
+            self.execute_set(tokens[1:])
+        elif first == "USE":
+            self.send(self.ok_packet())
+        elif first == "SHOW":
+            self.execute_show(tokens[1:])
+        elif first == "LOAD":
+            self.execute_load_data(tokens)
+        elif first in ("CREATE", "ALTER", "DROP", "RENAME", "TRUNCATE"):
+            # DDL隐式提交当前事务
+            self.commit()
+            try:
+                self.execute_ddl(first, tokens)
+            finally:
+                self.server.invalidate()
+        elif first in ("INSERT", "REPLACE"):
+            self.execute_insert(tokens)
+        elif first == "ANALYZE":
+            self.execute_analyze(tokens)
+        else:
+            self.execute_generic(tokens)
+
+    def commit(self):
+        if self.store.in_transaction:
+            self.store.execute("COMMIT")
+            self.server.count("commits")
+
+    def begin_implicit(self):
+        """关闭自动提交时，语句开始一个事务"""
+        if not self.autocommit and not self.store.in_transaction:
+            self.store.execute("BEGIN")
+
+    def run_statement(self, func):
+        """
+        在保存点内执行写入语句：语句失败时只撤销该语句，与InnoDB的语句级原子性一致
+        自动提交模式下语句成功后立即提交
+        """
+        self.begin_implicit()
+        self.store.execute("SAVEPOINT fake_mysql_statement")
+        try:
+            result = func()
+        except sqlite3.Error as e:
+            self.store.execute("ROLLBACK TO fake_mysql_statement")
+            self.store.execute("RELEASE fake_mysql_statement")
+            raise self.translate_error(e)
+        except MySQLError:
+            self.store.execute("ROLLBACK TO fake_mysql_statement")
+            self.store.execute("RELEASE fake_mysql_statement")
+            raise
+        self.store.execute("RELEASE fake_mysql_statement")
+        return result
+
+    def translate_error(self, error):
+        """SQLite错误转换为对应的MySQL错误"""
+        message = str(error)
+        lower = message.lower()
+        if "no such table" in lower:
+            return MySQLError(1146, f"Table '{self.server.database}.{message.split(':')[-1].strip()}' doesn't exist")
+        if "no such column" in lower:
+            return MySQLError(1054, f"Unknown column '{message.split(':')[-1].strip()}' in 'field list'")
+        if "unique constraint" in lower:
+            return MySQLError(1062, f"Duplicate entry for key '{message.split(':')[-1].strip()}'")
+        if "not null constraint" in lower:
+            return MySQLError(1048, f"Column '{message.split('.')[-1].strip()}' cannot be null")
+        if "values were supplied" in lower or "values for" in lower:
+            return MySQLError(1136)
+        if "locked" in lower:
+            return MySQLError(1205)
+        if "already exists" in lower:
+            return MySQLError(1050, message)
+        if "syntax error" in lower or isinstance(error, sqlite3.OperationalError):
+            return MySQLError(1064, message)
+        return MySQLError(1105, message)
+
+    def translate(self, tokens, params=None):
+        """
+        把MySQL语句的词法单元翻译为SQLite语句，字面量改为编号参数
+        返回: (SQL, 参数列表)
+        """
+        params = [] if params is None else params
+        out = []
+        pos = 0
+        while pos < len(tokens):
+            kind, text = tokens[pos]
+            upper = text.upper()
+            nxt = tokens[pos + 1] if pos + 1 < len(tokens) else None
+            if kind == "str":
+                params.append(decode_string(text))
+                out.append(f"?{len(params)}")
+            elif kind == "hex":
+                params.append(decode_hex(text))
+                out.append(f"?{len(params)}")
+            elif kind == "ident":
+                out.append(quote_sqlite(identifier(tokens[pos])))
+            elif kind == "word" and text.startswith("@@"):
+                name = text[2:].split(".")[-1].lower()
+                params.append(self.variable(name))
+                out.append(f"?{len(params)}")
+            elif kind == "word" and upper == "INFORMATION_SCHEMA" and nxt == ("op", ".") and pos + 2 < len(tokens):
+                table = identifier(tokens[pos + 2]).upper()
+                if table not in CATALOG_TABLES:
+                    raise MySQLError(1146, f"Table 'information_schema.{table}' doesn't exist")
+                out.append(CATALOG_TABLES[table][0])
+                pos += 2
+            elif kind == "word" and upper in ("NOW", "CURRENT_TIMESTAMP", "SYSDATE", "DATABASE", "SCHEMA",
+                                              "VERSION", "CURDATE", "CURRENT_DATE") \
+                    and (nxt == ("op", "(") or upper in ("CURRENT_TIMESTAMP", "CURRENT_DATE")):
+                params.append(self.function_value(upper))
+                out.append(f"?{len(params)}")
+                if nxt == ("op", "(") and pos + 2 < len(tokens) and tokens[pos + 2] == ("op", ")"):
+                    pos += 2
+            elif kind == "word" and upper == "VALUES" and nxt == ("op", "(") and pos + 3 < len(tokens) \
+                    and tokens[pos + 3] == ("op", ")"):
+                # ON DUPLICATE KEY UPDATE 中的 VALUES(col)
+                out.append("excluded." + quote_sqlite(identifier(tokens[pos + 2])))
+                pos += 3
+            elif kind == "op" and text == "<=>":
+                out.append("IS")
+            elif kind == "op" and text == "&&":
+                out.append("AND")
+            elif kind == "op" and text == "||":
+                out.append("OR")
+            else:
+                out.append(text)
+            pos += 1
+        return " ".join(out), params
+
+    def function_value(self, name):
+        now = datetime.datetime.now()
+        if name in ("DATABASE", "SCHEMA"):
+            return self.server.database
+        if name == "VERSION":
+            return SERVER_VERSION
+        if name in ("CURDATE", "CURRENT_DATE"):
+            return now.strftime("%Y-%m-%d")
+        return now.strftime("%Y-%m-%d %H:%M:%S")
+
+    def variable(self, name):
+        if name == "autocommit":
+            return 1 if self.autocommit else 0
+        return self.variables.get(name, self.server.variables.get(name))
+
+    def execute_generic(self, tokens):
+        """SELECT/UPDATE/DELETE等语句翻译后交给SQLite执行"""
+        first = tokens[0][1].upper()
+        if first == "UPDATE" and any(kind == "word" and text.upper() == "JOIN" for kind, text in tokens):
+            tokens = self.rewrite_update_join(tokens)
+        sql, params = self.translate(tokens)
+
+        if first in ("SELECT", "WITH", "DESC", "DESCRIBE", "EXPLAIN"):
+            self.begin_implicit()
+            try:
+                cursor = self.store.execute(sql, params)
+                rows = cursor.fetchall()
+            except sqlite3.Error as e:
+                raise self.translate_error(e)
+            names = [column[0] for column in cursor.description or []]
+            self.send_result_set(names, rows)
+            return
+
+        cursor = self.run_statement(lambda: self.store.execute(sql, params))
+        self.autocommit_after()
+        self.send(self.ok_packet(max(cursor.rowcount, 0)))
+
+    def autocommit_after(self):
+        if self.autocommit:
+            self.commit()
+
+    def rewrite_update_join(self, tokens):
+        """
+        UPDATE t a JOIN s b ON 条件 SET a.x = b.x WHERE 条件
+        -> UPDATE t AS a SET x = b.x FROM s AS b WHERE 条件 AND (条件)
+        """
+        upper = [text.upper() if kind == "word" else None for kind, text in tokens]
+        try:
+            join = upper.index("JOIN")
+            on = upper.index("ON", join)
+            set_pos = upper.index("SET", on)
+        except ValueError:
+            raise MySQLError(1235, "Unsupported UPDATE ... JOIN form")
+        where = upper.index("WHERE", set_pos) if "WHERE" in upper[set_pos:] else len(tokens)
+
+        def table_alias(part):
+            part = [token for token in part if token[1].upper() not in ("AS", "INNER")]
+            return part[0], part[1] if len(part) > 1 else part[0]
+
+        target, target_alias = table_alias(tokens[1:join])
+        source, source_alias = table_alias(tokens[join + 1:on])
+        assignments = []
+        for assignment in split_top_level(tokens[set_pos + 1:where]):
+            # SQLite的SET左侧不能带表别名
+            if len(assignment) > 2 and assignment[1] == ("op", "."):
+                assignment = assignment[2:]
+            assignments.append(assignment)
+
+        result = [("word", "UPDATE"), target, ("word", "AS"), target_alias, ("word", "SET")]
+        for pos, assignment in enumerate(assignments):
+            if pos:
+                result.append(("op", ","))
+            result.extend(assignment)
+        result += [("word", "FROM"), source, ("word", "AS"), source_alias, ("word", "WHERE"), ("op", "(")]
+        result += tokens[on + 1:set_pos] + [("op", ")")]
+        if where < len(tokens):
+            result += [("word", "AND"), ("op", "(")] + tokens[where + 1:] + [("op", ")")]
+        return result
+
+    def execute_set(self, tokens):
+        for assignment in split_top_level(tokens):
+            words = [token for token in assignment if token[1].upper() not in ("SESSION", "GLOBAL", "LOCAL")]
+            if not words:
+                continue
+            name = identifier(words[0]).lstrip("@").split(".")[-1].lower()
+            if name == "names" or name == "character":
+                continue
+            value = words[-1]
+            value = decode_string(value[1]) if value[0] == "str" else value[1]
+            if name == "autocommit":
+                enabled = str(value).upper() in ("1", "ON", "TRUE")
+                if enabled and not self.autocommit:
+                    self.commit()
+                self.autocommit = enabled
+            else:
+                self.variables[name] = str(value)
+        self.send(self.ok_packet())
+
+    def execute_show(self, tokens):
+        words = [text.upper() for kind, text in tokens if kind == "word"]
+        pattern = next((decode_string(text) for kind, text in tokens if kind == "str"), None)
+        regex = None
+        if pattern is not None:
+            regex = re.compile("^" + re.escape(pattern).replace("%", ".*").replace("_", ".") + "$", re.I)
+
+        if "VARIABLES" in words:
+            variables = dict(self.server.variables, **self.variables)
+            variables["autocommit"] = "ON" if self.autocommit else "OFF"
+            rows = [(name, value) for name, value in sorted(variables.items()) if regex is None or regex.match(name)]
+            self.send_result_set(["Variable_name", "Value"], rows)
+        elif "TABLES" in words:
+            tables = self.store.execute(
+                "SELECT TABLE_NAME FROM __information_schema_tables ORDER BY TABLE_NAME").fetchall()
+            self.send_result_set([f"Tables_in_{self.server.database}"],
+                                 [row for row in tables if regex is None or regex.match(row[0])])
+        elif "WARNINGS" in words:
+            self.send_result_set(["Level", "Code", "Message"], [])
+        else:
+            raise MySQLError(1235, "SHOW " + " ".join(words) + " is not supported by the fake server")
+
+    def execute_analyze(self, tokens):
+        """ANALYZE [NO_WRITE_TO_BINLOG | LOCAL] TABLE 表, ...：对每个表执行SQLite的ANALYZE，按MySQL的格式返回结果"""
+        words = [(kind, text) for kind, text in tokens[1:] if not (kind == "op" and text == ",")]
+        while words and words[0][0] == "word" and words[0][1].upper() in ("NO_WRITE_TO_BINLOG", "LOCAL", "TABLE"):
+            words.pop(0)
+        self.commit()
+        rows = []
+        for token in words:
+            table = identifier(token)
+            if self.table_exists(table):
+                self.store.execute(f"ANALYZE {quote_sqlite(table)}")
+                rows.append((f"{self.server.database}.{table}", "analyze", "status", "OK"))
+            else:
+                rows.append((f"{self.server.database}.{table}", "analyze", "Error", f"Table '{self.server.database}.{table}' doesn't exist"))
+        self.send_result_set(["Table", "Op", "Msg_type", "Msg_text"], rows)
+
+    # ---- INSERT ----
+
+    def execute_insert(self, tokens):
+        """
+        INSERT/REPLACE ... VALUES 逐行解析字面量后用一条executemany写入，不受SQLite参数个数的限制
+        INSERT ... SELECT 等其他形式按普通语句执行
+        """
+        parsed = self.parse_insert(tokens)
+        if parsed is None:
+            self.execute_generic(tokens)
+            return
+        table, columns, rows, verb, tail_tokens = parsed
+        table_columns = self.server.columns_of(self.store, table)
+        if table_columns is None:
+            raise MySQLError(1146, f"Table '{self.server.database}.{table}' doesn't exist")
+        if columns is None:
+            columns = [name for name, _, _ in table_columns]
+        for row_no, row in enumerate(rows, 1):
+            if len(row) != len(columns):
+                raise MySQLError(1136, f"Column count doesn't match value count at row {row_no}")
+        if self.server.strict and verb != "INSERT OR IGNORE":
+            self.check_values(table_columns, columns, rows)
+        rows = self.coerce_values(table_columns, columns, rows)
+
+        placeholders = ", ".join(f"?{pos}" for pos in range(1, len(columns) + 1))
+        sql = (f"{verb} INTO {quote_sqlite(table)} (" + ", ".join(quote_sqlite(col) for col in columns) +
+               f") VALUES ({placeholders})")
+        tail_params = []
+        if tail_tokens:
+            tail_sql, tail_params = self.translate(tail_tokens, [None] * len(columns))
+            tail_params = tail_params[len(columns):]
+            sql += " ON CONFLICT DO UPDATE SET " + tail_sql
+        if tail_params:
+            rows = [list(row) + tail_params for row in rows]
+
+        def insert():
+            before = self.store.total_changes
+            self.store.executemany(sql, rows)
+            return self.store.total_changes - before
+
+        affected = self.run_statement(insert)
+        last_id = self.store.execute("SELECT last_insert_rowid()").fetchone()[0]
+        self.autocommit_after()
+        self.server.count("rows_inserted", len(rows))
+        first_id = max(last_id - len(rows) + 1, 0) if last_id else 0
+        self.send(self.ok_packet(affected, first_id, f"Records: {len(rows)}  Duplicates: 0  Warnings: 0"
+                                 if len(rows) > 1 else ""))
+
+    def parse_insert(self, tokens):
+        """
+        解析 INSERT [IGNORE] [INTO] 表 [PARTITION (...)] [(列, ...)] VALUES (...), ... [ON DUPLICATE KEY UPDATE ...]
+        返回: (表名, 列名列表或None, 行值列表, SQLite动词, ON DUPLICATE KEY UPDATE之后的词法单元)；不是这种形式时返回None
+        """
+        pos = 1
+        verb = "INSERT" if tokens[0][1].upper() == "INSERT" else "INSERT OR REPLACE"
+        while pos < len(tokens) and tokens[pos][0] == "word" and tokens[pos][1].upper() in (
+                "IGNORE", "INTO", "LOW_PRIORITY", "DELAYED", "HIGH_PRIORITY"):
+            if tokens[pos][1].upper() == "IGNORE":
+                verb = "INSERT OR IGNORE"
+            pos += 1
+        if pos >= len(tokens):
+            return None
+        table = identifier(tokens[pos])
+        pos += 1
+        if pos + 1 < len(tokens) and tokens[pos] == ("op", "."):
+            table = identifier(tokens[pos + 1])
+            pos += 2
+        if pos < len(tokens) and tokens[pos][1].upper() == "PARTITION":
+            pos = matching_paren(tokens, pos + 1) + 1
+
+        columns = None
+        if pos < len(tokens) and tokens[pos] == ("op", "("):
+            end = matching_paren(tokens, pos)
+            columns = [identifier(part[0]) for part in split_top_level(tokens[pos + 1:end])]
+            pos = end + 1
+        if pos >= len(tokens) or tokens[pos][1].upper() not in ("VALUES", "VALUE"):
+            return None
+        pos += 1
+
+        rows = []
+        now = self.function_value("NOW")
+        while pos < len(tokens):
+            if tokens[pos] != ("op", "("):
+                return None
+            row = []
+            pos += 1
+            while True:
+                kind, text = tokens[pos]
+                sign = ""
+                if kind == "op" and text in ("-", "+") and tokens[pos + 1][0] == "num":
+                    sign = "-" if text == "-" else ""
+                    pos += 1
+                    kind, text = tokens[pos]
+                if kind == "str":
+                    row.append(decode_string(text))
+                elif kind == "num":
+                    text = sign + text
+                    row.append(int(text) if re.fullmatch(r"-?\d+", text) and abs(int(text)) < 1 << 63 else
+                               float(text) if "e" in text.lower() else text)
+                elif kind == "hex":
+                    row.append(decode_hex(text))
+                elif kind == "word" and text.upper() == "NULL":
+                    row.append(None)
+                elif kind == "word" and text.upper() in ("TRUE", "FALSE"):
+                    row.append(1 if text.upper() == "TRUE" else 0)
+                elif kind == "word" and text.upper() in ("NOW", "CURRENT_TIMESTAMP"):
+                    row.append(now)
+                    if tokens[pos + 1] == ("op", "(") and tokens[pos + 2] == ("op", ")"):
+                        pos += 2
+                else:
+                    return None
+                pos += 1
+                if tokens[pos] == ("op", ","):
+                    pos += 1
+                    continue
+                if tokens[pos] == ("op", ")"):
+                    pos += 1
+                    break
+                return None
+            rows.append(row)
+            if pos < len(tokens) and tokens[pos] == ("op", ","):
+                pos += 1
+                continue
+            break
+
+        tail = None
+        if pos < len(tokens):
+            words = [text.upper() for _, text in tokens[pos:pos + 4]]
+            if words != ["ON", "DUPLICATE", "KEY", "UPDATE"] or verb != "INSERT":
+                return None
+            tail = tokens[pos + 4:]
+        return table, columns, rows, verb, tail
+
+    @staticmethod
+    def coerce_values(table_columns, columns, rows):
+        """按列类型转换要写入的值，见 coercer"""
+        types = {name: column_type for name, column_type, _ in table_columns}
+        converters = [(pos, coercer(types.get(col, ""))) for pos, col in enumerate(columns)]
+        converters = [(pos, convert) for pos, convert in converters if convert is not None]
+        if not converters:
+            return rows
+        coerced = []
+        for row in rows:
+            row = list(row)
+            for pos, convert in converters:
+                row[pos] = convert(row[pos])
+            coerced.append(row)
+        return coerced
+
+    def check_values(self, table_columns, columns, rows):
+        """严格模式：字符串超长、非数值写入数值列、无法识别的日期时间，整条语句失败"""
+        types = {name: (column_type, nullable) for name, column_type, nullable in table_columns}
+        checks = []
+        for pos, col in enumerate(columns):
+            if col not in types:
+                raise MySQLError(1054, f"Unknown column '{col}' in 'field list'")
+            column_type, nullable = types[col]
+            match = re.match(r"(var)?char\((\d+)\)", column_type)
+            if match:
+                checks.append((pos, col, "length", int(match.group(2)), nullable))
+            elif re.match(r"(tiny|small|medium|big)?int|integer", column_type):
+                checks.append((pos, col, "integer", None, nullable))
+            elif re.match(r"decimal|numeric|float|double|real", column_type):
+                checks.append((pos, col, "decimal", None, nullable))
+            elif re.match(r"date|datetime|timestamp", column_type):
+                checks.append((pos, col, "datetime", None, nullable))
+            elif not nullable:
+                checks.append((pos, col, None, None, nullable))
+
+        number = re.compile(r"\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*")
+        date = re.compile(r"\s*\d{4}-\d{1,2}-\d{1,2}([ T]\d{1,2}:\d{1,2}(:\d{1,2}(\.\d+)?)?)?\s*")
+        for row_no, row in enumerate(rows, 1):
+            for pos, col, kind, size, nullable in checks:
+                value = row[pos]
+                if value is None:
+                    if not nullable:
+                        raise MySQLError(1048, f"Column '{col}' cannot be null")
+                    continue
+                if kind == "length":
+                    if len(value if isinstance(value, (str, bytes)) else str(value)) > size:
+                        raise MySQLError(1406, f"Data too long for column '{col}' at row {row_no}")
+                elif kind in ("integer", "decimal"):
+                    if isinstance(value, (str, bytes)) and not number.fullmatch(
+                            value.decode("latin-1") if isinstance(value, bytes) else value):
+                        raise MySQLError(1366, f"Incorrect {kind} value: '{value}' for column '{col}' at row {row_no}")
+                elif kind == "datetime":
+                    if isinstance(value, str) and not date.fullmatch(value):
+                        raise MySQLError(1292, f"Incorrect datetime value: '{value}' for column '{col}' at row {row_no}")
+
+    # ---- LOAD DATA LOCAL INFILE ----
+
+    def execute_load_data(self, tokens):
+        """
+        LOAD DATA LOCAL INFILE '文件' [REPLACE|IGNORE] INTO TABLE 表 [CHARACTER SET 字符集]
+            [FIELDS [TERMINATED BY ''] [[OPTIONALLY] ENCLOSED BY ''] [ESCAPED BY '']]
+            [LINES [STARTING BY ''] [TERMINATED BY '']] [IGNORE N LINES] [(列, ...)]
+        向客户端请求文件内容后解析写入；LOCAL方式遇到重复键时与MySQL一样跳过该行
+        """
+        upper = [text.upper() if kind == "word" else None for kind, text in tokens]
+        if "LOCAL" not in upper or "INFILE" not in upper:
+            raise MySQLError(1235, "Only LOAD DATA LOCAL INFILE is supported by the fake server")
+        pos = upper.index("INFILE") + 1
+        file_name = decode_string(tokens[pos][1])
+        pos += 1
+        verb = "INSERT OR IGNORE"
+        options = {"fields": "\t", "enclosed": "", "escaped": "\\", "lines": "\n", "starting": "", "ignore": 0,
+                   "charset": "utf-8"}
+        table = None
+        columns = None
+        section = None
+        while pos < len(tokens):
+            word = upper[pos]
+            if word == "REPLACE":
+                verb = "INSERT OR REPLACE"
+            elif word == "TABLE":
+                pos += 1
+                table = identifier(tokens[pos])
+            elif word == "CHARACTER" and upper[pos + 1] == "SET":
+                pos += 2
+                charset = identifier(tokens[pos]).lower()
+                options["charset"] = LOAD_DATA_CHARSETS.get(charset, charset)
+            elif word in ("FIELDS", "COLUMNS", "LINES"):
+                section = word
+            elif word in ("TERMINATED", "ENCLOSED", "ESCAPED", "STARTING") and upper[pos + 1] == "BY":
+                value = decode_string(tokens[pos + 2][1])
+                key = {"TERMINATED": "lines" if section == "LINES" else "fields", "ENCLOSED": "enclosed",
+                       "ESCAPED": "escaped", "STARTING": "starting"}[word]
+                options[key] = value
+                pos += 2
+            elif word == "IGNORE" and tokens[pos + 1][0] == "num":
+                options["ignore"] = int(tokens[pos + 1][1])
+                pos += 2
+            elif word == "IGNORE":
+                verb = "INSERT OR IGNORE"
+            elif tokens[pos] == ("op", "("):
+                end = matching_paren(tokens, pos)
+                columns = [identifier(part[0]) for part in split_top_level(tokens[pos + 1:end])]
+                pos = end
+            pos += 1
+        if table is None:
+            raise MySQLError(1064, "LOAD DATA缺少 INTO TABLE")
+
+        # 请求客户端发送文件内容，以空包结束
+        self.send(b"\xfb" + file_name.encode("utf-8", "surrogateescape"))
+        chunks = []
+        while True:
+            packet = self.read_packet()
+            if not packet:
+                break
+            chunks.append(packet)
+        try:
+            text = b"".join(chunks).decode(options["charset"])
+        except (UnicodeDecodeError, LookupError) as e:
+            raise MySQLError(1300, f"Invalid {options['charset']} character string: {e}")
+
+        records = self.parse_load_data(text, options)[options["ignore"]:]
+        table_columns = self.server.columns_of(self.store, table)
+        if table_columns is None:
+            raise MySQLError(1146, f"Table '{self.server.database}.{table}' doesn't exist")
+        if columns is None:
+            columns = [name for name, _, _ in table_columns]
+        # 字段数不一致时与MySQL一样补NULL或截断，并计为警告
+        rows = []
+        warnings = 0
+        for record in records:
+            if len(record) != len(columns):
+                warnings += 1
+                record = (record + [None] * len(columns))[:len(columns)]
+            rows.append(record)
+        self.warnings = warnings
+        rows = self.coerce_values(table_columns, columns, rows)
+
+        sql = (f"{verb} INTO {quote_sqlite(table)} (" + ", ".join(quote_sqlite(col) for col in columns) +
+               ") VALUES (" + ", ".join("?" * len(columns)) + ")")
+
+        def load():
+            before = self.store.total_changes
+            self.store.executemany(sql, rows)
+            return self.store.total_changes - before
+
+        affected = self.run_statement(load)
+        self.autocommit_after()
+        self.server.count("rows_inserted", affected)
+        skipped = len(rows) - affected if verb == "INSERT OR IGNORE" else 0
+        self.send(self.ok_packet(affected, 0, f"Records: {len(rows)}  Deleted: 0  Skipped: {skipped}  Warnings: {warnings}"))
+
+    @staticmethod
+    def parse_load_data(text, options):
+        """按 FIELDS/LINES 选项解析LOAD DATA的文件内容，\\N 为NULL"""
+        field_term = options["fields"]
+        line_term = options["lines"]
+        enclosed = options["enclosed"]
+        escaped = options["escaped"]
+        starting = options["starting"]
+        records = []
+        pos = 0
+        length = len(text)
+
+        def unescape(value):
+            if not escaped:
+                return value
+            out = []
+            i = 0
+            while i < len(value):
+                ch = value[i]
+                if ch == escaped and i + 1 < len(value):
+                    out.append(STRING_ESCAPES.get(value[i + 1], value[i + 1]))
+                    i += 2
+                else:
+                    out.append(ch)
+                    i += 1
+            return "".join(out)
+
+        while pos < length:
+            if starting:
+                found = text.find(starting, pos)
+                if found < 0:
+                    break
+                pos = found + len(starting)
+            record = []
+            while True:
+                if enclosed and text.startswith(enclosed, pos):
+                    # 包围的字段：找到不是转义、也不是连写的结束包围符
+                    i = pos + len(enclosed)
+                    value = []
+                    while i < length:
+                        if escaped and text[i] == escaped and i + 1 < length:
+                            value.append(STRING_ESCAPES.get(text[i + 1], text[i + 1]))
+                            i += 2
+                        elif text.startswith(enclosed + enclosed, i):
+                            value.append(enclosed)
+                            i += 2 * len(enclosed)
+                        elif text.startswith(enclosed, i):
+                            i += len(enclosed)
+                            break
+                        else:
+                            value.append(text[i])
+                            i += 1
+                    record.append("".join(value))
+                    pos = i
+                else:
+                    # 未包围的字段：到字段或行结束符为止，跳过转义字符后的字符
+                    i = pos
+                    while i < length and not text.startswith(field_term, i) and not text.startswith(line_term, i):
+                        i += 2 if escaped and text[i] == escaped else 1
+                    raw = text[pos:min(i, length)]
+                    record.append(None if escaped and raw == escaped + "N" else unescape(raw))
+                    pos = min(i, length)
+                if text.startswith(field_term, pos):
+                    pos += len(field_term)
+                    continue
+                if text.startswith(line_term, pos):
+                    pos += len(line_term)
+                break
+            records.append(record)
+        return records
+
+    # ---- DDL ----
+
+    def execute_ddl(self, first, tokens):
+        upper = [text.upper() if kind == "word" else None for kind, text in tokens]
+        try:
+            if first == "CREATE" and upper[1] in ("TABLE", "TEMPORARY"):
+                self.create_table(tokens, upper)
+            elif first == "CREATE" and "VIEW" in upper[1:5]:
+                self.create_view(tokens, upper)
+            elif first == "DROP" and upper[1] == "VIEW":
+                self.drop_view(tokens, upper)
+            elif first == "CREATE" and ("INDEX" in upper[1:4]):
+                self.create_index_statement(tokens, upper)
+            elif first == "ALTER" and upper[1] == "TABLE":
+                self.alter_table(tokens, upper)
+            elif first == "DROP" and upper[1] in ("TABLE", "TEMPORARY"):
+                self.drop_tables(tokens, upper)
+            elif first == "RENAME" and upper[1] == "TABLE":
+                self.rename_tables(tokens)
+            elif first == "TRUNCATE":
+                table = identifier(tokens[2] if upper[1] == "TABLE" else tokens[1])
+                self.require_table(table)
+                self.store.execute(f"DELETE FROM {quote_sqlite(table)}")
+            else:
+                raise MySQLError(1235, " ".join(word or "" for word in upper[:3]) + " is not supported by the fake server")
+        except sqlite3.Error as e:
+            if self.store.in_transaction:
+                self.store.execute("ROLLBACK")
+            raise self.translate_error(e)
+        self.send(self.ok_packet(0, 0))
+
+    def table_exists(self, table):
+        return self.store.execute("SELECT 1 FROM __information_schema_tables WHERE TABLE_NAME = ?",
+                                  (table,)).fetchone() is not None
+
+    def require_table(self, table):
+        if not self.table_exists(table):
+            raise MySQLError(1146, f"Table '{self.server.database}.{table}' doesn't exist")
+
+    def parse_column(self, part):
+        """解析列定义，返回列信息字典"""
+        name = identifier(part[0])
+        pos = 1
+        while pos < len(part) and not (part[pos][0] == "word" and part[pos][1].upper() in COLUMN_ATTRIBUTES):
+            pos += 1
+        column_type = " ".join(text for _, text in part[1:pos]).replace(" (", "(").replace("( ", "(") \
+            .replace(" )", ")").replace(" ,", ",").replace(", ", ",")
+        column = {"name": name, "type": column_type.lower(), "nullable": True, "default": None,
+                  "auto_increment": False, "primary": False, "unique": False, "comment": ""}
+        attributes = part[pos:]
+        words = [text.upper() if kind == "word" else None for kind, text in attributes]
+        for i, word in enumerate(words):
+            if word == "NOT" and i + 1 < len(words) and words[i + 1] == "NULL":
+                column["nullable"] = False
+            elif word == "AUTO_INCREMENT":
+                column["auto_increment"] = True
+            elif word == "PRIMARY":
+                column["primary"] = True
+                column["nullable"] = False
+            elif word == "UNIQUE":
+                column["unique"] = True
+            elif word == "DEFAULT" and i + 1 < len(attributes):
+                kind, text = attributes[i + 1]
+                column["default"] = decode_string(text) if kind == "str" else None if text.upper() == "NULL" else text
+            elif word == "COMMENT" and i + 1 < len(attributes) and attributes[i + 1][0] == "str":
+                column["comment"] = decode_string(attributes[i + 1][1])
+        return column
+
+    def parse_index(self, part, upper):
+        """解析表定义或ALTER中的索引，返回 (索引名, 类型, [(列名, 前缀长度, 是否降序)])"""
+        words = [word for word in upper if word]
+        if "PRIMARY" in words:
+            kind = "PRIMARY"
+        elif "UNIQUE" in words:
+            kind = "UNIQUE"
+        elif "FULLTEXT" in words:
+            kind = "FULLTEXT"
+        elif "SPATIAL" in words:
+            kind = "SPATIAL"
+        else:
+            kind = "INDEX"
+        open_pos = part.index(("op", "("))
+        end = matching_paren(part, open_pos)
+        name = None
+        for token in part[:open_pos]:
+            if token[0] == "ident" or (token[0] == "word" and token[1].upper() not in (
+                    "PRIMARY", "UNIQUE", "FULLTEXT", "SPATIAL", "KEY", "INDEX", "CONSTRAINT", "ADD", "USING", "BTREE")):
+                name = identifier(token)
+        columns = []
+        for column_part in split_top_level(part[open_pos + 1:end]):
+            sub_part = None
+            if len(column_part) > 1 and column_part[1] == ("op", "(") and column_part[2][0] == "num":
+                sub_part = int(column_part[2][1])
+            desc = any(token[1].upper() == "DESC" for token in column_part)
+            columns.append((identifier(column_part[0]), sub_part, desc))
+        if kind == "PRIMARY":
+            name = "PRIMARY"
+        return name or columns[0][0], kind, columns
+
+    def create_table(self, tokens, upper):
+        pos = upper.index("TABLE") + 1
+        if_not_exists = upper[pos:pos + 3] == ["IF", "NOT", "EXISTS"]
+        if if_not_exists:
+            pos += 3
+        table = identifier(tokens[pos])
+        pos += 1
+        if self.table_exists(table):
+            if if_not_exists:
+                self.warnings = 1
+                return
+            raise MySQLError(1050, f"Table '{table}' already exists")
+
+        if upper[pos] == "LIKE" or (tokens[pos] == ("op", "(") and upper[pos + 1] == "LIKE"):
+            source = identifier(tokens[pos + 1] if upper[pos] == "LIKE" else tokens[pos + 2])
+            self.require_table(source)
+            columns, indexes, options = self.load_definition(source)
+        else:
+            if tokens[pos] != ("op", "("):
+                raise MySQLError(1235, "CREATE TABLE ... SELECT is not supported by the fake server")
+            end = matching_paren(tokens, pos)
+            columns = []
+            indexes = []
+            for part in split_top_level(tokens[pos + 1:end]):
+                part_upper = [text.upper() if kind == "word" else None for kind, text in part]
+                if part_upper[0] in ("PRIMARY", "KEY", "INDEX", "UNIQUE", "FULLTEXT", "SPATIAL", "CONSTRAINT"):
+                    if part_upper[0] == "CONSTRAINT" and "FOREIGN" in part_upper:
+                        continue
+                    indexes.append(self.parse_index(part, part_upper))
+                elif part_upper[0] in ("FOREIGN", "CHECK"):
+                    continue
+                else:
+                    column = self.parse_column(part)
+                    columns.append(column)
+                    if column["primary"]:
+                        indexes.append(("PRIMARY", "PRIMARY", [(column["name"], None, False)]))
+                    elif column["unique"]:
+                        indexes.append((column["name"], "UNIQUE", [(column["name"], None, False)]))
+            options = "partitioned" if "PARTITION" in upper[end:] else ""
+        self.materialize(table, columns, indexes, options)
+
+    def materialize(self, table, columns, indexes, options=""):
+        """在SQLite中建表和索引，并写入INFORMATION_SCHEMA"""
+        primary = next((cols for _, kind, cols in indexes if kind == "PRIMARY"), None)
+        primary_names = [col for col, _, _ in primary] if primary else []
+        defs = []
+        for column in columns:
+            if column["auto_increment"] and primary_names == [column["name"]]:
+                # 只有 INTEGER PRIMARY KEY 才会由SQLite自动分配递增值
+                defs.append(quote_sqlite(column["name"]) + " INTEGER PRIMARY KEY AUTOINCREMENT")
+                continue
+            column_def = quote_sqlite(column["name"]) + " " + column["type"].upper()
+            if not column["nullable"]:
+                column_def += " NOT NULL"
+            if column["default"] is not None:
+                default = column["default"]
+                column_def += " DEFAULT " + (default if str(default).upper() == "CURRENT_TIMESTAMP" or
+                                             re.fullmatch(r"-?\d+(\.\d+)?", str(default))
+                                             else "'" + str(default).replace("'", "''") + "'")
+            defs.append(column_def)
+        if primary_names and not any(column["auto_increment"] and primary_names == [column["name"]]
+                                     for column in columns):
+            defs.append("PRIMARY KEY (" + ", ".join(quote_sqlite(col) for col in primary_names) + ")")
+        self.store.execute(f"CREATE TABLE {quote_sqlite(table)} (" + ", ".join(defs) + ")")
+
+        schema = self.server.database
+        self.store.execute("INSERT INTO __information_schema_tables VALUES (?, ?, 'BASE TABLE', 'InnoDB', "
+                           "'utf8mb4_unicode_ci', ?)", (schema, table, options))
+        for position, column in enumerate(columns, 1):
+            self.insert_column_catalog(table, column, position, primary_names, indexes)
+        for name, kind, index_columns in indexes:
+            if kind != "PRIMARY":
+                self.create_index(table, name, kind, index_columns)
+            else:
+                self.insert_index_catalog(table, name, kind, index_columns)
+
+    def insert_column_catalog(self, table, column, position, primary_names, indexes):
+        column_type = column["type"]
+        data_type = re.match(r"[a-z]+", column_type).group() if re.match(r"[a-z]+", column_type) else column_type
+        numbers = [int(n) for n in re.findall(r"\d+", column_type.split(")")[0])] if "(" in column_type else []
+        char_length = numbers[0] if data_type in ("char", "varchar", "binary", "varbinary") and numbers else None
+        precision = numbers[0] if data_type in ("decimal", "numeric") and numbers else None
+        scale = numbers[1] if data_type in ("decimal", "numeric") and len(numbers) > 1 else None
+        if column["name"] in primary_names:
+            key = "PRI"
+        elif any(kind == "UNIQUE" and cols[0][0] == column["name"] for _, kind, cols in indexes):
+            key = "UNI"
+        elif any(cols[0][0] == column["name"] for _, kind, cols in indexes):
+            key = "MUL"
+        else:
+            key = ""
+        self.store.execute(
+            "INSERT INTO __information_schema_columns VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (self.server.database, table, column["name"], position, column["default"],
+             "YES" if column["nullable"] else "NO", data_type, column_type, key,
+             "auto_increment" if column["auto_increment"] else "", char_length, precision, scale,
+             column.get("comment", "")))
+
+    def insert_index_catalog(self, table, name, kind, columns):
+        for seq, (col, sub_part, desc) in enumerate(columns, 1):
+            self.store.execute(
+                "INSERT INTO __information_schema_statistics VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.server.database, table, 0 if kind in ("PRIMARY", "UNIQUE") else 1, name, seq, col,
+                 "D" if desc else "A", sub_part, kind if kind in ("FULLTEXT", "SPATIAL") else "BTREE"))
+
+    def create_index(self, table, name, kind, columns):
+        exists = self.store.execute("SELECT 1 FROM __information_schema_statistics WHERE TABLE_NAME = ? "
+                                    "AND INDEX_NAME = ?", (table, name)).fetchone()
+        if exists:
+            raise MySQLError(1061, f"Duplicate key name '{name}'")
+        if kind in ("INDEX", "UNIQUE"):
+            self.store.execute(
+                ("CREATE UNIQUE INDEX " if kind == "UNIQUE" else "CREATE INDEX ") +
+                quote_sqlite(self.index_name(table, name)) + " ON " + quote_sqlite(table) + " (" +
+                ", ".join(quote_sqlite(col) + (" DESC" if desc else "") for col, _, desc in columns) + ")")
+        self.insert_index_catalog(table, name, kind, columns)
+
+    @staticmethod
+    def index_name(table, name):
+        # SQLite的索引名在整个库中唯一，MySQL只要求在表内唯一
+        return f"{table}__{name}"
+
+    def create_index_statement(self, tokens, upper):
+        """CREATE [UNIQUE] INDEX 名称 ON 表 (列, ...)"""
+        on = upper.index("ON")
+        table = identifier(tokens[on + 1])
+        self.require_table(table)
+        name, kind, columns = self.parse_index(tokens[1:on] + tokens[on + 2:], upper[1:on] + upper[on + 2:])
+        self.create_index(table, identifier(tokens[on - 1]), kind, columns)
+
+    def load_definition(self, table):
+        """从INFORMATION_SCHEMA读回表的列和索引定义"""
+        columns = [{"name": name, "type": column_type, "nullable": nullable == "YES", "default": default,
+                    "auto_increment": extra == "auto_increment", "primary": False, "unique": False, "comment": comment}
+                   for name, column_type, nullable, default, extra, comment in self.store.execute(
+                       "SELECT COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_DEFAULT, EXTRA, COLUMN_COMMENT "
+                       "FROM __information_schema_columns WHERE TABLE_NAME = ? ORDER BY ORDINAL_POSITION", (table,))]
+        indexes = {}
+        for name, non_unique, column, collation, sub_part, index_type in self.store.execute(
+                "SELECT INDEX_NAME, NON_UNIQUE, COLUMN_NAME, COLLATION, SUB_PART, INDEX_TYPE "
+                "FROM __information_schema_statistics WHERE TABLE_NAME = ? ORDER BY INDEX_NAME, SEQ_IN_INDEX",
+                (table,)):
+            kind = "PRIMARY" if name == "PRIMARY" else index_type if index_type in ("FULLTEXT", "SPATIAL") else \
+                "INDEX" if non_unique else "UNIQUE"
+            indexes.setdefault(name, (name, kind, []))[2].append((column, sub_part, collation == "D"))
+        options = self.store.execute("SELECT CREATE_OPTIONS FROM __information_schema_tables WHERE TABLE_NAME = ?",
+                                     (table,)).fetchone()[0]
+        return columns, list(indexes.values()), options
+
+    def drop_catalog(self, table):
+        for name, kind, _ in self.load_definition(table)[1]:
+            if kind in ("INDEX", "UNIQUE"):
+                self.store.execute("DROP INDEX IF EXISTS " + quote_sqlite(self.index_name(table, name)))
+        for catalog, _ in CATALOG_TABLES.values():
+            self.store.execute(f"DELETE FROM {catalog} WHERE TABLE_NAME = ?", (table,))
+
+    def create_view(self, tokens, upper):
+        """CREATE [OR REPLACE] VIEW 名称 AS SELECT ...，查询部分按普通语句翻译"""
+        pos = upper.index("VIEW") + 1
+        view = identifier(tokens[pos])
+        if upper[pos + 1] != "AS":
+            raise MySQLError(1064, "CREATE VIEW column lists are not supported by the fake server")
+        sql, params = self.translate(tokens[pos + 2:])
+        if params:
+            raise MySQLError(1351, "View's SELECT contains a variable or parameter")
+        if upper[1:3] == ["OR", "REPLACE"]:
+            self.store.execute(f"DROP VIEW IF EXISTS {quote_sqlite(view)}")
+        self.store.execute(f"CREATE VIEW {quote_sqlite(view)} AS {sql}")
+
+    def drop_view(self, tokens, upper):
+        if_exists = upper[2:4] == ["IF", "EXISTS"]
+        for part in split_top_level(tokens[4 if if_exists else 2:]):
+            self.store.execute(f"DROP VIEW {'IF EXISTS ' if if_exists else ''}{quote_sqlite(identifier(part[-1]))}")
+
+    def drop_tables(self, tokens, upper):
+        pos = upper.index("TABLE") + 1
+        if_exists = upper[pos:pos + 2] == ["IF", "EXISTS"]
+        if if_exists:
+            pos += 2
+        for part in split_top_level(tokens[pos:]):
+            table = identifier(part[-1])
+            if not self.table_exists(table):
+                if if_exists:
+                    self.warnings += 1
+                    continue
+                raise MySQLError(1051, f"Unknown table '{self.server.database}.{table}'")
+            self.drop_catalog(table)
+            self.store.execute(f"DROP TABLE {quote_sqlite(table)}")
+
+    def rename_tables(self, tokens):
+        """RENAME TABLE a TO b, c TO d 在一个事务中完成，中途失败时全部撤销"""
+        self.store.execute("BEGIN")
+        for part in split_top_level(tokens[2:]):
+            old, new = identifier(part[0]), identifier(part[-1])
+            self.rename_table(old, new)
+        self.store.execute("COMMIT")
+
+    def rename_table(self, old, new):
+        self.require_table(old)
+        if self.table_exists(new):
+            raise MySQLError(1050, f"Table '{new}' already exists")
+        columns, indexes, options = self.load_definition(old)
+        for name, kind, _ in indexes:
+            if kind in ("INDEX", "UNIQUE"):
+                self.store.execute("DROP INDEX IF EXISTS " + quote_sqlite(self.index_name(old, name)))
+        self.store.execute(f"ALTER TABLE {quote_sqlite(old)} RENAME TO {quote_sqlite(new)}")
+        for catalog, _ in CATALOG_TABLES.values():
+            self.store.execute(f"UPDATE {catalog} SET TABLE_NAME = ? WHERE TABLE_NAME = ?", (new, old))
+        for name, kind, index_columns in indexes:
+            if kind in ("INDEX", "UNIQUE"):
+                self.store.execute(
+                    ("CREATE UNIQUE INDEX " if kind == "UNIQUE" else "CREATE INDEX ") +
+                    quote_sqlite(self.index_name(new, name)) + " ON " + quote_sqlite(new) + " (" +
+                    ", ".join(quote_sqlite(col) for col, _, _ in index_columns) + ")")
+
+    def alter_table(self, tokens, upper):
+        """
+        ALTER TABLE 表 子句, ...：ADD [COLUMN]、ADD INDEX/KEY/UNIQUE/PRIMARY KEY、DROP [COLUMN]、DROP INDEX/KEY、
+        MODIFY/CHANGE [COLUMN](只更新列类型)、RENAME [TO]；ALGORITHM/LOCK选项忽略
+        """
+        table = identifier(tokens[2])
+        self.require_table(table)
+        self.store.execute("BEGIN")
+        for clause in split_top_level(tokens[3:]):
+            words = [text.upper() if kind == "word" else None for kind, text in clause]
+            action = words[0]
+            if action in ("ALGORITHM", "LOCK"):
+                continue
+            if action == "ADD" and words[1] in ("INDEX", "KEY", "UNIQUE", "PRIMARY", "FULLTEXT", "SPATIAL", "CONSTRAINT"):
+                name, kind, columns = self.parse_index(clause, words)
+                if kind == "PRIMARY":
+                    raise MySQLError(1235, "ADD PRIMARY KEY is not supported by the fake server")
+                self.create_index(table, name, kind, columns)
+            elif action == "ADD":
+                part = clause[2:] if words[1] == "COLUMN" else clause[1:]
+                part_words = [text.upper() if kind == "word" else None for kind, text in part]
+                for stop in ("FIRST", "AFTER"):
+                    if stop in part_words:
+                        part = part[:part_words.index(stop)]
+                column = self.parse_column(part)
+                sql_type = column["type"].upper()
+                column_def = quote_sqlite(column["name"]) + " " + sql_type
+                if column["default"] is not None:
+                    column_def += " DEFAULT '" + str(column["default"]).replace("'", "''") + "'"
+                self.store.execute(f"ALTER TABLE {quote_sqlite(table)} ADD COLUMN {column_def}")
+                position = self.store.execute("SELECT COUNT(*) FROM __information_schema_columns WHERE TABLE_NAME = ?",
+                                              (table,)).fetchone()[0] + 1
+                self.insert_column_catalog(table, column, position, [], [])
+            elif action == "DROP" and words[1] in ("INDEX", "KEY"):
+                name = identifier(clause[2])
+                found = self.store.execute("DELETE FROM __information_schema_statistics WHERE TABLE_NAME = ? "
+                                           "AND INDEX_NAME = ?", (table, name)).rowcount
+                if not found:
+                    raise MySQLError(1091, f"Can't DROP '{name}'; check that column/key exists")
+                self.store.execute("DROP INDEX IF EXISTS " + quote_sqlite(self.index_name(table, name)))
+            elif action == "DROP":
+                name = identifier(clause[2] if words[1] == "COLUMN" else clause[1])
+                self.store.execute(f"ALTER TABLE {quote_sqlite(table)} DROP COLUMN {quote_sqlite(name)}")
+                self.store.execute("DELETE FROM __information_schema_columns WHERE TABLE_NAME = ? AND COLUMN_NAME = ?",
+                                   (table, name))
+                self.store.execute(
+                    "UPDATE __information_schema_columns SET ORDINAL_POSITION = (SELECT COUNT(*) FROM "
+                    "__information_schema_columns c WHERE c.TABLE_NAME = __information_schema_columns.TABLE_NAME "
+                    "AND c.ORDINAL_POSITION <= __information_schema_columns.ORDINAL_POSITION) WHERE TABLE_NAME = ?",
+                    (table,))
+            elif action in ("MODIFY", "CHANGE"):
+                part = clause[2:] if words[1] == "COLUMN" else clause[1:]
+                old_name = identifier(part[0])
+                if action == "CHANGE":
+                    part = part[1:]
+                part_words = [text.upper() if kind == "word" else None for kind, text in part]
+                for stop in ("FIRST", "AFTER"):
+                    if stop in part_words:
+                        part = part[:part_words.index(stop)]
+                column = self.parse_column(part)
+                if column["name"] != old_name:
+                    self.store.execute(f"ALTER TABLE {quote_sqlite(table)} RENAME COLUMN {quote_sqlite(old_name)} "
+                                       f"TO {quote_sqlite(column['name'])}")
+                self.store.execute(
+                    "UPDATE __information_schema_columns SET COLUMN_NAME = ?, COLUMN_TYPE = ?, IS_NULLABLE = ?, "
+                    "DATA_TYPE = ?, COLUMN_DEFAULT = ?, EXTRA = ?, COLUMN_COMMENT = ? WHERE TABLE_NAME = ? AND COLUMN_NAME = ?",
+                    (column["name"], column["type"], "YES" if column["nullable"] else "NO",
+                     re.match(r"[a-z]*", column["type"]).group(), column["default"],
+                     "auto_increment" if column["auto_increment"] else "", column["comment"], table, old_name))
+            elif action == "RENAME":
+                self.rename_table(table, identifier(clause[-1]))
+                table = identifier(clause[-1])
+            else:
+                raise MySQLError(1235, f"ALTER TABLE ... {action} is not supported by the fake server")
+        self.store.execute("COMMIT")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.fake_mysql", description="进程内的模拟MySQL服务器")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=3307, help="监听端口，0为自动选择")
+    parser.add_argument("--database", default="fake", help="数据库名")
+    parser.add_argument("--store", help="SQLite文件路径，默认为内存库")
+    parser.add_argument("--latency", type=float, default=0.0, help="每条命令回复前的等待秒数")
+    parser.add_argument("--max-allowed-packet", default="64MB", help="单条语句的大小上限")
+    parser.add_argument("--fault", action="append", metavar="CODE[:PATTERN][:every=N|rate=P]",
+                        help="故障注入规则，可重复，如 1205:INSERT:every=20、2006::rate=0.01")
+    parser.add_argument("--no-strict", action="store_true", help="不检查写入值的长度和格式")
+    parser.add_argument("--seed", type=int, default=0, help="按比例注入故障的随机种子")
+    args = parser.parse_args(argv)
+
+    try:
+        server = FakeMySQLServer(args.host, args.port, args.database, store=args.store, latency=args.latency,
+                                 max_allowed_packet=parse_size(args.max_allowed_packet), faults=args.fault,
+                                 strict=not args.no_strict, seed=args.seed).start()
+    except (ValueError, OSError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    print(f"模拟MySQL服务器已启动: {server.url}，按 Ctrl+C 停止", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(f"统计: {server.stats}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+图形界面启动耗时基准
+在子进程中用 python -X importtime 导入两个界面的主模块，统计导入耗时。
+打开主窗口前的耗时几乎全部花在模块导入上，超出预算，或者启动时加载了
+pandas/numpy/pymysql等只在导入/拆分阶段才需要的依赖时，以非零状态退出:
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --budget-ms 200 --repeat 5 --json startup.json
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+# 仓库根目录，子进程在这里运行以便导入两个包
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 要测量的界面主模块
+TARGETS = ["data_importer.main", "split_data.main"]
+
+# 默认启动预算(毫秒)，按导入耗时的最小值比较
+DEFAULT_BUDGET_MS = 300
+
+# 启动时不应加载的重依赖
+HEAVY_MODULES = ["pandas", "numpy", "pymysql", "chardet", "openpyxl", "tqdm"]
+
+
+def parse_importtime(output):
+    """
+    解析 -X importtime 输出
+    返回: [(模块名, 自身耗时us, 累计耗时us, 层级), ...]
+    """
+    records = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        name_part = parts[2].rstrip()
+        name = name_part.strip()
+        level = (len(name_part) - len(name_part.lstrip())) // 2
+        records.append((name, int(parts[0]), int(parts[1]), level))
+    return records
+
+
+def measure_import(module):
+    """在全新的解释器中导入模块一次，返回 (总耗时ms, 导入记录)"""
+    env = dict(os.environ)
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{proc.stderr[-2000:]}")
+
+    records = parse_importtime(proc.stderr)
+    # 同一个解释器中的所有顶层导入累加即为启动的导入总耗时
+    total_us = sum(cumulative for _, _, cumulative, level in records if level == 0)
+    return total_us / 1000, records
+
+
+def run_benchmark(targets, repeat, budget_ms):
+    """测量每个目标模块，返回结果列表"""
+    results = []
+    for module in targets:
+        timings = []
+        records = []
+        for _ in range(repeat):
+            total_ms, records = measure_import(module)
+            timings.append(total_ms)
+
+        loaded = {name.split(".")[0] for name, _, _, _ in records}
+        heavy = [m for m in HEAVY_MODULES if m in loaded]
+        slowest = sorted(records, key=lambda r: r[1], reverse=True)[:10]
+        best_ms = min(timings)
+        results.append({
+            "module": module,
+            "best_ms": round(best_ms, 1),
+            "median_ms": round(sorted(timings)[len(timings) // 2], 1),
+            "budget_ms": budget_ms,
+            "heavy_modules": heavy,
+            "slowest_self_ms": [(name, round(self_us / 1000, 1)) for name, self_us, _, _ in slowest],
+            "passed": best_ms <= budget_ms and not heavy
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup", description="图形界面启动耗时基准")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="每个界面的导入耗时预算(毫秒)")
+    parser.add_argument("--repeat", type=int, default=3, help="每个界面测量次数，取最小值与预算比较")
+    parser.add_argument("--json", help="把结果写入JSON文件")
+    parser.add_argument("targets", nargs="*", default=TARGETS, help="要测量的模块")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.targets, max(1, args.repeat), args.budget_ms)
+
+    for result in results:
+        status = "通过" if result["passed"] else "失败"
+        print(f"[{status}] {result['module']}: 最快 {result['best_ms']} ms, 中位数 {result['median_ms']} ms "
+              f"(预算 {result['budget_ms']} ms)")
+        if result["heavy_modules"]:
+            print(f"  启动时加载了重依赖: {', '.join(result['heavy_modules'])}")
+        for name, self_ms in result["slowest_self_ms"][:5]:
+            print(f"  {self_ms:>8} ms  {name}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
+
+    return 0 if all(r["passed"] for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
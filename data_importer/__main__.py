@@ -1,8 +1,14 @@
 """
 模块入口点
 允许以 python -m data_importer 方式运行
+python -m data_importer import ... 进入命令行模式，不加载图形界面
 """
-from data_importer.main import main
+import sys
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == 'import':
+        from data_importer.cli import main as cli_main
+        sys.exit(cli_main())
+    else:
+        from data_importer.main import main
+        main()
@@ -8,8 +8,6 @@ import threading
 import traceback
 from tkinter import messagebox, ttk, Frame
 from data_importer.utils.ui_utils import UiUtils
-from data_importer.utils.file_utils import FileUtils
-from data_importer.utils.db_utils import DbUtils
 from data_importer.utils.log_utils import LogUtils
 from data_importer.utils.config_manager import ConfigManager
 import os
@@ -204,6 +202,10 @@ def create_main_window():
             # 使用线程执行导入操作
             def import_thread():
                 try:
+                    # pandas/pymysql等较重的依赖在导入开始时才加载，不拖慢主窗口启动
+                    from data_importer.utils.file_utils import FileUtils
+                    from data_importer.utils.db_utils import DbUtils
+                    
                     # 更新进度显示 - 启动
                     def update_progress(message, progress=None):
                         def do_update():
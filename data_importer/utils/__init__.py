@@ -1,10 +1,48 @@
 """
 工具类模块
 包含各种工具类
+
+工具类按需导入：命令行模式只会加载用到的模块，不会因为UiUtils/LogUtils而加载tkinter
 """
-from data_importer.utils.db_utils import DbUtils
-from data_importer.utils.data_utils import DataUtils
-from data_importer.utils.ui_utils import UiUtils
-from data_importer.utils.file_utils import FileUtils
-from data_importer.utils.config_utils import ConfigUtils
-from data_importer.utils.log_utils import LogUtils 
\ No newline at end of file
+import importlib
+
+_EXPORTS = {
+    "DbUtils": "data_importer.utils.db_utils",
+    "DataUtils": "data_importer.utils.data_utils",
+    "UiUtils": "data_importer.utils.ui_utils",
+    "FileUtils": "data_importer.utils.file_utils",
+    "ConfigUtils": "data_importer.utils.config_utils",
+    "LogUtils": "data_importer.utils.log_utils",
+    "CheckpointUtils": "data_importer.utils.checkpoint_utils",
+    "PartitionUtils": "data_importer.utils.partition_utils",
+    "ImportEngine": "data_importer.utils.import_engine",
+    "MemoryUtils": "data_importer.utils.memory_utils",
+    "RejectUtils": "data_importer.utils.reject_utils",
+    "LoggingUtils": "data_importer.utils.logging_utils",
+    "MetricsUtils": "data_importer.utils.metrics_utils",
+    "TimingUtils": "data_importer.utils.timing_utils",
+    "SinkUtils": "data_importer.utils.sink_utils",
+    "VerifyUtils": "data_importer.utils.verify_utils",
+    "SketchUtils": "data_importer.utils.sketch_utils",
+    "IndexUtils": "data_importer.utils.index_utils",
+    "DimensionUtils": "data_importer.utils.dimension_utils",
+    "KeyUtils": "data_importer.utils.key_utils",
+    "DedupUtils": "data_importer.utils.dedup_utils",
+    "RegistryUtils": "data_importer.utils.registry_utils",
+    "SchemaUtils": "data_importer.utils.schema_utils",
+    "ValidateUtils": "data_importer.utils.validate_utils",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
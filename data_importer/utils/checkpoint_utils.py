@@ -0,0 +1,161 @@
+"""
+断点续传工具类
+记录每个已提交批次对应的源数据偏移量，导入中断后可从第一个未提交的批次继续
+"""
+import os
+import json
+import hashlib
+import datetime
+
+
+class CheckpointUtils:
+    # 检查点文件目录
+    CHECKPOINT_DIR = os.path.join(os.getcwd(), 'checkpoints')
+    # 目标数据库中的检查点表
+    CHECKPOINT_TABLE = "_import_checkpoints"
+    # 计算文件指纹时读取的头尾字节数
+    FINGERPRINT_SAMPLE_BYTES = 1024 * 1024
+
+    @staticmethod
+    def ensure_checkpoint_dir():
+        """确保检查点目录存在"""
+        if not os.path.exists(CheckpointUtils.CHECKPOINT_DIR):
+            os.makedirs(CheckpointUtils.CHECKPOINT_DIR)
+
+    @staticmethod
+    def file_fingerprint(file_path):
+        """
+        计算文件指纹：文件大小 + 修改时间 + 头尾各1MB内容的SHA1
+        用于判断检查点是否仍然对应同一个文件
+        """
+        stat = os.stat(file_path)
+        sha1 = hashlib.sha1()
+        sha1.update(str(stat.st_size).encode('utf-8'))
+        sha1.update(str(int(stat.st_mtime)).encode('utf-8'))
+
+        sample_bytes = CheckpointUtils.FINGERPRINT_SAMPLE_BYTES
+        with open(file_path, 'rb') as f:
+            sha1.update(f.read(sample_bytes))
+            if stat.st_size > sample_bytes:
+                f.seek(max(stat.st_size - sample_bytes, sample_bytes))
+                sha1.update(f.read(sample_bytes))
+
+        return sha1.hexdigest()
+
+    @staticmethod
+    def get_checkpoint_path(file_path):
+        """获取数据文件对应的检查点文件路径"""
+        path_hash = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:16]
+        base_name = os.path.splitext(os.path.basename(file_path))[0]
+        clean_base_name = ''.join(c if c.isalnum() else '_' for c in base_name)
+        return os.path.join(CheckpointUtils.CHECKPOINT_DIR, f"{clean_base_name}_{path_hash}.json")
+
+    @staticmethod
+    def load_checkpoint(file_path):
+        """
+        加载数据文件的检查点
+        返回: 检查点字典，如果不存在或文件已变化则返回None
+        """
+        checkpoint_path = CheckpointUtils.get_checkpoint_path(file_path)
+        if not os.path.exists(checkpoint_path):
+            return None
+
+        try:
+            with open(checkpoint_path, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except Exception as e:
+            print(f"读取检查点文件失败: {e}")
+            return None
+
+        # 文件内容已变化，检查点失效
+        if checkpoint.get("fingerprint") != CheckpointUtils.file_fingerprint(file_path):
+            print("数据文件已变化，忽略旧的检查点")
+            CheckpointUtils.clear_checkpoint(file_path)
+            return None
+
+        return checkpoint
+
+    @staticmethod
+    def save_checkpoint(file_path, checkpoint):
+        """保存检查点，先写临时文件再替换，避免写入中断导致文件损坏"""
+        try:
+            CheckpointUtils.ensure_checkpoint_dir()
+            checkpoint_path = CheckpointUtils.get_checkpoint_path(file_path)
+            checkpoint["updated_at"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+            tmp_path = checkpoint_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(checkpoint, f, ensure_ascii=False, indent=4)
+            os.replace(tmp_path, checkpoint_path)
+            return True
+        except Exception as e:
+            print(f"保存检查点失败: {e}")
+            return False
+
+    @staticmethod
+    def clear_checkpoint(file_path):
+        """删除数据文件的检查点"""
+        checkpoint_path = CheckpointUtils.get_checkpoint_path(file_path)
+        try:
+            if os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+        except Exception as e:
+            print(f"删除检查点文件失败: {e}")
+
+    @staticmethod
+    def ensure_checkpoint_table(conn):
+        """确保目标数据库中存在检查点表"""
+        cursor = conn.cursor()
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS `" + CheckpointUtils.CHECKPOINT_TABLE + "` ("
+            "`table_name` VARCHAR(191) NOT NULL PRIMARY KEY, "
+            "`file_fingerprint` CHAR(40) NOT NULL, "
+            "`source_offset` BIGINT NOT NULL, "
+            "`batch_index` INT NOT NULL, "
+            "`rows_inserted` BIGINT NOT NULL, "
+            "`updated_at` DATETIME NOT NULL"
+            ") CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci"
+        )
+        conn.commit()
+
+    @staticmethod
+    def record_batch(cursor, table_name, fingerprint, source_offset, batch_index, rows_inserted):
+        """
+        在批次事务内记录已提交的源数据偏移量
+        与数据插入在同一事务中提交，保证检查点与表中数据严格一致
+        """
+        cursor.execute(
+            "REPLACE INTO `" + CheckpointUtils.CHECKPOINT_TABLE + "` "
+            "(`table_name`, `file_fingerprint`, `source_offset`, `batch_index`, `rows_inserted`, `updated_at`) "
+            "VALUES (%s, %s, %s, %s, %s, NOW())",
+            (table_name, fingerprint, source_offset, batch_index, rows_inserted)
+        )
+
+    @staticmethod
+    def read_committed_offset(conn, table_name, fingerprint):
+        """
+        读取目标数据库中记录的已提交偏移量
+        返回: (source_offset, batch_index, rows_inserted)，不存在时返回None
+        """
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT `source_offset`, `batch_index`, `rows_inserted` FROM `" + CheckpointUtils.CHECKPOINT_TABLE + "` "
+            "WHERE `table_name` = %s AND `file_fingerprint` = %s",
+            (table_name, fingerprint)
+        )
+        row = cursor.fetchone()
+        cursor.close()
+        if row is None:
+            return None
+        return int(row[0]), int(row[1]), int(row[2])
+
+    @staticmethod
+    def delete_db_checkpoint(conn, table_name):
+        """导入完成后删除目标数据库中的检查点记录"""
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM `" + CheckpointUtils.CHECKPOINT_TABLE + "` WHERE `table_name` = %s",
+            (table_name,)
+        )
+        conn.commit()
+        cursor.close()
@@ -5,13 +5,18 @@
 import pandas as pd
 import numpy as np
 import re
+from data_importer.utils.sketch_utils import HyperLogLog, QuantileSketch, SketchUtils
 
 class DataUtils:
     @staticmethod
     def normalize_column_names(df):
         """规范化列名，处理重复列名和特殊字符"""
-        # 复制原始列名，用于记录映射关系
-        original_columns = df.columns.tolist()
+        df.columns = DataUtils.normalize_names(df.columns.tolist())
+        return df
+
+    @staticmethod
+    def normalize_names(original_columns, verbose=True):
+        """规范化一组列名，返回新的列名列表；分块读取时各块共用这一份列名"""
         normalized_columns = []
         
         # 列名计数器，用于处理重复列名
@@ -45,14 +50,12 @@ class DataUtils:
         
         # 打印列名修改情况
         column_changes = [(orig, norm) for orig, norm in zip(original_columns, normalized_columns) if str(orig) != norm]
-        if column_changes:
+        if column_changes and verbose:
             print("以下列名已规范化:")
             for orig, norm in column_changes:
                 print("  '" + str(orig) + "' -> '" + str(norm) + "'")
-                
-        # 设置新的列名
-        df.columns = normalized_columns
-        return df
+
+        return normalized_columns
 
     @staticmethod
     def preprocess_dataframe(df):
@@ -66,6 +69,15 @@ class DataUtils:
             df = df.drop(columns=empty_cols)
         
         # 2. 检查数据类型是否一致
+        df = DataUtils.convert_numeric_columns(df)
+        
+        # 3. 确保每行有相同数量的列
+        print("预处理后: 行数 = " + str(len(df)) + ", 列数 = " + str(len(df.columns)))
+        return df
+
+    @staticmethod
+    def convert_numeric_columns(df):
+        """把可以解析为数值的文本列转换为可空整型或浮点型，分块读取时逐块调用"""
         for col in df.columns:
             try:
                 # 尝试转换合适的数据类型
@@ -80,9 +92,6 @@ class DataUtils:
             except:
                 # 保持原样
                 pass
-        
-        # 3. 确保每行有相同数量的列
-        print("预处理后: 行数 = " + str(len(df)) + ", 列数 = " + str(len(df.columns)))
         return df
 
     @staticmethod
@@ -245,6 +254,206 @@ class DataUtils:
         
         print("=== 诊断结束 ===\n")
 
+    @staticmethod
+    def profile_dataframe(df):
+        """
+        计算每列的统计信息（行数、空值数、最小值、最大值、最大长度、总长度）
+        对可以解析为日期的文本列额外给出日期范围，供分区建议等后续步骤使用
+        另附不同值计数草图(hll)和数值列的分位数草图(quantile_sketch)，分块扫描时随统计信息一起合并
+        """
+        profiles = {}
+        for col in df.columns:
+            series = df[col]
+            non_null = series.dropna()
+            profile = {
+                "count": len(series),
+                "non_null": len(non_null),
+                "nulls": len(series) - len(non_null),
+                "min": None,
+                "max": None,
+                "date_min": None,
+                "date_max": None,
+                "max_len": None,
+                "total_len": None,
+                "hll": HyperLogLog(),
+                "quantile_sketch": None
+            }
+
+            if len(non_null) > 0:
+                try:
+                    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+                        profile["date_min"] = non_null.min()
+                        profile["date_max"] = non_null.max()
+                        profile["hll"].add_hashes(SketchUtils.hash_values(non_null))
+                    elif pd.api.types.is_bool_dtype(series.dtype):
+                        profile["hll"].add_hashes(SketchUtils.hash_values(non_null))
+                    elif pd.api.types.is_numeric_dtype(series.dtype):
+                        profile["min"] = non_null.min()
+                        profile["max"] = non_null.max()
+                        profile["hll"].add_hashes(SketchUtils.hash_values(non_null))
+                        profile["quantile_sketch"] = QuantileSketch().add(non_null.to_numpy(dtype=np.float64))
+                    else:
+                        str_vals = non_null.astype(str)
+                        lengths = str_vals.str.len()
+                        profile["max_len"] = int(lengths.max())
+                        profile["total_len"] = int(lengths.sum())
+                        profile["hll"].add_hashes(SketchUtils.hash_values(str_vals))
+
+                        # 抽样判断是否为日期列，大部分值可解析时再计算完整的日期范围
+                        sample = str_vals.head(1000)
+                        if sample.str.contains(r'\d{1,4}[/\-.]\d{1,2}[/\-.]\d{1,4}').mean() >= 0.95:
+                            parsed = pd.to_datetime(str_vals, errors='coerce')
+                            if parsed.notna().mean() >= 0.95:
+                                profile["date_min"] = parsed.min()
+                                profile["date_max"] = parsed.max()
+                except Exception as e:
+                    print(f"列 '{col}' 统计信息计算失败: {e}")
+
+            profiles[col] = profile
+
+        return profiles
+
+    @staticmethod
+    def integer_type_for_range(min_val, max_val):
+        """根据取值范围选择能容纳的最小整数类型"""
+        if min_val >= 0:
+            if max_val <= 255:
+                return "TINYINT UNSIGNED"
+            elif max_val <= 65535:
+                return "SMALLINT UNSIGNED"
+            elif max_val <= 16777215:
+                return "MEDIUMINT UNSIGNED"
+            elif max_val <= 4294967295:
+                return "INT UNSIGNED"
+            else:
+                return "BIGINT UNSIGNED"
+        else:
+            if min_val >= -128 and max_val <= 127:
+                return "TINYINT"
+            elif min_val >= -32768 and max_val <= 32767:
+                return "SMALLINT"
+            elif min_val >= -8388608 and max_val <= 8388607:
+                return "MEDIUMINT"
+            elif min_val >= -2147483648 and max_val <= 2147483647:
+                return "INT"
+            else:
+                return "BIGINT"
+
+    @staticmethod
+    def merge_profiles(acc, profile):
+        """合并两个数据块同一列的统计信息，acc为None时直接返回profile的副本"""
+        if acc is None:
+            return dict(profile)
+
+        merged = dict(acc)
+        for key in ("count", "non_null", "nulls"):
+            merged[key] = acc[key] + profile[key]
+        for low, high in (("min", "max"), ("date_min", "date_max")):
+            try:
+                if profile[low] is not None:
+                    merged[low] = profile[low] if acc[low] is None else min(acc[low], profile[low])
+                if profile[high] is not None:
+                    merged[high] = profile[high] if acc[high] is None else max(acc[high], profile[high])
+            except TypeError:
+                # 不同数据块的取值类型不一致(如数值和日期)，无法比较时放弃该项统计
+                merged[low] = merged[high] = None
+        if profile["max_len"] is not None:
+            merged["max_len"] = max(acc["max_len"] or 0, profile["max_len"])
+        if profile.get("total_len") is not None:
+            merged["total_len"] = (acc.get("total_len") or 0) + profile["total_len"]
+        # 草图原地合并，acc 在合并后不再使用
+        if acc.get("hll") is not None:
+            merged["hll"] = acc["hll"].merge(profile.get("hll"))
+        else:
+            merged["hll"] = profile.get("hll")
+        if acc.get("quantile_sketch") is not None:
+            merged["quantile_sketch"] = acc["quantile_sketch"].merge(profile.get("quantile_sketch"))
+        else:
+            merged["quantile_sketch"] = profile.get("quantile_sketch")
+        return merged
+
+    @staticmethod
+    def _type_family(type_str):
+        """MySQL类型所属的类别: bool/int/decimal/double/date/string/other"""
+        t = type_str.upper()
+        if t == "TINYINT(1)":
+            return "bool"
+        if re.match(r'^(TINYINT|SMALLINT|MEDIUMINT|INT|BIGINT)( UNSIGNED)?$', t):
+            return "int"
+        if t.startswith("DECIMAL"):
+            return "decimal"
+        if t in ("DOUBLE", "FLOAT"):
+            return "double"
+        if t in ("DATE", "DATETIME"):
+            return "date"
+        if t.startswith("VARCHAR") or t.endswith("TEXT"):
+            return "string"
+        return "other"
+
+    @staticmethod
+    def _string_capacity(type_str):
+        """字符串类型可容纳的最大长度"""
+        t = type_str.upper()
+        match = re.match(r'^VARCHAR\((\d+)\)$', t)
+        if match:
+            return int(match.group(1))
+        return {"TEXT": 65535, "MEDIUMTEXT": 16777215, "LONGTEXT": 4294967295}.get(t, 255)
+
+    @staticmethod
+    def merge_mysql_types(type_a, type_b, profile=None):
+        """
+        合并分块推断出的同一列的两个MySQL类型，返回能容纳两者的类型
+        profile为该列合并后的全局统计信息，用于确定整数范围和字符串长度；
+        某个数据块中该列全为空时传入None，直接沿用另一个类型
+        """
+        if type_a is None or type_a == type_b:
+            return type_b
+        if type_b is None:
+            return type_a
+
+        profile = profile or {}
+        families = {DataUtils._type_family(type_a), DataUtils._type_family(type_b)}
+
+        if families <= {"int", "bool"}:
+            if families == {"int"} and profile.get("min") is not None and profile.get("max") is not None:
+                try:
+                    return DataUtils.integer_type_for_range(profile["min"], profile["max"])
+                except TypeError:
+                    pass
+            ints = [t for t in (type_a, type_b) if DataUtils._type_family(t) == "int"]
+            # 分不出范围时使用更宽的整数类型
+            return "BIGINT" if len(ints) > 1 else ints[0]
+
+        if families <= {"int", "bool", "decimal"}:
+            int_digits, scale = 0, 0
+            for t in (type_a, type_b):
+                match = re.match(r'^DECIMAL\((\d+),\s*(\d+)\)$', t.upper())
+                if match:
+                    int_digits = max(int_digits, int(match.group(1)) - int(match.group(2)))
+                    scale = max(scale, int(match.group(2)))
+                else:
+                    int_digits = max(int_digits, 20 if "BIGINT" in t.upper() else 10)
+            return f"DECIMAL({min(int_digits + scale, 65)},{min(scale, 30)})"
+
+        if families <= {"int", "bool", "decimal", "double"}:
+            return "DOUBLE"
+
+        if families == {"date"}:
+            return "DATETIME"
+
+        # 其余组合(含文本或类别冲突)统一使用字符串类型，长度覆盖两个类型和全局最大长度
+        length = max(DataUtils._string_capacity(t) if DataUtils._type_family(t) == "string" else 32
+                     for t in (type_a, type_b))
+        if profile.get("max_len"):
+            length = max(length, int(profile["max_len"] * 1.5))
+        if length <= 255:
+            return f"VARCHAR({length})"
+        elif length <= 65535:
+            return "TEXT"
+        elif length <= 16777215:
+            return "MEDIUMTEXT"
+        return "LONGTEXT"
+
     @staticmethod
     def determine_mysql_type(column_name, series):
         """根据列名和数据确定适合的MySQL数据类型"""
@@ -307,28 +516,7 @@ class DataUtils:
                     return "BIGINT"
                     
                 # 更细致的类型判断
-                if min_val >= 0:
-                    if max_val <= 255:
-                        return "TINYINT UNSIGNED"
-                    elif max_val <= 65535:
-                        return "SMALLINT UNSIGNED"
-                    elif max_val <= 16777215:
-                        return "MEDIUMINT UNSIGNED"
-                    elif max_val <= 4294967295:
-                        return "INT UNSIGNED"
-                    else:
-                        return "BIGINT UNSIGNED"
-                else:
-                    if min_val >= -128 and max_val <= 127:
-                        return "TINYINT"
-                    elif min_val >= -32768 and max_val <= 32767:
-                        return "SMALLINT"
-                    elif min_val >= -8388608 and max_val <= 8388607:
-                        return "MEDIUMINT"
-                    elif min_val >= -2147483648 and max_val <= 2147483647:
-                        return "INT"
-                    else:
-                        return "BIGINT"
+                return DataUtils.integer_type_for_range(min_val, max_val)
             except:
                 return "BIGINT"
         elif pd.api.types.is_float_dtype(series.dtype):
@@ -533,4 +721,43 @@ class DataUtils:
             val = val[:65535]
             
         # 返回处理后的字符串
-        return val
\ No newline at end of file
+        return val
+
+    @staticmethod
+    def clean_frame_for_mysql(df, columns, start_offset=0):
+        """
+        按列批量清理一个数据块，效果与逐个调用clean_value_for_mysql相同
+        数值、布尔和日期列整列转换为Python对象，只有文本列逐值清理，避免iterrows为每行创建Series
+
+        返回: (行列表, 错误列表)，错误列表元素为 (源数据行偏移, 错误信息)，出错的行不在行列表中
+        """
+        try:
+            column_values = []
+            for col in columns:
+                series = df[col]
+                dtype = series.dtype
+                if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+                    # 可空整型的tolist()得到Python整数和pd.NA
+                    values = [None if v is pd.NA else v for v in series.tolist()]
+                elif pd.api.types.is_float_dtype(dtype):
+                    values = [None if v != v or v in (np.inf, -np.inf) else v for v in series.tolist()]
+                elif pd.api.types.is_datetime64_any_dtype(dtype):
+                    mask = series.isna().tolist()
+                    values = [None if missing else ts.to_pydatetime()
+                              for ts, missing in zip(series.tolist(), mask)]
+                else:
+                    values = list(map(DataUtils.clean_value_for_mysql, series.tolist()))
+                column_values.append(values)
+            return [list(row) for row in zip(*column_values)], []
+        except Exception as e:
+            print(f"按列清理数据块失败，改为逐行清理: {e}")
+
+        # 回退：逐行清理，记录出错的行
+        rows = []
+        errors = []
+        for pos, record in enumerate(df[columns].itertuples(index=False, name=None)):
+            try:
+                rows.append([DataUtils.clean_value_for_mysql(val) for val in record])
+            except Exception as e:
+                errors.append((start_offset + pos, f"行 {start_offset + pos} 处理失败: {e}"))
+        return rows, errors
@@ -3,56 +3,32 @@
 包含MySQL连接、表创建和数据导入等功能
 """
 import pymysql
-import os
 import time
 import traceback
-import pandas as pd
-import logging
-import datetime
-from tkinter import messagebox
-from data_importer.utils.data_utils import DataUtils
-from data_importer.utils.ui_utils import UiUtils
-from tqdm import tqdm
-import numpy as np
+from data_importer.utils.logging_utils import LoggingUtils
+from data_importer.utils.timing_utils import TimingUtils
 
 class DbUtils:
+    # 合并模式暂存表中记录写入顺序的自增列，业务键重复时按它保留文件中最后出现的行
+    MERGE_SEQ_COLUMN = "_merge_seq"
+
     @staticmethod
-    def setup_logger(table_name):
-        """设置日志记录器"""
-        # 确保logs目录存在
-        log_dir = os.path.join(os.getcwd(), 'logs')
-        if not os.path.exists(log_dir):
-            os.makedirs(log_dir)
-            
-        # 创建日志文件名，包含表名和时间戳
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        log_file = os.path.join(log_dir, f"import_{table_name}_{timestamp}.log")
-        
-        # 配置日志记录器
-        logger = logging.getLogger(f"import_{table_name}")
-        logger.setLevel(logging.INFO)
-        
-        # 创建文件处理器
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
-        file_handler.setLevel(logging.INFO)
-        
-        # 创建控制台处理器
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
-        
-        # 创建格式化器
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        file_handler.setFormatter(formatter)
-        console_handler.setFormatter(formatter)
-        
-        # 添加处理器
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
-        
-        # 打印日志路径
-        print(f"正在记录日志到文件: {log_file}")
-        
-        return logger
+    def merge_staging_column_def():
+        """合并模式暂存表的写入顺序列定义，加在源数据列之后"""
+        return DbUtils.escape_sql_identifier(DbUtils.MERGE_SEQ_COLUMN) + " BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY"
+
+    @staticmethod
+    def setup_logger(table_name, levels=None):
+        """
+        设置日志记录器
+        日志经队列交给后台线程写入文件和控制台，levels 为 LoggingUtils.parse_levels 的结果
+        """
+        return LoggingUtils.setup_import_logger(table_name, levels)
+
+    @staticmethod
+    def close_logger(logger):
+        """导入结束后关闭日志文件，释放文件句柄"""
+        LoggingUtils.close_import_logger(logger)
 
     @staticmethod
     def escape_sql_identifier(identifier):
@@ -65,26 +41,37 @@ class DbUtils:
         return "`" + str(identifier).replace("`", " ") + "`"
 
     @staticmethod
-    def execute_create_table(conn, table_name, column_defs):
+    def build_create_table_sql(table_name, column_defs, partition_clause=None):
+        """
+        构建CREATE TABLE语句，导入时执行，导出SQL脚本时写入文件
+        partition_clause: 可选的分区子句，由PartitionUtils.build_partition_clause生成
+        """
+        # 使用封装好的转义函数处理表名
+        escaped_table_name = DbUtils.escape_sql_identifier(table_name)
+
+        # 构建SQL - 使用列表拼接避免任何格式化问题
+        sql_parts = []
+        sql_parts.append("CREATE TABLE IF NOT EXISTS")
+        sql_parts.append(escaped_table_name)
+        sql_parts.append("(")
+        sql_parts.append(", ".join(column_defs))
+        sql_parts.append(")")
+        sql_parts.append("CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+        if partition_clause:
+            sql_parts.append(partition_clause)
+
+        # 组合SQL - 使用join而不是+拼接避免格式化问题
+        return " ".join(sql_parts)
+
+    @staticmethod
+    def execute_create_table(conn, table_name, column_defs, partition_clause=None):
         """
         直接执行CREATE TABLE语句，避免所有格式化问题
+        partition_clause: 可选的分区子句，由PartitionUtils.build_partition_clause生成
         """
         cursor = conn.cursor()
         try:
-            # 使用封装好的转义函数处理表名
-            escaped_table_name = DbUtils.escape_sql_identifier(table_name)
-            
-            # 构建SQL - 使用列表拼接避免任何格式化问题
-            sql_parts = []
-            sql_parts.append("CREATE TABLE IF NOT EXISTS")
-            sql_parts.append(escaped_table_name)
-            sql_parts.append("(")
-            sql_parts.append(", ".join(column_defs))
-            sql_parts.append(")")
-            sql_parts.append("CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
-            
-            # 组合SQL - 使用join而不是+拼接避免格式化问题
-            create_sql = " ".join(sql_parts)
+            create_sql = DbUtils.build_create_table_sql(table_name, column_defs, partition_clause)
             
             print("SQL创建表语句:")
             print(create_sql)
@@ -253,7 +240,8 @@ class DbUtils:
                 result = func(cursor)
                 
                 # 提交事务
-                conn.commit()
+                with TimingUtils.span("commit"):
+                    conn.commit()
                 
                 return (True, result)
             
@@ -307,539 +295,356 @@ class DbUtils:
         return (False, f"达到最大重试次数 ({max_retries})，最后错误: {last_error}")
 
     @staticmethod
-    def create_database_from_file(file_path, mysql_conn_info, load_data_file_func, progress_callback=None):
+    def gui_callbacks():
+        """图形界面的交互回调，tkinter只在这里导入，命令行模式不会加载"""
+        from tkinter import messagebox
+        from data_importer.utils.ui_utils import UiUtils
+        return {
+            "ask_resume": UiUtils.ask_resume_import,
+            "confirm_mapping": UiUtils.confirm_column_mapping,
+            "show_report": UiUtils.show_import_report,
+            "show_error": messagebox.showerror
+        }
+
+    @staticmethod
+    def create_database_from_file(file_path, mysql_conn_info, load_data_file_func, progress_callback=None,
+                                  ui_callbacks=None):
         """从数据文件创建MySQL数据库表并导入数据
         
+        导入流程由ImportEngine完成，这里只负责与用户交互：询问断点续传、确认列映射、显示报告和错误
+        
         参数:
             file_path: 数据文件路径
             mysql_conn_info: MySQL连接信息字典
             load_data_file_func: 加载数据文件的函数
             progress_callback: 进度回调函数，接受消息和进度百分比参数
+            ui_callbacks: 交互回调字典(ask_resume/confirm_mapping/show_report/show_error)，
+                          默认使用图形界面对话框
+        返回:
+            导入的表名，失败或取消时返回None
         """
-        # 用于更新进度的辅助函数
-        def update_progress(message, progress=None):
-            if progress_callback:
-                progress_callback(message, progress)
-            print(message)
+        from data_importer.utils.import_engine import ImportEngine
         
-        # 加载数据文件
-        update_progress("正在加载数据文件...", 10)
-        df = load_data_file_func(file_path)
+        if ui_callbacks is None:
+            ui_callbacks = DbUtils.gui_callbacks()
         
-        if df is None:
-            update_progress("无法加载数据文件", None)
-            print("无法加载数据文件")
+        def on_event(event):
+            if progress_callback and event["type"] == "progress":
+                progress_callback(event["message"], event["progress"])
+        
+        engine = ImportEngine(file_path, mysql_conn_info, load_data_file_func, on_event)
+        plan = engine.prepare()
+        if plan is None:
             return None
         
-        # 计算总行数用于进度报告
-        total_rows = len(df)
-        update_progress(f"成功加载数据文件，总计 {total_rows} 行数据", 15)
-        
-        # 保存原始列名，用于后续映射展示
-        original_columns = df.columns.tolist()
-        
-        # 调试数据结构
-        DataUtils.debug_data_structure(df)
-        
-        # 检测和修复数据完整性问题
-        print("检测和修复数据完整性问题...")
-        update_progress("正在检查数据完整性...", 20)
-        
-        # 确保没有重复列名
-        if len(df.columns) != len(set(df.columns)):
-            print("重命名重复列...")
-            # 添加后缀以确保列名唯一
-            new_columns = []
-            seen = set()
-            for i, col in enumerate(df.columns):
-                if col in seen:
-                    count = 1
-                    new_col = col + "_" + str(count)
-                    while new_col in seen:
-                        count += 1
-                        new_col = col + "_" + str(count)
-                    new_columns.append(new_col)
-                    seen.add(new_col)
-                    print("  重命名: '" + str(col) + "' -> '" + str(new_col) + "'")
-                else:
-                    new_columns.append(col)
-                    seen.add(col)
-            df.columns = new_columns
-        
-        # 表名基于文件名，添加时间戳确保唯一
-        base_table_name = os.path.splitext(os.path.basename(file_path))[0]
-        # 移除非字母数字字符
-        clean_base_name = ''.join(c if c.isalnum() else '_' for c in base_table_name)
-        timestamp = str(int(time.time()))
-        table_name = clean_base_name + "_" + timestamp
-        print("将创建表: " + table_name)
-        
-        # 设置日志记录器
-        logger = DbUtils.setup_logger(clean_base_name)
-        logger.info(f"开始导入文件: {file_path}")
-        logger.info(f"目标表名: {table_name}")
-        logger.info(f"数据行数: {len(df)}, 列数: {len(df.columns)}")
-        
-        conn = None
-        try:
-            # 连接到MySQL数据库
-            logger.info(f"连接到MySQL数据库: {mysql_conn_info['database']}@{mysql_conn_info['host']}:{mysql_conn_info['port']}")
-            conn = pymysql.connect(
-                host=mysql_conn_info["host"],
-                port=mysql_conn_info["port"],
-                user=mysql_conn_info["user"],
-                password=mysql_conn_info["password"],
-                database=mysql_conn_info["database"],
-                charset='utf8mb4',
-                use_unicode=True
-            )
-            print("已连接到MySQL数据库: " + mysql_conn_info["database"])
-            
-            # 从表头创建表结构
-            columns = df.columns.tolist()
-            
-            # 确定每列的数据类型
-            column_defs = []
-            column_types = []
-            for col in columns:
-                type_str = DataUtils.determine_mysql_type(col, df[col])
-                column_types.append((col, type_str))
-                
-            # 添加列名映射和数据类型预览
-            column_mappings = []
-            for i, (orig, curr) in enumerate(zip(original_columns, columns)):
-                if str(orig) != str(curr):
-                    column_mappings.append((orig, curr, column_types[i][1]))
-                else:
-                    column_mappings.append((orig, curr, column_types[i][1]))
-            
-            # 记录列类型到日志
-            logger.info("自动推断的列数据类型:")
-            for col, type_str in column_types:
-                logger.info(f"  '{col}': {type_str}")
-            
-            # 创建预览信息
-            preview_info = "列名映射和数据类型预览:\n\n"
-            preview_info += "原始列名 -> 数据库列名 (MySQL类型)\n"
-            preview_info += "----------------------------------------\n"
-            for orig, curr, type_str in column_mappings:
-                if str(orig) != str(curr):
-                    preview_info += f"{orig} -> {curr} ({type_str}) ← 已修改\n"
-                else:
-                    preview_info += f"{orig} -> {curr} ({type_str})\n"
-            
+        options = None
+        resume = bool(plan["checkpoint"]) and ui_callbacks["ask_resume"](plan["checkpoint"])
+        if not resume:
             # 通过对话框显示预览信息并请求确认，允许修改数据类型
-            result = UiUtils.confirm_column_mapping(preview_info, table_name, column_mappings)
-            
-            if not result["confirmed"]:
-                logger.info("用户取消了导入操作")
+            options = ui_callbacks["confirm_mapping"](
+                plan["preview_info"], plan["table_name"], plan["column_mappings"], plan["partition_candidates"],
+                plan["index_candidates"], plan["dimension_candidates"])
+            if not options["confirmed"]:
                 print("用户取消了导入操作")
-                if conn:
-                    conn.close()
-                return None
-            
-            # 应用用户修改的数据类型
-            modified_types = result["types"]
-            
-            # 记录用户修改的类型到日志
-            if modified_types:
-                logger.info("用户修改的数据类型:")
-                for col, type_str in modified_types.items():
-                    logger.info(f"  '{col}': {type_str}")
-            
-            # 重建column_defs，应用用户修改的数据类型
-            column_defs = []
-            updated_column_types = []
-            
-            for col in columns:
-                # 使用用户修改的类型或保持原来的类型
-                if col in modified_types:
-                    type_str = modified_types[col]
-                    print(f"应用用户修改的类型: '{col}' -> {type_str}")
-                else:
-                    # 查找原始类型
-                    type_str = next((t for c, t in column_types if c == col), "VARCHAR(255)")
-                
-                updated_column_types.append((col, type_str))
-                
-                # 创建列定义字符串 - 使用转义函数
-                escaped_col = DbUtils.escape_sql_identifier(col)
-                column_defs.append(escaped_col + " " + type_str)
-            
-            # 更新column_mappings用于报告
-            for i, (orig, curr, _) in enumerate(column_mappings):
-                # 查找更新后的类型
-                updated_type = next((t for c, t in updated_column_types if c == curr), "VARCHAR(255)")
-                column_mappings[i] = (orig, curr, updated_type)
-            
-            # 创建表
-            logger.info("开始创建表...")
-            if not DbUtils.execute_create_table(conn, table_name, column_defs):
-                logger.error("表创建失败")
-                if conn:
-                    conn.close()
                 return None
+        
+        result = engine.run(options, resume=resume)
+        if not result["success"]:
+            ui_callbacks["show_error"]("数据库错误", result["error"])
+            return None
+        
+        ui_callbacks["show_report"](result["report"])
+        return result["table_name"]
+
+    @staticmethod
+    def get_table_columns(conn, table_name):
+        """
+        查询当前数据库中已有表的列定义
+        返回: [(列名, 列类型), ...]，表不存在时返回None
+        """
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COLUMN_NAME, COLUMN_TYPE FROM INFORMATION_SCHEMA.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION",
+            (table_name,)
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+        if not rows:
+            return None
+        return [(row[0], row[1]) for row in rows]
+
+    @staticmethod
+    def drop_table(conn, table_name):
+        """删除表（如果存在）"""
+        cursor = conn.cursor()
+        cursor.execute("DROP TABLE IF EXISTS " + DbUtils.escape_sql_identifier(table_name))
+        conn.commit()
+        cursor.close()
+
+    @staticmethod
+    def validate_merge_target(conn, target_table, key_columns, columns):
+        """
+        检查合并模式的目标表和业务键
+        返回: 错误信息，检查通过时返回None
+        """
+        if not target_table:
+            return "合并模式需要指定目标表"
+        if not key_columns:
+            return "合并模式需要指定至少一个业务键列"
+        
+        target_columns = DbUtils.get_table_columns(conn, target_table)
+        if target_columns is None:
+            return f"目标表不存在: {target_table}"
+        
+        target_names = [name for name, _ in target_columns]
+        for key in key_columns:
+            if key not in columns:
+                return f"业务键列 '{key}' 不在数据文件中"
+            if key not in target_names:
+                return f"业务键列 '{key}' 不在目标表 {target_table} 中"
+        
+        # 文件中多出的列不参与合并
+        extra_columns = [col for col in columns if col not in target_names]
+        if extra_columns:
+            print(f"警告: 以下列不在目标表中，合并时将被忽略: {extra_columns}")
+        return None
+
+    @staticmethod
+    def merge_staging_table(conn, staging_table, target_table, column_mappings, key_columns):
+        """
+        将暂存表中的数据以集合操作合并到目标表，不逐行往返
+        
+        文件中同一业务键出现多次时，先删去暂存表中被后面的行覆盖的行(按写入顺序列保留最后出现的一行)，
+        使每个业务键只对应一行；再统计新增/更新/未变化的行数，用一条UPDATE ... JOIN更新有变化的行、
+        一条INSERT ... SELECT插入目标表中不存在的行，全部在同一事务中完成。业务键中有空值的行不合并，直接插入
+        
+        参数:
+            conn: 数据库连接
+            staging_table: 已导入完成的暂存表
+            target_table: 合并目标表
+            column_mappings: [(原始列名, 列名, 类型), ...]
+            key_columns: 业务键列名列表
+        
+        返回:
+            (成功与否, 统计字典或错误信息)，统计字典为 {"staged", "duplicates", "inserted", "updated", "unchanged"}，
+            updated/unchanged 为目标表中的行数
+        """
+        esc = DbUtils.escape_sql_identifier
+        seq = esc(DbUtils.MERGE_SEQ_COLUMN)
+        staging = esc(staging_table)
+        target = esc(target_table)
+        
+        # 只合并目标表中存在的列
+        target_names = [name for name, _ in (DbUtils.get_table_columns(conn, target_table) or [])]
+        columns = [curr for _, curr, _ in column_mappings if curr in target_names]
+        value_columns = [col for col in columns if col not in key_columns]
+        
+        # 在暂存表的业务键上建索引，加快与目标表的连接和按业务键分组（TEXT/BLOB列需要前缀长度，跳过）
+        key_types = [type_str.upper() for _, curr, type_str in column_mappings if curr in key_columns]
+        if not any("TEXT" in t or "BLOB" in t for t in key_types):
+            cursor = conn.cursor()
+            cursor.execute(
+                "ALTER TABLE " + staging + " ADD INDEX `idx_merge_key` (" +
+                ", ".join(esc(key) for key in key_columns) + ")"
+            )
+            cursor.close()
+        
+        key_cond = " AND ".join("t." + esc(key) + " = s." + esc(key) for key in key_columns)
+        if value_columns:
+            # 使用NULL安全的比较判断行是否有变化
+            diff_cond = "NOT (" + " AND ".join("t." + esc(col) + " <=> s." + esc(col) for col in value_columns) + ")"
+        else:
+            diff_cond = "FALSE"
+        
+        key_not_null = " AND ".join(esc(key) + " IS NOT NULL" for key in key_columns)
+        
+        def do_merge(cursor):
+            cursor.execute("SELECT COUNT(*) FROM " + staging)
+            staged = cursor.fetchone()[0]
+            
+            # 同一业务键只保留最后写入的一行；子查询放在派生表中，MySQL才允许从同一张表中删除
+            cursor.execute(
+                "DELETE FROM " + staging + " WHERE " + key_not_null + " AND " + seq + " NOT IN (" +
+                "SELECT `last_seq` FROM (SELECT MAX(" + seq + ") AS `last_seq` FROM " + staging +
+                " WHERE " + key_not_null + " GROUP BY " + ", ".join(esc(key) for key in key_columns) + ") AS `keep`)"
+            )
+            duplicates = cursor.rowcount
             
-            # 将数据写入表中
-            logger.info("开始导入数据...")
-            print("正在导入数据...")
-            
-            # 确认列数
-            col_count = len(columns)
-            print("列数: " + str(col_count))
-            
-            # 使用逐行插入方法，避免格式化问题
-            print("切换到智能批处理导入模式...")
-            rows_inserted = 0
-            total_rows = len(df)
-            error_rows = 0
-            
-            # 错误详情记录
-            errors_detail = []
-            
-            # 智能批处理参数
-            initial_batch_size = 100
-            current_batch_size = initial_batch_size
-            min_batch_size = 20
-            max_batch_size = 500
-            
-            # 性能追踪
-            speed_history = []
-            start_time = time.time()
-            batch_start_time = start_time
-            
-            # 使用tqdm创建进度条
-            with tqdm(total=total_rows, desc="数据导入进度", unit="行", ncols=100) as pbar:
-                i = 0
-                # 初始化迭代器
-                iter_rows = df.iterrows()
-                
-                # 更新起始进度
-                update_progress("开始导入数据...", 35)
-                
-                # 上次进度更新时间，用于控制更新频率
-                last_progress_update = time.time()
-                progress_update_interval = 0.5  # 秒
-                
-                while i < total_rows:
-                    # 确定当前批次的结束索引
-                    end_idx = min(i + current_batch_size, total_rows)
-                    batch_size = end_idx - i
-                    
-                    # 处理当前批次
-                    batch_success = 0
-                    batch_errors = 0
-                    
-                    # 记录批次开始时间
-                    batch_start_time = time.time()
-                    
-                    # 智能批处理导入
-                    batch_values = []
-                    batch_rows_info = []  # 存储批次中每行的索引信息
-                    
-                    for _ in range(batch_size):
-                        try:
-                            # 从迭代器获取下一行
-                            idx, row = next(iter_rows)
-                            
-                            # 提取行数据并处理NaN值
-                            values = []
-                            for col in columns:
-                                val = row[col]
-                                # 使用专门的函数处理值
-                                clean_val = DataUtils.clean_value_for_mysql(val)
-                                values.append(clean_val)
-                            
-                            # 确保值的数量与列数相同
-                            if len(values) != len(columns):
-                                error_msg = f"行 {idx} 数据不完整, 预期 {len(columns)} 列, 实际 {len(values)} 列"
-                                logger.warning(error_msg)
-                                error_rows += 1
-                                batch_errors += 1
-                                errors_detail.append((idx, error_msg))
-                                continue
-                            
-                            # 将值添加到批处理列表
-                            batch_values.append(values)
-                            batch_rows_info.append(idx)
-                        
-                        except Exception as e:
-                            error_msg = f"行 {idx if 'idx' in locals() else '?'} 处理失败: {e}"
-                            logger.error(error_msg)
-                            logger.error(traceback.format_exc())
-                            error_rows += 1
-                            batch_errors += 1
-                            errors_detail.append((idx if 'idx' in locals() else -1, str(e)))
-                            
-                            # 如果连续出现多次错误，可能需要中断操作
-                            if error_rows > 10 and error_rows / (i + _ + 1) > 0.5:  # 如果错误率超过50%
-                                abort_msg = "错误率过高，中断导入操作"
-                                logger.error(abort_msg)
-                                update_progress(abort_msg, None)
-                                break
-                    
-                    # 执行批量插入（如果有数据）
-                    if batch_values:
-                        # 使用事务管理器和重试机制执行批量插入
-                        def execute_batch(cursor):
-                            # 构建和执行批量插入语句
-                            escaped_table = DbUtils.escape_sql_identifier(table_name)
-                            escaped_columns = [DbUtils.escape_sql_identifier(col) for col in columns]
-                            
-                            # 构建批量插入SQL语句
-                            sql_parts = []
-                            sql_parts.append("INSERT INTO")
-                            sql_parts.append(escaped_table)
-                            sql_parts.append("(")
-                            sql_parts.append(", ".join(escaped_columns))
-                            sql_parts.append(") VALUES ")
-                            
-                            # 添加占位符
-                            placeholders = []
-                            for _ in range(len(columns)):
-                                placeholders.append("%s")
-                            placeholder_group = "(" + ", ".join(placeholders) + ")"
-                            
-                            # 为每组值创建占位符组
-                            value_groups = []
-                            flattened_values = []
-                            
-                            for row_values in batch_values:
-                                value_groups.append(placeholder_group)
-                                # 处理每行的值
-                                for val in row_values:
-                                    flattened_values.append(val)
-                            
-                            # 完成SQL语句
-                            sql = sql_parts[0]
-                            for part in sql_parts[1:]:
-                                sql += " " + part
-                            sql += " " + ", ".join(value_groups)
-                            
-                            # 执行批量插入
-                            cursor.execute(sql, flattened_values)
-                            return len(batch_values)  # 返回成功插入的行数
-                        
-                        # 执行带有重试机制的事务
-                        success, result = DbUtils.execute_transaction_with_retry(conn, execute_batch)
-                        
-                        if success:
-                            # 批量插入成功
-                            rows_inserted += result
-                            batch_success += result
-                            logger.info(f"批量插入成功: {result} 行")
-                        else:
-                            # 批量插入失败，尝试逐行插入作为回退策略
-                            error_msg = f"批量插入失败: {result}"
-                            logger.warning(error_msg)
-                            update_progress(f"批量插入失败，尝试逐行插入...", None)
-                            
-                            fallback_success = 0
-                            fallback_errors = 0
-                            
-                            # 逐行插入时不在同一个事务中，以保留成功的部分
-                            for i, (idx, values) in enumerate(zip(batch_rows_info, batch_values)):
-                                try:
-                                    # 构建单行插入函数
-                                    def execute_single_row(cursor):
-                                        # 构建INSERT语句
-                                        escaped_table = DbUtils.escape_sql_identifier(table_name)
-                                        escaped_columns = [DbUtils.escape_sql_identifier(col) for col in columns]
-                                        
-                                        # 构建SQL
-                                        sql_parts = []
-                                        sql_parts.append("INSERT INTO")
-                                        sql_parts.append(escaped_table)
-                                        sql_parts.append("(")
-                                        sql_parts.append(", ".join(escaped_columns))
-                                        sql_parts.append(") VALUES (")
-                                        
-                                        # 添加占位符
-                                        placeholders = []
-                                        for _ in range(len(columns)):
-                                            placeholders.append("%s")
-                                        sql_parts.append(", ".join(placeholders))
-                                        sql_parts.append(")")
-                                        
-                                        # 组合SQL语句
-                                        sql = " ".join(sql_parts)
-                                        
-                                        # 执行插入
-                                        cursor.execute(sql, values)
-                                        return True
-                                    
-                                    # 执行带有重试的单行事务
-                                    row_success, row_result = DbUtils.execute_transaction_with_retry(
-                                        conn, execute_single_row, max_retries=2)
-                                    
-                                    if row_success:
-                                        rows_inserted += 1
-                                        fallback_success += 1
-                                    else:
-                                        error_msg = f"行 {idx} 插入失败: {row_result}"
-                                        logger.warning(error_msg)
-                                        error_rows += 1
-                                        fallback_errors += 1
-                                        errors_detail.append((idx, error_msg))
-                                
-                                except Exception as e:
-                                    error_msg = f"行 {idx} 处理异常: {e}"
-                                    logger.error(error_msg)
-                                    logger.error(traceback.format_exc())
-                                    error_rows += 1
-                                    fallback_errors += 1
-                                    errors_detail.append((idx, str(e)))
-                                
-                                # 每插入10行更新一次进度，避免UI卡顿
-                                if i % 10 == 0:
-                                    progress_message = f"逐行插入中... 成功: {fallback_success}/{i+1}, 失败: {fallback_errors}"
-                                    update_progress(progress_message, None)
-                            
-                            logger.info(f"逐行插入回退：成功 {fallback_success}/{len(batch_values)} 行, 失败: {fallback_errors}")
-                            update_progress(f"逐行插入完成：成功 {fallback_success}/{len(batch_values)} 行, 失败: {fallback_errors}", None)
-                    
-                    # 批次完成后不再需要显式提交，已在事务中处理
-                    # 之前的conn.commit()可以删除
-                    
-                    # 更新UI进度
-                    current_time = time.time()
-                    if current_time - last_progress_update >= progress_update_interval:
-                        # 计算总体进度百分比(35-95%)
-                        processed_rows = i + batch_size
-                        overall_progress = 35 + (60 * processed_rows / total_rows)
-                        overall_progress = min(95, round(overall_progress, 1))
-                        
-                        # 计算速度和预估剩余时间
-                        elapsed = current_time - start_time
-                        speed = processed_rows / elapsed if elapsed > 0 else 0
-                        remaining_rows = total_rows - processed_rows
-                        eta_seconds = remaining_rows / speed if speed > 0 else 0
-                        
-                        # 格式化ETA
-                        if eta_seconds < 60:
-                            eta_str = f"{eta_seconds:.0f}秒"
-                        elif eta_seconds < 3600:
-                            eta_str = f"{eta_seconds/60:.1f}分钟"
-                        else:
-                            eta_str = f"{eta_seconds/3600:.1f}小时"
-                        
-                        # 更新UI
-                        success_rate = (rows_inserted / processed_rows * 100) if processed_rows > 0 else 0
-                        progress_message = f"已处理 {processed_rows}/{total_rows} 行 | 成功: {rows_inserted} ({success_rate:.1f}%) | 失败: {error_rows} | 速度: {speed:.1f}行/秒 | 剩余: {eta_str}"
-                        update_progress(progress_message, overall_progress)
-                        
-                        # 更新上次更新时间
-                        last_progress_update = current_time
-                    
-                    # 计算批次处理时间和速度
-                    batch_time = time.time() - batch_start_time
-                    batch_speed = batch_size / batch_time if batch_time > 0 else 0  # 行/秒
-                    
-                    # 记录历史速度用于平滑计算
-                    speed_history.append(batch_speed)
-                    if len(speed_history) > 10:  # 只保留最近10个批次的速度
-                        speed_history.pop(0)
-                    
-                    # 计算平均速度
-                    avg_speed = np.mean(speed_history) if speed_history else batch_speed
-                    
-                    # 更高级的自适应批处理大小调整逻辑
-                    if batch_time > 0:
-                        # 考虑多个因素来调整批处理大小
-                        # 1. 批处理时间（目标：1-3秒）
-                        time_factor = 2.0 / batch_time
-                        
-                        # 2. 错误率（错误越多，批次越小）
-                        error_rate = batch_errors / batch_size if batch_size > 0 else 0
-                        error_factor = 1.0 - (error_rate * 2)  # 错误率50%时减半批次大小
-                        
-                        # 3. 内存使用（理论上批次越大内存使用越高，但难以直接测量）
-                        # 这里我们假设如果批处理速度开始下降，可能是由于内存压力
-                        memory_factor = 1.0
-                        if len(speed_history) > 3:
-                            recent_avg = np.mean(speed_history[-3:])
-                            previous_avg = np.mean(speed_history[:-3]) if len(speed_history) > 6 else recent_avg
-                            if recent_avg < previous_avg * 0.85:  # 如果最近速度下降15%以上
-                                memory_factor = 0.9  # 稍微减小批次大小
-                        
-                        # 综合因素，计算调整系数
-                        adjustment_factor = time_factor * error_factor * memory_factor
-                        
-                        # 限制单次调整的幅度（0.7-1.5倍）
-                        adjustment_factor = min(max(adjustment_factor, 0.7), 1.5)
-                        
-                        # 应用调整
-                        new_batch_size = int(current_batch_size * adjustment_factor)
-                        
-                        # 确保批处理大小在允许范围内
-                        current_batch_size = max(min_batch_size, min(new_batch_size, max_batch_size))
-                        
-                        # 如果错误率高，进一步限制批处理大小
-                        if error_rate > 0.1:  # 错误率大于10%
-                            current_batch_size = min(current_batch_size, 50)
-                    
-                    # 更新进度条
-                    pbar.update(batch_size)
-                    
-                    # 更新进度条描述
-                    progress_desc = f"已导入: {rows_inserted}/{i+batch_size} | 速度: {avg_speed:.1f}行/秒 | 批次: {current_batch_size} | ETA: {eta_str if 'eta_str' in locals() else 'N/A'}"
-                    pbar.set_description(progress_desc)
-                    
-                    # 记录到日志
-                    progress_msg = f"已导入 {i+batch_size}/{total_rows} 行 (成功: {rows_inserted}, 失败: {error_rows}) | 批次大小: {current_batch_size} | 速度: {avg_speed:.1f}行/秒"
-                    logger.info(progress_msg)
-                    
-                    # 移动到下一批
-                    i += batch_size
-            
-            # 记录详细的错误信息
-            if errors_detail:
-                logger.warning("导入过程中遇到的错误详情:")
-                for row_idx, error_msg in errors_detail:
-                    logger.warning(f"  行 {row_idx}: {error_msg}")
-            
-            # 计算总运行时间
-            total_time = time.time() - start_time
-            avg_speed = rows_inserted / total_time if total_time > 0 else 0
+            # 暂存表中每个业务键只有一行，连接的行数即目标表中的行数
+            cursor.execute("SELECT COUNT(*) FROM " + staging + " s JOIN " + target + " t ON " + key_cond)
+            matched = cursor.fetchone()[0]
             
-            # 生成导入报告
-            report = DbUtils.generate_import_report(table_name, column_mappings, rows_inserted, total_rows, error_rows)
-            # 添加性能数据到报告
-            report["performance"] = {
-                "total_time_seconds": total_time,
-                "average_speed": avg_speed,
-                "final_batch_size": current_batch_size
+            cursor.execute(
+                "SELECT COUNT(*) FROM " + staging + " s JOIN " + target + " t ON " + key_cond +
+                " WHERE " + diff_cond
+            )
+            changed = cursor.fetchone()[0]
+            
+            # 更新有变化的行
+            if value_columns and changed:
+                cursor.execute(
+                    "UPDATE " + target + " t JOIN " + staging + " s ON " + key_cond +
+                    " SET " + ", ".join("t." + esc(col) + " = s." + esc(col) for col in value_columns) +
+                    " WHERE " + diff_cond
+                )
+            
+            # 插入目标表中不存在的行
+            cursor.execute(
+                "INSERT INTO " + target + " (" + ", ".join(esc(col) for col in columns) + ") " +
+                "SELECT " + ", ".join("s." + esc(col) for col in columns) + " FROM " + staging + " s " +
+                "WHERE NOT EXISTS (SELECT 1 FROM " + target + " t WHERE " + key_cond + ")"
+            )
+            inserted = cursor.rowcount
+            
+            return {
+                "staged": staged,
+                "duplicates": duplicates,
+                "inserted": inserted,
+                "updated": changed,
+                "unchanged": matched - changed
             }
-            UiUtils.show_import_report(report)
-            
-            # 格式化总时间
-            if total_time < 60:
-                time_str = f"{total_time:.1f}秒"
-            elif total_time < 3600:
-                time_str = f"{total_time/60:.1f}分钟"
+        
+        return DbUtils.execute_transaction_with_retry(conn, do_merge)
+
+    @staticmethod
+    def get_secondary_indexes(conn, table_name):
+        """
+        读取表的二级索引定义（不含主键和函数索引）
+        返回: [(索引名, 索引类型, 列定义列表), ...]，索引类型为 INDEX/UNIQUE/FULLTEXT/SPATIAL
+        """
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT INDEX_NAME, NON_UNIQUE, INDEX_TYPE, COLUMN_NAME, SUB_PART, COLLATION "
+            "FROM INFORMATION_SCHEMA.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME <> 'PRIMARY' "
+            "ORDER BY INDEX_NAME, SEQ_IN_INDEX",
+            (table_name,)
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+        
+        indexes = {}
+        skipped = set()
+        for index_name, non_unique, index_type, column_name, sub_part, collation in rows:
+            # 函数索引没有列名，保留在表上不做处理
+            if column_name is None:
+                skipped.add(index_name)
+                continue
+            
+            if index_type in ("FULLTEXT", "SPATIAL"):
+                kind = index_type
             else:
-                time_str = f"{total_time/3600:.1f}小时"
-            
-            summary_msg = f"数据导入完成: 成功导入 {rows_inserted}/{total_rows} 行数据, 失败: {error_rows}, 用时: {time_str}, 平均速度: {avg_speed:.1f}行/秒"
-            logger.info(summary_msg)
-            logger.info("导入操作结束")
-            print(summary_msg)  # 保留最终总结信息的打印
-            
-            return table_name
+                kind = "INDEX" if int(non_unique) else "UNIQUE"
+            
+            column_def = DbUtils.escape_sql_identifier(column_name)
+            if sub_part:
+                column_def += f"({int(sub_part)})"
+            if collation == "D":
+                column_def += " DESC"
+            indexes.setdefault(index_name, (kind, []))[1].append(column_def)
         
-        except Exception as e:
-            error_msg = f"数据库操作出错: {e}"
-            if 'logger' in locals():
-                logger.error(error_msg)
-                logger.error(traceback.format_exc())
-            print(error_msg)
-            print(traceback.format_exc())
-            messagebox.showerror("数据库错误", f"导入数据时出错:\n{e}")
-            return None
-        finally:
-            # 确保无论如何都关闭连接
-            if conn:
-                conn.close()
+        return [(name, kind, cols) for name, (kind, cols) in indexes.items() if name not in skipped]
+
+    @staticmethod
+    def add_indexes(conn, table_name, index_defs):
+        """用一条ALTER TABLE语句创建多个索引，已存在的索引会被跳过"""
+        existing = {name for name, _, _ in DbUtils.get_secondary_indexes(conn, table_name)}
+        clauses = []
+        for index_name, kind, column_defs in index_defs:
+            if index_name in existing:
+                continue
+            prefix = "ADD INDEX" if kind == "INDEX" else "ADD " + kind + " INDEX"
+            clauses.append(prefix + " " + DbUtils.escape_sql_identifier(index_name) + " (" + ", ".join(column_defs) + ")")
+        
+        if not clauses:
+            return 0
+        
+        cursor = conn.cursor()
+        cursor.execute("ALTER TABLE " + DbUtils.escape_sql_identifier(table_name) + " " + ", ".join(clauses))
+        conn.commit()
+        cursor.close()
+        return len(clauses)
+
+    @staticmethod
+    def get_index_columns(conn, table_name):
+        """
+        读取表上所有索引(含主键)的名称和第一列
+        返回: (索引名列表, 作为某个索引第一列的列名列表)
+        """
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT INDEX_NAME, COLUMN_NAME FROM INFORMATION_SCHEMA.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND SEQ_IN_INDEX = 1",
+            (table_name,)
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+        return [name for name, _ in rows], [column for _, column in rows if column is not None]
+
+    @staticmethod
+    def analyze_table(conn, table_name):
+        """
+        执行 ANALYZE TABLE 更新索引的统计信息，使刚导入的表上的查询从一开始就能选对执行计划
+        返回: 服务器的结果消息列表 [(消息类型, 消息), ...]
+        """
+        cursor = conn.cursor()
+        cursor.execute("ANALYZE TABLE " + DbUtils.escape_sql_identifier(table_name))
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.commit()
+        return [(str(row[2]), str(row[3])) for row in rows if len(row) >= 4]
+
+    @staticmethod
+    def create_reload_staging(conn, target_table, staging_table):
+        """
+        为全量替换创建与目标表结构相同的暂存表
+        先删除暂存表上的二级索引以加快批量导入，返回被推迟创建的索引定义
+        """
+        esc = DbUtils.escape_sql_identifier
+        cursor = conn.cursor()
+        cursor.execute("CREATE TABLE " + esc(staging_table) + " LIKE " + esc(target_table))
+        conn.commit()
+        
+        index_defs = DbUtils.get_secondary_indexes(conn, staging_table)
+        if index_defs:
+            cursor.execute(
+                "ALTER TABLE " + esc(staging_table) + " " +
+                ", ".join("DROP INDEX " + esc(name) for name, _, _ in index_defs)
+            )
+            conn.commit()
+            print(f"暂存表 {staging_table} 已推迟创建 {len(index_defs)} 个索引")
+        cursor.close()
+        return index_defs
+
+    @staticmethod
+    def swap_tables(conn, target_table, staging_table, keep_old=False):
+        """
+        用一条RENAME TABLE语句原子地将暂存表切换为目标表
+        
+        参数:
+            keep_old: 是否保留旧表用于回滚
+        
+        返回:
+            保留的旧表名，不保留时返回None
+        """
+        esc = DbUtils.escape_sql_identifier
+        old_table = (target_table + "_old")[:50] + "_" + str(int(time.time()))
+        
+        cursor = conn.cursor()
+        cursor.execute(
+            "RENAME TABLE " + esc(target_table) + " TO " + esc(old_table) + ", " +
+            esc(staging_table) + " TO " + esc(target_table)
+        )
+        conn.commit()
+        cursor.close()
+        
+        if keep_old:
+            print(f"旧表已保留为 {old_table}，可用于回滚")
+            return old_table
+        
+        DbUtils.drop_table(conn, old_table)
+        return None
 
     @staticmethod
     def generate_import_report(table_name, column_mappings, rows_inserted, total_rows, error_rows):
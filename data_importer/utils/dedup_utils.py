@@ -0,0 +1,272 @@
+"""
+去重工具类
+导入前按键列去掉目标表中已有的行和文件中重复的行：键值按表中的列类型转换为与服务器端相同的文本(与导入校验一致)，
+取64位哈希存入紧凑的哈希集合，每个键约8字节；超过内存上限的部分放在临时文件中按需读取
+"""
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pymysql
+
+from data_importer.utils.db_utils import DbUtils
+from data_importer.utils.verify_utils import VerifyUtils
+
+
+class DedupUtils:
+    # 从表中读取已有键时每次取回的行数
+    FETCH_ROWS = 50000
+
+    @staticmethod
+    def validate_columns(dedup_columns, columns, column_types, dimension_columns=()):
+        """
+        检查去重键列
+
+        参数:
+            dedup_columns: 去重键列名列表
+            columns: 导入的列
+            column_types: [(列名, MySQL类型), ...]，为写入的表中的类型
+            dimension_columns: 拆分到维度表的列，表中存的是编号，不能作为去重键
+
+        返回:
+            错误信息，没有问题时返回None
+        """
+        types = dict(column_types)
+        if len(set(dedup_columns)) != len(dedup_columns):
+            return f"去重键列重复: {list(dedup_columns)}"
+        for col in dedup_columns:
+            if col not in columns or col not in types:
+                return f"去重键列不存在: {col}"
+            if col in dimension_columns:
+                return f"去重键列 {col} 不能拆分到维度表"
+            if VerifyUtils.renderer(types[col]) is None:
+                return f"去重键列 {col} 的类型为 {types[col]}，不能作为去重键"
+        return None
+
+    @staticmethod
+    def hash_texts(texts):
+        """键文本的64位哈希"""
+        if not texts:
+            return np.empty(0, dtype=np.uint64)
+        return pd.util.hash_pandas_object(pd.Series(texts, dtype=object), index=False).to_numpy()
+
+    @staticmethod
+    def key_select_sql(table_name, key_columns, key_types):
+        """
+        在服务器端把每行的键转换为与客户端相同的文本，键中有空值的行不参与去重
+        返回: (SQL, 参数)
+        """
+        esc = DbUtils.escape_sql_identifier
+        expressions = [VerifyUtils.column_expression(col, type_str) for col, type_str in zip(key_columns, key_types)]
+        sql = ("SELECT CONCAT_WS(%s, " + ", ".join(expressions) + ") FROM " + esc(table_name) +
+               " WHERE " + " AND ".join(esc(col) + " IS NOT NULL" for col in key_columns))
+        return sql, [VerifyUtils.FIELD_SEPARATOR]
+
+    @staticmethod
+    def format_dedup(result):
+        """把 Deduplicator.summary 的结果格式化为逐行文本"""
+        lines = [f"按 {result['columns']} 去重: 跳过表中已有的 {result['skipped_existing']} 行，"
+                 f"文件中重复的 {result['skipped_in_file']} 行"]
+        if result["existing_keys"]:
+            lines.append(f"表中已有 {result['existing_keys']} 个键" +
+                         (f"，{result['disk_bytes']} 字节存于临时文件" if result["disk_bytes"] else ""))
+        return lines
+
+
+class KeyHashSet:
+    """
+    64位键哈希的集合
+    新加入的哈希先放在Python集合中，攒够后排序为一段；长度相近的段两两合并，段数保持在对数级别，
+    查询时在各段中二分查找。内存中各段合计超过 memory_limit 字节时合并写入临时文件，以memmap只读访问
+    """
+    # 缓冲集合中的哈希个数达到该值时排序为一段
+    BUFFER_SIZE = 65536
+
+    def __init__(self, spill_dir=None, memory_limit=None):
+        """
+        参数:
+            spill_dir: 临时文件目录的父目录，默认使用系统临时目录
+            memory_limit: 内存中各段的字节数上限，None表示不限制
+        """
+        self.spill_parent = spill_dir
+        self.memory_limit = memory_limit
+        self.path = None
+        self.files = 0
+        self.buffer = set()
+        self.levels = []
+        self.disk_levels = []
+        self.disk_bytes = 0
+
+    def __len__(self):
+        return (len(self.buffer) + sum(len(level) for level in self.levels) +
+                sum(len(level) for level in self.disk_levels))
+
+    def add(self, hashes):
+        """加入少量哈希(如一个批次的键)"""
+        if len(hashes) == 0:
+            return
+        self.buffer.update(hashes.tolist())
+        if len(self.buffer) >= self.BUFFER_SIZE:
+            run = np.fromiter(self.buffer, dtype=np.uint64, count=len(self.buffer))
+            run.sort()
+            self.buffer = set()
+            self._push(run)
+
+    def add_many(self, hashes):
+        """加入大量哈希(如从表中读取的一页键)，直接排序为一段"""
+        if len(hashes) == 0:
+            return
+        run = np.unique(np.asarray(hashes, dtype=np.uint64))
+        if len(self.buffer):
+            run = run[~self._in_buffer(run)]
+        self._push(run)
+
+    def _push(self, run):
+        # 与不长于自己的段合并，相当于二进制计数的进位
+        while self.levels and len(self.levels[-1]) <= len(run):
+            run = np.union1d(self.levels.pop(), run)
+        self.levels.append(run)
+        if self.memory_limit is not None and sum(level.nbytes for level in self.levels) > self.memory_limit:
+            self._spill()
+
+    def _spill(self):
+        """把内存中的各段合并为一段写入临时文件"""
+        run = self.levels[0]
+        for level in self.levels[1:]:
+            run = np.union1d(run, level)
+        self.levels = []
+        if self.path is None:
+            self.path = tempfile.mkdtemp(prefix="import_dedup_", dir=self.spill_parent)
+        path = os.path.join(self.path, f"keys_{self.files:06d}.bin")
+        self.files += 1
+        run.tofile(path)
+        self.disk_bytes += run.nbytes
+        self.disk_levels.append(np.memmap(path, dtype=np.uint64, mode="r", shape=(len(run),)))
+
+    def _in_buffer(self, hashes):
+        buffer = self.buffer
+        return np.fromiter((h in buffer for h in hashes.tolist()), dtype=bool, count=len(hashes))
+
+    def contains(self, hashes):
+        """每个哈希是否在集合中"""
+        found = np.zeros(len(hashes), dtype=bool)
+        if len(hashes) == 0:
+            return found
+        if self.buffer:
+            found |= self._in_buffer(hashes)
+        for level in self.levels + self.disk_levels:
+            pos = np.searchsorted(level, hashes)
+            pos[pos == len(level)] = 0
+            found |= np.asarray(level[pos]) == hashes
+        return found
+
+    def close(self):
+        """删除临时文件"""
+        self.disk_levels = []
+        if self.path and os.path.exists(self.path):
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+class Deduplicator:
+    """
+    导入时去掉键已在表中或已在本文件前面出现过的行，键中有空值的行不去重
+    本批保留行的键在批次提交后才记入已导入的集合；逐行插入回退时只记入插入成功的行，被拒绝的行不影响后面的同键行
+    两个不同的键哈希相同的概率约为 n²/2^65(1亿个键时约为万分之三)，此时后一行会被误判为重复
+    """
+
+    def __init__(self, columns, key_columns, key_types, spill_dir=None, memory_limit=None):
+        """
+        参数:
+            columns: 行值对应的列
+            key_columns: 去重键列
+            key_types: 去重键列在表中的类型
+            spill_dir: 临时文件目录的父目录
+            memory_limit: 哈希集合在内存中的字节数上限，None表示不限制
+        """
+        self.columns = list(columns)
+        self.key_columns = list(key_columns)
+        self.key_types = list(key_types)
+        self.positions = [self.columns.index(col) for col in self.key_columns]
+        self.renderers = [VerifyUtils.renderer(type_str) for type_str in self.key_types]
+        # 表中已有的键和本次已写入的键分开保存，分别计数
+        self.existing = KeyHashSet(spill_dir, memory_limit)
+        self.seen = KeyHashSet(spill_dir, memory_limit)
+        self.pending = np.empty(0, dtype=np.uint64)
+        self.existing_keys = 0
+        self.skipped_existing = 0
+        self.skipped_in_file = 0
+
+    def load_table(self, conn, table_name):
+        """流式读取表中已有的键存入哈希集合，返回读取的键个数"""
+        sql, params = DedupUtils.key_select_sql(table_name, self.key_columns, self.key_types)
+        cursor = conn.cursor(pymysql.cursors.SSCursor)
+        try:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(DedupUtils.FETCH_ROWS)
+                if not rows:
+                    break
+                texts = [text if type(text) is str else (text.decode("utf-8", "surrogateescape")
+                                                         if isinstance(text, bytes) else str(text))
+                         for text, in rows]
+                self.existing.add_many(DedupUtils.hash_texts(texts))
+                self.existing_keys += len(texts)
+        finally:
+            cursor.close()
+        return self.existing_keys
+
+    def _key_hashes(self, rows):
+        """每行键的哈希和键中是否有空值"""
+        parts = [[render(row[pos]) for row in rows] for pos, render in zip(self.positions, self.renderers)]
+        separator = VerifyUtils.FIELD_SEPARATOR
+        has_null = np.zeros(len(rows), dtype=bool)
+        texts = []
+        for i, values in enumerate(zip(*parts)):
+            if None in values:
+                has_null[i] = True
+                texts.append("")
+            else:
+                texts.append(values[0] if len(values) == 1 else separator.join(values))
+        return DedupUtils.hash_texts(texts), has_null
+
+    def filter_rows(self, rows):
+        """
+        判断一批行中哪些需要导入，保留行的键暂存到 commit 时记入
+        返回: 与rows等长的布尔列表，True表示保留
+        """
+        if not rows:
+            return []
+        hashes, has_null = self._key_hashes(rows)
+        in_table = self.existing.contains(hashes) & ~has_null
+        # 批内重复的键只保留第一次出现的行
+        in_file = (self.seen.contains(hashes) | pd.Series(hashes).duplicated().to_numpy()) & ~has_null & ~in_table
+        keep = ~(in_table | in_file)
+        self.skipped_existing += int(in_table.sum())
+        self.skipped_in_file += int(in_file.sum())
+        self.pending = hashes[keep & ~has_null]
+        return keep.tolist()
+
+    def commit(self, rows=None):
+        """本批数据提交后调用；rows为逐行插入回退时成功插入的行，只记入这些行的键"""
+        if rows is None:
+            self.seen.add(self.pending)
+        elif rows:
+            hashes, has_null = self._key_hashes(rows)
+            self.seen.add(hashes[~has_null])
+        self.pending = np.empty(0, dtype=np.uint64)
+
+    def close(self):
+        self.existing.close()
+        self.seen.close()
+
+    def summary(self):
+        """{"columns", "existing_keys", "skipped_existing", "skipped_in_file", "disk_bytes"}"""
+        return {
+            "columns": self.key_columns,
+            "existing_keys": self.existing_keys,
+            "skipped_existing": self.skipped_existing,
+            "skipped_in_file": self.skipped_in_file,
+            "disk_bytes": self.existing.disk_bytes + self.seen.disk_bytes
+        }
@@ -0,0 +1,220 @@
+"""
+维度表工具类
+把取值重复的长文本列拆分到维度表(id, value)：导入时在内存中的哈希表里为每个不同值分配整数编号，
+事实表只存编号，另建一个视图按原来的列还原
+"""
+import re
+
+from data_importer.utils.db_utils import DbUtils
+from data_importer.utils.data_utils import DataUtils
+
+
+class DimensionUtils:
+    # 客户端哈希表中最多保存的不同值个数，超过时不适合拆分
+    MAX_DISTINCT = 1000000
+    # 建议拆分的列: 不同值个数/非空行数不超过此值
+    MAX_SELECTIVITY = 0.1
+    # 估计至少节省该比例的存储时才建议拆分
+    MIN_SAVING = 0.5
+    # 维度表每行除值以外的估计开销(字节)
+    ROW_OVERHEAD = 20
+
+    KEY_BYTES = {"TINYINT": 1, "SMALLINT": 2, "MEDIUMINT": 3, "INT": 4, "BIGINT": 8}
+
+    @staticmethod
+    def is_text_type(type_str):
+        return bool(re.match(r'^((VAR)?CHAR\(\d+\)|(TINY|MEDIUM|LONG)?TEXT)$', type_str.strip().upper()))
+
+    @staticmethod
+    def key_type(distinct):
+        """编号列的类型，按估计的不同值个数留出一倍余量"""
+        return DataUtils.integer_type_for_range(0, max(255, int(distinct or 0) * 2))
+
+    @staticmethod
+    def propose_dimensions(column_stats, column_types):
+        """
+        为取值重复多、值较长的文本列建议拆分到维度表
+
+        参数:
+            column_stats: SketchUtils.column_statistics 的结果
+            column_types: [(列名, MySQL类型), ...]
+
+        返回:
+            {列名: {"distinct", "avg_len", "key_type", "saving"}}，saving 为估计节省的存储比例
+        """
+        proposals = {}
+        for col, type_str in column_types:
+            stat = column_stats.get(col)
+            if not stat or not DimensionUtils.is_text_type(type_str) or not stat["distinct"]:
+                continue
+            if stat["distinct"] > DimensionUtils.MAX_DISTINCT or stat["selectivity"] > DimensionUtils.MAX_SELECTIVITY:
+                continue
+            avg_len = stat.get("avg_len") or 0
+            non_null = stat["rows"] - stat["nulls"]
+            key_type = DimensionUtils.key_type(stat["distinct"])
+            key_bytes = DimensionUtils.KEY_BYTES[key_type.split()[0]]
+            # 按字符数粗略估计: 原来每行存 长度+1 字节，拆分后每行存编号，维度表每个不同值存一次
+            before = non_null * (avg_len + 1)
+            after = non_null * key_bytes + stat["distinct"] * (avg_len + key_bytes + DimensionUtils.ROW_OVERHEAD)
+            if before <= 0 or 1 - after / before < DimensionUtils.MIN_SAVING:
+                continue
+            proposals[col] = {
+                "distinct": stat["distinct"],
+                "avg_len": avg_len,
+                "key_type": key_type,
+                "saving": round(1 - after / before, 3)
+            }
+        return proposals
+
+    @staticmethod
+    def plan_dimensions(table_name, dimension_columns, column_types, column_stats):
+        """
+        确定各维度列的维度表名、编号类型和值类型
+        返回: ({列名: {"table", "key_type", "value_type"}}, 错误信息)
+        """
+        types = dict(column_types)
+        specs = {}
+        used_names = set()
+        for col in dimension_columns:
+            if col not in types:
+                return None, f"维度列不存在: {col}"
+            if not DimensionUtils.is_text_type(types[col]):
+                return None, f"维度列 {col} 的类型为 {types[col]}，只有文本列可以拆分到维度表"
+            stat = column_stats.get(col) or {}
+            if (stat.get("distinct") or 0) > DimensionUtils.MAX_DISTINCT:
+                return None, f"维度列 {col} 约有 {stat['distinct']} 个不同值，超过上限 {DimensionUtils.MAX_DISTINCT}"
+
+            # 维度表名为 表名_列名，不超过MySQL标识符的64字符限制
+            name = (table_name + "_" + str(col))[:64]
+            suffix = 1
+            while name.lower() in used_names:
+                suffix += 1
+                name = (table_name + "_" + str(col))[:60] + f"_{suffix}"
+            used_names.add(name.lower())
+            specs[col] = {"table": name, "key_type": DimensionUtils.key_type(stat.get("distinct")),
+                          "value_type": types[col]}
+        return specs, None
+
+    @staticmethod
+    def existing_dimensions(conn, table_name, target_columns):
+        """
+        已有表中拆分到维度表的列: 列为整数类型，且存在按 plan_dimensions 规则命名的维度表 表名_列名，
+        维度表只有 id 和文本类型的 value 两列。合并、追加和全量替换到该表时按维度表中的编号写入
+
+        参数:
+            target_columns: [(列名, MySQL类型), ...]，为已有表中的列
+        返回: {列名: {"table", "key_type", "value_type"}}
+        """
+        specs = {}
+        for col, type_str in target_columns:
+            if not re.match(r'^(TINYINT|SMALLINT|MEDIUMINT|INT|BIGINT)\b', type_str.strip().upper()):
+                continue
+            name = (table_name + "_" + str(col))[:64]
+            dimension_columns = DbUtils.get_table_columns(conn, name)
+            if not dimension_columns or [str(dim_col).lower() for dim_col, _ in dimension_columns] != ["id", "value"]:
+                continue
+            if DimensionUtils.is_text_type(dimension_columns[1][1]):
+                specs[col] = {"table": name, "key_type": type_str, "value_type": dimension_columns[1][1]}
+        return specs
+
+    @staticmethod
+    def view_name(table_name):
+        return (table_name + "_view")[:64]
+
+    @staticmethod
+    def create_dimension_tables(conn, specs):
+        """创建各维度表，成功返回True"""
+        esc = DbUtils.escape_sql_identifier
+        for spec in specs.values():
+            column_defs = [esc("id") + " " + spec["key_type"] + " NOT NULL PRIMARY KEY",
+                           esc("value") + " " + spec["value_type"]]
+            if not DbUtils.execute_create_table(conn, spec["table"], column_defs):
+                return False
+        return True
+
+    @staticmethod
+    def build_view_sql(view_name, table_name, columns, specs):
+        """按原来的列顺序还原数据的视图，维度列LEFT JOIN维度表取回原值"""
+        esc = DbUtils.escape_sql_identifier
+        select = []
+        joins = []
+        for col in columns:
+            if col in specs:
+                alias = f"d{len(joins) + 1}"
+                select.append(f"{alias}.{esc('value')} AS {esc(col)}")
+                joins.append(f" LEFT JOIN {esc(specs[col]['table'])} AS {alias} ON {alias}.{esc('id')} = f.{esc(col)}")
+            else:
+                select.append(f"f.{esc(col)}")
+        return ("CREATE OR REPLACE VIEW " + esc(view_name) + " AS SELECT " + ", ".join(select) +
+                " FROM " + esc(table_name) + " AS f" + "".join(joins))
+
+    @staticmethod
+    def create_view(conn, view_name, table_name, columns, specs):
+        cursor = conn.cursor()
+        cursor.execute(DimensionUtils.build_view_sql(view_name, table_name, columns, specs))
+        conn.commit()
+        cursor.close()
+
+
+class DimensionEncoder:
+    """
+    导入过程中把维度列的值替换为编号，编号在客户端分配
+    每批新出现的值在写入该批数据的同一事务中写入维度表(INSERT IGNORE，事务重试时可重复执行)
+    """
+
+    def __init__(self, columns, specs):
+        self.specs = specs
+        self.positions = [(columns.index(col), col) for col in specs]
+        self.ids = {col: {} for col in specs}
+        self.next_id = {col: 1 for col in specs}
+        self.pending = {col: [] for col in specs}
+
+    def load(self, conn):
+        """从断点继续或写入已有表时读回维度表中已有的值和编号"""
+        for col, spec in self.specs.items():
+            cursor = conn.cursor()
+            cursor.execute("SELECT " + DbUtils.escape_sql_identifier("id") + ", " + DbUtils.escape_sql_identifier("value") +
+                           " FROM " + DbUtils.escape_sql_identifier(spec["table"]))
+            ids = self.ids[col]
+            for dim_id, value in cursor.fetchall():
+                ids[value if type(value) is str else str(value)] = dim_id
+                self.next_id[col] = max(self.next_id[col], dim_id + 1)
+            cursor.close()
+
+    def encode_rows(self, rows):
+        """返回维度列替换为编号后的新行列表(原行不变，附加输出可能仍在使用)，新值记入待写入列表"""
+        rows = [list(row) for row in rows]
+        for pos, col in self.positions:
+            ids = self.ids[col]
+            pending = self.pending[col]
+            for row in rows:
+                value = row[pos]
+                if value is None:
+                    continue
+                key = value if type(value) is str else str(value)
+                dim_id = ids.get(key)
+                if dim_id is None:
+                    dim_id = self.next_id[col]
+                    self.next_id[col] = dim_id + 1
+                    ids[key] = dim_id
+                    pending.append((dim_id, key))
+                row[pos] = dim_id
+        return rows
+
+    def write_pending(self, cursor):
+        """在当前事务中写入待写入的新值"""
+        for col, pending in self.pending.items():
+            if pending:
+                cursor.executemany(
+                    "INSERT IGNORE INTO " + DbUtils.escape_sql_identifier(self.specs[col]["table"]) +
+                    " (" + DbUtils.escape_sql_identifier("id") + ", " + DbUtils.escape_sql_identifier("value") +
+                    ") VALUES (%s, %s)", pending)
+
+    def clear_pending(self):
+        """新值所在的事务提交后调用"""
+        for pending in self.pending.values():
+            pending.clear()
+
+    def summary(self):
+        """{列名: {"table", "values"}}"""
+        return {col: {"table": spec["table"], "values": len(self.ids[col])} for col, spec in self.specs.items()}
@@ -7,7 +7,7 @@ import pandas as pd
 import chardet
 import re
 import traceback
-from tkinter import messagebox
+from data_importer.utils.timing_utils import TimingUtils
 
 class FileUtils:
     @staticmethod
@@ -102,10 +102,25 @@ class FileUtils:
         return None, None
 
     @staticmethod
-    def load_data_file(file_path, get_csv_settings_func):
-        """根据文件扩展名加载数据文件"""
+    def show_message_box(kind, title, message):
+        """用tkinter消息框显示提示，kind为error/warning"""
+        from tkinter import messagebox
+        if kind == "warning":
+            messagebox.showwarning(title, message)
+        else:
+            messagebox.showerror(title, message)
+
+    @staticmethod
+    def load_data_file(file_path, get_csv_settings_func, show_message=None):
+        """
+        根据文件扩展名加载数据文件
+        show_message: 提示回调 (kind, title, message)，默认弹出tkinter消息框
+        """
         from data_importer.utils.data_utils import DataUtils
         
+        if show_message is None:
+            show_message = FileUtils.show_message_box
+        
         _, ext = os.path.splitext(file_path)
         
         if ext.lower() in ['.xlsx', '.xls']:
@@ -126,7 +141,8 @@ class FileUtils:
                     print("文件较大，使用优化读取模式...")
                     try:
                         # 先获取表头信息
-                        excel_file = pd.ExcelFile(file_path)
+                        with TimingUtils.span("probe"):
+                            excel_file = pd.ExcelFile(file_path)
                         sheet_names = excel_file.sheet_names
                         print(f"检测到 {len(sheet_names)} 个工作表: {sheet_names}")
                         
@@ -135,7 +151,8 @@ class FileUtils:
                         print(f"使用第一个工作表: {sheet_name}")
                         
                         # 获取表头
-                        header_df = pd.read_excel(file_path, sheet_name=sheet_name, nrows=1)
+                        with TimingUtils.span("probe"):
+                            header_df = pd.read_excel(file_path, sheet_name=sheet_name, nrows=1)
                         columns = header_df.columns.tolist()
                         print(f"列名: {columns}")
                         
@@ -166,12 +183,13 @@ class FileUtils:
                             print(f"读取批次 {chunk_count+1}, 从第 {current_row+1} 行开始")
                             try:
                                 # 读取一批数据
-                                chunk = pd.read_excel(
-                                    file_path,
-                                    sheet_name=sheet_name,
-                                    skiprows=current_row,
-                                    nrows=chunk_size
-                                )
+                                with TimingUtils.span("parse"):
+                                    chunk = pd.read_excel(
+                                        file_path,
+                                        sheet_name=sheet_name,
+                                        skiprows=current_row,
+                                        nrows=chunk_size
+                                    )
                                 
                                 # 如果没有读到数据，说明已经到文件末尾
                                 if len(chunk) == 0:
@@ -207,7 +225,8 @@ class FileUtils:
                         # 合并所有批次
                         if chunks:
                             print(f"合并 {len(chunks)} 个数据批次...")
-                            df = pd.concat(chunks, ignore_index=True)
+                            with TimingUtils.span("parse"):
+                                df = pd.concat(chunks, ignore_index=True)
                             print(f"读取完成，总行数: {len(df)}")
                         else:
                             raise Exception("未能读取任何数据")
@@ -219,17 +238,18 @@ class FileUtils:
                 # 如果不使用优化模式或优化模式失败，使用常规方式读取
                 if not use_optimized_loading:
                     # 对于Excel文件，尝试使用不同的引擎读取
-                    try:
-                        df = pd.read_excel(file_path, engine='openpyxl')
-                        print("使用openpyxl引擎读取成功")
-                    except:
+                    with TimingUtils.span("parse"):
                         try:
-                            df = pd.read_excel(file_path, engine='xlrd')
-                            print("使用xlrd引擎读取成功")
+                            df = pd.read_excel(file_path, engine='openpyxl')
+                            print("使用openpyxl引擎读取成功")
                         except:
-                            # 最后尝试默认引擎
-                            df = pd.read_excel(file_path)
-                            print("使用默认引擎读取成功")
+                            try:
+                                df = pd.read_excel(file_path, engine='xlrd')
+                                print("使用xlrd引擎读取成功")
+                            except:
+                                # 最后尝试默认引擎
+                                df = pd.read_excel(file_path)
+                                print("使用默认引擎读取成功")
                 
                 # 检查是否成功读取数据
                 if df is None or len(df) == 0:
@@ -240,22 +260,24 @@ class FileUtils:
                         if len(df.columns) > 0:
                             print("列数: " + str(len(df.columns)))
                             print("列名: " + str(df.columns.tolist()))
-                    messagebox.showerror("错误", "Excel文件不包含数据或无法正确读取")
+                    show_message("error", "错误", "Excel文件不包含数据或无法正确读取")
                     return None
                     
                 # 数据预处理
                 print("开始预处理数据...")
-                df = DataUtils.preprocess_dataframe(df)
+                with TimingUtils.span("preprocess"):
+                    df = DataUtils.preprocess_dataframe(df)
                     
                 # 规范化列名
                 print("规范化列名...")
-                df = DataUtils.normalize_column_names(df)
+                with TimingUtils.span("normalize"):
+                    df = DataUtils.normalize_column_names(df)
                 print("Excel文件处理完成")
                 return df
             except Exception as e:
                 print("读取Excel文件出错: " + str(e))
                 print(traceback.format_exc())
-                messagebox.showerror("错误", "读取Excel文件失败:\n" + str(e))
+                show_message("error", "错误", "读取Excel文件失败:\n" + str(e))
                 return None
         elif ext.lower() == '.csv':
             print("正在读取CSV文件: " + file_path)
@@ -274,20 +296,22 @@ class FileUtils:
             if sep == "auto":
                 # 使用快速兼容的编码尝试检测分隔符
                 detect_encoding = 'utf-8'
-                try:
-                    sep = FileUtils.detect_csv_delimiter(file_path, detect_encoding)
-                except:
+                with TimingUtils.span("probe"):
                     try:
-                        sep = FileUtils.detect_csv_delimiter(file_path, 'latin1')
+                        sep = FileUtils.detect_csv_delimiter(file_path, detect_encoding)
                     except:
-                        sep = ','
+                        try:
+                            sep = FileUtils.detect_csv_delimiter(file_path, 'latin1')
+                        except:
+                            sep = ','
                 print("自动检测到分隔符: " + repr(sep))
             
             # 确定要尝试的编码
             encodings_to_try = []
             if user_encoding == "auto":
                 # 自动检测编码
-                detected_encoding = FileUtils.better_detect_encoding(file_path)
+                with TimingUtils.span("probe"):
+                    detected_encoding = FileUtils.better_detect_encoding(file_path)
                 print("自动检测到编码: " + str(detected_encoding))
                 # 编码尝试顺序: 检测到的编码, GB18030, GBK, UTF-8, latin1
                 encodings_to_try = [detected_encoding, 'gb18030', 'gbk', 'utf-8', 'utf-8-sig', 'latin1']
@@ -302,7 +326,8 @@ class FileUtils:
                     unique_encodings.append(enc)
             
             # 尝试使用不同编码读取
-            df, successful_encoding = FileUtils.try_read_csv(file_path, unique_encodings, sep, header, errors)
+            with TimingUtils.span("parse"):
+                df, successful_encoding = FileUtils.try_read_csv(file_path, unique_encodings, sep, header, errors)
             if df is not None:
                 print("成功使用编码 " + str(successful_encoding) + " 读取CSV文件")
                 
@@ -311,25 +336,180 @@ class FileUtils:
                     df.columns = ["Column_" + str(i+1) for i in range(len(df.columns))]
                 
                 # 数据预处理
-                df = DataUtils.preprocess_dataframe(df)
+                with TimingUtils.span("preprocess"):
+                    df = DataUtils.preprocess_dataframe(df)
                     
                 # 规范化列名
-                df = DataUtils.normalize_column_names(df)
+                with TimingUtils.span("normalize"):
+                    df = DataUtils.normalize_column_names(df)
                 
                 # 检查是否有数据
                 if len(df) == 0:
                     print("警告: 读取到的CSV文件不包含任何数据行")
-                    messagebox.showwarning("警告", "CSV文件不包含任何数据行")
+                    show_message("warning", "警告", "CSV文件不包含任何数据行")
                     return None
                     
                 return df
             else:
                 error_msg = "无法以任何支持的编码读取CSV文件"
                 print(error_msg)
-                messagebox.showerror("错误", error_msg)
+                show_message("error", "错误", error_msg)
                 return None
         else:
             error_msg = "不支持的文件类型: " + ext
             print(error_msg)
-            messagebox.showerror("错误", error_msg)
-            return None 
\ No newline at end of file
+            show_message("error", "错误", error_msg)
+            return None 
+
+    @staticmethod
+    def open_data_chunks(file_path, get_csv_settings_func, next_chunk_rows, show_message=None):
+        """
+        分块读取数据文件，整个文件不会同时驻留内存
+        next_chunk_rows: 无参函数，返回下一块应读取的行数，由内存预算动态调整
+        show_message: 提示回调 (kind, title, message)，默认弹出tkinter消息框
+
+        返回: {"columns": 原始列名列表, "chunks": 逐块产生原始DataFrame的迭代器}，无法读取时返回None
+        每块只做读取，不做预处理，预处理和列名规范化由调用方按全文件的统计结果统一完成
+        """
+        if show_message is None:
+            show_message = FileUtils.show_message_box
+
+        _, ext = os.path.splitext(file_path)
+        ext = ext.lower()
+
+        if ext == '.csv':
+            csv_settings = get_csv_settings_func()
+            if not csv_settings:
+                return None
+
+            sep = csv_settings["sep"]
+            header = csv_settings["header"]
+            if sep == "auto":
+                with TimingUtils.span("probe"):
+                    try:
+                        sep = FileUtils.detect_csv_delimiter(file_path, 'utf-8')
+                    except:
+                        sep = ','
+                print("自动检测到分隔符: " + repr(sep))
+
+            if csv_settings["encoding"] == "auto":
+                with TimingUtils.span("probe"):
+                    detected_encoding = FileUtils.better_detect_encoding(file_path)
+                encodings_to_try = [detected_encoding, 'gb18030', 'gbk', 'utf-8', 'utf-8-sig', 'latin1']
+            else:
+                encodings_to_try = [csv_settings["encoding"], 'gb18030', 'gbk', 'utf-8', 'latin1']
+
+            # 用第一块确认可用的编码，之后沿用同一个读取器
+            reader = None
+            first_chunk = None
+            for encoding in dict.fromkeys(enc for enc in encodings_to_try if enc):
+                try:
+                    with TimingUtils.span("parse"):
+                        reader = pd.read_csv(file_path, encoding=encoding, sep=sep, header=header,
+                                             on_bad_lines='warn', engine='python', quoting=0,
+                                             escapechar='\\', encoding_errors=csv_settings["errors"],
+                                             iterator=True)
+                        first_chunk = reader.get_chunk(next_chunk_rows())
+                    print("分块读取CSV，使用编码 " + str(encoding))
+                    break
+                except StopIteration:
+                    first_chunk = None
+                    break
+                except Exception as e:
+                    print("使用编码 " + str(encoding) + " 分块读取CSV失败: " + str(e))
+                    reader = None
+
+            if reader is None or first_chunk is None or len(first_chunk) == 0:
+                error_msg = "无法以任何支持的编码读取CSV文件" if reader is None else "CSV文件不包含任何数据行"
+                print(error_msg)
+                show_message("error" if reader is None else "warning", "错误" if reader is None else "警告", error_msg)
+                return None
+
+            if header is None:
+                columns = ["Column_" + str(i + 1) for i in range(len(first_chunk.columns))]
+            else:
+                columns = first_chunk.columns.tolist()
+
+            def csv_chunks():
+                chunk = first_chunk
+                try:
+                    while chunk is not None and len(chunk) > 0:
+                        chunk.columns = columns
+                        yield chunk
+                        try:
+                            with TimingUtils.span("parse"):
+                                chunk = reader.get_chunk(next_chunk_rows())
+                        except StopIteration:
+                            chunk = None
+                finally:
+                    reader.close()
+
+            return {"columns": columns, "chunks": csv_chunks()}
+
+        if ext == '.xlsx':
+            try:
+                from openpyxl import load_workbook
+                with TimingUtils.span("probe"):
+                    workbook = load_workbook(file_path, read_only=True, data_only=True)
+                    sheet = workbook.worksheets[0]
+                    rows = sheet.iter_rows(values_only=True)
+                    header_row = next(rows, None)
+            except Exception as e:
+                print("读取Excel文件出错: " + str(e))
+                show_message("error", "错误", "读取Excel文件失败:\n" + str(e))
+                return None
+
+            if header_row is None:
+                workbook.close()
+                show_message("error", "错误", "Excel文件不包含数据或无法正确读取")
+                return None
+
+            # 与pandas.read_excel一致，空表头命名为Unnamed: n
+            columns = [str(col) if col is not None else f"Unnamed: {i}" for i, col in enumerate(header_row)]
+
+            def read_block(limit):
+                buffer = []
+                with TimingUtils.span("parse"):
+                    for row in rows:
+                        # 跳过完全为空的行，与pandas读取结果一致
+                        if all(val is None for val in row):
+                            continue
+                        buffer.append(row[:len(columns)] + (None,) * (len(columns) - len(row)))
+                        if len(buffer) >= limit:
+                            break
+                    return pd.DataFrame(buffer, columns=columns) if buffer else None
+
+            def xlsx_chunks():
+                try:
+                    chunk = read_block(next_chunk_rows())
+                    while chunk is not None:
+                        yield chunk
+                        chunk = read_block(next_chunk_rows())
+                finally:
+                    workbook.close()
+
+            return {"columns": columns, "chunks": xlsx_chunks()}
+
+        if ext == '.xls':
+            # xls格式无法流式读取，整表读入后再分块交给后续步骤
+            try:
+                with TimingUtils.span("parse"):
+                    df = pd.read_excel(file_path)
+            except Exception as e:
+                print("读取Excel文件出错: " + str(e))
+                show_message("error", "错误", "读取Excel文件失败:\n" + str(e))
+                return None
+
+            def xls_chunks():
+                offset = 0
+                while offset < len(df):
+                    limit = next_chunk_rows()
+                    yield df.iloc[offset:offset + limit]
+                    offset += limit
+
+            return {"columns": df.columns.tolist(), "chunks": xls_chunks()}
+
+        error_msg = "不支持的文件类型: " + ext
+        print(error_msg)
+        show_message("error", "错误", error_msg)
+        return None
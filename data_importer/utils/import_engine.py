@@ -0,0 +1,1912 @@
+"""
+导入引擎
+与界面无关的导入流程：输入数据文件、连接信息和列映射/类型方案，输出结构化的进度事件和结果字典。
+图形界面和命令行都只是它的使用者，每个实例只持有自己的状态，可以在多个线程或进程中同时运行
+"""
+import os
+import time
+import traceback
+import logging
+import contextlib
+import collections
+import pymysql
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+from data_importer.utils.data_utils import DataUtils
+from data_importer.utils.db_utils import DbUtils
+from data_importer.utils.checkpoint_utils import CheckpointUtils
+from data_importer.utils.partition_utils import PartitionUtils
+from data_importer.utils.sketch_utils import SketchUtils
+from data_importer.utils.index_utils import IndexUtils
+from data_importer.utils.dimension_utils import DimensionUtils, DimensionEncoder
+from data_importer.utils.key_utils import KeyUtils, ExternalSorter
+from data_importer.utils.dedup_utils import DedupUtils, Deduplicator
+from data_importer.utils.registry_utils import RegistryUtils, RowHashLog
+from data_importer.utils.schema_utils import SchemaUtils
+from data_importer.utils.validate_utils import ValidateUtils, ChunkValidator
+from data_importer.utils.memory_utils import MemoryBudget, MemoryUtils, ChunkPipeline, StageMemoryProfiler
+from data_importer.utils.reject_utils import RejectUtils, RejectWriter
+from data_importer.utils.logging_utils import LoggingUtils
+from data_importer.utils.metrics_utils import ImportMetrics, MetricsReporter
+from data_importer.utils.timing_utils import TimingUtils, StageTimer
+from data_importer.utils.sink_utils import FanoutSink
+from data_importer.utils.verify_utils import VerifyUtils, LoadVerifier
+
+
+class ImportEngine:
+    """
+    单个文件的导入任务
+
+    用法:
+        engine = ImportEngine(file_path, mysql_conn_info, load_data_file_func, event_callback)
+        plan = engine.prepare()          # 加载文件、推断类型、给出分区建议、检测检查点
+        result = engine.run(options)     # 按确认后的方案建表并导入
+
+    事件以字典形式传给 event_callback，至少包含 type 字段:
+        progress: message, progress(0-100或None)，导入阶段另有 rows_processed/rows_inserted/error_rows/total_rows/speed
+        stage:    stage(阶段名), message
+        warning:  message
+    """
+
+    # 只写入附加输出(不写MySQL)时每批的行数
+    SINK_BATCH_ROWS = 10000
+
+    def __init__(self, file_path, mysql_conn_info, load_data_file_func, event_callback=None,
+                 max_memory=None, open_chunks_func=None, spill_dir=None, log_levels=None, metrics_output=None,
+                 memory_profile=None, connect_func=None, sinks=None, verify=False, incremental=None):
+        """
+        max_memory: 进程内存上限(字节)，为None时不限制
+        open_chunks_func: 分块读取函数 (file_path, next_chunk_rows) -> FileUtils.open_data_chunks 的结果；
+            与max_memory同时提供时按块流式导入，整个文件不会同时驻留内存
+        spill_dir: 写入跟不上时已清洗数据块的溢写目录，默认使用系统临时目录
+        log_levels: 整个导入或各阶段的日志级别，LoggingUtils.parse_levels 的结果；每批次明细默认为DEBUG不记录
+        metrics_output: 定期写出导入指标 {"json": 路径, "prometheus": 路径, "interval": 秒}，为None时只在内存中统计
+        memory_profile: 分阶段内存采样方式，"rss" 只采样进程内存，"tracemalloc" 另记录Python对象内存和分配位置
+        connect_func: 创建数据库连接的函数，参数与 pymysql.connect 相同，默认为 pymysql.connect；
+            基准测试用它接入不经过网络的模拟连接
+        sinks: 附加输出(SinkUtils中的 ImportSink 子类实例)列表，清洗后的每批数据同时写入这些输出；
+            mysql_conn_info 为None时只写入这些输出，不连接MySQL
+        verify: 导入完成后在服务器端计算整表的校验和，与写入时在客户端累计的校验和比较，不一致时定位到批次
+        incremental: 增量导入的数据源名称(True 表示使用文件名)；扫描时记录每行的哈希，与目标库登记表中该数据源
+            上次导入的版本逐段比较，内容相同时跳过，只导入新增或变化的部分
+        """
+        self.file_path = file_path
+        self.mysql_conn_info = mysql_conn_info
+        self.load_data_file_func = load_data_file_func
+        self.event_callback = event_callback
+        self.open_chunks_func = open_chunks_func
+        self.spill_dir = spill_dir
+        self.log_levels = log_levels
+        self.metrics_output = metrics_output
+        self.connect_func = connect_func or pymysql.connect
+        self.sinks = list(sinks or [])
+        self.sink_fanout = None
+        self.verify = verify
+        self.verifier = None
+        self.incremental = incremental
+        self.row_hashes = None
+        self.metrics = ImportMetrics({"file": os.path.basename(file_path)})
+        self.timer = StageTimer()
+        self.memory_profiler = StageMemoryProfiler(self.timer, memory_profile) if memory_profile else None
+        self.metrics.memory_profiler = self.memory_profiler
+        self.budget = MemoryBudget(max_memory)
+        self.streaming = max_memory is not None and open_chunks_func is not None
+        self.source_positions = None
+        self._recent_frames = collections.deque(maxlen=2)
+        self.sort_summary = None
+
+        self.df = None
+        self.plan = None
+        self.column_profiles = None
+        self.logger = None
+        self.fingerprint = None
+        self.checkpoint = None
+
+    def emit(self, event_type, message=None, progress=None, **fields):
+        """发出一个进度事件，消息交给后台日志线程打印，不阻塞插入循环"""
+        event = {"type": event_type, "time": time.time()}
+        if message is not None:
+            event["message"] = message
+        if event_type == "progress":
+            event["progress"] = progress
+        event.update(fields)
+        if event_type == "stage":
+            self.metrics.enter_stage(fields.get("stage"))
+        if self.event_callback:
+            self.event_callback(event)
+        if message is not None:
+            LoggingUtils.console_message(message)
+
+    def prepare(self):
+        """
+        加载数据文件并生成导入方案
+        返回: 方案字典，文件无法加载时返回None
+            table_name: 建议的表名
+            column_mappings: [(原始列名, 数据库列名, 推断的MySQL类型), ...]
+            partition_candidates: {列名: 分区方案}
+            column_stats: 各列的近似不同值个数、选择性和分位数
+            index_candidates: 建议创建的索引(IndexUtils.propose_indexes)
+            dimension_candidates: 建议拆分到维度表的文本列(DimensionUtils.propose_dimensions)
+            preview_info: 列映射预览文本
+            checkpoint: 该文件未完成导入的检查点(没有则为None)，run(resume=True)时从这里继续
+        """
+        self.emit("stage", "正在加载数据文件...", stage="load")
+        self.emit("progress", "正在加载数据文件...", 10)
+
+        # 设置了内存上限时分块扫描文件，不把整个文件读入内存
+        if self.memory_profiler:
+            self.memory_profiler.start()
+        token = TimingUtils.activate(self.timer)
+        try:
+            scan = self._scan_chunks() if self.streaming else self._load_frame()
+        finally:
+            TimingUtils.deactivate(token)
+        if scan is None:
+            if self.memory_profiler:
+                self.memory_profiler.stop()
+            self.emit("progress", "无法加载数据文件", None)
+            return None
+
+        original_columns = scan["original_columns"]
+        columns = scan["columns"]
+        column_types = scan["column_types"]
+        total_rows = scan["total_rows"]
+
+        # 表名基于文件名，添加时间戳确保唯一
+        base_table_name = os.path.splitext(os.path.basename(self.file_path))[0]
+        # 移除非字母数字字符
+        clean_base_name = ''.join(c if c.isalnum() else '_' for c in base_table_name)
+        table_name = clean_base_name + "_" + str(int(time.time()))
+
+        # 检查是否存在未完成导入的检查点
+        self.fingerprint = CheckpointUtils.file_fingerprint(self.file_path)
+        checkpoint = CheckpointUtils.load_checkpoint(self.file_path)
+        if checkpoint and checkpoint.get("columns") != [str(col) for col in columns]:
+            print("检查点中的列结构与当前文件不一致，忽略检查点")
+            CheckpointUtils.clear_checkpoint(self.file_path)
+            checkpoint = None
+
+        # 统计列信息，为可分区的列给出建议的分区方案；追加模式按统计信息判断是否需要放宽目标表的列类型
+        self.column_profiles = scan["column_profiles"]
+        partition_candidates = PartitionUtils.propose_partitions(scan["column_profiles"], column_types)
+
+        # 由扫描时累计的草图估计各列的不同值个数和分位数，为选择性高的键列建议索引
+        column_stats = SketchUtils.column_statistics(scan["column_profiles"])
+        index_candidates = IndexUtils.propose_indexes(column_stats, column_types)
+        dimension_candidates = DimensionUtils.propose_dimensions(column_stats, column_types)
+
+        # 添加列名映射和数据类型预览
+        column_mappings = []
+        for i, (orig, curr) in enumerate(zip(original_columns, columns)):
+            column_mappings.append((orig, curr, column_types[i][1]))
+
+        # 创建预览信息
+        preview_info = "列名映射和数据类型预览:\n\n"
+        preview_info += "原始列名 -> 数据库列名 (MySQL类型)\n"
+        preview_info += "----------------------------------------\n"
+        for orig, curr, type_str in column_mappings:
+            if str(orig) != str(curr):
+                preview_info += f"{orig} -> {curr} ({type_str}) ← 已修改\n"
+            else:
+                preview_info += f"{orig} -> {curr} ({type_str})\n"
+
+        self.checkpoint = checkpoint
+        self.plan = {
+            "table_name": table_name,
+            "clean_base_name": clean_base_name,
+            "columns": columns,
+            "column_types": column_types,
+            "column_mappings": column_mappings,
+            "partition_candidates": partition_candidates,
+            "column_stats": column_stats,
+            "index_candidates": index_candidates,
+            "dimension_candidates": dimension_candidates,
+            "preview_info": preview_info,
+            "total_rows": total_rows,
+            "checkpoint": checkpoint
+        }
+        return self.plan
+
+    def _reset_row_hashes(self, row_hashes):
+        """重新扫描文件时换用新的行哈希记录，删除之前的临时文件"""
+        if self.row_hashes is not None:
+            self.row_hashes.close()
+        self.row_hashes = row_hashes
+
+    @staticmethod
+    def _dedupe_columns(columns):
+        """为重复的列名添加后缀，返回新的列名列表"""
+        if len(columns) == len(set(columns)):
+            return list(columns)
+
+        print("重命名重复列...")
+        # 添加后缀以确保列名唯一
+        new_columns = []
+        seen = set()
+        for col in columns:
+            if col in seen:
+                count = 1
+                new_col = col + "_" + str(count)
+                while new_col in seen:
+                    count += 1
+                    new_col = col + "_" + str(count)
+                new_columns.append(new_col)
+                seen.add(new_col)
+                print("  重命名: '" + str(col) + "' -> '" + str(new_col) + "'")
+            else:
+                new_columns.append(col)
+                seen.add(col)
+        return new_columns
+
+    def _load_frame(self):
+        """整表读入内存并推断列类型"""
+        df = self.load_data_file_func(self.file_path)
+
+        if df is None:
+            return None
+
+        total_rows = len(df)
+        self.emit("progress", f"成功加载数据文件，总计 {total_rows} 行数据", 15)
+
+        # 导入拒绝文件时忽略其附加的行号/错误码/错误信息列
+        meta_columns = [col for col in df.columns if RejectUtils.is_meta_column(col)]
+        if meta_columns:
+            print(f"检测到拒绝文件的附加列，导入时忽略: {meta_columns}")
+            df = df.drop(columns=meta_columns)
+
+        # 保存原始列名，用于后续映射展示
+        original_columns = df.columns.tolist()
+
+        # 调试数据结构
+        with TimingUtils.span("profile"):
+            DataUtils.debug_data_structure(df)
+
+        # 检测和修复数据完整性问题
+        print("检测和修复数据完整性问题...")
+        self.emit("progress", "正在检查数据完整性...", 20)
+
+        # 确保没有重复列名
+        df.columns = self._dedupe_columns(df.columns.tolist())
+        self.df = df
+
+        # 增量导入：记录每行的哈希，用于与上次导入的版本比较
+        if self.incremental:
+            with TimingUtils.span("profile"):
+                self._reset_row_hashes(RowHashLog())
+                self.row_hashes.add(RegistryUtils.row_hashes(df))
+                self.row_hashes.finish()
+
+        # 确定每列的数据类型
+        self.emit("stage", "正在推断列数据类型...", stage="infer")
+        columns = df.columns.tolist()
+        column_types = []
+        with TimingUtils.span("infer"):
+            for col in columns:
+                type_str = DataUtils.determine_mysql_type(col, df[col])
+                column_types.append((col, type_str))
+
+        with TimingUtils.span("profile"):
+            column_profiles = DataUtils.profile_dataframe(df)
+
+        return {
+            "original_columns": original_columns,
+            "columns": columns,
+            "column_types": column_types,
+            "column_profiles": column_profiles,
+            "total_rows": total_rows
+        }
+
+    def _scan_chunks(self):
+        """
+        分块扫描数据文件：逐块推断类型、统计列信息并合并为全文件的结果，扫描过的块随即释放
+        空列的判断和列名规范化与整表读取时一致
+        """
+        source = self.open_chunks_func(self.file_path, self.budget.next_chunk_rows)
+        if source is None:
+            return None
+
+        raw_columns = source["columns"]
+        with TimingUtils.span("normalize"):
+            names = self._dedupe_columns(DataUtils.normalize_names(raw_columns, verbose=False))
+        has_values = [False] * len(raw_columns)
+        types = [None] * len(raw_columns)
+        profiles = [None] * len(raw_columns)
+        total_rows = 0
+        # 增量导入：每行的哈希写入临时文件，不随文件大小占用内存
+        if self.incremental:
+            self._reset_row_hashes(RowHashLog(self.spill_dir, on_disk=True))
+
+        self.emit("stage", "正在分块扫描数据文件并推断列数据类型...", stage="infer")
+        for chunk_no, chunk in enumerate(source["chunks"]):
+            self.budget.observe_chunk(len(chunk), int(chunk.memory_usage(index=False, deep=True).sum()))
+            for j in range(len(raw_columns)):
+                if not has_values[j] and chunk.iloc[:, j].notna().any():
+                    has_values[j] = True
+            if self.row_hashes is not None:
+                with TimingUtils.span("profile"):
+                    self.row_hashes.add(RegistryUtils.row_hashes(chunk))
+
+            with TimingUtils.span("preprocess"):
+                chunk = DataUtils.convert_numeric_columns(chunk)
+            chunk.columns = names
+
+            with TimingUtils.span("profile"):
+                if chunk_no == 0:
+                    DataUtils.debug_data_structure(chunk)
+                chunk_profiles = DataUtils.profile_dataframe(chunk)
+                for j, name in enumerate(names):
+                    profiles[j] = DataUtils.merge_profiles(profiles[j], chunk_profiles[name])
+
+            with TimingUtils.span("infer"):
+                for j, name in enumerate(names):
+                    series = chunk[name]
+                    # 该块中全为空的列不参与类型合并
+                    if series.notna().any():
+                        types[j] = DataUtils.merge_mysql_types(
+                            types[j], DataUtils.determine_mysql_type(name, series), profiles[j])
+
+            total_rows += len(chunk)
+            self.emit("progress", f"已扫描 {total_rows} 行数据", 15)
+            self.budget.check()
+
+        if total_rows == 0:
+            return None
+
+        # 删除所有空列和拒绝文件的附加列，再按保留的列规范化列名
+        keep = [j for j in range(len(raw_columns)) if has_values[j] and not RejectUtils.is_meta_column(raw_columns[j])]
+        if len(keep) < len(raw_columns):
+            print("删除 " + str(len(raw_columns) - len(keep)) + " 个空列或拒绝文件附加列")
+        original_columns = [raw_columns[j] for j in keep]
+        with TimingUtils.span("normalize"):
+            columns = self._dedupe_columns(DataUtils.normalize_names(original_columns))
+
+        self.source_positions = keep
+        self.df = None
+        if self.row_hashes is not None:
+            self.row_hashes.finish()
+        print(f"分块扫描完成: 总计 {total_rows} 行, {len(columns)} 列")
+        self.emit("progress", f"成功扫描数据文件，总计 {total_rows} 行数据", 20)
+
+        return {
+            "original_columns": original_columns,
+            "columns": columns,
+            "column_types": [(col, types[j]) for col, j in zip(columns, keep)],
+            "column_profiles": {col: profiles[j] for col, j in zip(columns, keep)},
+            "total_rows": total_rows
+        }
+
+    def run(self, options=None, resume=False):
+        """
+        按确认后的方案执行导入
+
+        参数:
+            options: 与列映射对话框结果相同的字典，均可省略:
+                types(修改的类型 {列名: 类型})、mode(create/merge/append/reload)、target_table、
+                key_columns、keep_old、partition_column、
+                create_indexes(导入后创建建议的索引，默认False)、analyze(导入后执行ANALYZE TABLE，默认True)、
+                dimension_columns(拆分到维度表的文本列，仅新建表)、
+                primary_key("auto" 添加自增代理主键，或自然主键的列名列表，仅新建表；自然主键按主键顺序写入)、
+                dedup_columns(去重键列，跳过键已在写入的表中或在文件中重复的行)、
+                evolve_schema(追加模式下为文件中新增的列和取值超出原类型的列修改目标表结构，默认True)、
+                validate(写入前按表中的列类型预校验清洗后的值，超长、超出范围、无法转换的值的处理策略:
+                reject 整行写入拒绝文件(默认)、truncate 截断或限定到类型的范围、coerce 置为NULL、off 不检查)
+            resume: 为True且prepare()发现检查点时，沿用检查点中的方案从断点继续
+
+        返回:
+            {"success": bool, "table_name": 导入的表名, "report": 导入报告, "error": 错误信息}
+        """
+        if self.plan is None and self.prepare() is None:
+            return {"success": False, "table_name": None, "report": None, "error": "无法加载数据文件"}
+
+        options = options or {}
+        if self.mysql_conn_info is None and not self.sinks:
+            return {"success": False, "table_name": None, "report": None, "error": "没有指定MySQL连接或其他输出"}
+
+        # 只写入附加输出时没有断点续传，也保留该文件写入MySQL时留下的检查点
+        sinks_only = self.mysql_conn_info is None
+        resume_checkpoint = self.plan["checkpoint"] if resume and not sinks_only else None
+        if self.plan["checkpoint"] and not resume_checkpoint and not sinks_only:
+            CheckpointUtils.clear_checkpoint(self.file_path)
+
+        table_name = resume_checkpoint["table_name"] if resume_checkpoint else self.plan["table_name"]
+        print(("将继续导入到表: " if resume_checkpoint else "将创建表: ") + table_name)
+
+        # 设置日志记录器
+        logger = DbUtils.setup_logger(self.plan["clean_base_name"], self.log_levels)
+        self.logger = logger
+        logger.info(f"开始导入文件: {self.file_path}")
+        logger.info(f"目标表名: {table_name}")
+        logger.info(f"数据行数: {self.plan['total_rows']}, 列数: {len(self.plan['columns'])}")
+        if self.budget.enabled:
+            logger.info(f"内存上限: {MemoryUtils.format_size(self.budget.max_memory)}, "
+                        f"当前占用: {MemoryUtils.format_size(MemoryUtils.current_rss())}")
+
+        # 后台线程定期写出导入指标
+        self.metrics.labels["table"] = table_name
+        reporter = MetricsReporter(self.metrics, self.metrics_output).start() if self.metrics_output else None
+
+        conn = None
+        self.checkpoint = None
+        if self.memory_profiler:
+            self.memory_profiler.start()
+        timer_token = TimingUtils.activate(self.timer)
+        try:
+            if sinks_only:
+                if self.row_hashes is not None:
+                    logger.warning("增量导入需要连接MySQL数据库，按完整文件写入附加输出")
+                with TimingUtils.span("create_table"):
+                    setup = self._create_target(None, table_name, options)
+                if setup.get("error"):
+                    return {"success": False, "table_name": None, "report": None, "error": setup["error"]}
+                stats = self._load_to_sinks(setup["table_name"], setup["column_mappings"], setup["import_options"])
+                report_table, report = self._finish(
+                    None, setup["table_name"], setup["column_mappings"], setup["import_options"], stats)
+                return {"success": True, "table_name": report_table, "report": report, "error": None}
+
+            # 连接到MySQL数据库
+            mysql_conn_info = self.mysql_conn_info
+            logger.info(f"连接到MySQL数据库: {mysql_conn_info['database']}@{mysql_conn_info['host']}:{mysql_conn_info['port']}")
+            conn = self.connect_func(
+                host=mysql_conn_info["host"],
+                port=mysql_conn_info["port"],
+                user=mysql_conn_info["user"],
+                password=mysql_conn_info["password"],
+                database=mysql_conn_info["database"],
+                charset='utf8mb4',
+                use_unicode=True
+            )
+            print("已连接到MySQL数据库: " + mysql_conn_info["database"])
+
+            if resume_checkpoint:
+                # 断点续传：沿用检查点中已确认的列映射、数据类型和导入模式，表已存在无需重建
+                column_mappings = [tuple(m) for m in resume_checkpoint["column_mappings"]]
+                import_options = resume_checkpoint.get("import_options", {"mode": "create"})
+                logger.info(f"从检查点继续导入到已有表: {table_name}")
+                if import_options.get("incremental") and self.row_hashes is None:
+                    logger.warning("从断点继续的增量导入没有指定数据源，完成后不更新登记表")
+            else:
+                # 增量导入：与登记表中上次导入的版本比较，决定导入方式和起始行
+                incremental = None
+                if self.row_hashes is not None:
+                    options, incremental = self._plan_incremental(conn, options)
+                    if incremental["status"] == "unchanged":
+                        report = DbUtils.generate_import_report(
+                            incremental["table"], self.plan["column_mappings"], 0, 0, 0)
+                        report["incremental"] = incremental
+                        report["timings"] = self.timer.summary()
+                        return {"success": True, "table_name": incremental["table"], "report": report, "error": None}
+
+                with TimingUtils.span("create_table"):
+                    setup = self._create_target(conn, table_name, options)
+                if setup.get("error"):
+                    return {"success": False, "table_name": None, "report": None, "error": setup["error"]}
+                table_name = setup["table_name"]
+                column_mappings = setup["column_mappings"]
+                import_options = setup["import_options"]
+                if incremental:
+                    import_options["incremental"] = incremental
+                    import_options["start_offset"] = incremental["start_row"]
+                self.metrics.labels["table"] = table_name
+
+            stats = self._load_rows(conn, table_name, column_mappings, import_options, resume_checkpoint)
+            report_table, report = self._finish(conn, table_name, column_mappings, import_options, stats)
+
+            return {"success": True, "table_name": report_table, "report": report, "error": None}
+
+        except Exception as e:
+            error_msg = f"数据库操作出错: {e}"
+            logger.error(error_msg)
+            logger.error(traceback.format_exc())
+            print(error_msg)
+            print(traceback.format_exc())
+            # 保留最新的检查点，以便下次从断点继续
+            if self.checkpoint:
+                CheckpointUtils.save_checkpoint(self.file_path, self.checkpoint)
+                print("已保存导入检查点，再次导入同一文件时可从断点继续")
+            return {"success": False, "table_name": None, "report": None, "error": f"导入数据时出错:\n{e}"}
+        finally:
+            # 确保无论如何都关闭连接
+            if conn:
+                conn.close()
+            if self.verifier:
+                self.verifier.close()
+                self.verifier = None
+            self._reset_row_hashes(None)
+            TimingUtils.deactivate(timer_token)
+            if self.memory_profiler:
+                self.memory_profiler.stop()
+            self.metrics.finish()
+            if reporter:
+                reporter.stop()
+            DbUtils.close_logger(logger)
+
+    def _plan_incremental(self, conn, options):
+        """
+        查找数据源上次导入的登记记录并与当前文件逐段比较:
+        没有记录(或上次导入的表已不存在)时按选项正常导入；内容相同时跳过；只在末尾追加了行时追加新增的行；
+        前面的段有变化时，指定了业务键则从第一个变化的段开始合并到已有表，否则全量替换已有表
+        返回: (调整后的选项, {"source", "status", "mode", "table", "start_row", "previous_rows", "changed_ranges"})
+        """
+        logger = LoggingUtils.stage_logger(self.logger, "load")
+        source = self.incremental if isinstance(self.incremental, str) else self.plan["clean_base_name"]
+        incremental = {"source": source, "status": "new", "mode": options.get("mode", "create"), "table": None,
+                       "start_row": 0, "previous_rows": 0, "changed_ranges": 0}
+
+        RegistryUtils.ensure_registry_table(conn)
+        entry = RegistryUtils.lookup(conn, source)
+        if entry and DbUtils.get_table_columns(conn, entry["table_name"]) is None:
+            logger.warning(f"数据源 {source} 上次导入的表 {entry['table_name']} 已不存在，重新导入")
+            entry = None
+
+        if entry:
+            incremental.update(RegistryUtils.compare(entry, self.plan["columns"], self.row_hashes))
+            incremental["table"] = entry["table_name"]
+            if incremental["status"] == "appended":
+                incremental["mode"] = "append"
+            elif incremental["status"] == "changed":
+                if options.get("key_columns"):
+                    incremental["mode"] = "merge"
+                else:
+                    incremental["mode"] = "reload"
+                    incremental["start_row"] = 0
+            else:
+                incremental["mode"] = None
+            # 已有表保持原结构，新建表才有的选项不再适用
+            options = dict(options, mode=incremental["mode"], target_table=entry["table_name"],
+                           dimension_columns=[], primary_key=None, partition_column=None)
+
+        message = RegistryUtils.format_incremental(incremental)
+        logger.info(message)
+        self.emit("progress", message, 30)
+        return options, incremental
+
+    def _create_target(self, conn, table_name, options):
+        """
+        应用确认后的类型和导入模式，创建目标表或暂存表；conn为None(只写入附加输出)时只确定列类型，不建表
+        返回: {"table_name", "column_mappings", "import_options"}，失败时返回 {"error": 错误信息}
+        """
+        logger = LoggingUtils.stage_logger(self.logger, "create_table")
+        columns = self.plan["columns"]
+        column_types = self.plan["column_types"]
+        partition_candidates = self.plan["partition_candidates"]
+        column_mappings = list(self.plan["column_mappings"])
+
+        # 记录列类型到日志
+        logger.info("自动推断的列数据类型:")
+        for col, type_str in column_types:
+            logger.info(f"  '{col}': {type_str}")
+
+        # 应用用户修改的数据类型
+        modified_types = options.get("types") or {}
+
+        # 记录用户修改的类型到日志
+        if modified_types:
+            logger.info("用户修改的数据类型:")
+            for col, type_str in modified_types.items():
+                logger.info(f"  '{col}': {type_str}")
+
+        # 重建column_defs，应用用户修改的数据类型
+        column_defs = []
+        updated_column_types = []
+
+        for col in columns:
+            # 使用用户修改的类型或保持原来的类型
+            if col in modified_types:
+                type_str = modified_types[col]
+                print(f"应用用户修改的类型: '{col}' -> {type_str}")
+            else:
+                # 查找原始类型
+                type_str = next((t for c, t in column_types if c == col), "VARCHAR(255)")
+
+            updated_column_types.append((col, type_str))
+
+            # 创建列定义字符串 - 使用转义函数
+            escaped_col = DbUtils.escape_sql_identifier(col)
+            column_defs.append(escaped_col + " " + type_str)
+
+        # 更新column_mappings用于报告
+        for i, (orig, curr, _) in enumerate(column_mappings):
+            # 查找更新后的类型
+            updated_type = next((t for c, t in updated_column_types if c == curr), "VARCHAR(255)")
+            column_mappings[i] = (orig, curr, updated_type)
+
+        # 导入模式：新建表、追加到已有表，或先导入暂存表再合并到已有表/替换已有表
+        import_options = {
+            "mode": options.get("mode", "create"),
+            "target_table": options.get("target_table"),
+            "key_columns": options.get("key_columns", []),
+            "keep_old": options.get("keep_old", False),
+            "create_indexes": bool(options.get("create_indexes", False)),
+            "analyze": bool(options.get("analyze", True)),
+            "dedup_columns": list(options.get("dedup_columns") or []),
+            "evolve_schema": bool(options.get("evolve_schema", True)),
+            "validate": options.get("validate") or ValidateUtils.DEFAULT_POLICY,
+            "partition": None
+        }
+        if import_options["validate"] not in ValidateUtils.POLICIES:
+            return {"error": f"不支持的预校验策略: {import_options['validate']}"}
+
+        dimension_columns = list(options.get("dimension_columns") or [])
+        if dimension_columns and import_options["mode"] != "create":
+            return {"error": "维度表只能用于新建表模式"}
+        primary_key = options.get("primary_key")
+        if primary_key and import_options["mode"] != "create":
+            return {"error": "主键只能用于新建表模式"}
+
+        if conn is None:
+            if import_options["mode"] != "create":
+                return {"error": "合并、追加和全量替换模式需要连接MySQL数据库"}
+            if dimension_columns:
+                return {"error": "维度表需要连接MySQL数据库"}
+            if primary_key:
+                return {"error": "主键需要连接MySQL数据库"}
+            # 只写入附加输出时只去掉文件中重复的行
+            dedup_error = DedupUtils.validate_columns(
+                import_options["dedup_columns"], columns, [(curr, type_str) for _, curr, type_str in column_mappings])
+            if dedup_error:
+                logger.error(dedup_error)
+                return {"error": dedup_error}
+            return {"table_name": table_name, "column_mappings": column_mappings, "import_options": import_options}
+
+        # 已有表中拆分到维度表的列：文件中的原值按维度表中已有的编号写入，新出现的值追加到维度表
+        existing_dimensions = {}
+        if import_options["mode"] != "create" and import_options["target_table"]:
+            existing_dimensions = {
+                col: spec for col, spec in DimensionUtils.existing_dimensions(
+                    conn, import_options["target_table"],
+                    DbUtils.get_table_columns(conn, import_options["target_table"]) or []).items()
+                if col in columns}
+
+        # 分区只作用于新建的表，暂存表和已有表保持原结构
+        partition_clause = None
+        if import_options["mode"] == "create" and options.get("partition_column") in partition_candidates:
+            import_options["partition"] = partition_candidates[options["partition_column"]]
+            partition_clause = PartitionUtils.build_partition_clause(import_options["partition"])
+
+            # RANGE COLUMNS按日期比较，分区列必须是日期时间类型
+            part_index = columns.index(options["partition_column"])
+            part_type = updated_column_types[part_index][1]
+            if import_options["partition"]["method"] == "range" and \
+                    not part_type.upper().startswith(("DATE", "DATETIME", "TIMESTAMP")):
+                logger.info(f"分区列 '{options['partition_column']}' 类型由 {part_type} 调整为 DATETIME")
+                column_defs[part_index] = DbUtils.escape_sql_identifier(options["partition_column"]) + " DATETIME"
+                orig, curr, _ = column_mappings[part_index]
+                column_mappings[part_index] = (orig, curr, "DATETIME")
+            logger.info(f"分区方案: {import_options['partition']['column']} - {import_options['partition']['description']}")
+
+        if import_options["mode"] == "merge":
+            merge_error = DbUtils.validate_merge_target(
+                conn, import_options["target_table"], import_options["key_columns"], columns)
+            if merge_error:
+                logger.error(merge_error)
+                return {"error": merge_error}
+
+            # 暂存表名不超过MySQL标识符的64字符限制
+            table_name = ("_stg_" + import_options["target_table"])[:50] + "_" + str(int(time.time()))
+            # 暂存表另有记录写入顺序的自增列，合并时同一业务键保留文件中最后出现的行
+            column_defs.append(DbUtils.merge_staging_column_def())
+            # 目标表的维度列在暂存表中同样存编号
+            for col, spec in existing_dimensions.items():
+                column_defs[columns.index(col)] = DbUtils.escape_sql_identifier(col) + " " + spec["key_type"]
+            logger.info(f"合并模式: 先导入暂存表 {table_name}，再按业务键 {import_options['key_columns']} 合并到 {import_options['target_table']}")
+        elif import_options["mode"] == "reload":
+            target_columns = DbUtils.get_table_columns(conn, import_options["target_table"]) if import_options["target_table"] else None
+            if target_columns is None:
+                reload_error = f"全量替换模式需要已存在的目标表: {import_options['target_table']}"
+                logger.error(reload_error)
+                return {"error": reload_error}
+
+            # 按目标表结构创建隐藏的暂存表，二级索引推迟到数据导入后再建
+            table_name = ("_stg_" + import_options["target_table"])[:50] + "_" + str(int(time.time()))
+            import_options["deferred_indexes"] = DbUtils.create_reload_staging(
+                conn, import_options["target_table"], table_name)
+
+            # 报告中显示目标表的实际列类型
+            target_types = dict(target_columns)
+            column_mappings = [(orig, curr, target_types.get(curr, type_str)) for orig, curr, type_str in column_mappings]
+            logger.info(f"全量替换模式: 导入暂存表 {table_name}，完成后与 {import_options['target_table']} 原子切换")
+        elif import_options["mode"] == "append":
+            target_columns = DbUtils.get_table_columns(conn, import_options["target_table"]) if import_options["target_table"] else None
+            if target_columns is None:
+                append_error = f"追加模式需要已存在的目标表: {import_options['target_table']}"
+                logger.error(append_error)
+                return {"error": append_error}
+
+            # 直接写入目标表，不经过暂存表；报告中显示目标表的实际列类型
+            table_name = import_options["target_table"]
+
+            # 表结构演进：文件中新增的列加到表末尾，取值超出原类型的列放宽类型，在建表步骤中用一条 ALTER TABLE 执行
+            if import_options["evolve_schema"]:
+                # 维度列在表中存编号，不按文件中的原值修改类型
+                evolution = SchemaUtils.plan_evolution(
+                    target_columns, [(col, type_str) for col, type_str in updated_column_types if col not in existing_dimensions],
+                    self.column_profiles or {})
+                for conflict in evolution["conflicts"]:
+                    logger.warning(conflict)
+                    self.emit("warning", conflict)
+                if evolution["add"] or evolution["modify"]:
+                    import_options["schema_evolution"] = evolution
+                    modified = {col: new_type for col, _, new_type in evolution["modify"]}
+                    target_columns = [(col, modified.get(col, type_str)) for col, type_str in target_columns] + \
+                        list(evolution["add"])
+            target_types = dict(target_columns)
+            column_mappings = [(orig, curr, target_types.get(curr, type_str)) for orig, curr, type_str in column_mappings]
+            logger.info(f"追加模式: 直接导入已有表 {table_name}")
+        else:
+            # 同一秒内导入同名文件时，表名加序号避免写入同一张表
+            base_name = table_name
+            suffix = 1
+            while DbUtils.get_table_columns(conn, table_name) is not None:
+                suffix += 1
+                table_name = f"{base_name}_{suffix}"
+
+        # 维度列：事实表中只存编号，原值存入维度表(id, value)
+        if dimension_columns:
+            if options.get("partition_column") in dimension_columns:
+                return {"error": f"分区列 {options['partition_column']} 不能拆分到维度表"}
+            specs, dimension_error = DimensionUtils.plan_dimensions(
+                table_name, dimension_columns, updated_column_types, self.plan["column_stats"])
+            if dimension_error:
+                logger.error(dimension_error)
+                return {"error": dimension_error}
+            for col, spec in specs.items():
+                column_defs[columns.index(col)] = DbUtils.escape_sql_identifier(col) + " " + spec["key_type"]
+                logger.info(f"维度列 '{col}': 事实表中存 {spec['key_type']} 编号，原值存入维度表 {spec['table']}")
+            import_options["dimensions"] = specs
+            import_options["dimension_view"] = DimensionUtils.view_name(table_name)
+        elif existing_dimensions:
+            for col, spec in existing_dimensions.items():
+                logger.info(f"目标表的维度列 '{col}': 按维度表 {spec['table']} 中的编号写入")
+            import_options["dimensions"] = existing_dimensions
+            import_options["dimension_view"] = DimensionUtils.view_name(import_options["target_table"])
+
+        # 主键：代理主键加在第一列，自然主键的列不允许为空，并按主键顺序写入数据
+        if primary_key:
+            key_spec, key_error = KeyUtils.plan_primary_key(
+                primary_key, [(curr, type_str) for _, curr, type_str in column_mappings],
+                import_options["partition"]["column"] if import_options["partition"] else None, dimension_columns)
+            if key_error:
+                logger.error(key_error)
+                return {"error": key_error}
+            if key_spec["kind"] == "surrogate":
+                column_defs.insert(0, key_spec["column_def"])
+                logger.info(f"代理主键: {key_spec['columns'][0]} {KeyUtils.SURROGATE_TYPE} AUTO_INCREMENT")
+            else:
+                for col in key_spec["columns"]:
+                    column_defs[columns.index(col)] += " NOT NULL"
+                for warning in KeyUtils.duplicate_warnings(key_spec["columns"], self.plan["column_stats"]):
+                    logger.warning(warning)
+                    self.emit("warning", warning)
+                import_options["sort_key"] = key_spec["sort"]
+                logger.info(f"自然主键: {key_spec['columns']}，按主键顺序写入")
+            column_defs.append(key_spec["constraint"])
+            import_options["primary_key"] = {"kind": key_spec["kind"], "columns": key_spec["columns"]}
+
+        # 去重键列按写入的表中的类型取键值，追加/全量替换模式只导入目标表中存在的列
+        if import_options["dedup_columns"]:
+            if import_options["mode"] in ("append", "reload"):
+                dedup_types = target_columns
+            else:
+                dedup_types = [(curr, type_str) for _, curr, type_str in column_mappings]
+            dedup_error = DedupUtils.validate_columns(
+                import_options["dedup_columns"], columns, dedup_types, list(import_options.get("dimensions") or {}))
+            if dedup_error:
+                logger.error(dedup_error)
+                return {"error": dedup_error}
+            logger.info(f"去重键: {import_options['dedup_columns']}")
+
+        # 创建表（全量替换模式的暂存表已按目标表结构创建，追加模式写入已有表，只执行表结构变更）
+        self.emit("stage", "开始创建表...", stage="create_table")
+        if import_options.get("schema_evolution"):
+            evolution = import_options.pop("schema_evolution")
+            try:
+                algorithm = SchemaUtils.apply_evolution(conn, table_name, evolution)
+            except pymysql.MySQLError as e:
+                logger.error(f"修改表结构失败: {e}")
+                return {"error": f"修改表 {table_name} 的结构失败: {e}"}
+            import_options["schema_evolution"] = {
+                "added": evolution["add"], "modified": evolution["modify"],
+                "conflicts": evolution["conflicts"], "algorithm": algorithm
+            }
+            for line in SchemaUtils.format_evolution(import_options["schema_evolution"]):
+                logger.info(line)
+        if import_options["mode"] not in ("reload", "append") and not DbUtils.execute_create_table(conn, table_name, column_defs, partition_clause):
+            logger.error("表创建失败")
+            return {"error": f"表创建失败: {table_name}"}
+
+        # 创建维度表和按原来的列还原数据的视图
+        if import_options.get("dimensions") and import_options["mode"] == "create":
+            if not DimensionUtils.create_dimension_tables(conn, import_options["dimensions"]):
+                logger.error("维度表创建失败")
+                return {"error": f"维度表创建失败: {', '.join(spec['table'] for spec in import_options['dimensions'].values())}"}
+            DimensionUtils.create_view(conn, import_options["dimension_view"], table_name, columns, import_options["dimensions"])
+            logger.info(f"已创建视图 {import_options['dimension_view']}，按原来的列还原维度列的值")
+
+        return {"table_name": table_name, "column_mappings": column_mappings, "import_options": import_options}
+
+    def _load_rows(self, conn, table_name, column_mappings, import_options, resume_checkpoint):
+        """分批写入数据，每个批次与检查点在同一事务中提交，返回导入统计"""
+        logger = LoggingUtils.stage_logger(self.logger, "insert")
+        batch_logger = LoggingUtils.stage_logger(self.logger, "batch")
+        file_path = self.file_path
+        fingerprint = self.fingerprint
+        columns = list(self.plan["columns"])
+
+        # 追加/全量替换模式只导入目标表中存在的列
+        if import_options["mode"] in ("reload", "append"):
+            target_names = [name for name, _ in (DbUtils.get_table_columns(conn, table_name) or [])]
+            skipped_columns = [col for col in columns if col not in target_names]
+            if skipped_columns:
+                logger.warning(f"以下列不在目标表中，将不会导入: {skipped_columns}")
+                self.emit("warning", f"以下列不在目标表中，将不会导入: {skipped_columns}")
+            columns = [col for col in columns if col in target_names]
+
+        if self.sinks and resume_checkpoint:
+            logger.warning("从断点继续导入时，附加输出中只有本次写入的行")
+            self.emit("warning", "从断点继续导入时，附加输出中只有本次写入的行")
+
+        # 分区表的批次按分区路由
+        partition_spec = import_options.get("partition")
+        partition_key_index = columns.index(partition_spec["column"]) if partition_spec else None
+
+        # 将数据写入表中
+        logger.info("开始导入数据...")
+        self.emit("stage", "正在导入数据...", stage="insert")
+
+        # 确认列数
+        col_count = len(columns)
+        print("列数: " + str(col_count))
+
+        # 使用逐行插入方法，避免格式化问题
+        print("切换到智能批处理导入模式...")
+        rows_inserted = 0
+        total_rows = self.plan["total_rows"]
+        error_rows = 0
+
+        # 断点续传：确定起始偏移量；增量导入从第一个新增或变化的行开始
+        CheckpointUtils.ensure_checkpoint_table(conn)
+        start_offset = import_options.get("start_offset", 0)
+        batch_index = 0
+        if start_offset and not resume_checkpoint:
+            logger.info(f"增量导入: 跳过与上次导入相同的前 {start_offset} 行")
+            self.emit("progress", f"增量导入: 跳过与上次导入相同的前 {start_offset} 行", 35)
+        if resume_checkpoint:
+            # 数据库中的检查点与数据在同一事务中提交，优先以其为准
+            committed = CheckpointUtils.read_committed_offset(conn, table_name, fingerprint)
+            if committed:
+                start_offset, batch_index, rows_inserted = committed
+            else:
+                start_offset = resume_checkpoint.get("offset", 0)
+                batch_index = resume_checkpoint.get("batch_index", 0)
+                rows_inserted = resume_checkpoint.get("rows_inserted", 0)
+            error_rows = resume_checkpoint.get("error_rows", 0)
+            logger.info(f"从第 {start_offset} 行继续导入 (已提交批次: {batch_index}, 已导入: {rows_inserted} 行)")
+            self.emit("progress", f"从断点继续: 跳过已提交的 {start_offset} 行", 35)
+
+        checkpoint = {
+            "file_path": os.path.abspath(file_path),
+            "fingerprint": fingerprint,
+            "table_name": table_name,
+            "columns": [str(col) for col in self.plan["columns"]],
+            "column_mappings": [list(m) for m in column_mappings],
+            "import_options": import_options,
+            "total_rows": total_rows,
+            "offset": start_offset,
+            "batch_index": batch_index,
+            "rows_inserted": rows_inserted,
+            "error_rows": error_rows
+        }
+        # 失败的行随时写入拒绝文件，日志中只保留计数和样本；继续导入时追加到同一个拒绝文件
+        rejects = RejectWriter(
+            table_name, [orig for orig, _, _ in self.plan["column_mappings"]], logger,
+            path=resume_checkpoint.get("rejects_file") if resume_checkpoint else None)
+        checkpoint["rejects_file"] = rejects.path
+
+        # 导入校验：按表中实际的列类型累计每批已提交数据的客户端校验和
+        verifier = None
+        if self.verify:
+            if import_options["mode"] == "append":
+                logger.warning("追加模式的目标表中有之前的数据，跳过导入校验")
+                self.emit("warning", "追加模式的目标表中有之前的数据，跳过导入校验")
+            elif resume_checkpoint:
+                logger.warning("从断点继续导入时之前批次的数据不在本次写入范围内，跳过导入校验")
+                self.emit("warning", "从断点继续导入时之前批次的数据不在本次写入范围内，跳过导入校验")
+            else:
+                table_types = dict(DbUtils.get_table_columns(conn, table_name) or [])
+                verifier = LoadVerifier(columns, [table_types.get(col, "VARCHAR(255)") for col in columns], self.spill_dir)
+                self.verifier = verifier
+
+        # 维度列替换为编号；从断点继续或写入已有表时先读回维度表中已分配的编号
+        dimensions = None
+        if import_options.get("dimensions"):
+            dimensions = DimensionEncoder(columns, import_options["dimensions"])
+            if resume_checkpoint or import_options["mode"] != "create":
+                dimensions.load(conn)
+
+        # 去重：追加模式和从断点继续时先读入表中已有的键，其他情况表是新建的，只去掉文件中重复的行
+        dedup = None
+        if import_options.get("dedup_columns"):
+            table_types = dict(DbUtils.get_table_columns(conn, table_name) or [])
+            dedup = Deduplicator(
+                columns, import_options["dedup_columns"],
+                [table_types.get(col, "VARCHAR(255)") for col in import_options["dedup_columns"]],
+                self.spill_dir, self.budget.max_memory // 4 if self.budget.enabled else None)
+            if import_options["mode"] == "append" or resume_checkpoint:
+                self.emit("progress", f"正在读取表 {table_name} 中已有的键...", 35)
+                with TimingUtils.span("dedup"):
+                    existing_keys = dedup.load_table(conn, table_name)
+                logger.info(f"已读取表 {table_name} 中的 {existing_keys} 个键用于去重")
+
+        self.checkpoint = checkpoint
+        CheckpointUtils.save_checkpoint(file_path, checkpoint)
+
+        # 智能批处理参数
+        initial_batch_size = 100
+        current_batch_size = initial_batch_size
+        min_batch_size = 20
+        max_batch_size = 500
+
+        # 性能追踪
+        speed_history = []
+        start_time = time.time()
+
+        # 清洗后按表中的列类型预校验，超长、超出范围的值按策略处理，避免整批插入失败后逐行重试
+        validator = self._create_validator(conn, table_name, columns, column_mappings, import_options)
+
+        # 使用tqdm创建进度条
+        # 后台线程按块读取和清洗数据，跳过已提交的行，不再重复清洗
+        pipeline = ChunkPipeline(
+            self._iter_chunks(start_offset, import_options.get("sort_key")),
+            lambda offset, frame: self._clean_chunk(frame, columns, offset, validator),
+            self.budget, self.spill_dir).start()
+        iter_rows = self._iter_rows(pipeline)
+        self.metrics.register_gauge("queue_depth", pipeline.pending)
+        sinks = self._open_sinks(import_options["target_table"] or table_name, columns, column_mappings)
+
+        with tqdm(total=total_rows, initial=start_offset, desc="数据导入进度", unit="行", ncols=100) as pbar, \
+                contextlib.closing(pipeline), contextlib.closing(rejects), \
+                (contextlib.closing(sinks) if sinks else contextlib.nullcontext()), \
+                (contextlib.closing(dedup) if dedup else contextlib.nullcontext()):
+            i = start_offset
+
+            # 更新起始进度
+            self.emit("progress", "开始导入数据...", 35)
+
+            # 上次进度更新时间，用于控制更新频率
+            last_progress_update = time.time()
+            progress_update_interval = 0.5  # 秒
+
+            while i < total_rows:
+                # 确定当前批次的结束索引
+                end_idx = min(i + current_batch_size, total_rows)
+                batch_size = end_idx - i
+
+                # 处理当前批次
+                batch_success = 0
+                batch_errors = 0
+
+                # 记录批次开始时间
+                batch_start_time = time.time()
+                inserted_before = rows_inserted
+                errors_before = error_rows
+
+                # 智能批处理导入
+                batch_values = []
+                batch_rows_info = []  # 存储批次中每行的索引信息
+                rows_consumed = 0  # 本批次实际从源数据中读取的行数
+
+                for _ in range(batch_size):
+                    # 从迭代器获取下一行(已清洗)
+                    item = next(iter_rows, None)
+                    if item is None:
+                        break
+                    idx, values, row_error = item
+                    rows_consumed += 1
+
+                    if row_error is not None:
+                        error_rows += 1
+                        batch_errors += 1
+                        rejects.add(self._source_row(idx), RejectUtils.clean_error_code(row_error), row_error,
+                                    self._source_values(idx))
+
+                        # 如果连续出现多次错误，可能需要中断操作
+                        if error_rows > 10 and error_rows / (i + _ + 1) > 0.5:  # 如果错误率超过50%
+                            abort_msg = "错误率过高，中断导入操作"
+                            logger.error(abort_msg)
+                            self.emit("progress", abort_msg, None)
+                            break
+                        continue
+
+                    # 将值添加到批处理列表
+                    batch_values.append(values)
+                    batch_rows_info.append(idx)
+
+                # 数据源提前结束(实际行数少于统计的行数)
+                if rows_consumed == 0:
+                    break
+
+                # 按实际读取的行数推进偏移量，保证检查点与源数据位置一致
+                batch_size = rows_consumed
+                batch_end_offset = i + batch_size
+                checkpoint_committed = False
+
+                # 去掉键已在表中或在文件中重复的行，附加输出中也不写入
+                if dedup and batch_values:
+                    with TimingUtils.span("dedup"):
+                        keep = dedup.filter_rows(batch_values)
+                    batch_values = [values for values, kept in zip(batch_values, keep) if kept]
+                    batch_rows_info = [idx for idx, kept in zip(batch_rows_info, keep) if kept]
+
+                # 清洗后的数据同时写入附加输出，不受MySQL插入结果影响
+                if sinks and batch_values:
+                    with TimingUtils.span("sink"):
+                        sinks.write_rows(batch_values)
+
+                # 维度列替换为编号(附加输出中保留原值)
+                if dimensions and batch_values:
+                    with TimingUtils.span("encode"):
+                        batch_values = dimensions.encode_rows(batch_values)
+
+                # 执行批量插入（如果有数据）
+                if batch_values:
+                    # 使用事务管理器和重试机制执行批量插入
+                    def execute_batch(cursor):
+                        # 本批新出现的维度值与数据在同一事务中提交
+                        if dimensions:
+                            with TimingUtils.span("execute"):
+                                dimensions.write_pending(cursor)
+
+                        # 分区表按分区分组插入，每条INSERT只写入一个分区
+                        if partition_spec:
+                            groups = PartitionUtils.route_rows(partition_spec, partition_key_index, batch_values)
+                        else:
+                            groups = [(None, batch_values)]
+
+                        for partition_name, group_values in groups:
+                            # 构建和执行批量插入语句
+                            with TimingUtils.span("encode"):
+                                escaped_table = DbUtils.escape_sql_identifier(table_name)
+                                escaped_columns = [DbUtils.escape_sql_identifier(col) for col in columns]
+
+                                # 构建批量插入SQL语句
+                                sql_parts = []
+                                sql_parts.append("INSERT INTO")
+                                sql_parts.append(escaped_table)
+                                if partition_name:
+                                    sql_parts.append("PARTITION (" + DbUtils.escape_sql_identifier(partition_name) + ")")
+                                sql_parts.append("(")
+                                sql_parts.append(", ".join(escaped_columns))
+                                sql_parts.append(") VALUES ")
+
+                                # 添加占位符
+                                placeholders = []
+                                for _ in range(len(columns)):
+                                    placeholders.append("%s")
+                                placeholder_group = "(" + ", ".join(placeholders) + ")"
+
+                                # 为每组值创建占位符组
+                                value_groups = []
+                                flattened_values = []
+
+                                for row_values in group_values:
+                                    value_groups.append(placeholder_group)
+                                    # 处理每行的值
+                                    for val in row_values:
+                                        flattened_values.append(val)
+
+                                # 完成SQL语句
+                                sql = sql_parts[0]
+                                for part in sql_parts[1:]:
+                                    sql += " " + part
+                                sql += " " + ", ".join(value_groups)
+
+                                # 转义参数并生成最终语句，单独计入编码耗时
+                                query = cursor.mogrify(sql, flattened_values)
+
+                            # 执行批量插入
+                            with TimingUtils.span("execute"):
+                                cursor.execute(query)
+                            self._observe_statement(cursor)
+
+                        # 在同一事务中记录检查点
+                        CheckpointUtils.record_batch(
+                            cursor, table_name, fingerprint, batch_end_offset,
+                            batch_index + 1, rows_inserted + len(batch_values))
+                        return len(batch_values)  # 返回成功插入的行数
+
+                    # 执行带有重试机制的事务
+                    success, result = DbUtils.execute_transaction_with_retry(conn, execute_batch)
+
+                    if success:
+                        # 批量插入成功
+                        rows_inserted += result
+                        batch_success += result
+                        checkpoint_committed = True
+                        if dimensions:
+                            dimensions.clear_pending()
+                        if dedup:
+                            dedup.commit()
+                        if verifier:
+                            with TimingUtils.span("verify"):
+                                verifier.add_batch(batch_index + 1, i, batch_end_offset, batch_values)
+                        batch_logger.info(f"批量插入成功: {result} 行")
+                    else:
+                        # 批量插入失败，尝试逐行插入作为回退策略
+                        error_msg = f"批量插入失败: {result}"
+                        logger.warning(error_msg)
+                        self.metrics.inc("batch_fallbacks_total")
+                        self.emit("progress", "批量插入失败，尝试逐行插入...", None)
+
+                        fallback_success = 0
+                        fallback_errors = 0
+                        fallback_values = []
+
+                        # 逐行插入前先单独提交本批新出现的维度值，否则插入的行引用不到
+                        if dimensions:
+                            dim_success, dim_result = DbUtils.execute_transaction_with_retry(
+                                conn, lambda cursor: dimensions.write_pending(cursor) or True)
+                            if not dim_success:
+                                raise Exception(f"写入维度表失败: {dim_result}")
+                            dimensions.clear_pending()
+
+                        # 逐行插入时每行单独一个事务，以保留成功的部分；检查点在同一事务中推进到该行之后，
+                        # 中断后从断点继续时不会重复插入已提交的行
+                        for row_no, (idx, values) in enumerate(zip(batch_rows_info, batch_values)):
+                            try:
+                                # 构建单行插入函数
+                                def execute_single_row(cursor):
+                                    # 构建INSERT语句
+                                    escaped_table = DbUtils.escape_sql_identifier(table_name)
+                                    escaped_columns = [DbUtils.escape_sql_identifier(col) for col in columns]
+
+                                    # 构建SQL
+                                    sql_parts = []
+                                    sql_parts.append("INSERT INTO")
+                                    sql_parts.append(escaped_table)
+                                    sql_parts.append("(")
+                                    sql_parts.append(", ".join(escaped_columns))
+                                    sql_parts.append(") VALUES (")
+
+                                    # 添加占位符
+                                    placeholders = []
+                                    for _ in range(len(columns)):
+                                        placeholders.append("%s")
+                                    sql_parts.append(", ".join(placeholders))
+                                    sql_parts.append(")")
+
+                                    # 组合SQL语句
+                                    sql = " ".join(sql_parts)
+
+                                    # 执行插入
+                                    with TimingUtils.span("execute"):
+                                        cursor.execute(sql, values)
+                                    self._observe_statement(cursor)
+                                    CheckpointUtils.record_batch(
+                                        cursor, table_name, fingerprint, idx + 1, batch_index, rows_inserted + 1)
+                                    return True
+
+                                # 执行带有重试的单行事务
+                                row_success, row_result = DbUtils.execute_transaction_with_retry(
+                                    conn, execute_single_row, max_retries=2)
+
+                                if row_success:
+                                    rows_inserted += 1
+                                    fallback_success += 1
+                                    fallback_values.append(values)
+                                else:
+                                    error_rows += 1
+                                    fallback_errors += 1
+                                    rejects.add(self._source_row(idx), RejectUtils.error_code(row_result),
+                                                f"插入失败: {row_result}", self._source_values(idx))
+
+                            except Exception as e:
+                                error_rows += 1
+                                fallback_errors += 1
+                                rejects.add(self._source_row(idx), RejectUtils.CODE_INSERT, f"处理异常: {e}",
+                                            self._source_values(idx))
+
+                            # 每插入10行更新一次进度，避免UI卡顿
+                            if row_no % 10 == 0:
+                                progress_message = f"逐行插入中... 成功: {fallback_success}/{row_no+1}, 失败: {fallback_errors}"
+                                self.emit("progress", progress_message, None)
+
+                        if dedup:
+                            dedup.commit(fallback_values)
+                        if verifier:
+                            with TimingUtils.span("verify"):
+                                verifier.add_batch(batch_index + 1, i, batch_end_offset, fallback_values)
+                        batch_logger.info(f"逐行插入回退：成功 {fallback_success}/{len(batch_values)} 行, 失败: {fallback_errors}")
+                        self.emit("progress", f"逐行插入完成：成功 {fallback_success}/{len(batch_values)} 行, 失败: {fallback_errors}", None)
+
+                # 逐行回退或整批无有效数据时，单独提交本批次的检查点(包含本批末尾被拒绝或跳过的行)；
+                # 记录失败时中断导入，否则后面批次的检查点会越过未记录的位置
+                if not checkpoint_committed:
+                    def record_checkpoint(cursor):
+                        CheckpointUtils.record_batch(
+                            cursor, table_name, fingerprint, batch_end_offset,
+                            batch_index + 1, rows_inserted)
+                        return True
+
+                    ckpt_success, ckpt_result = DbUtils.execute_transaction_with_retry(conn, record_checkpoint)
+                    if not ckpt_success:
+                        raise Exception(f"记录检查点失败: {ckpt_result}")
+                batch_index += 1
+
+                # 更新检查点文件
+                checkpoint.update({
+                    "offset": batch_end_offset,
+                    "batch_index": batch_index,
+                    "rows_inserted": rows_inserted,
+                    "error_rows": error_rows
+                })
+                if batch_errors:
+                    rejects.flush()
+
+                # 更新UI进度
+                current_time = time.time()
+                if current_time - last_progress_update >= progress_update_interval:
+                    # 计算总体进度百分比(35-95%)
+                    processed_rows = i + batch_size
+                    overall_progress = 35 + (60 * processed_rows / total_rows)
+                    overall_progress = min(95, round(overall_progress, 1))
+
+                    # 计算速度和预估剩余时间
+                    elapsed = current_time - start_time
+                    speed = processed_rows / elapsed if elapsed > 0 else 0
+                    remaining_rows = total_rows - processed_rows
+                    eta_seconds = remaining_rows / speed if speed > 0 else 0
+
+                    # 格式化ETA
+                    if eta_seconds < 60:
+                        eta_str = f"{eta_seconds:.0f}秒"
+                    elif eta_seconds < 3600:
+                        eta_str = f"{eta_seconds/60:.1f}分钟"
+                    else:
+                        eta_str = f"{eta_seconds/3600:.1f}小时"
+
+                    # 更新UI
+                    success_rate = (rows_inserted / processed_rows * 100) if processed_rows > 0 else 0
+                    progress_message = f"已处理 {processed_rows}/{total_rows} 行 | 成功: {rows_inserted} ({success_rate:.1f}%) | 失败: {error_rows} | 速度: {speed:.1f}行/秒 | 剩余: {eta_str}"
+                    self.emit("progress", progress_message, overall_progress,
+                              rows_processed=processed_rows, rows_inserted=rows_inserted,
+                              error_rows=error_rows, total_rows=total_rows, speed=round(speed, 1))
+
+                    # 检查点文件随进度一起节流写入，数据库中的检查点每批次都会提交
+                    CheckpointUtils.save_checkpoint(file_path, checkpoint)
+
+                    # 更新上次更新时间
+                    last_progress_update = current_time
+
+                # 计算批次处理时间和速度
+                batch_time = time.time() - batch_start_time
+                self.metrics.observe("batch_seconds", batch_time)
+                self.metrics.inc("batches_total")
+                self.metrics.inc("rows_inserted_total", rows_inserted - inserted_before)
+                self.metrics.inc("rows_rejected_total", error_rows - errors_before)
+                batch_speed = batch_size / batch_time if batch_time > 0 else 0  # 行/秒
+
+                # 记录历史速度用于平滑计算
+                speed_history.append(batch_speed)
+                if len(speed_history) > 10:  # 只保留最近10个批次的速度
+                    speed_history.pop(0)
+
+                # 计算平均速度
+                avg_speed = np.mean(speed_history) if speed_history else batch_speed
+
+                # 更高级的自适应批处理大小调整逻辑
+                if batch_time > 0:
+                    # 考虑多个因素来调整批处理大小
+                    # 1. 批处理时间（目标：1-3秒）
+                    time_factor = 2.0 / batch_time
+
+                    # 2. 错误率（错误越多，批次越小）
+                    error_rate = batch_errors / batch_size if batch_size > 0 else 0
+                    error_factor = 1.0 - (error_rate * 2)  # 错误率50%时减半批次大小
+
+                    # 3. 内存使用（理论上批次越大内存使用越高，但难以直接测量）
+                    # 这里我们假设如果批处理速度开始下降，可能是由于内存压力
+                    memory_factor = 1.0
+                    if len(speed_history) > 3:
+                        recent_avg = np.mean(speed_history[-3:])
+                        previous_avg = np.mean(speed_history[:-3]) if len(speed_history) > 6 else recent_avg
+                        if recent_avg < previous_avg * 0.85:  # 如果最近速度下降15%以上
+                            memory_factor = 0.9  # 稍微减小批次大小
+
+                    # 综合因素，计算调整系数
+                    adjustment_factor = time_factor * error_factor * memory_factor
+
+                    # 限制单次调整的幅度（0.7-1.5倍）
+                    adjustment_factor = min(max(adjustment_factor, 0.7), 1.5)
+
+                    # 应用调整
+                    new_batch_size = int(current_batch_size * adjustment_factor)
+
+                    # 确保批处理大小在允许范围内
+                    current_batch_size = max(min_batch_size, min(new_batch_size, max_batch_size))
+
+                    # 如果错误率高，进一步限制批处理大小
+                    if error_rate > 0.1:  # 错误率大于10%
+                        current_batch_size = min(current_batch_size, 50)
+
+                # 更新进度条
+                pbar.update(batch_size)
+
+                # 更新进度条描述
+                progress_desc = f"已导入: {rows_inserted}/{i+batch_size} | 速度: {avg_speed:.1f}行/秒 | 批次: {current_batch_size} | ETA: {eta_str if 'eta_str' in locals() else 'N/A'}"
+                pbar.set_description(progress_desc)
+
+                # 记录到日志(每批次明细默认不记录，未开启时不拼接消息)
+                if batch_logger.isEnabledFor(logging.INFO):
+                    progress_msg = f"已导入 {i+batch_size}/{total_rows} 行 (成功: {rows_inserted}, 失败: {error_rows}) | 批次大小: {current_batch_size} | 速度: {avg_speed:.1f}行/秒"
+                    batch_logger.info(progress_msg)
+
+                # 移动到下一批
+                i += batch_size
+
+        self.metrics.unregister_gauge("queue_depth")
+
+        return {
+            "rows_inserted": rows_inserted,
+            "error_rows": error_rows,
+            "total_rows": total_rows,
+            "start_time": start_time,
+            "final_batch_size": current_batch_size,
+            "memory": self._memory_stats(pipeline, logger),
+            "rejects": rejects.summary() if rejects.count else None,
+            "dimensions": dimensions.summary() if dimensions else None,
+            "dedup": dedup.summary() if dedup else None,
+            "validation": validator.summary() if validator else None
+        }
+
+    def _open_sinks(self, table_name, columns, column_mappings):
+        """按最终的列和类型打开附加输出，没有附加输出时返回None"""
+        if not self.sinks:
+            return None
+        types = {curr: type_str for _, curr, type_str in column_mappings}
+        self.sink_fanout = FanoutSink(self.sinks, LoggingUtils.stage_logger(self.logger, "sink"))
+        self.sink_fanout.open(table_name, columns, [types.get(col, "VARCHAR(255)") for col in columns])
+        return self.sink_fanout
+
+    def _load_to_sinks(self, table_name, column_mappings, import_options):
+        """不连接MySQL时，把清洗后的数据每 SINK_BATCH_ROWS 行一批写入附加输出，返回与 _load_rows 相同结构的统计"""
+        logger = LoggingUtils.stage_logger(self.logger, "insert")
+        columns = list(self.plan["columns"])
+        total_rows = self.plan["total_rows"]
+        logger.info("开始写入输出: " + ", ".join(f"{sink.kind}:{sink.target}" for sink in self.sinks))
+        self.emit("stage", "正在写入输出...", stage="insert")
+
+        rejects = RejectWriter(table_name, [orig for orig, _, _ in self.plan["column_mappings"]], logger)
+        sinks = self._open_sinks(table_name, columns, column_mappings)
+        validator = self._create_validator(None, table_name, columns, column_mappings, import_options)
+        pipeline = ChunkPipeline(
+            self._iter_chunks(0),
+            lambda offset, frame: self._clean_chunk(frame, columns, offset, validator),
+            self.budget, self.spill_dir).start()
+        self.metrics.register_gauge("queue_depth", pipeline.pending)
+        types = {curr: type_str for _, curr, type_str in column_mappings}
+        dedup = Deduplicator(columns, import_options["dedup_columns"],
+                             [types[col] for col in import_options["dedup_columns"]], self.spill_dir,
+                             self.budget.max_memory // 4 if self.budget.enabled else None) \
+            if import_options.get("dedup_columns") else None
+
+        counts = {"written": 0, "errors": 0, "processed": 0, "reported_errors": 0}
+        start_time = time.time()
+        last_progress_update = start_time
+
+        def flush(batch, batch_start_time, pbar):
+            batch_rows = len(batch)
+            if dedup and batch:
+                with TimingUtils.span("dedup"):
+                    keep = dedup.filter_rows(batch)
+                    dedup.commit()
+                batch = [values for values, kept in zip(batch, keep) if kept]
+            if batch:
+                with TimingUtils.span("sink"):
+                    sinks.write_rows(batch)
+                if not sinks.active:
+                    raise Exception("所有输出都已写入失败")
+                counts["written"] += len(batch)
+            batch_errors = counts["errors"] - counts["reported_errors"]
+            counts["reported_errors"] = counts["errors"]
+            self.metrics.observe("batch_seconds", time.time() - batch_start_time)
+            self.metrics.inc("batches_total")
+            self.metrics.inc("rows_inserted_total", len(batch))
+            self.metrics.inc("rows_rejected_total", batch_errors)
+            pbar.update(batch_rows + batch_errors)
+
+        with tqdm(total=total_rows, desc="数据导入进度", unit="行", ncols=100) as pbar, \
+                contextlib.closing(pipeline), contextlib.closing(rejects), contextlib.closing(sinks), \
+                (contextlib.closing(dedup) if dedup else contextlib.nullcontext()):
+            batch = []
+            batch_start_time = time.time()
+            for idx, values, row_error in self._iter_rows(pipeline):
+                counts["processed"] += 1
+                if row_error is not None:
+                    counts["errors"] += 1
+                    rejects.add(self._source_row(idx), RejectUtils.clean_error_code(row_error), row_error,
+                                self._source_values(idx))
+                    continue
+                batch.append(values)
+                if len(batch) < self.SINK_BATCH_ROWS:
+                    continue
+
+                flush(batch, batch_start_time, pbar)
+                batch = []
+                batch_start_time = time.time()
+                if batch_start_time - last_progress_update >= 0.5:
+                    processed_rows = counts["processed"]
+                    elapsed = batch_start_time - start_time
+                    speed = processed_rows / elapsed if elapsed > 0 else 0
+                    self.emit("progress", f"已处理 {processed_rows}/{total_rows} 行 | 成功: {counts['written']} | 失败: {counts['errors']} | 速度: {speed:.1f}行/秒",
+                              min(95, round(35 + 60 * processed_rows / total_rows, 1)) if total_rows else None,
+                              rows_processed=processed_rows, rows_inserted=counts["written"],
+                              error_rows=counts["errors"], total_rows=total_rows, speed=round(speed, 1))
+                    last_progress_update = batch_start_time
+            flush(batch, batch_start_time, pbar)
+
+        self.metrics.unregister_gauge("queue_depth")
+
+        return {
+            "rows_inserted": counts["written"],
+            "error_rows": counts["errors"],
+            "total_rows": total_rows,
+            "start_time": start_time,
+            "final_batch_size": self.SINK_BATCH_ROWS,
+            "memory": self._memory_stats(pipeline, logger),
+            "rejects": rejects.summary() if rejects.count else None,
+            "dedup": dedup.summary() if dedup else None,
+            "validation": validator.summary() if validator else None
+        }
+
+    def _memory_stats(self, pipeline, logger):
+        """设置了内存上限时，汇总内存峰值和溢写情况"""
+        if not self.budget.enabled:
+            return None
+        memory_stats = dict(self.budget.summary(), **pipeline.summary())
+        logger.info(f"内存峰值: {MemoryUtils.format_size(memory_stats['peak_rss'])} "
+                    f"(上限 {MemoryUtils.format_size(memory_stats['max_memory'])}), "
+                    f"溢写到磁盘的数据块: {memory_stats['spilled_chunks']}")
+        return memory_stats
+
+    def _iter_chunks(self, start_offset, sort_key=None):
+        """
+        按内存预算给出的块大小产生 (源数据起始偏移, DataFrame块)，跳过start_offset之前的行
+        sort_key 为自然主键的排序键，此时按主键顺序产生数据，偏移为排序后的位置，块的索引为行在源数据中的偏移
+        """
+        if sort_key:
+            yield from self._iter_sorted_chunks(start_offset, sort_key)
+            return
+
+        if not self.streaming:
+            offset = start_offset
+            while offset < len(self.df):
+                chunk_rows = self.budget.next_chunk_rows()
+                chunk = self.df.iloc[offset:offset + chunk_rows]
+                self.metrics.inc("rows_read_total", len(chunk))
+                yield offset, chunk
+                offset += chunk_rows
+            return
+
+        # 流式模式再读一遍文件，按扫描时确定的列做与整表读取相同的预处理
+        source = self.open_chunks_func(self.file_path, self.budget.next_chunk_rows)
+        if source is None:
+            raise Exception("无法重新读取数据文件")
+        offset = 0
+        for chunk in source["chunks"]:
+            chunk_end = offset + len(chunk)
+            if chunk_end > start_offset:
+                chunk = chunk.iloc[:, self.source_positions]
+                if offset < start_offset:
+                    chunk = chunk.iloc[start_offset - offset:]
+                with TimingUtils.span("preprocess"):
+                    chunk = DataUtils.convert_numeric_columns(chunk.copy())
+                chunk.columns = self.plan["columns"]
+                self.metrics.inc("rows_read_total", len(chunk))
+                yield max(offset, start_offset), chunk
+            offset = chunk_end
+
+    def _iter_sorted_chunks(self, start_offset, sort_key):
+        """
+        按主键顺序产生数据块：整表已在内存中时直接稳定排序，流式导入时先读完文件做外部归并排序
+        两种方式的结果都与整体稳定排序相同，从断点继续时按同样的顺序跳过已提交的行
+        """
+        logger = LoggingUtils.stage_logger(self.logger, "insert")
+        if not self.streaming:
+            with TimingUtils.span("sort"):
+                # 索引记录行在源数据中的偏移，写入拒绝文件时换算
+                self.df.index = pd.RangeIndex(len(self.df))
+                order = KeyUtils.sort_order(self.df, sort_key)
+                presorted = bool((order[1:] > order[:-1]).all())
+                if not presorted:
+                    self.df = self.df.iloc[order]
+            self.sort_summary = {"method": "memory", "presorted": presorted}
+            logger.info(f"已在内存中按主键 {sort_key['columns']} 排序" + ("(数据原本有序)" if presorted else ""))
+            offset = start_offset
+            while offset < len(self.df):
+                chunk_rows = self.budget.next_chunk_rows()
+                chunk = self.df.iloc[offset:offset + chunk_rows]
+                self.metrics.inc("rows_read_total", len(chunk))
+                yield offset, chunk
+                offset += chunk_rows
+            return
+
+        source = self.open_chunks_func(self.file_path, self.budget.next_chunk_rows)
+        if source is None:
+            raise Exception("无法重新读取数据文件")
+        sorter = ExternalSorter(sort_key, self.plan["total_rows"], self.spill_dir)
+        try:
+            # 第一遍：每块按主键排序后写为一个有序段
+            source_offset = 0
+            for chunk in source["chunks"]:
+                chunk = chunk.iloc[:, self.source_positions]
+                chunk.columns = self.plan["columns"]
+                chunk.index = pd.RangeIndex(source_offset, source_offset + len(chunk))
+                source_offset += len(chunk)
+                self.metrics.inc("rows_read_total", len(chunk))
+                with TimingUtils.span("sort"):
+                    sorter.add(chunk)
+            self.sort_summary = dict(sorter.summary(), method="external")
+            logger.info(f"已按主键 {sort_key['columns']} 把数据排序为 {sorter.run_count} 个有序段"
+                        f"({MemoryUtils.format_size(sorter.spilled_bytes)})，归并写入")
+
+            # 第二遍：归并各段，按排序后的位置跳过已提交的行，预处理与不排序时相同
+            offset = 0
+            for chunk in sorter.chunks(self.budget.next_chunk_rows):
+                chunk_end = offset + len(chunk)
+                if chunk_end > start_offset:
+                    if offset < start_offset:
+                        chunk = chunk.iloc[start_offset - offset:]
+                    with TimingUtils.span("preprocess"):
+                        chunk = DataUtils.convert_numeric_columns(chunk.copy())
+                    yield max(offset, start_offset), chunk
+                offset = chunk_end
+        finally:
+            sorter.close()
+
+    def _create_validator(self, conn, table_name, columns, column_mappings, import_options):
+        """
+        按写入的表中的列类型和NOT NULL约束创建预校验器，conn为None(只写入附加输出)时按确认的列类型；
+        维度列在校验后才替换为编号，按维度表中原值的类型检查。策略为off或没有需要检查的列时返回None
+        """
+        policy = import_options.get("validate") or ValidateUtils.DEFAULT_POLICY
+        if policy == "off":
+            return None
+        if conn is None:
+            types = {curr: type_str for _, curr, type_str in column_mappings}
+            not_null = set()
+        else:
+            table_columns = ValidateUtils.table_columns(conn, table_name)
+            types = {name: type_str for name, type_str, _ in table_columns}
+            not_null = {name for name, _, nullable in table_columns if not nullable}
+        for col, spec in (import_options.get("dimensions") or {}).items():
+            types[col] = spec["value_type"]
+            not_null.discard(col)
+        validator = ChunkValidator(columns, [types.get(col) for col in columns], policy, not_null)
+        return validator if validator.rules else None
+
+    def _clean_chunk(self, frame, columns, offset, validator=None):
+        """在清洗线程中清洗并预校验一个数据块，结果附带原始DataFrame供写入拒绝文件"""
+        with TimingUtils.span("clean"):
+            rows, errors = DataUtils.clean_frame_for_mysql(frame, columns, offset)
+        self.metrics.inc("rows_cleaned_total", len(rows))
+        if validator is not None:
+            with TimingUtils.span("validate"):
+                rows, errors = validator.validate(rows, errors, offset)
+        return rows, errors, frame
+
+    def _observe_statement(self, cursor):
+        """记录刚执行的语句大小，pymysql在 _executed 中保留了实际发送的SQL"""
+        executed = getattr(cursor, "_executed", None)
+        if executed:
+            size = len(executed.encode('utf-8')) if isinstance(executed, str) else len(executed)
+            self.metrics.inc("bytes_sent_total", size)
+            self.metrics.observe("statement_bytes", size)
+
+    def _iter_rows(self, pipeline):
+        """
+        把清洗后的数据块展开为 (源数据行偏移, 行值, 错误信息) 序列，出错的行值为None
+        最近两个数据块的原始DataFrame保留在 _recent_frames 中，一个批次最多跨两个块，供写入拒绝文件时取原始值
+        """
+        self._recent_frames = collections.deque(maxlen=2)
+        for offset, (rows, errors, frame) in pipeline:
+            self._recent_frames.append((offset, frame))
+            if not errors:
+                for pos, values in enumerate(rows):
+                    yield offset + pos, values, None
+                continue
+
+            failed = dict(errors)
+            row_iter = iter(rows)
+            for idx in range(offset, offset + len(rows) + len(errors)):
+                if idx in failed:
+                    yield idx, None, failed[idx]
+                else:
+                    yield idx, next(row_iter), None
+
+    def _source_row(self, idx):
+        """拒绝文件中的行号：按主键排序导入时把排序后的位置换算为行在源数据中的偏移"""
+        if not self.sort_summary:
+            return idx
+        for offset, frame in self._recent_frames:
+            if offset <= idx < offset + len(frame):
+                return int(frame.index[idx - offset])
+        return idx
+
+    def _source_values(self, idx):
+        """取源数据第idx行的原始值(空值为None)，与方案中的列顺序一致"""
+        for offset, frame in self._recent_frames:
+            if offset <= idx < offset + len(frame):
+                row = frame.iloc[idx - offset].astype(object)
+                return row.where(row.notna(), None).tolist()
+        return [None] * len(self.plan["columns"])
+
+    def _advise_indexes(self, conn, table_name, column_mappings):
+        """按最终的列类型和表上已有的索引给出索引建议，conn为None时不考虑已有索引"""
+        index_names, indexed_columns = DbUtils.get_index_columns(conn, table_name) if conn is not None else ([], [])
+        column_types = [(curr, type_str) for _, curr, type_str in column_mappings]
+        return IndexUtils.propose_indexes(self.plan["column_stats"], column_types, indexed_columns, index_names)
+
+    def _create_indexes(self, conn, table_name, proposals):
+        """用一条ALTER TABLE创建建议的索引，失败时只记录警告，不影响已经导入的数据；返回是否创建成功"""
+        logger = LoggingUtils.stage_logger(self.logger, "index_build")
+        self.emit("stage", f"正在创建 {len(proposals)} 个建议的索引...", stage="index_build")
+        try:
+            with TimingUtils.span("index_build"):
+                DbUtils.add_indexes(conn, table_name, [proposal["definition"] for proposal in proposals])
+        except pymysql.MySQLError as e:
+            logger.warning(f"创建建议的索引失败: {e}")
+            self.emit("warning", f"创建建议的索引失败: {e}")
+            return False
+        for line in IndexUtils.format_index_advice(proposals, created=True):
+            logger.info(line)
+        return True
+
+    def _analyze_table(self, conn, table_name):
+        """执行ANALYZE TABLE，失败时只记录警告；返回是否成功"""
+        logger = LoggingUtils.stage_logger(self.logger, "analyze")
+        self.emit("stage", f"正在更新表 {table_name} 的统计信息...", stage="analyze")
+        try:
+            with TimingUtils.span("analyze"):
+                messages = DbUtils.analyze_table(conn, table_name)
+        except pymysql.MySQLError as e:
+            logger.warning(f"更新统计信息失败: {e}")
+            return False
+        errors = [message for msg_type, message in messages if msg_type.lower() in ("error", "warning")]
+        if errors:
+            logger.warning(f"更新统计信息失败: {'; '.join(errors)}")
+            return False
+        logger.info(f"已更新表 {table_name} 的统计信息(ANALYZE TABLE)")
+        return True
+
+    def _finish(self, conn, table_name, column_mappings, import_options, stats):
+        """合并/切换到目标表，建议(或创建)索引并更新统计信息，生成报告并清除检查点，返回 (报告中的表名, 报告)"""
+        logger = LoggingUtils.stage_logger(self.logger, "finish")
+        rows_inserted = stats["rows_inserted"]
+        error_rows = stats["error_rows"]
+        # 增量导入只统计本次需要导入的行
+        total_rows = stats["total_rows"] - import_options.get("start_offset", 0)
+
+        # 导入校验：在合并/切换之前校验实际写入的表(合并/全量替换模式为暂存表)
+        verification = None
+        if self.verifier is not None:
+            verify_logger = LoggingUtils.stage_logger(self.logger, "verify")
+            self.emit("stage", "正在校验导入的数据...", stage="verify")
+            self.emit("progress", "正在校验导入的数据...", 96)
+            with TimingUtils.span("verify"):
+                verification = self.verifier.verify(conn, table_name)
+            for line in VerifyUtils.format_verification(verification):
+                if verification["status"] == "passed":
+                    verify_logger.info(line)
+                else:
+                    verify_logger.error(line)
+            if verification["status"] != "passed":
+                self.emit("warning", VerifyUtils.format_verification(verification)[0])
+                # 不把校验未通过的数据合并或切换到目标表
+                if import_options["mode"] != "create":
+                    raise Exception(f"导入校验未通过，暂存表 {table_name} 已保留，未作用到目标表 "
+                                    f"{import_options['target_table']}: " +
+                                    "; ".join(VerifyUtils.format_verification(verification)))
+
+        # 索引建议：按最终的列类型和表上已有的索引，为选择性高的键列建议索引
+        # 合并/追加/全量替换模式以目标表上的索引为准(全量替换的暂存表此时还没有二级索引)
+        report_table = import_options["target_table"] if import_options["mode"] != "create" else table_name
+        index_advice = self._advise_indexes(conn, report_table, column_mappings)
+        create_indexes = bool(index_advice) and conn is not None and import_options.get("create_indexes", False)
+        indexes_created = False
+
+        # 合并/全量替换模式：暂存表数据全部提交后，再作用到目标表
+        merge_stats = None
+        reload_stats = None
+        if import_options["mode"] == "merge":
+            self.emit("stage", f"正在合并到目标表 {import_options['target_table']}...", stage="merge")
+            self.emit("progress", f"正在合并到目标表 {import_options['target_table']}...", 96)
+            with TimingUtils.span("merge"):
+                merge_success, merge_result = DbUtils.merge_staging_table(
+                    conn, table_name, import_options["target_table"], column_mappings, import_options["key_columns"])
+            if not merge_success:
+                raise Exception(f"合并到目标表失败: {merge_result}")
+            merge_stats = merge_result
+            merge_msg = f"合并完成: 新增 {merge_stats['inserted']} 行, 更新 {merge_stats['updated']} 行, 未变化 {merge_stats['unchanged']} 行"
+            if merge_stats["duplicates"]:
+                merge_msg += f", 文件中业务键重复的 {merge_stats['duplicates']} 行按最后出现的行合并"
+            LoggingUtils.stage_logger(self.logger, "merge").info(merge_msg)
+            self.emit("progress", merge_msg, 98)
+        elif import_options["mode"] == "reload":
+            # 在暂存表上一次性建好索引，再与目标表原子切换，读者始终看到完整的数据
+            self.emit("stage", f"正在为暂存表创建 {len(import_options['deferred_indexes'])} 个索引...", stage="index_build")
+            self.emit("progress", f"正在为暂存表创建 {len(import_options['deferred_indexes'])} 个索引...", 96)
+            with TimingUtils.span("index_build"):
+                DbUtils.add_indexes(conn, table_name, import_options["deferred_indexes"])
+            # 建议的索引也在切换前建在暂存表上
+            if create_indexes:
+                indexes_created = self._create_indexes(conn, table_name, index_advice)
+            self.emit("progress", f"正在切换到新数据: {import_options['target_table']}...", 98)
+            old_table = DbUtils.swap_tables(conn, import_options["target_table"], table_name, import_options["keep_old"])
+            # 维度视图按名称指向切换后的目标表，重新创建以免仍绑定在改名后的旧表上
+            if import_options.get("dimensions"):
+                target_columns = DbUtils.get_table_columns(conn, import_options["target_table"]) or []
+                DimensionUtils.create_view(
+                    conn, import_options["dimension_view"], import_options["target_table"], [col for col, _ in target_columns],
+                    DimensionUtils.existing_dimensions(conn, import_options["target_table"], target_columns))
+            reload_stats = {
+                "indexes_built": len(import_options["deferred_indexes"]),
+                "old_table": old_table
+            }
+            reload_msg = f"全量替换完成: {import_options['target_table']} 已切换到新数据"
+            if old_table:
+                reload_msg += f"，旧数据保留在 {old_table}"
+            LoggingUtils.stage_logger(self.logger, "index_build").info(reload_msg)
+            self.emit("progress", reload_msg, 98)
+
+        if create_indexes and import_options["mode"] != "reload":
+            indexes_created = self._create_indexes(conn, report_table, index_advice)
+        elif index_advice:
+            index_logger = LoggingUtils.stage_logger(self.logger, "index_build")
+            for line in IndexUtils.format_index_advice(index_advice):
+                index_logger.info(line)
+
+        # 更新统计信息，使刚导入的表上的查询从一开始就能选对执行计划
+        analyzed = False
+        if conn is not None and import_options.get("analyze", True):
+            analyzed = self._analyze_table(conn, report_table)
+
+        # 计算总运行时间
+        total_time = time.time() - stats["start_time"]
+        avg_speed = rows_inserted / total_time if total_time > 0 else 0
+
+        # 生成导入报告
+        partition_spec = import_options.get("partition")
+        report = DbUtils.generate_import_report(report_table, column_mappings, rows_inserted, total_rows, error_rows)
+        if merge_stats:
+            report["merge"] = merge_stats
+        if reload_stats:
+            report["reload"] = reload_stats
+        if partition_spec:
+            report["partition"] = {"column": partition_spec["column"], "description": partition_spec["description"]}
+        if stats.get("memory"):
+            report["memory"] = stats["memory"]
+        if stats.get("rejects"):
+            report["rejects"] = stats["rejects"]
+        if verification:
+            report["verification"] = verification
+        if import_options.get("primary_key"):
+            report["primary_key"] = dict(import_options["primary_key"], sort=self.sort_summary)
+        if import_options.get("incremental"):
+            report["incremental"] = import_options["incremental"]
+            # 记录本次导入后的版本，下次与之比较
+            if self.row_hashes is not None:
+                RegistryUtils.register(conn, import_options["incremental"]["source"], report_table, self.plan["columns"],
+                                       self.row_hashes, {"mode": import_options["mode"],
+                                                         "dimensions": bool(import_options.get("dimensions"))})
+                logger.info(f"已登记数据源 {import_options['incremental']['source']}: 表 {report_table}, {len(self.row_hashes)} 行")
+        if import_options.get("schema_evolution"):
+            report["schema_evolution"] = import_options["schema_evolution"]
+        if stats.get("validation"):
+            report["validation"] = stats["validation"]
+            for line in ValidateUtils.format_validation(stats["validation"]):
+                logger.info(line)
+        if stats.get("dedup"):
+            report["dedup"] = stats["dedup"]
+            for line in DedupUtils.format_dedup(stats["dedup"]):
+                logger.info(line)
+        if stats.get("dimensions"):
+            report["dimensions"] = {"view": import_options["dimension_view"], "tables": stats["dimensions"]}
+            for col, dimension in stats["dimensions"].items():
+                logger.info(f"维度列 '{col}': {dimension['values']} 个不同值，存于 {dimension['table']}")
+        report["column_stats"] = self.plan["column_stats"]
+        report["index_advice"] = {
+            "indexes": [{key: value for key, value in proposal.items() if key != "definition"}
+                        for proposal in index_advice],
+            "created": indexes_created,
+            "sql": None if indexes_created else IndexUtils.build_index_sql(report_table, index_advice),
+            "analyzed": analyzed
+        }
+        if self.sink_fanout:
+            report["sinks"] = self.sink_fanout.summary()
+            for sink in report["sinks"]:
+                logger.info(f"输出 {sink['type']}:{sink['target']}: {sink['rows']} 行" +
+                            (f", {sink['error']}" if sink["error"] else ""))
+        # 添加性能数据到报告
+        report["performance"] = {
+            "total_time_seconds": total_time,
+            "average_speed": avg_speed,
+            "final_batch_size": stats["final_batch_size"]
+        }
+
+        # 导入完成，清除检查点和暂存表(只写入附加输出时没有检查点)
+        if conn is not None:
+            CheckpointUtils.delete_db_checkpoint(conn, table_name)
+            CheckpointUtils.clear_checkpoint(self.file_path)
+        self.checkpoint = None
+        if merge_stats:
+            DbUtils.drop_table(conn, table_name)
+
+        # 格式化总时间
+        if total_time < 60:
+            time_str = f"{total_time:.1f}秒"
+        elif total_time < 3600:
+            time_str = f"{total_time/60:.1f}分钟"
+        else:
+            time_str = f"{total_time/3600:.1f}小时"
+
+        # 各阶段耗时，后台解析/清洗与写入并行，合计可能超过总用时
+        logger.info("各列近似统计:")
+        for line in SketchUtils.format_column_statistics(report["column_stats"]):
+            logger.info(f"  {line}")
+        report["timings"] = self.timer.summary()
+        logger.info("各阶段耗时:")
+        for line in TimingUtils.format_timings(report["timings"], total_time):
+            logger.info(f"  {line}")
+        if self.memory_profiler:
+            report["memory_profile"] = self.memory_profiler.summary()
+            logger.info("各阶段内存峰值:")
+            for line in MemoryUtils.format_memory_profile(report["memory_profile"]):
+                logger.info(f"  {line}")
+
+        summary_msg = f"数据导入完成: 成功导入 {rows_inserted}/{total_rows} 行数据, 失败: {error_rows}, 用时: {time_str}, 平均速度: {avg_speed:.1f}行/秒"
+        logger.info(summary_msg)
+        logger.info("导入操作结束")
+        self.emit("progress", summary_msg, 100)
+
+        return report_table, report
+
+
+def import_file(file_path, mysql_conn_info, options=None, csv_settings=None, resume=False,
+                max_memory=None, spill_dir=None, log_levels=None, metrics_output=None, memory_profile=None, sinks=None,
+                verify=False, incremental=None):
+    """
+    在当前线程或进程中完成一个文件的导入，不需要任何交互，适合作为线程池/进程池的任务
+    csv_settings 与界面的CSV设置相同，省略时自动检测编码和分隔符
+    max_memory 为内存上限(字节)，设置后分块流式导入
+    metrics_output 为导入指标的输出 {"json": 路径, "prometheus": 路径, "interval": 秒}
+    memory_profile 为分阶段内存采样方式("rss" 或 "tracemalloc")，默认不采样
+    sinks 为附加输出(ImportSink)列表；mysql_conn_info 为None时只写入这些输出
+    verify 为True时导入完成后用服务器端的校验和核对写入的数据
+    incremental 为增量导入的数据源名称(True 表示使用文件名)，只导入与上次导入相比新增或变化的部分
+    返回: ImportEngine.run 的结果字典(可被pickle)
+    """
+    from data_importer.utils.file_utils import FileUtils
+
+    if csv_settings is None:
+        csv_settings = {"encoding": "auto", "sep": "auto", "header": 0, "errors": "replace"}
+
+    def show_message(kind, title, message):
+        print(message)
+
+    engine = ImportEngine(
+        file_path, mysql_conn_info,
+        lambda path: FileUtils.load_data_file(path, lambda: csv_settings, show_message),
+        max_memory=max_memory,
+        open_chunks_func=lambda path, next_chunk_rows: FileUtils.open_data_chunks(
+            path, lambda: csv_settings, next_chunk_rows, show_message),
+        spill_dir=spill_dir,
+        log_levels=log_levels,
+        metrics_output=metrics_output,
+        memory_profile=memory_profile,
+        sinks=sinks,
+        verify=verify,
+        incremental=incremental)
+    if engine.prepare() is None:
+        return {"success": False, "table_name": None, "report": None, "error": "无法加载数据文件"}
+    return engine.run(options, resume=resume)
@@ -0,0 +1,119 @@
+"""
+索引建议工具类
+根据导入时统计的不同值个数(选择性)为键列建议二级索引，生成索引定义，导入后可直接创建
+"""
+import re
+
+from data_importer.utils.db_utils import DbUtils
+
+
+class IndexUtils:
+    # 行数少于此值的表全表扫描已经很快，不建议索引
+    MIN_ROWS = 1000
+    # 名称像键的列(编号、代码等)：每个值平均不超过100行时建议索引
+    KEY_MIN_SELECTIVITY = 0.01
+    # 名称不像键的整数列：几乎每行取值都不同且没有空值时视为键列
+    # (金额、时间等度量列的取值也几乎都不同，因此不按选择性推断非整数列)
+    UNIQUE_MIN_SELECTIVITY = 0.95
+    # 单表最多建议的索引数，索引过多会拖慢写入
+    MAX_INDEXES = 5
+
+    KEY_NAME_PATTERN = re.compile(
+        r'(^id$|_id$|^id_|(^|_)(code|no|num|key|uuid|sn|sku)$|编号|编码|代码|单号|号码|账号|工号|学号|证号)', re.I)
+
+    @staticmethod
+    def index_kind(type_str):
+        """类型能否作为索引键: 返回 int/decimal/date/string，不适合建索引(浮点数、布尔、长文本等)时返回None"""
+        t = type_str.upper()
+        if t == "TINYINT(1)":
+            return None
+        if re.match(r'^(TINYINT|SMALLINT|MEDIUMINT|INT|INTEGER|BIGINT)\b', t):
+            return "int"
+        if t.startswith(("DECIMAL", "NUMERIC")):
+            return "decimal"
+        if t.startswith(("DATE", "DATETIME", "TIMESTAMP")):
+            return "date"
+        match = re.match(r'^(VAR)?CHAR\((\d+)\)', t)
+        # utf8mb4 下 VARCHAR(768) 以内不超过InnoDB 3072字节的索引长度上限
+        if match and int(match.group(2)) <= 768:
+            return "string"
+        return None
+
+    @staticmethod
+    def propose_indexes(column_stats, column_types, indexed_columns=(), index_names=()):
+        """
+        为选择性高的键列建议二级索引
+
+        参数:
+            column_stats: SketchUtils.column_statistics 的结果
+            column_types: [(列名, MySQL类型), ...]，为最终建表(或目标表)的类型
+            indexed_columns: 已经作为某个索引第一列的列名，不再重复建议
+            index_names: 表上已有的索引名，生成的索引名避开这些名称
+
+        返回:
+            [{"column", "name", "distinct", "selectivity", "reason", "definition"}, ...]，
+            按建议的优先顺序排列；definition 为 DbUtils.add_indexes 使用的 (索引名, "INDEX", [列定义])
+        """
+        indexed = {str(col).lower() for col in indexed_columns}
+        used_names = {str(name).lower() for name in index_names}
+        candidates = []
+        for col, type_str in column_types:
+            stat = column_stats.get(col)
+            if not stat or stat["distinct"] is None or str(col).lower() in indexed:
+                continue
+            if stat["rows"] < IndexUtils.MIN_ROWS or not stat["selectivity"]:
+                continue
+            kind = IndexUtils.index_kind(type_str)
+            if kind is None:
+                continue
+
+            selectivity = stat["selectivity"]
+            if IndexUtils.KEY_NAME_PATTERN.search(str(col)):
+                if selectivity < IndexUtils.KEY_MIN_SELECTIVITY:
+                    continue
+                priority = 0
+                reason = f"键列，约 {stat['distinct']} 个不同值"
+            elif kind == "int" and selectivity >= IndexUtils.UNIQUE_MIN_SELECTIVITY and stat["nulls"] == 0:
+                priority = 1
+                reason = f"几乎每行取值都不同(约 {stat['distinct']} 个不同值)，可能是业务键"
+            else:
+                continue
+            candidates.append((priority, -selectivity, col, stat, reason))
+
+        candidates.sort(key=lambda item: item[:2])
+        proposals = []
+        for _, _, col, stat, reason in candidates[:IndexUtils.MAX_INDEXES]:
+            name = ("idx_" + str(col))[:64]
+            suffix = 1
+            while name.lower() in used_names:
+                suffix += 1
+                name = ("idx_" + str(col))[:60] + f"_{suffix}"
+            used_names.add(name.lower())
+            proposals.append({
+                "column": col,
+                "name": name,
+                "distinct": stat["distinct"],
+                "selectivity": stat["selectivity"],
+                "reason": reason,
+                "definition": (name, "INDEX", [DbUtils.escape_sql_identifier(col)])
+            })
+        return proposals
+
+    @staticmethod
+    def format_index_advice(proposals, created=False):
+        """把索引建议格式化为逐行文本，created为True时说明已创建"""
+        lines = []
+        for proposal in proposals:
+            state = "已创建" if created else "建议创建"
+            lines.append(f"{state}索引 {proposal['name']} ({proposal['column']}): {proposal['reason']}，"
+                         f"选择性 {proposal['selectivity']:.2%}")
+        return lines
+
+    @staticmethod
+    def build_index_sql(table_name, proposals):
+        """建议索引的 ALTER TABLE 语句，供不自动创建时手动执行"""
+        if not proposals:
+            return None
+        return "ALTER TABLE " + DbUtils.escape_sql_identifier(table_name) + " " + ", ".join(
+            "ADD INDEX " + DbUtils.escape_sql_identifier(p["name"]) + " (" + ", ".join(p["definition"][2]) + ")"
+            for p in proposals)
@@ -0,0 +1,319 @@
+"""
+主键工具类
+新建表时添加代理主键(BIGINT AUTO_INCREMENT)或指定自然主键；
+使用自然主键时按主键顺序写入数据(整表在内存中排序，流式导入时外部归并排序)，
+InnoDB按聚簇索引顺序追加页面，不会随机分裂页面
+"""
+import os
+import re
+import heapq
+import pickle
+import shutil
+import operator
+import tempfile
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from data_importer.utils.db_utils import DbUtils
+from data_importer.utils.index_utils import IndexUtils
+from data_importer.utils.timing_utils import TimingUtils
+
+
+class KeyUtils:
+    # 代理主键的列名，与已有列重名时在前面加下划线
+    SURROGATE_NAME = "id"
+    SURROGATE_TYPE = "BIGINT UNSIGNED"
+    # 自然主键的估计不同值个数低于非空行数的该比例时提示有重复(HyperLogLog误差约1%)
+    DUPLICATE_WARN_RATIO = 0.98
+
+    @staticmethod
+    def is_numeric_type(type_str):
+        """按数值比较排序键的类型，其余类型(含日期)按文本比较"""
+        t = type_str.strip().upper()
+        if t == "TINYINT(1)":
+            return False
+        return bool(re.match(r'^(TINYINT|SMALLINT|MEDIUMINT|INT|INTEGER|BIGINT|DECIMAL|NUMERIC|FLOAT|DOUBLE|REAL)\b', t))
+
+    @staticmethod
+    def is_integer_type(type_str):
+        """按整数精确比较排序键的类型，BIGINT超过2^53的值按浮点数比较会并在一起"""
+        t = type_str.strip().upper()
+        return t != "TINYINT(1)" and bool(re.match(r'^(TINYINT|SMALLINT|MEDIUMINT|INT|INTEGER|BIGINT)\b', t))
+
+    @staticmethod
+    def plan_primary_key(primary_key, column_types, partition_column=None, dimension_columns=()):
+        """
+        确定新建表的主键
+
+        参数:
+            primary_key: "auto" 表示添加代理主键，或自然主键的列名列表
+            column_types: [(列名, MySQL类型), ...]，为最终建表的类型
+            partition_column: 分区列，MySQL要求主键包含分区列
+            dimension_columns: 拆分到维度表的列，不能作为自然主键
+
+        返回:
+            ({"kind": "surrogate"|"natural", "columns", "column_def", "constraint", "sort"}, 错误信息)
+            column_def 为代理主键的列定义(自然主键为None)；sort 为排序键 {"columns", "numeric", "integer"}(代理主键为None)
+        """
+        esc = DbUtils.escape_sql_identifier
+        types = dict(column_types)
+
+        if primary_key == "auto":
+            name = KeyUtils.SURROGATE_NAME
+            existing = {str(col).lower() for col in types}
+            while name.lower() in existing:
+                name = "_" + name
+            # 自增列是主键的第一列即可，分区表的主键再加上分区列
+            key_columns = [name] + ([partition_column] if partition_column else [])
+            return {
+                "kind": "surrogate",
+                "columns": key_columns,
+                "column_def": esc(name) + " " + KeyUtils.SURROGATE_TYPE + " NOT NULL AUTO_INCREMENT",
+                "constraint": "PRIMARY KEY (" + ", ".join(esc(col) for col in key_columns) + ")",
+                "sort": None
+            }, None
+
+        key_columns = list(primary_key or [])
+        if not key_columns:
+            return None, "没有指定主键列"
+        if len(set(key_columns)) != len(key_columns):
+            return None, f"主键列重复: {key_columns}"
+        for col in key_columns:
+            if col not in types:
+                return None, f"主键列不存在: {col}"
+            if col in dimension_columns:
+                return None, f"主键列 {col} 不能拆分到维度表"
+            if IndexUtils.index_kind(types[col]) is None:
+                return None, f"主键列 {col} 的类型为 {types[col]}，不能作为主键"
+        if partition_column and partition_column not in key_columns:
+            return None, f"分区表的主键必须包含分区列 {partition_column}"
+
+        return {
+            "kind": "natural",
+            "columns": key_columns,
+            "column_def": None,
+            "constraint": "PRIMARY KEY (" + ", ".join(esc(col) for col in key_columns) + ")",
+            "sort": {"columns": key_columns,
+                     "numeric": [col for col in key_columns if KeyUtils.is_numeric_type(types[col])],
+                     "integer": [col for col in key_columns if KeyUtils.is_integer_type(types[col])]}
+        }, None
+
+    @staticmethod
+    def duplicate_warnings(key_columns, column_stats):
+        """单列自然主键的估计不同值个数明显少于行数时给出提示"""
+        if len(key_columns) != 1:
+            return []
+        stat = column_stats.get(key_columns[0])
+        if not stat or stat["distinct"] is None:
+            return []
+        non_null = stat["rows"] - stat["nulls"]
+        warnings = []
+        if stat["distinct"] < non_null * KeyUtils.DUPLICATE_WARN_RATIO:
+            warnings.append(f"主键列 {key_columns[0]} 约有 {stat['distinct']} 个不同值，少于 {non_null} 行，重复的行会被拒绝")
+        if stat["nulls"]:
+            warnings.append(f"主键列 {key_columns[0]} 有 {stat['nulls']} 个空值，这些行会被拒绝")
+        return warnings
+
+    @staticmethod
+    def _integer_values(series):
+        """整数列的 (是否为空, 值)，值为int64/uint64数组或Python整数的object数组，按整数精确比较"""
+        if pd.api.types.is_integer_dtype(series.dtype) and not isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+            return np.zeros(len(series), dtype=bool), series.to_numpy()
+
+        def exact(value):
+            # 文本中的整数按Python整数解析，不经过浮点数；带小数的值按浮点数比较
+            if isinstance(value, (int, np.integer)):
+                return int(value)
+            try:
+                return int(str(value).strip())
+            except ValueError:
+                pass
+            number = pd.to_numeric(value, errors="coerce")
+            return None if pd.isna(number) else (int(number) if float(number).is_integer() else float(number))
+
+        # 逐个填入object数组，Series.map 会把整数和空值推断为float64
+        raw = series.to_numpy(dtype=object)
+        values = np.empty(len(raw), dtype=object)
+        values[:] = [None if pd.isna(value) else exact(value) for value in raw]
+        nulls = pd.isna(values)
+        values[nulls] = 0
+        return nulls, values
+
+    @staticmethod
+    def _collation_keys(series):
+        """
+        文本列按与表的排序规则(utf8mb4_unicode_ci)相近的键比较: 不区分大小写和重音，忽略末尾空格；
+        标点与字母等少数字符的先后仍按码点，只影响页面是否顺序追加
+        """
+        # 分解后去掉组合用的重音符号
+        texts = series.astype(str).str.normalize("NFKD").str.replace(r"[\u0300-\u036f]", "", regex=True)
+        return texts.str.casefold().str.rstrip(" ").to_numpy(dtype=object)
+
+    @staticmethod
+    def _key_arrays(frame, sort):
+        """
+        每个排序列的 (是否为空, 值) 数组，空值排在最后: 整数列按整数精确比较，其他数值列按浮点数比较，
+        其余列按与表的排序规则相近的文本键比较
+        """
+        arrays = []
+        for col in sort["columns"]:
+            series = frame[col]
+            if col in sort.get("integer", ()):
+                nulls, values = KeyUtils._integer_values(series)
+            elif col in sort["numeric"]:
+                values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+                nulls = np.isnan(values)
+                values = np.where(nulls, 0.0, values)
+            else:
+                nulls = series.isna().to_numpy()
+                # to_numpy 可能返回原数据的视图，不能就地修改
+                values = np.where(nulls, "", KeyUtils._collation_keys(series))
+            arrays.append(nulls)
+            arrays.append(values)
+        return arrays
+
+    @staticmethod
+    def sort_order(frame, sort):
+        """按排序键稳定排序后各行的位置"""
+        arrays = KeyUtils._key_arrays(frame, sort)
+        keys = pd.DataFrame({i: array for i, array in enumerate(arrays)})
+        return keys.sort_values(list(keys.columns), kind="mergesort").index.to_numpy()
+
+    @staticmethod
+    def sort_keys(frame, sort):
+        """每行的排序键元组，与 sort_order 的顺序一致"""
+        return list(zip(*(array.tolist() for array in KeyUtils._key_arrays(frame, sort))))
+
+
+class ExternalSorter:
+    """
+    外部归并排序
+    每个数据块按排序键稳定排序后作为一个有序段写入临时文件，全部写完后各段分小块读回，按键归并；
+    键相同的行保持源数据顺序，结果与整体稳定排序相同，与分块大小无关，断点续传时顺序不变
+    """
+    # 同时归并的段数上限，超过时先把相邻的段合并为较长的段
+    MAX_OPEN_RUNS = 128
+    # 段内每个小块的行数范围，归并时每段驻留一个小块
+    MIN_BLOCK_ROWS = 256
+    MAX_BLOCK_ROWS = 8192
+
+    def __init__(self, sort, total_rows, spill_dir=None):
+        """
+        参数:
+            sort: KeyUtils.plan_primary_key 给出的排序键
+            total_rows: 总行数，用于确定小块大小，使归并时各段驻留的行数之和约为一个数据块
+            spill_dir: 临时文件目录的父目录，默认使用系统临时目录
+        """
+        self.sort = sort
+        self.total_rows = max(int(total_rows or 0), 1)
+        self.spill_parent = spill_dir
+        self.path = None
+        self.runs = []
+        self.files = 0
+        self.run_count = 0
+        self.spilled_bytes = 0
+
+    def add(self, frame):
+        """排序一个数据块并写为一个有序段"""
+        if len(frame) == 0:
+            return
+        order = KeyUtils.sort_order(frame, self.sort)
+        frame = frame.iloc[order]
+        keys = KeyUtils.sort_keys(frame, self.sort)
+        block_rows = min(max(len(frame) * len(frame) // self.total_rows, self.MIN_BLOCK_ROWS), self.MAX_BLOCK_ROWS)
+        self._write_run([(frame.iloc[start:start + block_rows], keys[start:start + block_rows])
+                         for start in range(0, len(frame), block_rows)])
+        self.run_count += 1
+
+    def _write_run(self, blocks):
+        """把 (DataFrame小块, 键列表) 序列依次写入一个段文件，返回路径"""
+        if self.path is None:
+            self.path = tempfile.mkdtemp(prefix="import_sort_", dir=self.spill_parent)
+        path = os.path.join(self.path, f"run_{self.files:06d}.pkl")
+        self.files += 1
+        with open(path, "wb") as f:
+            for block in blocks:
+                pickle.dump(block, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.spilled_bytes += os.path.getsize(path)
+        self.runs.append(path)
+        return path
+
+    @staticmethod
+    def _read_run(path):
+        """按顺序产生段中每行的 (键, 所在小块, 块内位置)，读完后删除文件"""
+        try:
+            with open(path, "rb") as f:
+                while True:
+                    try:
+                        block, keys = pickle.load(f)
+                    except EOFError:
+                        break
+                    for pos, key in enumerate(keys):
+                        yield key, block, pos
+        finally:
+            os.remove(path)
+
+    def _merge(self, paths):
+        # heapq.merge 在键相同时按输入顺序输出，段按源数据顺序排列即可保证稳定
+        return heapq.merge(*(self._read_run(path) for path in paths), key=operator.itemgetter(0))
+
+    @staticmethod
+    def _assemble(items):
+        """把归并出的行按所在小块分组一次取出，再恢复归并顺序，列类型与原数据块一致"""
+        groups = {}
+        for seq, (_, block, pos) in enumerate(items):
+            group = groups.get(id(block))
+            if group is None:
+                group = groups[id(block)] = (block, [], [])
+            group[1].append(pos)
+            group[2].append(seq)
+        parts = []
+        seqs = []
+        for block, positions, group_seqs in groups.values():
+            parts.append(block.iloc[positions])
+            seqs.extend(group_seqs)
+        chunk = pd.concat(parts) if len(parts) > 1 else parts[0]
+        return chunk.iloc[np.argsort(seqs, kind="stable")]
+
+    def _merged_blocks(self, paths):
+        merged = self._merge(paths)
+        while True:
+            items = list(itertools.islice(merged, self.MAX_BLOCK_ROWS))
+            if not items:
+                return
+            yield self._assemble(items), [key for key, _, _ in items]
+
+    def _compact(self):
+        """段数超过上限时，每 MAX_OPEN_RUNS 个相邻的段合并为一段，合并后的段边归并边写入"""
+        while len(self.runs) > self.MAX_OPEN_RUNS:
+            runs, self.runs = self.runs, []
+            for start in range(0, len(runs), self.MAX_OPEN_RUNS):
+                group = runs[start:start + self.MAX_OPEN_RUNS]
+                if len(group) == 1:
+                    self.runs.append(group[0])
+                else:
+                    self._write_run(self._merged_blocks(group))
+
+    def chunks(self, next_chunk_rows):
+        """按键的顺序产生DataFrame块，块大小由 next_chunk_rows() 决定，索引为行在源数据中的偏移"""
+        with TimingUtils.span("sort"):
+            self._compact()
+            merged = self._merge(self.runs)
+        while True:
+            with TimingUtils.span("sort"):
+                items = list(itertools.islice(merged, next_chunk_rows()))
+                if not items:
+                    return
+                chunk = self._assemble(items)
+            del items
+            yield chunk
+
+    def close(self):
+        """删除临时文件"""
+        if self.path and os.path.exists(self.path):
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def summary(self):
+        return {"runs": self.run_count, "spilled_bytes": self.spilled_bytes}
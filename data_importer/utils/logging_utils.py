@@ -0,0 +1,231 @@
+"""
+导入日志工具类
+所有导入共用一个后台日志线程(QueueListener)：导入线程只把日志记录放入队列，
+写文件和输出到控制台都在后台完成，不会阻塞插入循环。
+控制台处理器在整个进程中只创建一次，多次导入不会重复输出；每次导入的日志文件按记录器名分发
+"""
+import os
+import queue
+import atexit
+import logging
+import datetime
+import itertools
+import threading
+import logging.handlers
+
+# 所有导入日志记录器的父名称
+ROOT_LOGGER_NAME = "data_importer.import"
+# 进度消息的记录器，由后台日志线程原样输出到标准输出，不写入日志文件
+CONSOLE_LOGGER_NAME = "data_importer.console"
+# 日志格式与日志管理界面解析的格式一致
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# 日志记录器序号，保证同时进行的多个导入各自使用独立的记录器
+_LOGGER_SEQ = itertools.count(1)
+_lock = threading.Lock()
+_queue = None
+_queue_handler = None
+_listener = None
+_router = None
+
+
+class _ImportFileRouter(logging.Handler):
+    """在后台日志线程中把记录写入所属导入的日志文件"""
+
+    def __init__(self):
+        super().__init__()
+        self.file_handlers = {}
+
+    @staticmethod
+    def import_name(record_name):
+        # data_importer.import.<序号>.<阶段> -> data_importer.import.<序号>
+        return ".".join(record_name.split(".")[:3])
+
+    def emit(self, record):
+        close_event = getattr(record, "close_import_event", None)
+        name = self.import_name(record.name)
+        if close_event is not None:
+            handler = self.file_handlers.pop(name, None)
+            if handler:
+                handler.close()
+            close_event.set()
+            return
+
+        handler = self.file_handlers.get(name)
+        if handler:
+            handler.handle(record)
+
+
+class _SkipControlRecords(logging.Filter):
+    """控制台不输出关闭日志文件的控制记录和进度消息(进度消息由 _ProgressPrinter 原样输出)"""
+
+    def filter(self, record):
+        return not hasattr(record, "close_import_event") and record.name != CONSOLE_LOGGER_NAME
+
+
+class _ProgressPrinter(logging.Handler):
+    """在后台日志线程中把进度消息原样打印到标准输出"""
+
+    def emit(self, record):
+        if record.name == CONSOLE_LOGGER_NAME and not hasattr(record, "close_import_event"):
+            print(record.getMessage(), flush=True)
+
+
+class LoggingUtils:
+    # 导入过程的阶段名，可分别设置日志级别；batch为每个批次的明细，以INFO级别记录
+    STAGES = ("load", "infer", "create_table", "insert", "batch", "sink", "verify", "merge", "index_build", "analyze", "finish")
+    DEFAULT_LEVEL = logging.INFO
+    # 未单独设置时各阶段的默认级别，其余阶段沿用整个导入的级别；整个导入设为DEBUG时全部沿用
+    STAGE_DEFAULT_LEVELS = {"batch": logging.WARNING}
+    # 后台日志线程输出到控制台的最低级别
+    CONSOLE_LEVEL = logging.INFO
+
+    @staticmethod
+    def parse_levels(specs):
+        """
+        解析日志级别设置，如 ["INFO", "batch=DEBUG", "insert=WARNING"]
+        不带阶段名的设置作用于整个导入
+        返回: {阶段名或"": 级别数值}
+        """
+        levels = {}
+        for spec in specs or []:
+            stage, _, level_name = spec.rpartition("=")
+            level = logging.getLevelName(level_name.strip().upper())
+            if not isinstance(level, int):
+                raise ValueError(f"无法识别的日志级别: {level_name}")
+            stage = stage.strip()
+            if stage and stage not in LoggingUtils.STAGES:
+                raise ValueError(f"未知的导入阶段: {stage}，可选: {', '.join(LoggingUtils.STAGES)}")
+            levels[stage] = level
+        return levels
+
+    @staticmethod
+    def ensure_listener():
+        """启动后台日志线程，重复调用直接返回已有的队列处理器"""
+        global _queue, _queue_handler, _listener, _router
+        with _lock:
+            if _listener is None:
+                _queue = queue.Queue(-1)
+                _queue_handler = logging.handlers.QueueHandler(_queue)
+                _router = _ImportFileRouter()
+
+                console_handler = logging.StreamHandler()
+                console_handler.setLevel(LoggingUtils.CONSOLE_LEVEL)
+                console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+                console_handler.addFilter(_SkipControlRecords())
+
+                _listener = logging.handlers.QueueListener(
+                    _queue, _router, console_handler, _ProgressPrinter(), respect_handler_level=True)
+                _listener.start()
+                # 退出前写完队列中剩余的日志
+                atexit.register(LoggingUtils.shutdown)
+            return _queue_handler
+
+    @staticmethod
+    def console_message(message):
+        """把进度消息交给后台日志线程打印，调用方不等待控制台输出"""
+        queue_handler = LoggingUtils.ensure_listener()
+        console = logging.getLogger(CONSOLE_LOGGER_NAME)
+        if queue_handler not in console.handlers:
+            console.setLevel(logging.INFO)
+            console.propagate = False
+            console.addHandler(queue_handler)
+        console.info(message)
+
+    @staticmethod
+    def flush(timeout=5.0):
+        """等待后台日志线程处理完此前放入队列的记录(如命令行模式恢复标准输出之前)"""
+        if _listener is None:
+            return
+        done = threading.Event()
+        _queue.put_nowait(logging.makeLogRecord({"name": CONSOLE_LOGGER_NAME, "msg": "", "levelno": logging.CRITICAL,
+                                                 "levelname": "CRITICAL", "close_import_event": done}))
+        done.wait(timeout)
+
+    @staticmethod
+    def shutdown():
+        """停止后台日志线程，写完队列中剩余的记录"""
+        global _listener
+        with _lock:
+            if _listener is not None:
+                _listener.stop()
+                for handler in list(_router.file_handlers.values()):
+                    handler.close()
+                _router.file_handlers.clear()
+                _listener = None
+
+    @staticmethod
+    def setup_import_logger(table_name, levels=None):
+        """
+        为一次导入创建日志记录器，日志写入 logs/import_<表名>_<时间戳>.log
+        levels: parse_levels 的结果，设置整个导入或各阶段的日志级别
+        """
+        levels = levels or {}
+        queue_handler = LoggingUtils.ensure_listener()
+
+        # 确保logs目录存在
+        log_dir = os.path.join(os.getcwd(), 'logs')
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+
+        # 创建日志文件名，包含表名和时间戳
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        log_file = os.path.join(log_dir, f"import_{table_name}_{timestamp}.log")
+        # 同一秒内导入同名文件时加序号，避免两个导入写入同一个日志文件
+        suffix = 1
+        while os.path.exists(log_file):
+            suffix += 1
+            log_file = os.path.join(log_dir, f"import_{table_name}_{suffix}_{timestamp}.log")
+
+        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+        logger = logging.getLogger(f"{ROOT_LOGGER_NAME}.{next(_LOGGER_SEQ)}")
+        import_level = levels.get("", LoggingUtils.DEFAULT_LEVEL)
+        logger.setLevel(import_level)
+        logger.propagate = False
+        # 记录器只挂队列处理器，重复设置也不会增加处理器
+        if queue_handler not in logger.handlers:
+            logger.addHandler(queue_handler)
+
+        # 每批次明细默认不记录，可通过 batch=INFO 单独打开
+        for stage in LoggingUtils.STAGES:
+            default_level = LoggingUtils.STAGE_DEFAULT_LEVELS.get(stage, logging.NOTSET) \
+                if import_level > logging.DEBUG else logging.NOTSET
+            stage_logger = logger.getChild(stage)
+            stage_logger.setLevel(levels.get(stage, default_level))
+
+        with _lock:
+            _router.file_handlers[logger.name] = file_handler
+        logger.log_file = log_file
+
+        # 打印日志路径
+        print(f"正在记录日志到文件: {log_file}")
+
+        return logger
+
+    @staticmethod
+    def stage_logger(logger, stage):
+        """取导入记录器下某个阶段的子记录器"""
+        return logger.getChild(stage)
+
+    @staticmethod
+    def close_import_logger(logger, timeout=5.0):
+        """
+        导入结束后关闭日志文件
+        关闭请求排在该导入已提交的日志之后，等待后台线程写完再返回
+        """
+        if logger is None or _listener is None:
+            return
+
+        close_event = threading.Event()
+        record = logging.makeLogRecord({"name": logger.name, "msg": "", "levelno": logging.CRITICAL,
+                                        "levelname": "CRITICAL", "close_import_event": close_event})
+        _queue.put_nowait(record)
+        close_event.wait(timeout)
+
+        # 移除该导入的记录器，长时间运行的界面会话中不会不断累积
+        logger_dict = logging.Logger.manager.loggerDict
+        for name in [n for n in logger_dict if n == logger.name or n.startswith(logger.name + ".")]:
+            logger_dict.pop(name, None)
+        logger.handlers.clear()
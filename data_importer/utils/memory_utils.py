@@ -0,0 +1,466 @@
+"""
+内存预算工具类
+解析内存上限、读取进程RSS，并据此决定分块行数和队列深度；
+写入跟不上解析时，把已清洗的数据块溢写到临时目录，保证进程内存不超过预算
+"""
+import os
+import re
+import sys
+import gc
+import pickle
+import shutil
+import tempfile
+import tracemalloc
+import threading
+import contextvars
+import collections
+
+# 尝试导入psutil，没有时退回到/proc或Windows API读取RSS
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+
+class MemoryUtils:
+    SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "KB": 1024, "M": 1024 ** 2, "MB": 1024 ** 2,
+                  "G": 1024 ** 3, "GB": 1024 ** 3, "T": 1024 ** 4, "TB": 1024 ** 4}
+
+    @staticmethod
+    def parse_size(text):
+        """解析 2GB、512M、1.5G 这样的大小，返回字节数"""
+        match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([KMGT]?B?)\s*$', str(text).upper())
+        if not match:
+            raise ValueError(f"无法识别的内存大小: {text}，示例: 2GB、512MB")
+        return int(float(match.group(1)) * MemoryUtils.SIZE_UNITS[match.group(2)])
+
+    @staticmethod
+    def format_size(num_bytes):
+        """把字节数格式化为易读的大小"""
+        if num_bytes is None:
+            return "未知"
+        for unit in ("B", "KB", "MB", "GB"):
+            if abs(num_bytes) < 1024:
+                return f"{num_bytes:.1f}{unit}"
+            num_bytes /= 1024
+        return f"{num_bytes:.1f}TB"
+
+    @staticmethod
+    def format_memory_profile(profile):
+        """把 StageMemoryProfiler.summary() 的结果格式化为逐行文本"""
+        from data_importer.utils.timing_utils import TimingUtils
+
+        lines = [f"进程内存峰值: {MemoryUtils.format_size(profile['peak_rss'])}"]
+        if profile["peak_traced"] is not None:
+            lines[0] += f", Python对象峰值: {MemoryUtils.format_size(profile['peak_traced'])}"
+        for name, stage in profile["stages"].items():
+            line = f"{TimingUtils.STAGES.get(name, name)}({name}): RSS峰值 {MemoryUtils.format_size(stage['peak_rss'])}"
+            if stage["peak_traced"] is not None:
+                line += f", Python对象峰值 {MemoryUtils.format_size(stage['peak_traced'])}"
+            lines.append(line)
+        if profile["top_allocations"]:
+            lines.append(f"内存峰值时占用最多的分配位置 (阶段: {', '.join(profile['top_allocations_stages']) or '无'}):")
+            for site in profile["top_allocations"]:
+                lines.append(f"  {site['file']}:{site['line']} - {MemoryUtils.format_size(site['size'])}, {site['count']} 个对象")
+        return lines
+
+    @staticmethod
+    def current_rss():
+        """读取当前进程的常驻内存(字节)，无法读取时返回None"""
+        if PSUTIL_AVAILABLE:
+            try:
+                return psutil.Process().memory_info().rss
+            except Exception:
+                pass
+
+        # Linux: /proc/self/statm 的第二列是常驻页数
+        try:
+            with open("/proc/self/statm", "r") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, AttributeError, IndexError):
+            pass
+
+        # Windows: GetProcessMemoryInfo 的 WorkingSetSize
+        if sys.platform == "win32":
+            try:
+                import ctypes
+                from ctypes import wintypes
+
+                class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                    _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                                ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                                ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+                counters = PROCESS_MEMORY_COUNTERS()
+                counters.cb = ctypes.sizeof(counters)
+                handle = ctypes.windll.kernel32.GetCurrentProcess()
+                if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                    return counters.WorkingSetSize
+            except Exception:
+                pass
+
+        return None
+
+
+class MemoryBudget:
+    """
+    导入过程的内存预算
+    根据预算和已观测到的每行内存占用，给出分块行数和队列深度；
+    max_memory为None时不限制内存，使用固定的默认值
+    """
+    # 预算中分给单个数据块和等待写入的队列的比例
+    CHUNK_FRACTION = 0.08
+    QUEUE_FRACTION = 0.35
+    # 清洗成Python对象后相对于DataFrame内存的膨胀系数
+    EXPANSION = 4
+    MIN_CHUNK_ROWS = 1000
+    MAX_CHUNK_ROWS = 200000
+    DEFAULT_CHUNK_ROWS = 20000
+    MAX_QUEUE_DEPTH = 16
+
+    def __init__(self, max_memory=None):
+        self.max_memory = max_memory
+        self.lock = threading.Lock()
+        # 开始导入时进程已占用的内存(解释器、pandas等)，不计入可用预算
+        self.baseline_rss = MemoryUtils.current_rss() or 0
+        self.bytes_per_row = None
+        self.chunk_rows = self.DEFAULT_CHUNK_ROWS
+        self.queue_depth = 2
+        self.peak_rss = self.baseline_rss
+        self.shrink_count = 0
+
+    @property
+    def enabled(self):
+        return self.max_memory is not None
+
+    def available(self):
+        """预算中除去基线内存后可用于数据的字节数"""
+        if not self.enabled:
+            return None
+        return max(self.max_memory - self.baseline_rss, self.max_memory // 4)
+
+    def observe_chunk(self, rows, frame_bytes):
+        """根据实际数据块的内存占用更新每行估计，并重新计算分块参数"""
+        if rows <= 0:
+            return
+        with self.lock:
+            per_row = frame_bytes / rows
+            if self.bytes_per_row is None:
+                self.bytes_per_row = per_row
+            else:
+                self.bytes_per_row = max(per_row, self.bytes_per_row * 0.8 + per_row * 0.2)
+            self._plan()
+
+    def _plan(self):
+        if not self.enabled or not self.bytes_per_row:
+            return
+        available = self.available()
+        row_cost = self.bytes_per_row * self.EXPANSION
+        chunk_rows = int(available * self.CHUNK_FRACTION / row_cost)
+        # 内存吃紧而缩小过的分块不再放大
+        chunk_rows = chunk_rows >> self.shrink_count
+        self.chunk_rows = max(self.MIN_CHUNK_ROWS, min(chunk_rows, self.MAX_CHUNK_ROWS))
+
+        chunk_bytes = self.chunk_rows * row_cost
+        self.queue_depth = max(1, min(int(available * self.QUEUE_FRACTION / chunk_bytes), self.MAX_QUEUE_DEPTH))
+
+    def next_chunk_rows(self):
+        """下一个数据块应读取的行数"""
+        return self.chunk_rows
+
+    def check(self):
+        """
+        检查当前RSS，超过预算的90%时缩小分块并回收内存
+        返回: 是否处于内存压力下(应把数据块溢写到磁盘)
+        """
+        rss = MemoryUtils.current_rss()
+        if rss is None or not self.enabled:
+            return False
+        with self.lock:
+            self.peak_rss = max(self.peak_rss, rss)
+            if rss < self.max_memory * 0.75:
+                return False
+            if rss >= self.max_memory * 0.9 and self.chunk_rows > self.MIN_CHUNK_ROWS:
+                self.shrink_count += 1
+                self.chunk_rows = max(self.MIN_CHUNK_ROWS, self.chunk_rows // 2)
+                self.queue_depth = max(1, self.queue_depth // 2)
+        gc.collect()
+        return True
+
+    def summary(self):
+        """内存预算的使用情况，写入导入报告"""
+        return {
+            "max_memory": self.max_memory,
+            "baseline_rss": self.baseline_rss,
+            "peak_rss": self.peak_rss,
+            "chunk_rows": self.chunk_rows,
+            "queue_depth": self.queue_depth
+        }
+
+
+class SpilledChunk:
+    """已溢写到磁盘的数据块"""
+
+    def __init__(self, path, offset, row_count):
+        self.path = path
+        self.offset = offset
+        self.row_count = row_count
+
+
+class ChunkPipeline:
+    """
+    后台解析/清洗、前台写入的数据块流水线
+    后台线程从数据源读取DataFrame块并逐块清洗为行列表，按源数据顺序放入队列；
+    清洗是纯Python逻辑，多线程并行也会争抢GIL，因此只用一个后台线程，与写入端等待MySQL的时间重叠；
+    队列中驻留的块超过预算允许的深度，或进程内存接近上限时，新块溢写到临时目录，
+    由写入端取用时再读回，保证解析不必等待写入，内存也不会随积压增长
+    """
+    _END = object()
+
+    def __init__(self, chunks, clean_func, budget, spill_dir=None):
+        """
+        参数:
+            chunks: 产生 (源数据起始偏移, DataFrame块) 的迭代器
+            clean_func: 把 (起始偏移, DataFrame块) 转换为清洗结果的函数，结果为元组，第一个元素是行列表
+            budget: MemoryBudget
+            spill_dir: 溢写目录的父目录，默认使用系统临时目录
+        """
+        self.chunks = chunks
+        self.clean_func = clean_func
+        self.budget = budget
+        self.spill_parent = spill_dir
+        self.spill_path = None
+        self.spilled_chunks = 0
+        self.spilled_bytes = 0
+
+        self.items = collections.deque()
+        self.in_memory = 0
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.error = None
+        self.thread = None
+
+    def start(self):
+        # 后台线程沿用调用方的上下文，解析和清洗仍计入所属导入的分阶段计时
+        context = contextvars.copy_context()
+        self.thread = threading.Thread(target=context.run, args=(self._produce,),
+                                       name="import-chunk-producer", daemon=True)
+        self.thread.start()
+        return self
+
+    def _spill(self, offset, result):
+        if self.spill_path is None:
+            self.spill_path = tempfile.mkdtemp(prefix="import_spill_", dir=self.spill_parent)
+        path = os.path.join(self.spill_path, f"chunk_{offset:012d}.pkl")
+        with open(path, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.spilled_chunks += 1
+        self.spilled_bytes += os.path.getsize(path)
+        return SpilledChunk(path, offset, len(result[0]))
+
+    def _put(self, offset, result):
+        under_pressure = self.budget.check()
+        with self.condition:
+            spill = self.budget.enabled and (self.in_memory >= self.budget.queue_depth or under_pressure)
+            if not spill:
+                # 不限内存时队列满了就等待写入端
+                while not self.budget.enabled and self.in_memory >= self.budget.queue_depth \
+                        and not self.stop_event.is_set():
+                    self.condition.wait(0.5)
+                self.items.append((offset, result))
+                self.in_memory += 1
+                self.condition.notify_all()
+                return
+
+        item = self._spill(offset, result)
+        with self.condition:
+            self.items.append(item)
+            self.condition.notify_all()
+
+    def _produce(self):
+        try:
+            for offset, frame in self.chunks:
+                if self.stop_event.is_set():
+                    break
+                self.budget.observe_chunk(len(frame), int(frame.memory_usage(index=False, deep=True).sum()))
+                result = self.clean_func(offset, frame)
+                del frame
+                self._put(offset, result)
+        except BaseException as e:
+            self.error = e
+        finally:
+            with self.condition:
+                self.items.append(self._END)
+                self.condition.notify_all()
+
+    def __iter__(self):
+        """按源数据顺序产生 (起始偏移, 清洗结果)"""
+        while True:
+            with self.condition:
+                while not self.items:
+                    self.condition.wait(0.5)
+                item = self.items.popleft()
+                if item is self._END:
+                    break
+                if not isinstance(item, SpilledChunk):
+                    self.in_memory -= 1
+                self.condition.notify_all()
+
+            if isinstance(item, SpilledChunk):
+                with open(item.path, "rb") as f:
+                    result = pickle.load(f)
+                os.remove(item.path)
+                yield item.offset, result
+            else:
+                yield item
+
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        """停止后台线程并删除溢写目录"""
+        self.stop_event.set()
+        with self.condition:
+            self.items.clear()
+            self.in_memory = 0
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=10)
+        if self.spill_path and os.path.exists(self.spill_path):
+            shutil.rmtree(self.spill_path, ignore_errors=True)
+
+    def pending(self):
+        """等待写入的数据块数(含已溢写的块)"""
+        with self.condition:
+            return sum(1 for item in self.items if item is not self._END)
+
+    def summary(self):
+        return {"spilled_chunks": self.spilled_chunks, "spilled_bytes": self.spilled_bytes}
+
+
+class StageMemoryProfiler:
+    """
+    分阶段内存采样
+    后台线程定期读取进程RSS(mode="tracemalloc"时还读取tracemalloc统计的Python对象内存)，
+    峰值计入采样时正在进行的阶段；Python对象内存创新高时记录占用最多的分配位置，
+    用于找出大文件导入时哪一步(读取、类型转换、清洗等)撑高了内存
+    """
+    MODES = ("rss", "tracemalloc")
+    DEFAULT_INTERVAL = 0.05
+    # 记录的分配位置数和回溯帧数
+    TOP_SITES = 10
+    TRACE_FRAMES = 1
+    # 对象内存比上次记录分配位置时高出该比例才重新记录，避免频繁拍快照
+    SNAPSHOT_STEP = 1.1
+
+    def __init__(self, timer, mode="rss", interval=None):
+        if mode not in self.MODES:
+            raise ValueError(f"未知的内存采样方式: {mode}，可选: {', '.join(self.MODES)}")
+        self.timer = timer
+        self.mode = mode
+        self.interval = interval or self.DEFAULT_INTERVAL
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.peak_rss = 0
+        self.peak_traced = None
+        self.top_sites = []
+        self.top_stages = []
+        self.snapshot_threshold = 0
+        self.last_stages = set()
+        self.started_tracing = False
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def tracing(self):
+        return self.mode == "tracemalloc"
+
+    def start(self):
+        if self.thread is not None:
+            return self
+        if self.tracing and not tracemalloc.is_tracing():
+            tracemalloc.start(self.TRACE_FRAMES)
+            self.started_tracing = True
+        self.timer.memory = self
+        self.thread = threading.Thread(target=self._run, name="import-memory-sampler", daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """采样一次，峰值计入上次采样以来进行过的阶段"""
+        rss = MemoryUtils.current_rss()
+        traced = None
+        current = 0
+        if self.tracing and tracemalloc.is_tracing():
+            current, traced = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+        active = self.timer.active_stages()
+
+        with self.lock:
+            stages = active | self.last_stages
+            self.last_stages = active
+            if rss is not None:
+                self.peak_rss = max(self.peak_rss, rss)
+            if traced is not None:
+                self.peak_traced = max(self.peak_traced or 0, traced)
+            for name in stages:
+                stage = self.stages.setdefault(name, {"peak_rss": 0, "peak_traced": None})
+                if rss is not None:
+                    stage["peak_rss"] = max(stage["peak_rss"], rss)
+                if traced is not None:
+                    stage["peak_traced"] = max(stage["peak_traced"] or 0, traced)
+            record_sites = traced is not None and current > self.snapshot_threshold
+            if record_sites:
+                self.snapshot_threshold = current * self.SNAPSHOT_STEP
+
+        if record_sites:
+            self._record_sites(sorted(stages))
+
+    def _record_sites(self, stages):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+        sites = [{"file": stat.traceback[0].filename, "line": stat.traceback[0].lineno,
+                  "size": stat.size, "count": stat.count}
+                 for stat in snapshot.statistics("lineno")[:self.TOP_SITES]]
+        with self.lock:
+            self.top_sites = sites
+            self.top_stages = stages
+
+    def stop(self):
+        """停止采样，停止由本采样器启动的tracemalloc"""
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join(timeout=5)
+        self.sample()
+        self.timer.memory = None
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+        self.thread = None
+
+    def summary(self):
+        """各阶段的内存峰值和峰值时的分配位置，写入导入报告和导入指标"""
+        from data_importer.utils.timing_utils import TimingUtils
+
+        with self.lock:
+            order = [name for name in TimingUtils.STAGES if name in self.stages]
+            order += [name for name in self.stages if name not in TimingUtils.STAGES]
+            return {
+                "mode": self.mode,
+                "peak_rss": self.peak_rss,
+                "peak_traced": self.peak_traced,
+                "stages": {name: dict(self.stages[name]) for name in order},
+                "top_allocations": list(self.top_sites),
+                "top_allocations_stages": list(self.top_stages)
+            }
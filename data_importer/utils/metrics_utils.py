@@ -0,0 +1,291 @@
+"""
+导入指标工具类
+记录导入过程的计数器(读取/清洗/插入/拒绝的行数、发送的字节数)、直方图(批次耗时、语句大小)
+和仪表值(队列深度、RSS、速度、各阶段耗时)，由后台线程定期写入JSON文件和Prometheus文本文件，
+node_exporter的textfile收集器可以直接读取后者
+"""
+import os
+import json
+import time
+import bisect
+import threading
+
+# 指标名前缀
+METRIC_PREFIX = "data_importer_"
+
+# 指标定义: 名称 -> (类型, 说明)
+METRICS = {
+    "rows_read_total": ("counter", "从数据文件读取的行数"),
+    "rows_cleaned_total": ("counter", "清洗完成的行数"),
+    "rows_inserted_total": ("counter", "成功插入数据库的行数"),
+    "rows_rejected_total": ("counter", "写入拒绝文件的行数"),
+    "bytes_sent_total": ("counter", "发送到数据库的SQL语句字节数"),
+    "batches_total": ("counter", "已提交的批次数"),
+    "batch_fallbacks_total": ("counter", "批量插入失败后改为逐行插入的批次数"),
+    "batch_seconds": ("histogram", "每批次插入耗时(秒)"),
+    "statement_bytes": ("histogram", "每条INSERT语句的字节数"),
+    "queue_depth": ("gauge", "等待写入的已清洗数据块数"),
+    "rss_bytes": ("gauge", "进程常驻内存(字节)"),
+    "rows_per_second": ("gauge", "平均插入速度(行/秒)"),
+    "bytes_per_second": ("gauge", "平均发送速度(字节/秒)"),
+    "stage_seconds": ("gauge", "各阶段耗时(秒)"),
+    "stage_peak_rss_bytes": ("gauge", "各阶段进行时的进程内存峰值(字节)"),
+    "stage_peak_traced_bytes": ("gauge", "各阶段进行时tracemalloc统计的Python对象内存峰值(字节)"),
+    "running": ("gauge", "导入是否正在进行"),
+    "last_update_timestamp_seconds": ("gauge", "指标最后更新时间"),
+}
+
+# 直方图的桶上限
+HISTOGRAM_BUCKETS = {
+    "batch_seconds": (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+    "statement_bytes": (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216),
+}
+
+
+class Histogram:
+    """累积直方图，与Prometheus的histogram语义一致"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = self.count
+        return {"buckets": buckets, "sum": self.sum, "count": self.count}
+
+
+class ImportMetrics:
+    """单次导入的指标，可在导入线程、清洗线程和上报线程之间共享"""
+
+    def __init__(self, labels=None):
+        self.labels = dict(labels or {})
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.counters = {name: 0 for name, (kind, _) in METRICS.items() if kind == "counter"}
+        self.histograms = {name: Histogram(buckets) for name, buckets in HISTOGRAM_BUCKETS.items()}
+        self.gauges = {}
+        self.gauge_callbacks = {}
+        self.stage_seconds = {}
+        self.current_stage = None
+        self.stage_started = None
+        # 分阶段内存采样器(StageMemoryProfiler)，开启后其结果随指标一起输出
+        self.memory_profiler = None
+
+    def inc(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def observe(self, name, value):
+        with self.lock:
+            self.histograms[name].observe(value)
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def register_gauge(self, name, func):
+        """注册在上报时才取值的仪表，如队列深度"""
+        with self.lock:
+            self.gauge_callbacks[name] = func
+
+    def unregister_gauge(self, name):
+        with self.lock:
+            self.gauge_callbacks.pop(name, None)
+
+    def enter_stage(self, stage):
+        """进入新阶段，结束上一个阶段的计时"""
+        now = time.time()
+        with self.lock:
+            self._close_stage(now)
+            self.current_stage = stage
+            self.stage_started = now
+
+    def _close_stage(self, now):
+        if self.current_stage is not None:
+            self.stage_seconds[self.current_stage] = \
+                self.stage_seconds.get(self.current_stage, 0) + now - self.stage_started
+            self.current_stage = None
+
+    def finish(self):
+        """导入结束，结束最后一个阶段的计时"""
+        with self.lock:
+            self._close_stage(time.time())
+            self.gauges["running"] = 0
+
+    def snapshot(self):
+        """当前所有指标的快照"""
+        from data_importer.utils.memory_utils import MemoryUtils
+
+        now = time.time()
+        with self.lock:
+            callbacks = dict(self.gauge_callbacks)
+        gauges = {}
+        for name, func in callbacks.items():
+            try:
+                gauges[name] = func()
+            except Exception:
+                pass
+        rss = MemoryUtils.current_rss()
+        if rss is not None:
+            gauges["rss_bytes"] = rss
+        memory_profiler = self.memory_profiler
+        memory_profile = memory_profiler.summary() if memory_profiler is not None else None
+
+        with self.lock:
+            elapsed = max(now - self.start_time, 1e-9)
+            stage_seconds = dict(self.stage_seconds)
+            if self.current_stage is not None:
+                stage_seconds[self.current_stage] = stage_seconds.get(self.current_stage, 0) + now - self.stage_started
+            gauges.update({
+                "running": 1,
+                "rows_per_second": self.counters["rows_inserted_total"] / elapsed,
+                "bytes_per_second": self.counters["bytes_sent_total"] / elapsed,
+                "last_update_timestamp_seconds": now,
+            })
+            gauges.update(self.gauges)
+            return {
+                "labels": dict(self.labels),
+                "updated_at": now,
+                "elapsed_seconds": now - self.start_time,
+                "stage": self.current_stage,
+                "counters": dict(self.counters),
+                "gauges": gauges,
+                "stage_seconds": stage_seconds,
+                "memory_profile": memory_profile,
+                "histograms": {name: hist.snapshot() for name, hist in self.histograms.items()}
+            }
+
+
+class MetricsUtils:
+    @staticmethod
+    def _atomic_write(path, text):
+        """先写临时文件再替换，读取方不会读到写了一半的文件"""
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def write_json(path, snapshot):
+        MetricsUtils._atomic_write(path, json.dumps(snapshot, ensure_ascii=False, indent=2, default=str))
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ""
+        parts = []
+        for key, value in labels.items():
+            escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            parts.append(f'{key}="{escaped}"')
+        return "{" + ",".join(parts) + "}"
+
+    @staticmethod
+    def format_prometheus(snapshot):
+        """把指标快照格式化为Prometheus文本格式"""
+        labels = snapshot["labels"]
+        lines = []
+
+        def header(name):
+            kind, help_text = METRICS[name]
+            lines.append(f"# HELP {METRIC_PREFIX}{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} {kind}")
+
+        for name, value in snapshot["counters"].items():
+            header(name)
+            lines.append(f"{METRIC_PREFIX}{name}{MetricsUtils._format_labels(labels)} {value}")
+
+        for name, value in snapshot["gauges"].items():
+            if name not in METRICS:
+                continue
+            header(name)
+            lines.append(f"{METRIC_PREFIX}{name}{MetricsUtils._format_labels(labels)} {value}")
+
+        if snapshot["stage_seconds"]:
+            header("stage_seconds")
+            for stage, seconds in snapshot["stage_seconds"].items():
+                stage_labels = dict(labels, stage=stage)
+                lines.append(f"{METRIC_PREFIX}stage_seconds{MetricsUtils._format_labels(stage_labels)} {seconds:.6f}")
+
+        memory_profile = snapshot.get("memory_profile")
+        if memory_profile and memory_profile["stages"]:
+            for name, key in (("stage_peak_rss_bytes", "peak_rss"), ("stage_peak_traced_bytes", "peak_traced")):
+                values = [(stage, info[key]) for stage, info in memory_profile["stages"].items() if info[key] is not None]
+                if not values:
+                    continue
+                header(name)
+                for stage, value in values:
+                    stage_labels = dict(labels, stage=stage)
+                    lines.append(f"{METRIC_PREFIX}{name}{MetricsUtils._format_labels(stage_labels)} {value}")
+
+        for name, hist in snapshot["histograms"].items():
+            header(name)
+            for bound, count in hist["buckets"].items():
+                bucket_labels = dict(labels, le=bound)
+                lines.append(f"{METRIC_PREFIX}{name}_bucket{MetricsUtils._format_labels(bucket_labels)} {count}")
+            lines.append(f"{METRIC_PREFIX}{name}_sum{MetricsUtils._format_labels(labels)} {hist['sum']}")
+            lines.append(f"{METRIC_PREFIX}{name}_count{MetricsUtils._format_labels(labels)} {hist['count']}")
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def write_prometheus(path, snapshot):
+        MetricsUtils._atomic_write(path, MetricsUtils.format_prometheus(snapshot))
+
+
+class MetricsReporter:
+    """
+    后台线程定期把指标写入JSON文件和Prometheus文本文件，写文件不占用导入线程
+    output: {"json": JSON文件路径, "prometheus": .prom文件路径, "interval": 写入间隔秒数}
+    """
+    DEFAULT_INTERVAL = 10
+
+    def __init__(self, metrics, output):
+        self.metrics = metrics
+        self.json_path = output.get("json")
+        self.prometheus_path = output.get("prometheus")
+        self.interval = output.get("interval") or self.DEFAULT_INTERVAL
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def write(self):
+        snapshot = self.metrics.snapshot()
+        try:
+            if self.json_path:
+                MetricsUtils.write_json(self.json_path, snapshot)
+            if self.prometheus_path:
+                MetricsUtils.write_prometheus(self.prometheus_path, snapshot)
+        except OSError as e:
+            print(f"写入导入指标失败: {e}")
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.write()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="import-metrics", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """停止上报，并写入最终的指标"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+        self.write()
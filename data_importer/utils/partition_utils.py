@@ -0,0 +1,189 @@
+"""
+分区表工具类
+根据列的统计信息建议RANGE/HASH分区方案，生成分区子句，并将批次数据按分区路由
+"""
+import re
+import bisect
+import datetime
+import numbers
+import pandas as pd
+from data_importer.utils.db_utils import DbUtils
+
+
+class PartitionUtils:
+    # 单表建议的最大分区数（MySQL上限为8192，过多分区会拖慢打开表和优化器）
+    MAX_RANGE_PARTITIONS = 240
+    # 建议HASH分区时每个分区的目标行数
+    ROWS_PER_HASH_PARTITION = 2000000
+    MAX_HASH_PARTITIONS = 64
+    # KEY分区只建议用于这些类型的键列，TEXT/BLOB不能作为分区键
+    KEY_TYPES = r'^(TINYINT|SMALLINT|MEDIUMINT|INT|INTEGER|BIGINT|CHAR|VARCHAR|DATE|DATETIME|TIMESTAMP)\b'
+
+    @staticmethod
+    def is_integer_type(type_str):
+        """可用于HASH分区的整数类型，TINYINT(1)是布尔列，不作为分区键"""
+        t = type_str.strip().upper()
+        return t != "TINYINT(1)" and bool(re.match(r'^(TINYINT|SMALLINT|MEDIUMINT|INT|INTEGER|BIGINT)\b', t))
+
+    @staticmethod
+    def is_key_type(type_str):
+        """可用于KEY分区的键列类型"""
+        t = type_str.strip().upper()
+        return t != "TINYINT(1)" and bool(re.match(PartitionUtils.KEY_TYPES, t))
+
+    @staticmethod
+    def propose_partitions(column_profiles, column_types):
+        """
+        根据列统计信息为可分区的列给出建议方案
+
+        参数:
+            column_profiles: DataUtils.profile_dataframe 的结果
+            column_types: [(列名, MySQL类型), ...]
+
+        返回:
+            {列名: 分区方案字典}，日期列建议RANGE分区，整数键列建议HASH分区
+        """
+        proposals = {}
+        for col, type_str in column_types:
+            profile = column_profiles.get(col)
+            if not profile or profile["non_null"] == 0:
+                continue
+
+            if profile.get("date_min") is not None and profile.get("date_max") is not None:
+                spec = PartitionUtils.propose_range_partitions(col, profile["date_min"], profile["date_max"])
+                if spec:
+                    proposals[col] = spec
+            elif PartitionUtils.is_integer_type(type_str) and profile.get("min") is not None:
+                proposals[col] = PartitionUtils.propose_hash_partitions(col, profile["count"], "HASH")
+            elif (col.lower() == 'id' or col.lower().endswith('_id')) and PartitionUtils.is_key_type(type_str):
+                # 非整数的键列使用KEY分区，由MySQL计算哈希
+                proposals[col] = PartitionUtils.propose_hash_partitions(col, profile["count"], "KEY")
+
+        return proposals
+
+    @staticmethod
+    def propose_range_partitions(column, date_min, date_max):
+        """
+        根据日期列的最小值和最大值建议RANGE COLUMNS分区边界
+        跨度较短时按天分区，否则按月分区，跨度过长时按年分区
+        """
+        start = pd.Timestamp(date_min).normalize()
+        end = pd.Timestamp(date_max).normalize()
+        if pd.isna(start) or pd.isna(end) or end < start:
+            return None
+
+        span_days = (end - start).days
+        months = (end.year - start.year) * 12 + end.month - start.month + 1
+        if span_days < 92:
+            granularity = "day"
+            first = start
+            step = pd.DateOffset(days=1)
+            name_format = "p%Y%m%d"
+        elif months <= PartitionUtils.MAX_RANGE_PARTITIONS:
+            granularity = "month"
+            first = start.replace(day=1)
+            step = pd.DateOffset(months=1)
+            name_format = "p%Y%m"
+        else:
+            granularity = "year"
+            first = start.replace(month=1, day=1)
+            step = pd.DateOffset(years=1)
+            name_format = "p%Y"
+
+        # 每个分区的上界是下一个周期的起点
+        names = []
+        bounds = []
+        current = first
+        while current <= end:
+            names.append(current.strftime(name_format))
+            current = current + step
+            bounds.append(current.strftime("%Y-%m-%d"))
+
+        unit = {"day": "天", "month": "月", "year": "年"}[granularity]
+        return {
+            "method": "range",
+            "column": column,
+            "granularity": granularity,
+            "names": names,
+            "bounds": bounds,
+            "description": f"RANGE按{unit}分区: {start.strftime('%Y-%m-%d')} ~ {end.strftime('%Y-%m-%d')}, "
+                           f"共 {len(names) + 1} 个分区"
+        }
+
+    @staticmethod
+    def propose_hash_partitions(column, row_count, function="HASH"):
+        """根据行数建议HASH/KEY分区数（2的幂，便于日后调整）"""
+        partitions = 4
+        while partitions < PartitionUtils.MAX_HASH_PARTITIONS and \
+                partitions * PartitionUtils.ROWS_PER_HASH_PARTITION < row_count:
+            partitions *= 2
+
+        return {
+            "method": "hash",
+            "column": column,
+            "function": function,
+            "partitions": partitions,
+            "description": f"{function}分区: {partitions} 个分区"
+        }
+
+    @staticmethod
+    def build_partition_clause(spec):
+        """生成CREATE TABLE语句的分区子句"""
+        column = DbUtils.escape_sql_identifier(spec["column"])
+        if spec["method"] == "range":
+            parts = []
+            for name, bound in zip(spec["names"], spec["bounds"]):
+                parts.append(f"PARTITION {name} VALUES LESS THAN ('{bound}')")
+            # 超出建议范围的数据进入最后一个分区
+            parts.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+            return "PARTITION BY RANGE COLUMNS(" + column + ") (" + ", ".join(parts) + ")"
+
+        return f"PARTITION BY {spec['function']}({column}) PARTITIONS {int(spec['partitions'])}"
+
+    @staticmethod
+    def partition_for_value(spec, value, range_bounds=None):
+        """
+        计算单个值所属的分区名
+        无法在客户端确定时返回None（KEY分区、NULL值以外的非法值等），交给服务器路由
+        """
+        if spec["method"] == "range":
+            if value is None:
+                # NULL在RANGE COLUMNS分区中小于任何值，进入第一个分区
+                return spec["names"][0] if spec["names"] else "pmax"
+            if isinstance(value, datetime.datetime):
+                key = value
+            elif isinstance(value, datetime.date):
+                key = datetime.datetime(value.year, value.month, value.day)
+            else:
+                return None
+            index = bisect.bisect_right(range_bounds, key)
+            return spec["names"][index] if index < len(spec["names"]) else "pmax"
+
+        if spec["function"] == "HASH":
+            if value is None:
+                # HASH分区中NULL按0处理
+                return "p0"
+            if isinstance(value, bool) or not isinstance(value, numbers.Integral) or value < 0:
+                return None
+            return f"p{int(value) % int(spec['partitions'])}"
+
+        return None
+
+    @staticmethod
+    def route_rows(spec, key_index, batch_values):
+        """
+        将一个批次的行按分区分组，使每条INSERT只写入一个分区
+
+        返回:
+            [(分区名或None, 行列表), ...]，分区名为None的行由服务器自行路由
+        """
+        range_bounds = None
+        if spec["method"] == "range":
+            range_bounds = [datetime.datetime.strptime(b, "%Y-%m-%d") for b in spec["bounds"]]
+
+        groups = {}
+        for row in batch_values:
+            partition = PartitionUtils.partition_for_value(spec, row[key_index], range_bounds)
+            groups.setdefault(partition, []).append(row)
+
+        return list(groups.items())
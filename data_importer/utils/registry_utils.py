@@ -0,0 +1,211 @@
+"""
+导入登记工具类
+在目标库的登记表中记录每个数据源最近一次导入的表、内容指纹和每 RANGE_ROWS 行一段的摘要。
+同一数据源的新版本到来时逐段比较：内容相同时跳过，只在末尾追加了行时只导入新增的行，
+前面的段有变化时从第一个变化的段开始导入
+"""
+import os
+import json
+import hashlib
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+class RegistryUtils:
+    # 目标数据库中的登记表
+    REGISTRY_TABLE = "_import_registry"
+    # 每段的行数
+    RANGE_ROWS = 10000
+    # 组合各列哈希时的乘数
+    COLUMN_MULTIPLIER = np.uint64(1000003)
+
+    @staticmethod
+    def row_hashes(frame):
+        """
+        每行的64位哈希，按列依次组合；数值列统一按浮点数计算，
+        使同一份数据在不同版本的文件中推断出整数/浮点数类型时哈希一致
+        """
+        combined = np.zeros(len(frame), dtype=np.uint64)
+        for j in range(frame.shape[1]):
+            series = frame.iloc[:, j]
+            if pd.api.types.is_bool_dtype(series.dtype) or pd.api.types.is_datetime64_any_dtype(series.dtype):
+                hashes = pd.util.hash_pandas_object(series, index=False).to_numpy()
+            elif pd.api.types.is_numeric_dtype(series.dtype):
+                hashes = pd.util.hash_pandas_object(series.astype(np.float64), index=False).to_numpy()
+            else:
+                hashes = pd.util.hash_pandas_object(series.astype(str), index=False).to_numpy()
+            combined = combined * RegistryUtils.COLUMN_MULTIPLIER ^ hashes
+        return combined
+
+    @staticmethod
+    def ensure_registry_table(conn):
+        """确保目标数据库中存在登记表"""
+        cursor = conn.cursor()
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS `" + RegistryUtils.REGISTRY_TABLE + "` ("
+            "`source` VARCHAR(191) NOT NULL PRIMARY KEY, "
+            "`table_name` VARCHAR(64) NOT NULL, "
+            "`fingerprint` CHAR(40) NOT NULL, "
+            "`columns` TEXT NOT NULL, "
+            "`total_rows` BIGINT NOT NULL, "
+            "`range_rows` INT NOT NULL, "
+            "`range_digests` LONGTEXT NOT NULL, "
+            "`options` TEXT NOT NULL, "
+            "`updated_at` DATETIME NOT NULL"
+            ") CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci"
+        )
+        conn.commit()
+        cursor.close()
+
+    @staticmethod
+    def lookup(conn, source):
+        """
+        读取数据源的登记记录
+        返回: {"table_name", "fingerprint", "columns", "total_rows", "range_rows", "range_digests", "options"}，不存在时返回None
+        """
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT `table_name`, `fingerprint`, `columns`, `total_rows`, `range_rows`, `range_digests`, `options` "
+            "FROM `" + RegistryUtils.REGISTRY_TABLE + "` WHERE `source` = %s",
+            (source,)
+        )
+        row = cursor.fetchone()
+        cursor.close()
+        if row is None:
+            return None
+        return {
+            "table_name": row[0],
+            "fingerprint": row[1],
+            "columns": json.loads(row[2]),
+            "total_rows": int(row[3]),
+            "range_rows": int(row[4]),
+            "range_digests": json.loads(row[5]),
+            "options": json.loads(row[6])
+        }
+
+    @staticmethod
+    def register(conn, source, table_name, columns, row_hashes, options):
+        """导入完成后记录数据源当前版本的内容指纹和各段摘要"""
+        range_rows = RegistryUtils.RANGE_ROWS
+        digests = [row_hashes.digest(start, min(start + range_rows, len(row_hashes)))
+                   for start in range(0, len(row_hashes), range_rows)]
+        cursor = conn.cursor()
+        cursor.execute(
+            "REPLACE INTO `" + RegistryUtils.REGISTRY_TABLE + "` "
+            "(`source`, `table_name`, `fingerprint`, `columns`, `total_rows`, `range_rows`, `range_digests`, `options`, `updated_at`) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW())",
+            (source, table_name, row_hashes.fingerprint(columns), json.dumps([str(col) for col in columns], ensure_ascii=False),
+             len(row_hashes), range_rows, json.dumps(digests), json.dumps(options, ensure_ascii=False))
+        )
+        conn.commit()
+        cursor.close()
+
+    @staticmethod
+    def compare(entry, columns, row_hashes):
+        """
+        比较数据源的登记记录与当前文件
+        返回: {"status": "unchanged"|"appended"|"changed", "start_row": 需要从这一行开始导入,
+               "previous_rows": 上次导入的行数, "changed_ranges": 有变化的段数}
+        """
+        previous_rows = entry["total_rows"]
+        result = {"status": "changed", "start_row": 0, "previous_rows": previous_rows, "changed_ranges": 0}
+        if entry["columns"] != [str(col) for col in columns]:
+            result["changed_ranges"] = len(entry["range_digests"])
+            return result
+        if len(row_hashes) == previous_rows and entry["fingerprint"] == row_hashes.fingerprint(columns):
+            return dict(result, status="unchanged", start_row=previous_rows)
+
+        first_changed = None
+        for k, digest in enumerate(entry["range_digests"]):
+            start = k * entry["range_rows"]
+            end = min(start + entry["range_rows"], previous_rows)
+            if end > len(row_hashes) or row_hashes.digest(start, end) != digest:
+                result["changed_ranges"] += 1
+                if first_changed is None:
+                    first_changed = start
+        if first_changed is None:
+            return dict(result, status="appended", start_row=previous_rows)
+        return dict(result, start_row=first_changed)
+
+    @staticmethod
+    def format_incremental(result):
+        """把增量导入的比较结果格式化为一行文本"""
+        if result["status"] == "new":
+            return f"数据源 {result['source']} 第一次导入"
+        if result["status"] == "unchanged":
+            return f"数据源 {result['source']} 的内容与上次导入的 {result['previous_rows']} 行相同，跳过导入"
+        if result["status"] == "appended":
+            return f"数据源 {result['source']} 在上次导入的 {result['previous_rows']} 行之后追加了数据，从第 {result['start_row']} 行开始追加"
+        line = f"数据源 {result['source']} 有 {result['changed_ranges']} 段数据与上次导入不同"
+        if result["mode"] == "merge":
+            return line + f"，从第 {result['start_row']} 行开始按业务键合并"
+        return line + "，全量替换"
+
+
+class RowHashLog:
+    """
+    扫描文件时按顺序记录每行的64位哈希，每行8字节；
+    流式导入时写入临时文件，扫描完成后以memmap只读访问，整表已在内存中时直接保存在内存中
+    """
+
+    def __init__(self, spill_dir=None, on_disk=False):
+        self.spill_parent = spill_dir
+        self.on_disk = on_disk
+        self.parts = []
+        self.path = None
+        self.file = None
+        self.rows = 0
+        self.hashes = None
+
+    def __len__(self):
+        return self.rows
+
+    def add(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        self.rows += len(hashes)
+        if not self.on_disk:
+            self.parts.append(hashes)
+            return
+        if self.file is None:
+            fd, self.path = tempfile.mkstemp(prefix="import_rows_", suffix=".bin", dir=self.spill_parent)
+            self.file = os.fdopen(fd, "wb")
+        hashes.tofile(self.file)
+
+    def finish(self):
+        """扫描完成后调用"""
+        if self.on_disk:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            self.hashes = np.memmap(self.path, dtype=np.uint64, mode="r", shape=(self.rows,)) \
+                if self.rows else np.empty(0, dtype=np.uint64)
+        else:
+            self.hashes = np.concatenate(self.parts) if self.parts else np.empty(0, dtype=np.uint64)
+            self.parts = []
+        return self
+
+    def digest(self, start, end):
+        """第 start 到 end 行(不含)的摘要"""
+        return hashlib.sha1(np.ascontiguousarray(self.hashes[start:end]).tobytes()).hexdigest()[:16]
+
+    def fingerprint(self, columns):
+        """列名和全部行的内容指纹，按块计算"""
+        sha1 = hashlib.sha1(json.dumps([str(col) for col in columns], ensure_ascii=False).encode("utf-8"))
+        block = RegistryUtils.RANGE_ROWS * 100
+        for start in range(0, self.rows, block):
+            sha1.update(np.ascontiguousarray(self.hashes[start:start + block]).tobytes())
+        return sha1.hexdigest()
+
+    def close(self):
+        """删除临时文件"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.hashes = None
+        if self.path and os.path.exists(self.path):
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
@@ -0,0 +1,124 @@
+"""
+拒绝行工具类
+导入失败的行随时写入拒绝文件(CSV)，包含原始值、错误码和源数据行号；
+日志中只保留计数和少量样本，修正数据后可以直接导入拒绝文件
+"""
+import os
+import re
+import csv
+import datetime
+import collections
+
+
+class RejectUtils:
+    # 拒绝文件目录
+    REJECT_DIR = os.path.join(os.getcwd(), 'rejects')
+    # 拒绝文件的附加列，导入拒绝文件时自动忽略
+    LINE_COLUMN = "_reject_line"
+    CODE_COLUMN = "_reject_code"
+    MESSAGE_COLUMN = "_reject_message"
+    META_COLUMNS = (LINE_COLUMN, CODE_COLUMN, MESSAGE_COLUMN)
+    # 清洗阶段的错误码，数据库错误使用MySQL错误号
+    CODE_CLEAN = "CLEAN"
+    CODE_INSERT = "INSERT"
+
+    @staticmethod
+    def error_code(message):
+        """从数据库错误信息中提取MySQL错误号，如 (1366, 'Incorrect integer value...')"""
+        match = re.search(r'\((\d{4}),', str(message))
+        return match.group(1) if match else RejectUtils.CODE_INSERT
+
+    @staticmethod
+    def clean_error_code(message):
+        """清洗阶段的错误码：预校验拒绝的行以服务器会返回的MySQL错误号开头，其余为 CLEAN"""
+        match = re.match(r'^\((\d{4}),', str(message))
+        return match.group(1) if match else RejectUtils.CODE_CLEAN
+
+    @staticmethod
+    def is_meta_column(column):
+        """是否为拒绝文件的附加列"""
+        return str(column) in RejectUtils.META_COLUMNS
+
+
+class RejectWriter:
+    """
+    单次导入的拒绝文件
+    第一次写入时才创建文件；继续导入时传入检查点中记录的路径，追加到同一个文件
+    """
+    # 写入日志的样本行数
+    SAMPLE_LIMIT = 20
+
+    def __init__(self, base_name, columns, logger=None, path=None):
+        if path is None:
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            path = os.path.join(RejectUtils.REJECT_DIR, f"{base_name}_{timestamp}.rejects.csv")
+        self.path = path
+        self.columns = [str(col) for col in columns]
+        self.logger = logger
+        self.file = None
+        self.writer = None
+        self.count = 0
+        self.by_code = collections.Counter()
+        self.samples = []
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        append = os.path.exists(self.path) and os.path.getsize(self.path) > 0
+        # 使用带BOM的UTF-8，Excel可以直接打开，再次导入时编码检测也能识别
+        if append:
+            self.file = open(self.path, 'a', encoding='utf-8', newline='')
+        else:
+            self.file = open(self.path, 'w', encoding='utf-8-sig', newline='')
+        self.writer = csv.writer(self.file)
+        if not append:
+            self.writer.writerow(list(RejectUtils.META_COLUMNS) + self.columns)
+
+    def add(self, row_offset, code, message, values):
+        """
+        写入一行被拒绝的数据
+        参数:
+            row_offset: 源数据行偏移(从0开始，不含表头)
+            code: 错误码，MySQL错误号或 CLEAN/INSERT
+            message: 错误信息
+            values: 该行的原始值，与columns顺序一致
+        """
+        if self.file is None:
+            self._open()
+
+        self.writer.writerow([row_offset + 1, code, message] +
+                             ["" if val is None else val for val in values])
+        self.count += 1
+        self.by_code[str(code)] += 1
+
+        if len(self.samples) < self.SAMPLE_LIMIT:
+            self.samples.append((row_offset + 1, code, message))
+            if self.logger:
+                self.logger.warning(f"拒绝第 {row_offset + 1} 行 [{code}]: {message}")
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        """关闭拒绝文件，并在日志中记录汇总"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.writer = None
+
+        if self.count and self.logger:
+            codes = ", ".join(f"{code}: {n}" for code, n in self.by_code.most_common())
+            self.logger.warning(f"共拒绝 {self.count} 行 (错误码 {codes})，详情见拒绝文件: {self.path}")
+            if self.count > len(self.samples):
+                self.logger.warning(f"日志只记录了前 {len(self.samples)} 行，其余 {self.count - len(self.samples)} 行见拒绝文件")
+
+    def summary(self):
+        """拒绝行的统计，写入导入报告"""
+        return {
+            "file": self.path,
+            "rows": self.count,
+            "by_code": dict(self.by_code),
+            "samples": [{"line": line, "code": code, "message": message} for line, code, message in self.samples]
+        }
@@ -0,0 +1,329 @@
+"""
+表结构演进工具类
+追加到已有表时比较文件推断出的列类型与 INFORMATION_SCHEMA 中目标表的列：文件中新增的列加到表末尾，
+取值超出原类型的列放宽类型(只放宽不收窄)，所有变更合并为一条 ALTER TABLE；
+只有加列时在支持的服务器上使用 ALGORITHM=INSTANT，只修改元数据，不重建表
+"""
+import re
+
+import numpy as np
+import pymysql
+
+from data_importer.utils.data_utils import DataUtils
+from data_importer.utils.db_utils import DbUtils
+
+
+class SchemaUtils:
+    # 各整数类型的取值范围 (有符号, 无符号)
+    INTEGER_RANGES = {
+        "TINYINT": ((-128, 127), (0, 255)),
+        "SMALLINT": ((-32768, 32767), (0, 65535)),
+        "MEDIUMINT": ((-8388608, 8388607), (0, 16777215)),
+        "INT": ((-2147483648, 2147483647), (0, 4294967295)),
+        "BIGINT": ((-9223372036854775808, 9223372036854775807), (0, 18446744073709551615)),
+    }
+    # 非文本值写入文本列时的最大长度
+    TEXT_LENGTHS = {"bool": 1, "double": 24, "date": 19}
+    # 服务器不能按 INSTANT 执行时的错误码(不支持该算法、不支持的原因、INSTANT 加列次数达到上限)，去掉算法子句重试
+    INSTANT_ERRORS = (1845, 1846, 4092)
+
+    @staticmethod
+    def normalize_type(type_str):
+        """
+        把 INFORMATION_SCHEMA 中的 COLUMN_TYPE 规范为推断类型的写法:
+        大写，去掉整数的显示宽度(TINYINT(1)除外)，INTEGER/NUMERIC 写为 INT/DECIMAL
+        """
+        t = " ".join(type_str.strip().upper().split())
+        t = re.sub(r'^INTEGER\b', "INT", t)
+        t = re.sub(r'^NUMERIC\b', "DECIMAL", t)
+        t = re.sub(r'^DECIMAL\((\d+)\)', r'DECIMAL(\1,0)', t)
+        t = re.sub(r'^DECIMAL$', "DECIMAL(10,0)", t)
+        t = t.replace(", ", ",")
+        if t != "TINYINT(1)":
+            t = re.sub(r'^(TINYINT|SMALLINT|MEDIUMINT|INT|BIGINT)\(\d+\)', r'\1', t)
+        return t.replace(" ZEROFILL", "")
+
+    @staticmethod
+    def _family(type_str):
+        """在 DataUtils._type_family 的基础上把 CHAR(n) 也归为文本"""
+        if re.match(r'^CHAR\(\d+\)$', type_str):
+            return "string"
+        return DataUtils._type_family(type_str)
+
+    @staticmethod
+    def _capacity(type_str):
+        match = re.match(r'^CHAR\((\d+)\)$', type_str)
+        if match:
+            return int(match.group(1))
+        return DataUtils._string_capacity(type_str)
+
+    @staticmethod
+    def _integer_range(type_str):
+        """整数类型的取值范围，TINYINT(1) 按 TINYINT 计算"""
+        t = "TINYINT" if type_str == "TINYINT(1)" else type_str
+        signed, unsigned = SchemaUtils.INTEGER_RANGES[t.split()[0]]
+        return unsigned if t.endswith("UNSIGNED") else signed
+
+    @staticmethod
+    def _decimal_spec(type_str):
+        """DECIMAL(p,s) 的 (整数位数, 小数位数)，不是 DECIMAL 时返回None"""
+        match = re.match(r'^DECIMAL\((\d+),(\d+)\)', type_str)
+        if not match:
+            return None
+        return int(match.group(1)) - int(match.group(2)), int(match.group(2))
+
+    @staticmethod
+    def _profile_range(profile):
+        """统计信息中的数值范围，整数保持为整数(BIGINT的边界值转为浮点数会失去精度)，没有时返回None"""
+        if not profile or profile.get("min") is None or profile.get("max") is None:
+            return None
+        try:
+            return tuple(int(v) if isinstance(v, (int, np.integer)) else float(v)
+                         for v in (profile["min"], profile["max"]))
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _integer_digits(low, high):
+        return len(str(int(max(abs(low), abs(high)))))
+
+    @staticmethod
+    def _decimal_type(int_digits, scale):
+        """能容纳的 DECIMAL 类型，超出 DECIMAL 的精度上限(65位)时使用 DOUBLE"""
+        scale = min(scale, 30)
+        if int_digits + scale > 65:
+            return "DOUBLE"
+        return f"DECIMAL({int_digits + scale},{scale})"
+
+    @staticmethod
+    def _text_length(file_type, profile):
+        """文件中的值写成文本后的最大长度"""
+        family = SchemaUtils._family(file_type)
+        if family == "string":
+            return (profile or {}).get("max_len") or 0
+        if family in ("int", "decimal"):
+            value_range = SchemaUtils._profile_range(profile)
+            if value_range is None:
+                return 0
+            spec = SchemaUtils._decimal_spec(file_type)
+            # 负号、小数点和小数部分
+            return SchemaUtils._integer_digits(*value_range) + 1 + (spec[1] + 1 if spec and spec[1] else 0)
+        if family == "date":
+            return 10 if file_type == "DATE" else 19
+        return SchemaUtils.TEXT_LENGTHS.get(family, 0)
+
+    @staticmethod
+    def widen_type(target_type, file_type, profile=None):
+        """
+        放宽目标表中的列类型，使其能容纳文件中的值；只放宽不收窄
+
+        参数:
+            target_type: 目标表中的列类型(已规范化)
+            file_type: 文件推断出的类型(或用户修改的类型)
+            profile: 该列在整个文件中的统计信息
+
+        返回:
+            (放宽后的类型, 冲突说明)，不需要修改时类型为None；类别不兼容时给出冲突说明，不修改类型
+        """
+        target_type = SchemaUtils.normalize_type(target_type)
+        file_type = SchemaUtils.normalize_type(file_type)
+        target_family = SchemaUtils._family(target_type)
+        file_family = SchemaUtils._family(file_type)
+        if target_type == file_type or "other" in (target_family, file_family):
+            return None, None
+        new_type, conflict = SchemaUtils._widen(target_type, target_family, file_type, file_family, profile)
+        if new_type and SchemaUtils.normalize_type(new_type) == target_type:
+            new_type = None
+        return new_type, conflict
+
+    @staticmethod
+    def _widen(target_type, target_family, file_type, file_family, profile):
+        """按目标类型和文件类型的类别放宽，返回值与 widen_type 相同"""
+        # 文本列：文件中的值(按文本计)超过原长度时加长
+        if target_family == "string":
+            length = SchemaUtils._text_length(file_type, profile)
+            if length <= SchemaUtils._capacity(target_type):
+                return None, None
+            base = target_type if target_type.startswith("VARCHAR") or target_type.endswith("TEXT") \
+                else f"VARCHAR({SchemaUtils._capacity(target_type)})"
+            return DataUtils.merge_mysql_types(base, file_type, {"max_len": length}), None
+
+        conflict = f"文件中为 {file_type}，与目标表的 {target_type} 不兼容，无法转换的行会被拒绝"
+        if file_family == "string":
+            # 可解析为日期的文本列写入日期列时由服务器转换
+            if target_family == "date" and (profile or {}).get("date_min") is not None:
+                return None, None
+            return None, conflict
+        if file_family == "date" or target_family == "date":
+            if target_family == file_family:
+                return ("DATETIME", None) if target_type == "DATE" and file_type == "DATETIME" else (None, None)
+            return None, conflict
+
+        # 以下均为数值(含布尔)类型
+        value_range = SchemaUtils._profile_range(profile)
+        if target_family == "double":
+            if target_type == "FLOAT" and file_family in ("decimal", "double"):
+                return "DOUBLE", None
+            return None, None
+
+        if target_family == "decimal":
+            int_digits, scale = SchemaUtils._decimal_spec(target_type)
+            file_spec = SchemaUtils._decimal_spec(file_type)
+            new_digits = max(int_digits, SchemaUtils._integer_digits(*value_range) if value_range else 0)
+            new_scale = max(scale, file_spec[1] if file_spec else 0)
+            if (new_digits, new_scale) == (int_digits, scale):
+                return None, None
+            return SchemaUtils._decimal_type(new_digits, new_scale), None
+
+        # 目标为整数或布尔：文件中有小数时改为 DECIMAL/DOUBLE，否则按两者的合并范围选整数类型
+        low, high = SchemaUtils._integer_range(target_type)
+        if file_family == "double":
+            return "DOUBLE", None
+        if file_family == "decimal":
+            file_digits, file_scale = SchemaUtils._decimal_spec(file_type)
+            int_digits = max(len(str(max(abs(low), abs(high)))), file_digits,
+                             SchemaUtils._integer_digits(*value_range) if value_range else 0)
+            return SchemaUtils._decimal_type(int_digits, file_scale), None
+        if file_family == "bool" or value_range is None or (low <= value_range[0] and value_range[1] <= high):
+            return None, None
+        low, high = min(low, int(value_range[0])), max(high, int(value_range[1]))
+        # 同时有负数和超出 BIGINT 的正数时没有能容纳的整数类型
+        if low < 0 and high > SchemaUtils.INTEGER_RANGES["BIGINT"][0][1]:
+            return SchemaUtils._decimal_type(SchemaUtils._integer_digits(low, high), 0), None
+        return DataUtils.integer_type_for_range(low, high), None
+
+    @staticmethod
+    def plan_evolution(target_columns, column_types, profiles):
+        """
+        比较文件的列与目标表的列
+
+        参数:
+            target_columns: [(列名, 列类型), ...]，DbUtils.get_table_columns 的结果
+            column_types: [(列名, 类型), ...]，文件推断出的类型(已应用用户修改的类型)
+            profiles: {列名: 统计信息}
+
+        返回:
+            {"add": [(列名, 类型)], "modify": [(列名, 原类型, 新类型)], "conflicts": [说明, ...]}
+        """
+        target_types = dict(target_columns)
+        # MySQL的列名不区分大小写，只差大小写的列视为已有的列，不再添加
+        target_names = {str(name).lower() for name in target_types}
+        plan = {"add": [], "modify": [], "conflicts": []}
+        for col, file_type in column_types:
+            if col not in target_types:
+                if str(col).lower() not in target_names:
+                    plan["add"].append((col, file_type))
+                continue
+            new_type, conflict = SchemaUtils.widen_type(target_types[col], file_type, profiles.get(col))
+            if new_type:
+                plan["modify"].append((col, target_types[col], new_type))
+            if conflict:
+                plan["conflicts"].append(f"列 {col}: {conflict}")
+        return plan
+
+    @staticmethod
+    def supports_instant(conn):
+        """服务器是否支持 ALGORITHM=INSTANT 加列(MySQL 8.0.12+、MariaDB 10.3.2+)"""
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT VERSION()")
+            version = str(cursor.fetchone()[0])
+        finally:
+            cursor.close()
+        match = re.match(r'(\d+)\.(\d+)\.(\d+)', version)
+        if not match:
+            return False
+        numbers = tuple(int(n) for n in match.groups())
+        return numbers >= ((10, 3, 2) if "MARIADB" in version.upper() else (8, 0, 12))
+
+    @staticmethod
+    def _quote_literal(value):
+        return "'" + str(value).replace("\\", "\\\\").replace("'", "''") + "'"
+
+    @staticmethod
+    def _column_attributes(conn, table_name, columns):
+        """
+        MODIFY COLUMN 会替换整个列定义，读取需要保留的 NOT NULL、DEFAULT、AUTO_INCREMENT、ON UPDATE 和注释
+        返回: {列名: 类型之后的属性文本}
+        """
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COLUMN_NAME, IS_NULLABLE, COLUMN_DEFAULT, EXTRA, COLUMN_COMMENT FROM INFORMATION_SCHEMA.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (table_name,)
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+        attributes = {}
+        for name, nullable, default, extra, comment in rows:
+            if name not in columns:
+                continue
+            extra = extra or ""
+            parts = [] if nullable == "YES" else ["NOT NULL"]
+            if default is not None and str(default).upper() != "NULL":
+                default = str(default)
+                # 表达式默认值(MySQL标记为DEFAULT_GENERATED)和MariaDB中已加引号的默认值原样保留
+                if "DEFAULT_GENERATED" in extra.upper() or re.match(r"^(CURRENT_TIMESTAMP|NOW\()", default.upper()) \
+                        or (len(default) >= 2 and default[0] == default[-1] == "'"):
+                    parts.append("DEFAULT " + default)
+                else:
+                    parts.append("DEFAULT " + SchemaUtils._quote_literal(default))
+            if "AUTO_INCREMENT" in extra.upper():
+                parts.append("AUTO_INCREMENT")
+            on_update = re.search(r"on update (\S+)", extra, re.IGNORECASE)
+            if on_update:
+                parts.append("ON UPDATE " + on_update.group(1))
+            if comment:
+                parts.append("COMMENT " + SchemaUtils._quote_literal(comment))
+            attributes[name] = " ".join(parts)
+        return attributes
+
+    @staticmethod
+    def build_alter_sql(table_name, plan, attributes=None, algorithm=None):
+        """把加列和放宽类型合并为一条 ALTER TABLE 语句，attributes 为需要保留的列属性"""
+        esc = DbUtils.escape_sql_identifier
+        attributes = attributes or {}
+        clauses = [f"ADD COLUMN {esc(col)} {type_str}" for col, type_str in plan["add"]]
+        for col, _, new_type in plan["modify"]:
+            clauses.append((f"MODIFY COLUMN {esc(col)} {new_type} " + attributes.get(col, "")).rstrip())
+        if algorithm:
+            clauses.append("ALGORITHM=" + algorithm)
+        return "ALTER TABLE " + esc(table_name) + " " + ", ".join(clauses)
+
+    @staticmethod
+    def apply_evolution(conn, table_name, plan):
+        """
+        执行表结构变更；只有加列且服务器支持时使用 ALGORITHM=INSTANT，服务器拒绝时按默认算法重新执行
+        返回: 实际使用的算法("INSTANT" 或 "DEFAULT")，没有变更时返回None
+        """
+        if not plan["add"] and not plan["modify"]:
+            return None
+        attributes = SchemaUtils._column_attributes(conn, table_name, {col for col, _, _ in plan["modify"]}) \
+            if plan["modify"] else {}
+        algorithm = "INSTANT" if not plan["modify"] and SchemaUtils.supports_instant(conn) else None
+        cursor = conn.cursor()
+        try:
+            try:
+                cursor.execute(SchemaUtils.build_alter_sql(table_name, plan, attributes, algorithm))
+            except pymysql.MySQLError as e:
+                if algorithm is None or not e.args or e.args[0] not in SchemaUtils.INSTANT_ERRORS:
+                    raise
+                print(f"服务器不能按 INSTANT 执行表结构变更({e})，改用默认算法")
+                algorithm = None
+                cursor.execute(SchemaUtils.build_alter_sql(table_name, plan, attributes))
+            conn.commit()
+        finally:
+            cursor.close()
+        return algorithm or "DEFAULT"
+
+    @staticmethod
+    def format_evolution(result):
+        """把表结构变更的结果格式化为逐行文本，不兼容的列在规划时已给出警告，不再重复"""
+        lines = []
+        if result["added"]:
+            lines.append("新增列: " + ", ".join(f"{col} {type_str}" for col, type_str in result["added"]))
+        if result["modified"]:
+            lines.append("放宽类型: " + ", ".join(f"{col} {old} -> {new}" for col, old, new in result["modified"]))
+        if result["algorithm"]:
+            lines.append(f"已用一条 ALTER TABLE 完成表结构变更(ALGORITHM={result['algorithm']})")
+        return lines
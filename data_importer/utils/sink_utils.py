@@ -0,0 +1,555 @@
+"""
+导入输出工具类
+导入引擎把清洗后的数据按批交给输出(sink)，同一遍读取可以同时写入多个目标:
+MySQL(executemany批量插入)、SQLite(大事务内executemany)、Parquet(按行组写入)、CSV(csv.writer.writerows)
+和SQL脚本(多行INSERT，可gzip压缩)
+"""
+import os
+import re
+import csv
+import math
+import gzip
+import time
+import sqlite3
+import decimal
+import datetime
+
+# 尝试导入pyarrow，没有时Parquet输出不可用
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+
+class SinkUtils:
+    @staticmethod
+    def type_family(mysql_type):
+        """
+        MySQL列类型所属的类别
+        返回: int/bool/decimal/float/date/datetime/text 之一
+        """
+        type_upper = str(mysql_type).strip().upper()
+        if type_upper in ("TINYINT(1)", "BOOL", "BOOLEAN"):
+            return "bool"
+        if re.match(r'^(TINYINT|SMALLINT|MEDIUMINT|INT|INTEGER|BIGINT)\b', type_upper):
+            return "int"
+        if type_upper.startswith(("DECIMAL", "NUMERIC")):
+            return "decimal"
+        if type_upper.startswith(("FLOAT", "DOUBLE", "REAL")):
+            return "float"
+        if type_upper.startswith(("DATETIME", "TIMESTAMP")):
+            return "datetime"
+        if type_upper.startswith("DATE"):
+            return "date"
+        return "text"
+
+    @staticmethod
+    def decimal_precision(mysql_type):
+        """DECIMAL(p,s) 的 (精度, 小数位)，未写明时按MySQL默认的 (10, 0)"""
+        match = re.search(r'\(\s*(\d+)\s*(?:,\s*(\d+)\s*)?\)', str(mysql_type))
+        if not match:
+            return 10, 0
+        return int(match.group(1)), int(match.group(2) or 0)
+
+    @staticmethod
+    def sqlite_type(mysql_type):
+        """MySQL列类型对应的SQLite类型亲和性"""
+        return {
+            "bool": "INTEGER",
+            "int": "INTEGER",
+            "decimal": "NUMERIC",
+            "float": "REAL",
+            "date": "TEXT",
+            "datetime": "TEXT",
+            "text": "TEXT",
+        }[SinkUtils.type_family(mysql_type)]
+
+    @staticmethod
+    def sqlite_value(value):
+        """把sqlite3不能直接绑定的值转换为文本"""
+        if value is None or isinstance(value, (int, float, str, bytes)):
+            return value
+        if isinstance(value, datetime.datetime):
+            return value.isoformat(sep=" ")
+        if isinstance(value, datetime.date):
+            return value.isoformat()
+        return str(value)
+
+    @staticmethod
+    def sql_literals(values):
+        """
+        把一列值转换为SQL字面量，结果与导入时 cursor.mogrify 的转义相同(pymysql.converters)
+        先按整列的值类型选择转换方式，整列只有字符串、整数或浮点数(及NULL)时不逐个判断类型
+        """
+        from pymysql.converters import escape_item, escape_string, escape_float
+
+        types = set(map(type, values))
+        types.discard(type(None))
+        if types <= {str}:
+            return ["NULL" if val is None else "'" + escape_string(val) + "'" for val in values]
+        if types <= {int}:
+            return ["NULL" if val is None else str(val) for val in values]
+        if types <= {float}:
+            # 与escape_float相同: 科学计数法形式，inf/nan按它的方式报错
+            literals = []
+            for val in values:
+                if val is None:
+                    literals.append("NULL")
+                    continue
+                if not math.isfinite(val):
+                    # escape_float对inf/nan报错，不把无效的字面量写入SQL文件
+                    literals.append(escape_float(val))
+                    continue
+                text = repr(val)
+                if "e" not in text:
+                    text += "e0"
+                literals.append(text)
+            return literals
+        return ["NULL" if val is None else escape_item(val, "utf8mb4") for val in values]
+
+    @staticmethod
+    def parquet_type(mysql_type):
+        """MySQL列类型对应的Arrow类型"""
+        family = SinkUtils.type_family(mysql_type)
+        if family == "bool":
+            return pa.bool_()
+        if family == "int":
+            return pa.uint64() if "BIGINT" in str(mysql_type).upper() and "UNSIGNED" in str(mysql_type).upper() else pa.int64()
+        if family == "decimal":
+            precision, scale = SinkUtils.decimal_precision(mysql_type)
+            return pa.decimal128(min(max(precision, 1), 38), min(scale, 38))
+        if family == "float":
+            return pa.float64()
+        if family == "date":
+            return pa.date32()
+        if family == "datetime":
+            return pa.timestamp("us")
+        return pa.string()
+
+
+class ImportSink:
+    """
+    导入输出的基类
+    open 在目标表结构确定后调用一次，write_rows 每批调用一次(rows 为与columns顺序一致的值列表)，
+    导入结束或出错时调用 close
+    """
+    kind = "sink"
+
+    def __init__(self, target):
+        self.target = target
+        self.rows = 0
+        self.batches = 0
+
+    def open(self, table_name, columns, column_types):
+        raise NotImplementedError
+
+    def write_rows(self, rows):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def summary(self):
+        """输出的统计，写入导入报告"""
+        return {"type": self.kind, "target": self.target, "rows": self.rows, "batches": self.batches}
+
+
+class MySQLSink(ImportSink):
+    """
+    输出到另一个MySQL库：建表后每批用一条executemany写入，pymysql会把它改写为多行INSERT
+    主导入目标仍由导入引擎按批次、检查点和重试写入；该输出用于把同一份数据再写一份
+    """
+    kind = "mysql"
+
+    def __init__(self, mysql_conn_info, table_name=None, connect_func=None):
+        super().__init__(f"{mysql_conn_info['database']}@{mysql_conn_info['host']}:{mysql_conn_info['port']}")
+        self.mysql_conn_info = mysql_conn_info
+        self.table_name = table_name
+        self.connect_func = connect_func
+        self.conn = None
+        self.sql = None
+
+    def open(self, table_name, columns, column_types):
+        import pymysql
+        from data_importer.utils.db_utils import DbUtils
+
+        connect = self.connect_func or pymysql.connect
+        info = self.mysql_conn_info
+        self.conn = connect(host=info["host"], port=info["port"], user=info["user"], password=info["password"],
+                            database=info["database"], charset='utf8mb4', use_unicode=True)
+        self.table_name = self.table_name or table_name
+        column_defs = [DbUtils.escape_sql_identifier(col) + " " + type_str for col, type_str in zip(columns, column_types)]
+        if not DbUtils.execute_create_table(self.conn, self.table_name, column_defs):
+            raise Exception(f"创建表失败: {self.table_name}")
+        self.target += "/" + self.table_name
+        self.sql = ("INSERT INTO " + DbUtils.escape_sql_identifier(self.table_name) + " (" +
+                    ", ".join(DbUtils.escape_sql_identifier(col) for col in columns) + ") VALUES (" +
+                    ", ".join(["%s"] * len(columns)) + ")")
+
+    def write_rows(self, rows):
+        cursor = self.conn.cursor()
+        try:
+            cursor.executemany(self.sql, rows)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        self.rows += len(rows)
+        self.batches += 1
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class SQLiteSink(ImportSink):
+    """
+    输出到SQLite文件：导入期间关闭同步写盘，在大事务中用executemany写入，每 commit_rows 行提交一次
+    """
+    kind = "sqlite"
+    DEFAULT_COMMIT_ROWS = 200000
+
+    def __init__(self, path, table_name=None, commit_rows=None):
+        super().__init__(path)
+        self.path = path
+        self.table_name = table_name
+        self.commit_rows = commit_rows or self.DEFAULT_COMMIT_ROWS
+        self.conn = None
+        self.sql = None
+        self.pending = 0
+
+    @staticmethod
+    def _quote(identifier):
+        return '"' + str(identifier).replace('"', '""') + '"'
+
+    def open(self, table_name, columns, column_types):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.table_name = self.table_name or table_name
+        # 自行管理事务，导入期间不逐条同步到磁盘
+        self.conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("PRAGMA journal_mode=MEMORY")
+
+        column_defs = ", ".join(self._quote(col) + " " + SinkUtils.sqlite_type(type_str)
+                                for col, type_str in zip(columns, column_types))
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {self._quote(self.table_name)} ({column_defs})")
+        self.sql = (f"INSERT INTO {self._quote(self.table_name)} VALUES (" + ", ".join(["?"] * len(columns)) + ")")
+        self.target = f"{self.path}/{self.table_name}"
+        self.conn.execute("BEGIN")
+
+    def write_rows(self, rows):
+        try:
+            self.conn.executemany(self.sql, rows)
+        except (sqlite3.InterfaceError, sqlite3.ProgrammingError):
+            # 日期、Decimal等值不能直接绑定时，整批转换后重试
+            self.conn.executemany(self.sql, ([SinkUtils.sqlite_value(val) for val in row] for row in rows))
+        self.rows += len(rows)
+        self.batches += 1
+        self.pending += len(rows)
+        if self.pending >= self.commit_rows:
+            self.conn.execute("COMMIT")
+            self.conn.execute("BEGIN")
+            self.pending = 0
+
+    def close(self):
+        if self.conn is not None:
+            if self.conn.in_transaction:
+                self.conn.execute("COMMIT")
+            self.conn.close()
+            self.conn = None
+
+
+class ParquetSink(ImportSink):
+    """
+    输出到Parquet文件：按MySQL列类型确定Arrow模式，攒够 row_group_rows 行后按列构建并写出一个行组
+    """
+    kind = "parquet"
+    DEFAULT_ROW_GROUP_ROWS = 100000
+
+    def __init__(self, path, row_group_rows=None, compression="snappy"):
+        if not PYARROW_AVAILABLE:
+            raise ImportError("输出Parquet需要安装pyarrow: pip install pyarrow")
+        super().__init__(path)
+        self.path = path
+        self.row_group_rows = row_group_rows or self.DEFAULT_ROW_GROUP_ROWS
+        self.compression = compression
+        self.schema = None
+        self.families = None
+        self.writer = None
+        self.buffer = []
+        self.row_groups = 0
+
+    def open(self, table_name, columns, column_types):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.schema = pa.schema([pa.field(str(col), SinkUtils.parquet_type(type_str), nullable=True)
+                                 for col, type_str in zip(columns, column_types)])
+        self.families = [SinkUtils.type_family(type_str) for type_str in column_types]
+        self.writer = pq.ParquetWriter(self.path, self.schema, compression=self.compression)
+
+    def _convert(self, values, field, family):
+        """值与列类型不一致(如小数列中的float、日期列中的字符串)时逐个转换"""
+        if family == "decimal":
+            quantum = decimal.Decimal(1).scaleb(-field.type.scale)
+            return [None if val is None else decimal.Decimal(str(val)).quantize(quantum) for val in values]
+        if family in ("date", "datetime"):
+            import pandas as pd
+            converted = pd.to_datetime(pd.Series(values, dtype=object), errors="coerce")
+            if family == "date":
+                return [None if pd.isna(val) else val.date() for val in converted]
+            return [None if pd.isna(val) else val.to_pydatetime() for val in converted]
+        if family == "bool":
+            return [None if val is None else bool(val) for val in values]
+        if family == "int":
+            return [None if val is None else int(val) for val in values]
+        if family == "float":
+            return [None if val is None else float(val) for val in values]
+        return [None if val is None else str(val) for val in values]
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        arrays = []
+        for field, family, values in zip(self.schema, self.families, zip(*self.buffer)):
+            try:
+                arrays.append(pa.array(values, type=field.type))
+            except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+                try:
+                    arrays.append(pa.array(self._convert(values, field, family), type=field.type))
+                except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError, decimal.InvalidOperation) as e:
+                    raise ValueError(f"列 '{field.name}' 的值无法转换为 {field.type}: {e}")
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema), row_group_size=len(self.buffer))
+        self.row_groups += 1
+        self.buffer = []
+
+    def write_rows(self, rows):
+        self.buffer.extend(rows)
+        self.rows += len(rows)
+        self.batches += 1
+        if len(self.buffer) >= self.row_group_rows:
+            self._flush()
+
+    def close(self):
+        if self.writer is not None:
+            try:
+                self._flush()
+            finally:
+                self.writer.close()
+                self.writer = None
+
+    def summary(self):
+        result = super().summary()
+        result["row_groups"] = self.row_groups
+        return result
+
+
+class CsvSink(ImportSink):
+    """输出到CSV文件：表头为数据库列名，每批用一次writerows写入，默认带BOM便于Excel打开"""
+    kind = "csv"
+
+    def __init__(self, path, encoding="utf-8-sig"):
+        super().__init__(path)
+        self.path = path
+        self.encoding = encoding
+        self.file = None
+        self.writer = None
+
+    def open(self, table_name, columns, column_types):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.file = open(self.path, "w", encoding=self.encoding, newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([str(col) for col in columns])
+
+    def write_rows(self, rows):
+        # csv模块把None写为空字符串
+        self.writer.writerows(rows)
+        self.rows += len(rows)
+        self.batches += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class SqlDumpSink(ImportSink):
+    """
+    输出为SQL脚本，供只能由DBA执行 mysql < file.sql 的库离线导入:
+    先写CREATE TABLE(与导入时的建表语句相同)，再写多行INSERT，每条语句不超过 max_statement_bytes 字节
+    路径以 .gz 结尾时gzip压缩。值的转义与导入时 cursor.mogrify 相同，每行只编码一次并直接写入文件
+    """
+    kind = "sql"
+    # 与mysqldump默认的net_buffer_length相同，远小于服务器和客户端默认的max_allowed_packet
+    DEFAULT_STATEMENT_BYTES = 1024 * 1024
+    # 每写入这么多行提交一次，避免执行脚本时出现一个超大事务
+    DEFAULT_COMMIT_ROWS = 100000
+    # 脚本只是传输用的中间文件，压缩级别1比默认的6快数倍，文件只大一些
+    DEFAULT_COMPRESSLEVEL = 1
+
+    def __init__(self, path, table_name=None, max_statement_bytes=None, commit_rows=None, compresslevel=None):
+        super().__init__(path)
+        self.path = path
+        self.table_name = table_name
+        self.max_statement_bytes = max_statement_bytes or self.DEFAULT_STATEMENT_BYTES
+        self.commit_rows = commit_rows or self.DEFAULT_COMMIT_ROWS
+        self.compresslevel = self.DEFAULT_COMPRESSLEVEL if compresslevel is None else compresslevel
+        self.file = None
+        self.prefix = None
+        self.parts = []
+        self.size = 0
+        self.pending = 0
+        self.statements = 0
+        self.bytes_written = 0
+
+    def open(self, table_name, columns, column_types):
+        from data_importer.utils.db_utils import DbUtils
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.table_name = self.table_name or table_name
+        if self.path.endswith(".gz"):
+            self.file = gzip.open(self.path, "wb", compresslevel=self.compresslevel)
+        else:
+            self.file = open(self.path, "wb")
+
+        column_defs = [DbUtils.escape_sql_identifier(col) + " " + type_str for col, type_str in zip(columns, column_types)]
+        header = [
+            f"-- data_importer SQL脚本: 表 {self.table_name}，生成于 {time.strftime('%Y-%m-%d %H:%M:%S')}",
+            "-- 执行: mysql --default-character-set=utf8mb4 DATABASE < FILE.sql",
+            "/*!40101 SET NAMES utf8mb4 */;",
+            "SET @OLD_UNIQUE_CHECKS=@@UNIQUE_CHECKS, UNIQUE_CHECKS=0;",
+            "SET @OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS=0;",
+            "SET @OLD_AUTOCOMMIT=@@AUTOCOMMIT, AUTOCOMMIT=0;",
+            DbUtils.build_create_table_sql(self.table_name, column_defs) + ";",
+            "",
+        ]
+        self._write("\n".join(header).encode("utf-8"))
+        self.prefix = ("INSERT INTO " + DbUtils.escape_sql_identifier(self.table_name) + " (" +
+                       ", ".join(DbUtils.escape_sql_identifier(col) for col in columns) + ") VALUES\n").encode("utf-8")
+        self.target = f"{self.path}/{self.table_name}"
+
+    def _write(self, data):
+        self.file.write(data)
+        self.bytes_written += len(data)
+
+    def _flush_statement(self):
+        """把攒下的行写成一条INSERT语句"""
+        if not self.parts:
+            return
+        self._write(self.prefix + b",\n".join(self.parts) + b";\n")
+        self.statements += 1
+        self.parts = []
+        self.size = len(self.prefix)
+        if self.pending >= self.commit_rows:
+            self._write(b"COMMIT;\n")
+            self.pending = 0
+
+    def write_rows(self, rows):
+        if not rows:
+            return
+        # 按列转换为字面量，再按行拼接
+        columns = [SinkUtils.sql_literals(values) for values in zip(*rows)]
+        limit = self.max_statement_bytes - 2
+        for literals in zip(*columns):
+            encoded = ("(" + ",".join(literals) + ")").encode("utf-8")
+            # 单行超过上限时单独成一条语句
+            if self.parts and self.size + len(encoded) + 2 > limit:
+                self._flush_statement()
+            if not self.parts:
+                self.size = len(self.prefix)
+            self.parts.append(encoded)
+            self.size += len(encoded) + 2
+            self.pending += 1
+        self.rows += len(rows)
+        self.batches += 1
+
+    def close(self):
+        if self.file is not None:
+            try:
+                self._flush_statement()
+                self._write(b"COMMIT;\n"
+                            b"SET AUTOCOMMIT=@OLD_AUTOCOMMIT;\n"
+                            b"SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS;\n"
+                            b"SET UNIQUE_CHECKS=@OLD_UNIQUE_CHECKS;\n")
+            finally:
+                self.file.close()
+                self.file = None
+
+    def summary(self):
+        result = super().summary()
+        result["statements"] = self.statements
+        result["bytes"] = self.bytes_written
+        return result
+
+
+class FanoutSink(ImportSink):
+    """
+    同时写入多个输出，每批数据只清洗一次
+    某个输出出错时记录错误并关闭它，其余输出继续写入
+    """
+    kind = "fanout"
+
+    def __init__(self, sinks, logger=None):
+        super().__init__(", ".join(sink.target for sink in sinks))
+        self.sinks = list(sinks)
+        self.logger = logger
+        self.errors = {}
+
+    @property
+    def active(self):
+        return [sink for sink in self.sinks if id(sink) not in self.errors]
+
+    def _fail(self, sink, stage, error):
+        message = f"输出 {sink.kind}:{sink.target} {stage}失败，已停止写入该输出: {error}"
+        self.errors[id(sink)] = message
+        print(message)
+        if self.logger:
+            self.logger.error(message)
+        try:
+            sink.close()
+        except Exception:
+            pass
+
+    def open(self, table_name, columns, column_types):
+        for sink in self.active:
+            try:
+                sink.open(table_name, columns, column_types)
+            except Exception as e:
+                self._fail(sink, "打开", e)
+        if not self.active:
+            raise Exception("所有输出都无法打开")
+
+    def write_rows(self, rows):
+        for sink in self.active:
+            try:
+                sink.write_rows(rows)
+            except Exception as e:
+                self._fail(sink, "写入", e)
+        self.rows += len(rows)
+        self.batches += 1
+
+    def close(self):
+        for sink in self.active:
+            try:
+                sink.close()
+            except Exception as e:
+                self._fail(sink, "关闭", e)
+
+    def summary(self):
+        results = []
+        for sink in self.sinks:
+            result = sink.summary()
+            result["error"] = self.errors.get(id(sink))
+            results.append(result)
+        return results
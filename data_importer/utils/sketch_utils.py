@@ -0,0 +1,163 @@
+"""
+列统计草图工具类
+分块扫描时用固定大小的草图累计每列的不同值个数(HyperLogLog)和数值分位数(均匀抽样)，
+各数据块的草图可以合并，内存占用与文件行数无关
+"""
+import numpy as np
+import pandas as pd
+
+
+class HyperLogLog:
+    """
+    HyperLogLog不同值计数，2^precision 个寄存器，相对误差约 1.04/sqrt(2^precision)
+    输入为64位哈希值(SketchUtils.hash_values)，同一个值在不同数据块中的哈希相同
+    """
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        if len(hashes) == 0:
+            return self
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.intp)
+        # 剩余位的前导零个数+1，末尾补一个1位使全零时的秩不超过 64-p+1
+        rest = (hashes << np.uint64(p)) | np.uint64(1 << (p - 1))
+        high = (rest >> np.uint64(32)).astype(np.float64)
+        low = (rest & np.uint64(0xFFFFFFFF)).astype(np.float64)
+        bit_length = np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+        np.maximum.at(self.registers, index, (65 - bit_length).astype(np.uint8))
+        return self
+
+    def merge(self, other):
+        """把另一个草图合并到当前草图，返回当前草图"""
+        if other is not None:
+            np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        m = len(self.registers)
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if zeros == m:
+            return 0
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+        # 基数较小时用线性计数，64位哈希不需要大基数修正
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+
+class QuantileSketch:
+    """
+    近似分位数：为每个值分配随机键，保留键最小的 size 个值，即全部值的均匀样本
+    两个草图合并后仍是合并数据的均匀样本；值的个数不超过 size 时结果是精确的
+    """
+
+    def __init__(self, size=4096, seed=None):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.keys = np.empty(0, dtype=np.float64)
+        self.values = np.empty(0, dtype=np.float64)
+        self.count = 0
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        self._keep(self.rng.random(len(values)), values)
+        return self
+
+    def merge(self, other):
+        """把另一个草图合并到当前草图，返回当前草图"""
+        if other is not None:
+            self.count += other.count
+            self._keep(other.keys, other.values)
+        return self
+
+    def _keep(self, keys, values):
+        if len(self.keys) >= self.size:
+            # 样本已满时只有键小于当前最大键的值可能进入样本
+            candidates = keys < self.keys.max()
+            keys, values = keys[candidates], values[candidates]
+        if len(keys) == 0:
+            return
+        keys = np.concatenate([self.keys, keys])
+        values = np.concatenate([self.values, values])
+        if len(keys) > self.size:
+            keep = np.argpartition(keys, self.size - 1)[:self.size]
+            keys, values = keys[keep], values[keep]
+        self.keys, self.values = keys, values
+
+    def quantiles(self, qs):
+        """各分位点的近似值，没有值时返回None"""
+        if len(self.values) == 0:
+            return None
+        return [float(v) for v in np.quantile(self.values, qs)]
+
+
+class SketchUtils:
+    # 导入报告中给出的分位点
+    QUANTILES = (0.01, 0.25, 0.5, 0.75, 0.99)
+
+    @staticmethod
+    def hash_values(series):
+        """
+        非空值的64位哈希，数值统一按浮点数计算，使各数据块中整数/浮点数类型不同的同一列哈希一致
+        """
+        if pd.api.types.is_bool_dtype(series.dtype) or pd.api.types.is_datetime64_any_dtype(series.dtype):
+            return pd.util.hash_pandas_object(series, index=False).to_numpy()
+        if pd.api.types.is_numeric_dtype(series.dtype):
+            return pd.util.hash_pandas_object(series.astype(np.float64), index=False).to_numpy()
+        # 文本列重复值多时先去重再哈希更快，几乎没有重复时直接逐个哈希更快
+        values = series.astype(str)
+        sample = values.head(1000)
+        categorize = sample.nunique() < len(sample) // 2
+        return pd.util.hash_pandas_object(values, index=False, categorize=categorize).to_numpy()
+
+    @staticmethod
+    def column_statistics(column_profiles):
+        """
+        由 DataUtils.profile_dataframe 的统计信息(含草图)计算每列的近似统计，结果可写入JSON报告
+        返回: {列名: {"rows", "nulls", "distinct", "selectivity", "max_len", "avg_len", "quantiles"}}，
+              selectivity 为不同值个数/非空行数，quantiles 为 {"p1": 值, ...}(仅数值列)
+        """
+        stats = {}
+        for col, profile in column_profiles.items():
+            non_null = profile["non_null"]
+            distinct = profile["hll"].estimate() if profile.get("hll") is not None else None
+            if distinct is not None:
+                # 估计值可能略大于非空行数
+                distinct = min(distinct, non_null)
+            quantiles = None
+            if profile.get("quantile_sketch") is not None:
+                values = profile["quantile_sketch"].quantiles(SketchUtils.QUANTILES)
+                if values is not None:
+                    quantiles = {f"p{q * 100:g}": v for q, v in zip(SketchUtils.QUANTILES, values)}
+            stats[col] = {
+                "rows": profile["count"],
+                "nulls": profile["nulls"],
+                "distinct": distinct,
+                "selectivity": round(distinct / non_null, 4) if distinct is not None and non_null else None,
+                "max_len": profile.get("max_len"),
+                "avg_len": round(profile["total_len"] / non_null, 1) if profile.get("total_len") is not None and non_null else None,
+                "quantiles": quantiles
+            }
+        return stats
+
+    @staticmethod
+    def format_column_statistics(stats):
+        """把 column_statistics 的结果格式化为逐行文本"""
+        lines = []
+        for col, stat in stats.items():
+            line = f"{col}: 约 {stat['distinct']} 个不同值"
+            if stat["selectivity"] is not None:
+                line += f"(选择性 {stat['selectivity']:.2%})"
+            if stat["nulls"]:
+                line += f", {stat['nulls']} 个空值"
+            if stat["quantiles"]:
+                line += ", " + ", ".join(f"{name}={value:g}" for name, value in stat["quantiles"].items())
+            lines.append(line)
+        return lines
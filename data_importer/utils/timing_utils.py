@@ -0,0 +1,150 @@
+"""
+导入阶段计时工具类
+按阶段名累计耗时(探测、解析、预处理、清洗、编码、执行、提交等)，写入导入报告和日志；
+可选用cProfile记录整个导入的调用耗时，定位慢导入的时间花在哪里
+"""
+import time
+import threading
+import contextlib
+import contextvars
+import collections
+
+# 当前导入的计时器，FileUtils/DbUtils中的计时点通过它找到所属的导入
+_active_timer = contextvars.ContextVar("data_importer_stage_timer", default=None)
+
+
+class StageTimer:
+    """
+    单次导入的分阶段计时器，可在导入线程、解析线程和清洗线程中同时使用
+    后台线程中的阶段(解析、清洗)与写入并行，各阶段耗时之和可能超过总用时
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+        # 正在进行的阶段，供内存采样把峰值计入这些阶段
+        self.active = collections.Counter()
+        # 分阶段内存采样器(StageMemoryProfiler)，阶段开始和结束时各采样一次
+        self.memory = None
+
+    @contextlib.contextmanager
+    def span(self, name):
+        with self.lock:
+            self.active[name] += 1
+        memory = self.memory
+        if memory is not None:
+            memory.sample()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if memory is not None:
+                memory.sample()
+            with self.lock:
+                self.active[name] -= 1
+                if self.active[name] <= 0:
+                    del self.active[name]
+            self.add(name, elapsed)
+
+    def active_stages(self):
+        """当前正在进行的阶段名"""
+        with self.lock:
+            return set(self.active)
+
+    def add(self, name, seconds):
+        with self.lock:
+            stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+            stage["seconds"] += seconds
+            stage["calls"] += 1
+
+    def summary(self):
+        """各阶段的累计耗时和次数，按导入流程的顺序排列"""
+        with self.lock:
+            order = [name for name in TimingUtils.STAGES if name in self.stages]
+            order += [name for name in self.stages if name not in TimingUtils.STAGES]
+            return {name: dict(self.stages[name]) for name in order}
+
+
+class TimingUtils:
+    # 阶段名及说明，按导入流程的顺序
+    STAGES = {
+        "probe": "探测编码/分隔符",
+        "parse": "解析文件",
+        "preprocess": "预处理",
+        "normalize": "规范化列名",
+        "profile": "列统计",
+        "infer": "推断类型",
+        "create_table": "建表",
+        "sort": "按主键排序",
+        "dedup": "去重",
+        "clean": "清洗数据",
+        "validate": "预校验",
+        "encode": "构建SQL",
+        "execute": "执行SQL",
+        "commit": "提交事务",
+        "sink": "写入附加输出",
+        "verify": "校验数据",
+        "merge": "合并到目标表",
+        "index_build": "创建索引",
+        "analyze": "更新统计信息",
+    }
+
+    @staticmethod
+    def activate(timer):
+        """把计时器设为当前线程(及由它复制上下文的线程)的计时器，返回用于 deactivate 的令牌"""
+        return _active_timer.set(timer)
+
+    @staticmethod
+    def deactivate(token):
+        _active_timer.reset(token)
+
+    @staticmethod
+    def span(name):
+        """
+        在当前导入的计时器中记录一个阶段的耗时，没有进行中的导入时不做任何事
+        用法: with TimingUtils.span("parse"): ...
+        """
+        timer = _active_timer.get()
+        if timer is None:
+            return contextlib.nullcontext()
+        return timer.span(name)
+
+    @staticmethod
+    def format_timings(timings, total_seconds=None):
+        """把 StageTimer.summary() 的结果格式化为逐行文本"""
+        lines = []
+        for name, stage in timings.items():
+            line = f"{TimingUtils.STAGES.get(name, name)}({name}): {stage['seconds']:.3f}秒"
+            if stage["calls"] > 1:
+                line += f", {stage['calls']} 次"
+            if total_seconds:
+                line += f", {stage['seconds'] / total_seconds * 100:.1f}%"
+            lines.append(line)
+        return lines
+
+    @staticmethod
+    @contextlib.contextmanager
+    def profile(path):
+        """
+        用cProfile记录代码块的调用耗时，结束后写入pstats文件(path)和按累计耗时排序的文本(path.txt)
+        path为空时不做任何事。只记录调用线程，后台解析/清洗线程的耗时见分阶段计时
+        """
+        if not path:
+            yield
+            return
+
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+            with open(path + ".txt", "w", encoding="utf-8") as f:
+                stats = pstats.Stats(profiler, stream=f)
+                stats.sort_stats("cumulative").print_stats(50)
+            print(f"性能分析结果已写入: {path} (文本摘要: {path}.txt)")
@@ -4,10 +4,26 @@ import re
 import tkinter as tk
 from tkinter import Tk, filedialog, StringVar, OptionMenu, messagebox, Text, Scrollbar, Frame, ttk
 from datetime import datetime
-import pandas as pd
 from data_importer.utils.config_utils import ConfigUtils
+from data_importer.utils.timing_utils import TimingUtils
 
 class UiUtils:
+    # 导入模式选项：显示名称 -> 模式代码
+    IMPORT_MODES = {
+        "新建表": "create",
+        "合并到已有表": "merge",
+        "追加到已有表": "append",
+        "全量替换已有表": "reload"
+    }
+    
+    # 预校验策略: 值超出目标列类型时的处理方式
+    VALIDATE_POLICIES = {
+        "拒绝整行": "reject",
+        "截断或限定到类型范围": "truncate",
+        "置为NULL": "coerce",
+        "不检查": "off"
+    }
+
     @staticmethod
     def select_file():
         """选择Excel或CSV文件"""
@@ -205,8 +221,14 @@ class UiUtils:
         return result if result else None
 
     @staticmethod
-    def confirm_column_mapping(preview_info, table_name, column_mappings):
-        """显示列映射预览并请求用户确认，支持修改数据类型"""
+    def confirm_column_mapping(preview_info, table_name, column_mappings, partition_candidates=None,
+                               index_candidates=None, dimension_candidates=None):
+        """
+        显示列映射预览并请求用户确认，支持修改数据类型
+        partition_candidates: PartitionUtils.propose_partitions 给出的 {列名: 分区方案}，可选择其一
+        index_candidates: IndexUtils.propose_indexes 建议的索引，可选择导入后创建
+        dimension_candidates: DimensionUtils.propose_dimensions 建议拆分到维度表的列，默认填入输入框
+        """
         dialog = tk.Tk()
         dialog.title(f"列映射预览 - {table_name}")
         dialog.geometry("800x600")
@@ -296,14 +318,120 @@ class UiUtils:
         ref_label = tk.Label(ref_frame, text=ref_types, justify="left")
         ref_label.pack(anchor="w")
         
+        # 导入模式设置
+        mode_frame = Frame(dialog)
+        mode_frame.pack(fill="x", padx=20, pady=5)
+        
+        tk.Label(mode_frame, text="导入模式:").grid(row=0, column=0, padx=5, sticky="w")
+        mode_var = StringVar(dialog)
+        mode_var.set("新建表")
+        mode_menu = OptionMenu(mode_frame, mode_var, *UiUtils.IMPORT_MODES.keys())
+        mode_menu.grid(row=0, column=1, padx=5, sticky="w")
+        
+        tk.Label(mode_frame, text="目标表:").grid(row=0, column=2, padx=5, sticky="w")
+        target_entry = tk.Entry(mode_frame, width=20)
+        target_entry.grid(row=0, column=3, padx=5, sticky="w")
+        
+        tk.Label(mode_frame, text="业务键(逗号分隔):").grid(row=1, column=2, padx=5, sticky="w")
+        key_entry = tk.Entry(mode_frame, width=20)
+        key_entry.grid(row=1, column=3, padx=5, sticky="w")
+        
+        keep_old_var = tk.BooleanVar(dialog, value=False)
+        tk.Checkbutton(mode_frame, text="全量替换时保留旧表用于回滚", variable=keep_old_var).grid(
+            row=1, column=0, columnspan=2, padx=5, sticky="w")
+        
+        # 分区方案（仅新建表时生效）
+        partition_options = {"不分区": None}
+        for col, spec in (partition_candidates or {}).items():
+            partition_options[f"{col} - {spec['description']}"] = col
+        
+        tk.Label(mode_frame, text="分区(仅新建表):").grid(row=2, column=0, padx=5, sticky="w")
+        partition_var = StringVar(dialog)
+        partition_var.set("不分区")
+        partition_menu = OptionMenu(mode_frame, partition_var, *partition_options.keys())
+        partition_menu.grid(row=2, column=1, columnspan=3, padx=5, sticky="w")
+        
+        # 建议的索引(按扫描时估计的选择性)
+        create_indexes_var = tk.BooleanVar(dialog, value=False)
+        if index_candidates:
+            index_columns = ", ".join(str(candidate["column"]) for candidate in index_candidates)
+            tk.Checkbutton(mode_frame, text=f"导入后创建建议的索引: {index_columns}", variable=create_indexes_var).grid(
+                row=3, column=0, columnspan=4, padx=5, sticky="w")
+        
+        # 维度表列(仅新建表)，默认不拆分，建议的列显示在输入框后面
+        tk.Label(mode_frame, text="维度表列(逗号分隔，仅新建表):").grid(row=4, column=0, padx=5, sticky="w")
+        dimension_entry = tk.Entry(mode_frame, width=30)
+        dimension_entry.grid(row=4, column=1, columnspan=2, padx=5, sticky="w")
+        if dimension_candidates:
+            tk.Label(mode_frame, text="建议: " + ", ".join(str(col) for col in dimension_candidates)).grid(
+                row=4, column=3, padx=5, sticky="w")
+        
+        # 主键(仅新建表): auto 添加自增代理主键，列名为自然主键并按主键顺序写入
+        tk.Label(mode_frame, text="主键(auto或逗号分隔的列，仅新建表):").grid(row=5, column=0, padx=5, sticky="w")
+        primary_key_entry = tk.Entry(mode_frame, width=30)
+        primary_key_entry.grid(row=5, column=1, columnspan=2, padx=5, sticky="w")
+        
+        # 去重键: 跳过键已在写入的表中(追加模式)或在文件中重复的行
+        tk.Label(mode_frame, text="去重键(逗号分隔):").grid(row=6, column=0, padx=5, sticky="w")
+        dedup_entry = tk.Entry(mode_frame, width=30)
+        dedup_entry.grid(row=6, column=1, columnspan=2, padx=5, sticky="w")
+        
+        # 追加模式: 文件中新增的列和取值超出原类型的列用一条 ALTER TABLE 修改目标表
+        evolve_schema_var = tk.BooleanVar(dialog, value=True)
+        tk.Checkbutton(mode_frame, text="追加时为新增的列和更宽的值修改目标表结构", variable=evolve_schema_var).grid(
+            row=7, column=0, columnspan=4, padx=5, sticky="w")
+        
+        # 预校验: 超长、超出范围、无法转换的值在写入前处理，避免整批插入失败
+        tk.Label(mode_frame, text="值超出列类型时:").grid(row=8, column=0, padx=5, sticky="w")
+        validate_var = StringVar(dialog)
+        validate_var.set("拒绝整行")
+        validate_menu = OptionMenu(mode_frame, validate_var, *UiUtils.VALIDATE_POLICIES.keys())
+        validate_menu.grid(row=8, column=1, columnspan=2, padx=5, sticky="w")
+        
         # 创建一个变量存储结果
         result = {"confirmed": False, "types": {}}
         
         def on_confirm():
+            mode = UiUtils.IMPORT_MODES[mode_var.get()]
+            target_table = target_entry.get().strip()
+            key_columns = [k.strip() for k in key_entry.get().split(",") if k.strip()]
+            dimension_columns = [c.strip() for c in dimension_entry.get().split(",") if c.strip()]
+            primary_key = primary_key_entry.get().strip()
+            if primary_key and primary_key.lower() != "auto":
+                primary_key = [c.strip() for c in primary_key.split(",") if c.strip()]
+            dedup_columns = [c.strip() for c in dedup_entry.get().split(",") if c.strip()]
+            
+            if mode == "merge" and (not target_table or not key_columns):
+                messagebox.showerror("错误", "合并模式需要填写目标表和业务键！", parent=dialog)
+                return
+            if mode == "reload" and not target_table:
+                messagebox.showerror("错误", "全量替换模式需要填写目标表！", parent=dialog)
+                return
+            if mode == "append" and not target_table:
+                messagebox.showerror("错误", "追加模式需要填写目标表！", parent=dialog)
+                return
+            if dimension_columns and mode != "create":
+                messagebox.showerror("错误", "维度表只能用于新建表模式！", parent=dialog)
+                return
+            if primary_key and mode != "create":
+                messagebox.showerror("错误", "主键只能用于新建表模式！", parent=dialog)
+                return
+            
             # 收集所有修改后的类型信息
             for col_name, entry in type_entries:
                 result["types"][col_name] = entry.get().strip()
             
+            result["mode"] = mode
+            result["target_table"] = target_table
+            result["key_columns"] = key_columns
+            result["keep_old"] = keep_old_var.get()
+            result["partition_column"] = partition_options[partition_var.get()]
+            result["create_indexes"] = create_indexes_var.get()
+            result["dimension_columns"] = dimension_columns
+            result["primary_key"] = "auto" if isinstance(primary_key, str) and primary_key else primary_key or None
+            result["dedup_columns"] = dedup_columns
+            result["evolve_schema"] = evolve_schema_var.get()
+            result["validate"] = UiUtils.VALIDATE_POLICIES[validate_var.get()]
             result["confirmed"] = True
             dialog.destroy()
         
@@ -324,6 +452,16 @@ class UiUtils:
         
         return result
 
+    @staticmethod
+    def ask_resume_import(checkpoint):
+        """发现未完成的导入时，询问用户是否从断点继续"""
+        message = "检测到该文件有未完成的导入:\n\n"
+        message += f"目标表: {checkpoint['table_name']}\n"
+        message += f"已提交: {checkpoint.get('offset', 0)}/{checkpoint.get('total_rows', '?')} 行\n"
+        message += f"更新时间: {checkpoint.get('updated_at', '未知')}\n\n"
+        message += "是否从断点继续导入？\n选择'否'将重新导入到新表。"
+        return messagebox.askyesno("断点续传", message)
+
     @staticmethod
     def show_import_report(report):
         """显示导入报告"""
@@ -347,6 +485,66 @@ class UiUtils:
         stats_text += f"失败: {report['error_rows']} 行\n"
         stats_text += f"成功率: {report['success_rate']:.2f}%"
         
+        # 合并模式统计
+        if report.get("merge"):
+            merge = report["merge"]
+            stats_text += f"\n合并结果: 新增 {merge['inserted']} 行, 更新 {merge['updated']} 行, 未变化 {merge['unchanged']} 行"
+            if merge.get("duplicates"):
+                stats_text += f", 业务键重复的 {merge['duplicates']} 行按最后出现的行合并"
+        
+        # 全量替换统计
+        if report.get("reload"):
+            reload_info = report["reload"]
+            stats_text += f"\n全量替换: 已原子切换到新数据, 重建索引 {reload_info['indexes_built']} 个"
+            if reload_info["old_table"]:
+                stats_text += f", 旧数据保留在 {reload_info['old_table']}"
+        
+        # 分区方案
+        if report.get("partition"):
+            stats_text += f"\n分区: {report['partition']['column']} - {report['partition']['description']}"
+        
+        # 主键
+        if report.get("primary_key"):
+            primary_key = report["primary_key"]
+            stats_text += f"\n{'代理主键' if primary_key['kind'] == 'surrogate' else '自然主键(按主键顺序写入)'}: " + \
+                ", ".join(str(col) for col in primary_key["columns"])
+        
+        # 维度表
+        if report.get("dimensions"):
+            dimension_columns = ", ".join(str(col) for col in report["dimensions"]["tables"])
+            stats_text += f"\n维度列: {dimension_columns}，按原来的列查询视图 {report['dimensions']['view']}"
+        
+        # 去重
+        if report.get("dedup"):
+            dedup = report["dedup"]
+            stats_text += f"\n去重({', '.join(str(col) for col in dedup['columns'])}): 跳过表中已有的 {dedup['skipped_existing']} 行, " + \
+                f"文件中重复的 {dedup['skipped_in_file']} 行"
+        
+        # 表结构变更
+        if report.get("schema_evolution"):
+            evolution = report["schema_evolution"]
+            if evolution["added"]:
+                stats_text += "\n新增列: " + ", ".join(f"{col} {type_str}" for col, type_str in evolution["added"])
+            if evolution["modified"]:
+                stats_text += "\n放宽类型: " + ", ".join(f"{col} {old} -> {new}" for col, old, new in evolution["modified"])
+        
+        # 预校验
+        if report.get("validation"):
+            validation = report["validation"]
+            fixed = validation["fixed_cells"]
+            stats_text += f"\n预校验: 拒绝 {validation['rejected_rows']} 行, 截断 {fixed['truncated']} 个值, " + \
+                f"限定到类型范围 {fixed['clamped']} 个值, 置为NULL {fixed['nulled']} 个值"
+        
+        # 拒绝的行
+        if report.get("rejects"):
+            stats_text += f"\n拒绝的行已写入: {report['rejects']['file']}"
+        
+        # 索引建议
+        index_advice = report.get("index_advice") or {}
+        if index_advice.get("indexes"):
+            names = ", ".join(f"{index['name']}({index['column']})" for index in index_advice["indexes"])
+            stats_text += f"\n{'已创建' if index_advice['created'] else '建议创建'}索引: {names}"
+        
         tk.Label(stats_frame, text=stats_text, justify="left").pack(anchor="w")
         
         # 创建分隔线
@@ -379,6 +577,22 @@ class UiUtils:
             else:
                 mapping_text += f"{orig} -> {curr} ({type_str})\n"
         
+        # 各阶段耗时
+        if report.get("timings"):
+            total_time = report.get("performance", {}).get("total_time_seconds")
+            mapping_text += "\n各阶段耗时 (解析/清洗在后台线程中与写入并行):\n"
+            mapping_text += "----------------------------------------\n"
+            for line in TimingUtils.format_timings(report["timings"], total_time):
+                mapping_text += line + "\n"
+        
+        # 各阶段内存峰值
+        if report.get("memory_profile"):
+            from data_importer.utils.memory_utils import MemoryUtils
+            mapping_text += "\n各阶段内存峰值:\n"
+            mapping_text += "----------------------------------------\n"
+            for line in MemoryUtils.format_memory_profile(report["memory_profile"]):
+                mapping_text += line + "\n"
+        
         text_area.insert("1.0", mapping_text)
         text_area.config(state="disabled")  # 设为只读
         
@@ -0,0 +1,312 @@
+"""
+预校验工具类
+写入前按表中的列类型整列检查清洗后的值：文本长度、整数/DECIMAL/FLOAT的取值范围、数值和日期能否转换、NOT NULL，
+按策略截断、置为NULL或写入拒绝文件，使批次不会因为个别值被服务器拒绝而改为逐行插入
+"""
+import re
+import datetime
+import threading
+import collections
+
+import numpy as np
+import pandas as pd
+
+from data_importer.utils.schema_utils import SchemaUtils
+
+
+class ValidateUtils:
+    # 处理策略: reject 整行写入拒绝文件，truncate 截断或限定到类型的范围，coerce 置为NULL，off 不检查
+    POLICIES = ("reject", "truncate", "coerce", "off")
+    DEFAULT_POLICY = "reject"
+    # 各类问题及严格模式下服务器返回的错误号，拒绝的行按该错误号写入拒绝文件
+    PROBLEMS = {
+        "too_long": (1406, "超长"),
+        "out_of_range": (1264, "超出范围"),
+        "invalid": (1366, "不是有效的数值"),
+        "bad_date": (1292, "不是有效的日期"),
+        "null": (1048, "不能为空"),
+    }
+    FLOAT_MAX = 3.402823466e38
+    # TIMESTAMP的取值范围，两端各留一天，不受会话时区影响
+    TIMESTAMP_RANGE = (datetime.datetime(1970, 1, 2), datetime.datetime(2038, 1, 18))
+    # 按字节计算长度上限的文本类型
+    TEXT_BYTES = {"TINYTEXT": 255, "TEXT": 65535, "MEDIUMTEXT": 16777215, "LONGTEXT": 4294967295}
+
+    @staticmethod
+    def column_rule(type_str):
+        """
+        按列类型生成检查规则，不需要检查的类型返回None
+        返回: {"kind": "string"|"int"|"decimal"|"float"|"date", "type", ...}
+        """
+        if not type_str:
+            return None
+        t = SchemaUtils.normalize_type(type_str)
+        if t in ValidateUtils.TEXT_BYTES:
+            return {"kind": "string", "type": t, "capacity": ValidateUtils.TEXT_BYTES[t], "bytes": True}
+        match = re.match(r'^(VAR)?CHAR\((\d+)\)', t)
+        if match:
+            return {"kind": "string", "type": t, "capacity": int(match.group(2)), "bytes": False}
+        base = t.split()[0]
+        if t == "TINYINT(1)" or base in SchemaUtils.INTEGER_RANGES:
+            low, high = SchemaUtils._integer_range(t if t == "TINYINT(1)" else " ".join(t.split()[:2]))
+            return {"kind": "int", "type": t, "low": low, "high": high}
+        spec = SchemaUtils._decimal_spec(t)
+        if spec:
+            return {"kind": "decimal", "type": t, "limit": 10 ** spec[0], "scale": spec[1]}
+        if base in ("FLOAT", "DOUBLE", "REAL"):
+            return {"kind": "float", "type": t, "limit": ValidateUtils.FLOAT_MAX if base == "FLOAT" else None}
+        if base in ("DATE", "DATETIME", "TIMESTAMP"):
+            return {"kind": "date", "type": t,
+                    "range": ValidateUtils.TIMESTAMP_RANGE if base == "TIMESTAMP" else None}
+        return None
+
+    @staticmethod
+    def table_columns(conn, table_name):
+        """
+        表中各列的类型和可否为空
+        返回: [(列名, 列类型, 可否为NULL), ...]，表不存在时返回空列表
+        """
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE FROM INFORMATION_SCHEMA.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION",
+            (table_name,)
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+        return [(row[0], row[1], row[2] == "YES") for row in rows]
+
+    @staticmethod
+    def _numbers(values):
+        """转换为浮点数数组，空值和无法转换的值为NaN；返回 (数组, 无法转换的非空值掩码)"""
+        series = pd.Series(values, dtype=object)
+        numbers = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        invalid = np.isnan(numbers) & series.notna().to_numpy()
+        return numbers, invalid
+
+    @staticmethod
+    def _check_string(rule, values):
+        series = pd.Series(values, dtype=object)
+        present = series[series.notna()]
+        if present.empty:
+            return []
+        texts = present if pd.api.types.infer_dtype(present, skipna=True) == "string" else present.map(str)
+        lengths = texts.str.len()
+        capacity = rule["capacity"]
+        if rule["bytes"]:
+            # 一个字符最多4字节，只有字符数超过上限的四分之一时才需要计算字节数
+            candidates = lengths > capacity // 4
+            lengths = lengths.copy()
+            lengths[candidates] = texts[candidates].str.encode("utf-8").str.len()
+        over = lengths > capacity
+        if not over.any():
+            return []
+        positions = over.index[over.to_numpy()].to_numpy()
+        fixed = [ValidateUtils._cut(text, capacity, rule["bytes"]) for text in texts[over].tolist()]
+        return [("too_long", positions, fixed)]
+
+    @staticmethod
+    def _cut(text, capacity, in_bytes):
+        if not in_bytes:
+            return text[:capacity]
+        return text.encode("utf-8")[:capacity].decode("utf-8", errors="ignore")
+
+    @staticmethod
+    def _check_number(rule, values):
+        numbers, invalid = ValidateUtils._numbers(values)
+        problems = []
+        if invalid.any():
+            positions = np.flatnonzero(invalid)
+            problems.append(("invalid", positions, [None] * len(positions)))
+
+        if rule["kind"] == "int":
+            # 服务器先四舍五入再检查范围
+            low, high = rule["low"], rule["high"]
+            over = (numbers < low - 0.5) | (numbers >= high + 0.5)
+            positions = np.flatnonzero(over)
+            # 浮点数表示不了BIGINT边界附近的整数，被判为超出范围的Python整数再精确比较一次
+            positions = np.array([pos for pos in positions.tolist()
+                                  if not (type(values[pos]) is int and low <= values[pos] <= high)], dtype=np.intp)
+            fixed = [low if numbers[pos] < 0 else high for pos in positions.tolist()]
+        elif rule["kind"] == "decimal":
+            limit = rule["limit"]
+            with np.errstate(invalid="ignore"):
+                over = np.abs(np.round(numbers, rule["scale"])) >= limit
+            positions = np.flatnonzero(over)
+            largest = limit - 10 ** -rule["scale"] if rule["scale"] else limit - 1
+            fixed = [-largest if numbers[pos] < 0 else largest for pos in positions.tolist()]
+        elif rule["limit"] is not None:
+            with np.errstate(invalid="ignore"):
+                over = np.abs(numbers) > rule["limit"]
+            positions = np.flatnonzero(over)
+            fixed = [-rule["limit"] if numbers[pos] < 0 else rule["limit"] for pos in positions.tolist()]
+        else:
+            positions = np.empty(0, dtype=np.intp)
+            fixed = []
+        if len(positions):
+            problems.append(("out_of_range", positions, fixed))
+        return problems
+
+    @staticmethod
+    def _check_date(rule, values):
+        # 清洗时已把常见格式的日期文本转换为datetime，这里只解析剩下的文本和数值(YYYYMMDD、YYYYMMDDhhmmss)
+        others = [(pos, value) for pos, value in enumerate(values)
+                  if value is not None and not isinstance(value, (datetime.date, np.datetime64))]
+        problems = []
+        if others:
+            texts = []
+            for _, value in others:
+                if isinstance(value, (bool, np.bool_)):
+                    texts.append("")
+                elif isinstance(value, (int, float, np.number)):
+                    text = str(int(value)) if float(value).is_integer() else ""
+                    texts.append(text if len(text) in (8, 14) else "")
+                else:
+                    texts.append(str(value))
+            # 只判断能否解析，带时区的文本统一换算为UTC，避免混合时区时报错
+            parsed = pd.to_datetime(pd.Series(texts, dtype=object), errors="coerce", format="mixed", utc=True)
+            bad = parsed.isna().to_numpy()
+            if bad.any():
+                positions = np.array([pos for (pos, _), failed in zip(others, bad) if failed], dtype=np.intp)
+                problems.append(("bad_date", positions, [None] * len(positions)))
+        if rule["range"]:
+            low, high = rule["range"]
+            positions = np.array([pos for pos, value in enumerate(values)
+                                  if isinstance(value, datetime.datetime) and not low <= value <= high], dtype=np.intp)
+            if len(positions):
+                problems.append(("out_of_range", positions, [None] * len(positions)))
+        return problems
+
+    @staticmethod
+    def check_column(rule, values):
+        """
+        检查一列的值
+        返回: [(问题, 行位置数组, 截断策略下的替换值列表), ...]，同一个值只属于一个问题
+        """
+        if rule["kind"] == "string":
+            return ValidateUtils._check_string(rule, values)
+        if rule["kind"] == "date":
+            return ValidateUtils._check_date(rule, values)
+        return ValidateUtils._check_number(rule, values)
+
+    @staticmethod
+    def format_validation(summary):
+        """把 ChunkValidator.summary 的结果格式化为逐行文本"""
+        fixed = summary["fixed_cells"]
+        line = f"预校验(策略 {summary['policy']}，检查 {summary['columns']} 列): 拒绝 {summary['rejected_rows']} 行"
+        if any(fixed.values()):
+            line += f"，截断 {fixed['truncated']} 个值，限定到类型范围 {fixed['clamped']} 个值，置为NULL {fixed['nulled']} 个值"
+        lines = [line]
+        for col, counts in summary["problems"].items():
+            lines.append(f"  列 {col}: " + ", ".join(f"{ValidateUtils.PROBLEMS[problem][1]} {count}"
+                                                    for problem, count in counts.items()))
+        return lines
+
+
+class ChunkValidator:
+    """
+    清洗线程中逐块校验清洗后的行，按策略就地修正值或把整行转为清洗错误；
+    后台清洗线程与读取报告的主线程共用一个实例，计数在锁内累加
+    """
+
+    def __init__(self, columns, column_types, policy=ValidateUtils.DEFAULT_POLICY, not_null=()):
+        """
+        参数:
+            columns: 行值对应的列
+            column_types: 与columns对应的表中类型，None表示不检查该列
+            policy: ValidateUtils.POLICIES 之一
+            not_null: 不允许为NULL的列
+        """
+        self.columns = list(columns)
+        self.policy = policy
+        self.rules = []
+        for pos, (col, type_str) in enumerate(zip(self.columns, column_types)):
+            rule = ValidateUtils.column_rule(type_str)
+            if rule is not None or col in not_null:
+                self.rules.append((pos, col, rule, col in not_null))
+        self.lock = threading.Lock()
+        self.rejected_rows = 0
+        self.fixed_cells = collections.Counter({"truncated": 0, "clamped": 0, "nulled": 0})
+        self.problems = collections.defaultdict(collections.Counter)
+
+    def validate(self, rows, errors, offset):
+        """
+        校验一个数据块清洗后的行
+
+        参数:
+            rows: 清洗后的行列表(就地修改)
+            errors: 清洗错误 [(源数据行偏移, 错误信息)]
+            offset: 数据块的起始偏移
+
+        返回:
+            (保留的行, 清洗错误加上被拒绝的行)，被拒绝的行的错误信息以服务器的错误号开头
+        """
+        if not rows or not self.rules:
+            return rows, errors
+        rejected = {}
+        fixed = collections.Counter()
+        problems = collections.defaultdict(collections.Counter)
+        for pos, col, rule, not_null in self.rules:
+            values = [row[pos] for row in rows]
+            found = ValidateUtils.check_column(rule, values) if rule else []
+            nulled = []
+            for problem, positions, replacements in found:
+                problems[col][problem] += len(positions)
+                if self.policy == "reject":
+                    for i in positions.tolist():
+                        rejected.setdefault(i, self._message(problem, col, rule, values[i]))
+                    continue
+                if self.policy == "coerce":
+                    replacements = [None] * len(positions)
+                for i, value in zip(positions.tolist(), replacements):
+                    rows[i][pos] = value
+                    if value is None:
+                        nulled.append(i)
+                        fixed["nulled"] += 1
+                    else:
+                        fixed["truncated" if problem == "too_long" else "clamped"] += 1
+            if not_null:
+                # 原本为空和被置为NULL的值都无法写入NOT NULL列
+                missing = [i for i, value in enumerate(values) if value is None] + nulled
+                if missing:
+                    problems[col]["null"] += len(missing)
+                for i in missing:
+                    rejected.setdefault(i, self._message("null", col, rule, None))
+
+        with self.lock:
+            self.rejected_rows += len(rejected)
+            self.fixed_cells.update(fixed)
+            for col, counts in problems.items():
+                self.problems[col].update(counts)
+        if not rejected:
+            return rows, errors
+
+        # 行在块中的位置换算为源数据偏移(清洗失败的行不在rows中)
+        failed = {idx for idx, _ in errors}
+        row_offsets = [idx for idx in range(offset, offset + len(rows) + len(errors)) if idx not in failed] \
+            if errors else range(offset, offset + len(rows))
+        errors = list(errors) + [(row_offsets[i], message) for i, message in rejected.items()]
+        return [row for i, row in enumerate(rows) if i not in rejected], errors
+
+    @staticmethod
+    def _message(problem, col, rule, value):
+        code, label = ValidateUtils.PROBLEMS[problem]
+        if problem == "null":
+            detail = f"列 {col} {label}"
+        elif problem == "too_long":
+            detail = f"列 {col} 的值长度 {len(str(value))} 超过 {rule['type']}"
+        elif problem == "out_of_range":
+            detail = f"列 {col} 的值 {value} 超出 {rule['type']} 的范围"
+        else:
+            detail = f"列 {col} 的值 {str(value)[:100]!r} {label}"
+        return f"({code}, {detail!r})"
+
+    def summary(self):
+        """{"policy", "columns", "rejected_rows", "fixed_cells", "problems": {列名: {问题: 个数}}}"""
+        return {
+            "policy": self.policy,
+            "columns": len(self.rules),
+            "rejected_rows": self.rejected_rows,
+            "fixed_cells": dict(self.fixed_cells),
+            "problems": {col: dict(counts) for col, counts in self.problems.items()}
+        }
@@ -0,0 +1,444 @@
+"""
+导入校验工具类
+导入时在客户端按列累计校验和(非空值个数、值的CRC32之和与异或)和整行哈希，导入完成后在服务器端用
+几条SELECT对整张表计算同样的聚合并比较，不逐行比对就能确认数据完整写入。
+不一致时按行哈希的高位分桶缩小范围，只取出有差异的桶中的行哈希，与客户端溢写的行哈希对照，定位到出错的批次
+"""
+import os
+import re
+import zlib
+import time
+import array
+import struct
+import decimal
+import datetime
+import tempfile
+import collections
+
+from data_importer.utils.db_utils import DbUtils
+from data_importer.utils.sink_utils import SinkUtils
+
+
+class VerifyUtils:
+    # 行哈希(32位)的高 BUCKET_BITS 位作为桶号
+    BUCKET_BITS = 10
+    # 最多取出这么多个有差异的桶中的行哈希
+    MAX_DRILLDOWN_BUCKETS = 64
+    # 报告中最多列出的出错批次数
+    MAX_REPORTED_BATCHES = 100
+    # 浮点列按该小数位数比较
+    FLOAT_SCALE = 6
+    # 拼接整行时的分隔符和NULL标记，客户端和服务器端必须一致
+    FIELD_SEPARATOR = "\x1f"
+    NULL_MARKER = "\\N"
+
+    @staticmethod
+    def column_kind(mysql_type):
+        """
+        列的校验方式: int/decimal/float/date/datetime/text；
+        JSON、二进制、TIME等服务器会改写格式的类型返回None，只比较NULL个数
+        """
+        type_upper = str(mysql_type).strip().upper()
+        if re.match(r'^(JSON|BLOB|TINYBLOB|MEDIUMBLOB|LONGBLOB|BINARY|VARBINARY|BIT|TIME\b|YEAR|GEOMETRY|POINT)',
+                    type_upper):
+            return None
+        family = SinkUtils.type_family(mysql_type)
+        return "int" if family == "bool" else family
+
+    @staticmethod
+    def column_expression(column, mysql_type):
+        """服务器端把列值转换为与客户端 render 相同文本的表达式，不校验值的列返回None"""
+        kind = VerifyUtils.column_kind(mysql_type)
+        col = DbUtils.escape_sql_identifier(column)
+        if kind is None:
+            return None
+        if kind == "decimal":
+            return f"FORMAT({col}, {SinkUtils.decimal_precision(mysql_type)[1]})"
+        if kind == "float":
+            return f"FORMAT({col}, {VerifyUtils.FLOAT_SCALE})"
+        # 语句带参数执行，格式中的%需要写成%%
+        if kind == "date":
+            return f"DATE_FORMAT({col}, '%%Y-%%m-%%d')"
+        if kind == "datetime":
+            return f"DATE_FORMAT({col}, '%%Y-%%m-%%d %%H:%%i:%%s')"
+        return col
+
+    @staticmethod
+    def _decimal(value):
+        if isinstance(value, decimal.Decimal):
+            return value
+        if isinstance(value, bool):
+            return decimal.Decimal(int(value))
+        if isinstance(value, float):
+            # 导入时浮点数按repr发送，服务器按该文本转换
+            return decimal.Decimal(repr(value))
+        return decimal.Decimal(str(value).strip())
+
+    @staticmethod
+    def _double_text(value):
+        """MySQL把DOUBLE存入字符串列时的文本: 最短的往返表示，整数不带小数点，指数不带+号和前导0"""
+        text = repr(value)
+        if text.endswith(".0"):
+            return text[:-2]
+        if "e" in text:
+            mantissa, exponent = text.split("e")
+            if mantissa.endswith(".0"):
+                mantissa = mantissa[:-2]
+            return mantissa + "e" + str(int(exponent))
+        return text
+
+    @staticmethod
+    def _parse_datetime(value):
+        if isinstance(value, datetime.datetime):
+            return value
+        if isinstance(value, datetime.date):
+            return datetime.datetime(value.year, value.month, value.day)
+        return datetime.datetime.fromisoformat(str(value).strip().replace("/", "-"))
+
+    @staticmethod
+    def renderer(mysql_type):
+        """
+        客户端把写入的值转换为服务器端 column_expression 结果的函数，NULL返回None
+        转换失败时返回原值的文本，由校验报告为不一致
+        """
+        kind = VerifyUtils.column_kind(mysql_type)
+        if kind is None:
+            return None
+
+        if kind == "int":
+            def render(value):
+                if type(value) is int:
+                    return str(value)
+                # 非整数按四舍五入存入整数列
+                return str(int(VerifyUtils._decimal(value).quantize(decimal.Decimal(1), decimal.ROUND_HALF_UP)))
+        elif kind == "decimal":
+            scale = SinkUtils.decimal_precision(mysql_type)[1]
+            quantum = decimal.Decimal(1).scaleb(-scale)
+            spec = f",.{scale}f"
+
+            def render(value):
+                number = VerifyUtils._decimal(value).quantize(quantum, decimal.ROUND_HALF_UP)
+                return format(number.copy_abs() if number.is_zero() else number, spec)
+        elif kind == "float":
+            single = str(mysql_type).strip().upper().startswith("FLOAT")
+            scale = 10 ** VerifyUtils.FLOAT_SCALE
+            spec = f",.{VerifyUtils.FLOAT_SCALE}f"
+
+            def render(value):
+                number = float(value)
+                if single:
+                    number = struct.unpack("f", struct.pack("f", number))[0]
+                # 与FORMAT对DOUBLE的舍入相同: 放大后按rint(四舍六入五成双)取整
+                rounded = round(number * scale) / scale
+                return format(rounded if rounded else 0.0 * number, spec)
+        elif kind == "date":
+            def render(value):
+                return VerifyUtils._parse_datetime(value).strftime("%Y-%m-%d")
+        elif kind == "datetime":
+            def render(value):
+                moment = VerifyUtils._parse_datetime(value)
+                # DATETIME不带小数秒，写入时按四舍五入到秒
+                if moment.microsecond >= 500000:
+                    moment += datetime.timedelta(seconds=1)
+                return moment.strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            def render(value):
+                value_type = type(value)
+                if value_type is str:
+                    return value
+                if value_type is float:
+                    return VerifyUtils._double_text(value)
+                if value_type is bool:
+                    return "1" if value else "0"
+                if isinstance(value, bytes):
+                    return value.decode("utf-8", "surrogateescape")
+                if isinstance(value, datetime.datetime):
+                    return value.strftime("%Y-%m-%d %H:%M:%S")
+                return str(value)
+
+        def safe_render(value):
+            if value is None:
+                return None
+            try:
+                return render(value)
+            except (ValueError, TypeError, ArithmeticError, OverflowError):
+                return str(value)
+        return safe_render
+
+    @staticmethod
+    def row_hash_expression(expressions):
+        """服务器端整行哈希的表达式，与 LoadVerifier 中的行哈希一致；参数为分隔符和NULL标记"""
+        return ("CRC32(CONCAT_WS(%s, " +
+                ", ".join(f"IFNULL({expr}, %s)" for expr in expressions) + "))")
+
+    @staticmethod
+    def _row_hash_params(expressions):
+        return [VerifyUtils.FIELD_SEPARATOR] + [VerifyUtils.NULL_MARKER] * len(expressions)
+
+    @staticmethod
+    def server_checksums(conn, table_name, columns, column_types):
+        """
+        在服务器端一次扫描计算整表的聚合
+        返回: {"rows", "row_sum", "row_xor", "columns": {列名: {"non_null", "sum", "xor"}}}
+        """
+        expressions = [VerifyUtils.column_expression(col, type_str) for col, type_str in zip(columns, column_types)]
+        verified = [expr for expr in expressions if expr is not None]
+        select = ["COUNT(*)"]
+        params = []
+        if verified:
+            row_hash = VerifyUtils.row_hash_expression(verified)
+            select += [f"SUM({row_hash})", f"BIT_XOR({row_hash})"]
+            params += VerifyUtils._row_hash_params(verified) * 2
+        for col, expr in zip(columns, expressions):
+            select.append(f"COUNT({DbUtils.escape_sql_identifier(col)})")
+            if expr is not None:
+                select += [f"SUM(CRC32({expr}))", f"BIT_XOR(CRC32({expr}))"]
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT " + ", ".join(select) + " FROM " + DbUtils.escape_sql_identifier(table_name),
+                           params)
+            values = [int(val) if val is not None else 0 for val in cursor.fetchone()]
+        finally:
+            cursor.close()
+
+        result = {"rows": values[0], "row_sum": 0, "row_xor": 0, "columns": {}}
+        pos = 1
+        if verified:
+            result["row_sum"], result["row_xor"] = values[1], values[2]
+            pos = 3
+        for col, expr in zip(columns, expressions):
+            stats = {"non_null": values[pos]}
+            pos += 1
+            if expr is not None:
+                stats["sum"], stats["xor"] = values[pos], values[pos + 1]
+                pos += 2
+            result["columns"][col] = stats
+        return result
+
+    @staticmethod
+    def server_buckets(conn, table_name, columns, column_types):
+        """服务器端各桶的行数和行哈希之和 {桶号: (行数, 哈希和)}"""
+        expressions = [expr for expr in (VerifyUtils.column_expression(col, type_str)
+                                         for col, type_str in zip(columns, column_types)) if expr is not None]
+        shift = 32 - VerifyUtils.BUCKET_BITS
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                f"SELECT h >> {shift} AS bucket, COUNT(*), SUM(h) FROM (SELECT " +
+                VerifyUtils.row_hash_expression(expressions) + " AS h FROM " +
+                DbUtils.escape_sql_identifier(table_name) + ") AS hashes GROUP BY bucket",
+                VerifyUtils._row_hash_params(expressions))
+            return {int(bucket): (int(count), int(total)) for bucket, count, total in cursor.fetchall()}
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def server_row_hashes(conn, table_name, columns, column_types, buckets):
+        """服务器端指定桶中每个行哈希出现的次数"""
+        expressions = [expr for expr in (VerifyUtils.column_expression(col, type_str)
+                                         for col, type_str in zip(columns, column_types)) if expr is not None]
+        shift = 32 - VerifyUtils.BUCKET_BITS
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "SELECT h FROM (SELECT " + VerifyUtils.row_hash_expression(expressions) + " AS h FROM " +
+                DbUtils.escape_sql_identifier(table_name) + f") AS hashes WHERE h >> {shift} IN (" +
+                ", ".join(str(int(bucket)) for bucket in sorted(buckets)) + ")",
+                VerifyUtils._row_hash_params(expressions))
+            return collections.Counter(int(row[0]) for row in cursor.fetchall())
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def format_verification(result):
+        """把 LoadVerifier.verify 的结果格式化为逐行文本"""
+        if result["status"] == "passed":
+            return [f"校验通过: {result['rows']['server']} 行，{len(result['verified_columns'])} 列的值和NULL个数与写入的一致"]
+        lines = [f"校验未通过: 写入 {result['rows']['client']} 行，表中 {result['rows']['server']} 行"]
+        for column in result["mismatched_columns"]:
+            lines.append(f"  列 {column['column']}: NULL个数 {column['nulls'][0]} / {column['nulls'][1]}" +
+                         ("" if column["values_match"] else "，值不一致"))
+        for batch in result["batches"]:
+            lines.append(f"  批次 {batch['batch']} (数据行 {batch['start'] + 1}-{batch['end']}): "
+                         f"{batch['missing_rows']} 行在表中找不到或不一致")
+        if result.get("unexpected_rows"):
+            lines.append(f"  表中有 {result['unexpected_rows']} 行与写入的任何一行都不一致")
+        if result.get("truncated"):
+            lines.append("  有差异的范围过多，只列出了一部分批次")
+        return lines
+
+
+class LoadVerifier:
+    """
+    导入时的客户端校验和
+    每批提交成功后用 add_batch 累计写入的行，导入完成后用 verify 与服务器端的聚合比较
+    行哈希按写入顺序溢写到临时文件(每行4字节)，只在校验不一致时读取
+    """
+
+    def __init__(self, columns, column_types, spill_dir=None):
+        self.columns = list(columns)
+        self.column_types = list(column_types)
+        self.renderers = [VerifyUtils.renderer(type_str) for type_str in self.column_types]
+        self.verified = [pos for pos, render in enumerate(self.renderers) if render is not None]
+        self.rows = 0
+        self.row_sum = 0
+        self.row_xor = 0
+        self.nulls = [0] * len(self.columns)
+        self.sums = [0] * len(self.columns)
+        self.xors = [0] * len(self.columns)
+        self.bucket_counts = [0] * (1 << VerifyUtils.BUCKET_BITS)
+        self.bucket_sums = [0] * (1 << VerifyUtils.BUCKET_BITS)
+        # 每批: (累计行数, 批次号, 起始数据行, 结束数据行)
+        self.batches = []
+        self.hash_file = tempfile.TemporaryFile(prefix="import_verify_", dir=spill_dir)
+
+    def add_batch(self, batch_index, start, end, rows):
+        """累计一批已提交的行，start/end 为该批在源数据中的行范围"""
+        if not rows:
+            return
+        crc32 = zlib.crc32
+        separator = VerifyUtils.FIELD_SEPARATOR
+        null_marker = VerifyUtils.NULL_MARKER
+        shift = 32 - VerifyUtils.BUCKET_BITS
+
+        rendered = []
+        for pos in self.verified:
+            render = self.renderers[pos]
+            texts = [render(row[pos]) for row in rows]
+            column_sum = 0
+            column_xor = 0
+            nulls = 0
+            for text in texts:
+                if text is None:
+                    nulls += 1
+                    continue
+                value_hash = crc32(text.encode("utf-8", "surrogateescape"))
+                column_sum += value_hash
+                column_xor ^= value_hash
+            self.nulls[pos] += nulls
+            self.sums[pos] += column_sum
+            self.xors[pos] ^= column_xor
+            rendered.append(texts)
+        for pos in range(len(self.columns)):
+            if self.renderers[pos] is None:
+                self.nulls[pos] += sum(1 for row in rows if row[pos] is None)
+
+        hashes = array.array("I")
+        if rendered:
+            for texts in zip(*rendered):
+                row_hash = crc32(separator.join(null_marker if text is None else text for text in texts)
+                                 .encode("utf-8", "surrogateescape"))
+                hashes.append(row_hash)
+                self.row_sum += row_hash
+                self.row_xor ^= row_hash
+                bucket = row_hash >> shift
+                self.bucket_counts[bucket] += 1
+                self.bucket_sums[bucket] += row_hash
+        else:
+            hashes.extend([0] * len(rows))
+        hashes.tofile(self.hash_file)
+
+        self.rows += len(rows)
+        self.batches.append((self.rows, batch_index, start, end))
+
+    def close(self):
+        if self.hash_file is not None:
+            self.hash_file.close()
+            self.hash_file = None
+
+    def _client_row_hashes(self, buckets):
+        """客户端指定桶中的行哈希 {哈希: [写入序号, ...]}"""
+        shift = 32 - VerifyUtils.BUCKET_BITS
+        positions = collections.defaultdict(list)
+        self.hash_file.seek(0)
+        offset = 0
+        while True:
+            chunk = array.array("I")
+            try:
+                chunk.fromfile(self.hash_file, 1 << 20)
+            except EOFError:
+                pass
+            if not chunk:
+                break
+            for pos, row_hash in enumerate(chunk):
+                if row_hash >> shift in buckets:
+                    positions[row_hash].append(offset + pos)
+            offset += len(chunk)
+        self.hash_file.seek(0, os.SEEK_END)
+        return positions
+
+    def _batch_of(self, row_number):
+        """写入序号所在的批次 (批次号, 起始数据行, 结束数据行)"""
+        low, high = 0, len(self.batches) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.batches[middle][0] <= row_number:
+                low = middle + 1
+            else:
+                high = middle
+        return self.batches[low][1:]
+
+    def verify(self, conn, table_name):
+        """与服务器端的聚合比较，返回校验结果字典(status 为 passed/failed)"""
+        start_time = time.time()
+        server = VerifyUtils.server_checksums(conn, table_name, self.columns, self.column_types)
+
+        result = {
+            "status": "passed",
+            "rows": {"client": self.rows, "server": server["rows"]},
+            "verified_columns": [self.columns[pos] for pos in self.verified],
+            "unverified_columns": [col for col, render in zip(self.columns, self.renderers) if render is None],
+            "mismatched_columns": [],
+            "batches": [],
+            "unexpected_rows": 0,
+            "truncated": False,
+        }
+        for pos, col in enumerate(self.columns):
+            stats = server["columns"][col]
+            server_nulls = server["rows"] - stats["non_null"]
+            values_match = self.renderers[pos] is None or (stats["sum"], stats["xor"]) == (self.sums[pos], self.xors[pos])
+            if server_nulls != self.nulls[pos] or not values_match:
+                result["mismatched_columns"].append({
+                    "column": col, "type": self.column_types[pos],
+                    "nulls": [self.nulls[pos], server_nulls], "values_match": values_match})
+
+        rows_match = (server["rows"], server["row_sum"], server["row_xor"]) == (self.rows, self.row_sum, self.row_xor)
+        if rows_match and not result["mismatched_columns"]:
+            result["seconds"] = time.time() - start_time
+            return result
+
+        result["status"] = "failed"
+        if self.verified:
+            self._locate(conn, table_name, result)
+        result["seconds"] = time.time() - start_time
+        return result
+
+    def _locate(self, conn, table_name, result):
+        """按桶比较缩小范围，再对照有差异的桶中的行哈希，定位到批次"""
+        server_buckets = VerifyUtils.server_buckets(conn, table_name, self.columns, self.column_types)
+        buckets = sorted(bucket for bucket in range(len(self.bucket_counts))
+                         if (self.bucket_counts[bucket], self.bucket_sums[bucket]) !=
+                         server_buckets.get(bucket, (0, 0)))
+        if len(buckets) > VerifyUtils.MAX_DRILLDOWN_BUCKETS:
+            buckets = buckets[:VerifyUtils.MAX_DRILLDOWN_BUCKETS]
+            result["truncated"] = True
+        if not buckets:
+            return
+
+        server_hashes = VerifyUtils.server_row_hashes(conn, table_name, self.columns, self.column_types, buckets)
+        client_hashes = self._client_row_hashes(set(buckets))
+        missing = collections.Counter()
+        for row_hash, positions in client_hashes.items():
+            shortfall = len(positions) - server_hashes.get(row_hash, 0)
+            # 相同的行出现多次时无法区分是哪一次缺失，记在最后几次上
+            for row_number in positions[len(positions) - shortfall:] if shortfall > 0 else ():
+                missing[self._batch_of(row_number)] += 1
+        result["unexpected_rows"] = sum(max(count - len(client_hashes.get(row_hash, ())), 0)
+                                        for row_hash, count in server_hashes.items())
+
+        for (batch_index, start, end), count in sorted(missing.items()):
+            if len(result["batches"]) >= VerifyUtils.MAX_REPORTED_BATCHES:
+                result["truncated"] = True
+                break
+            result["batches"].append({"batch": batch_index, "start": start, "end": end, "missing_rows": count})
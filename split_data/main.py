@@ -16,7 +16,6 @@ if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
 # 使用直接导入
-from split_data.split import split_file
 from split_data.utils.file_utils import get_file_info, is_valid_file
 from split_data.utils.ui_utils import center_window, create_tooltip
 from split_data.utils.log_utils import setup_logging, get_log_path
@@ -424,6 +423,9 @@ class SplitApp:
     def run_split_task(self, filepath, batch_size, max_workers, clear_old):
         """在线程中执行拆分任务"""
         try:
+            # pandas等依赖在开始拆分时才加载，不拖慢主窗口启动
+            from split_data.split import split_file
+            
             # 调用拆分函数
             result = split_file(filepath, batch_size, max_workers, clear_old)
             # 拆分成功
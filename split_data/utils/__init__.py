@@ -2,8 +2,33 @@
 工具模块
 包含文件处理、界面、日志和拆分相关功能
 """
-# 导入各个工具类，使它们可以从split_data.utils直接导入
-from split_data.utils.file_utils import get_file_extension, create_output_folder, get_file_name
-from split_data.utils.log_utils import setup_logging, log_info, log_error, log_split_result
-from split_data.utils.split_utils import split_csv_file, split_excel_file
-from split_data.utils.ui_utils import center_window, create_tooltip
+import importlib
+
+# 各个工具函数可以从split_data.utils直接导入，首次访问时才加载所在模块
+_EXPORTS = {
+    "get_file_extension": "split_data.utils.file_utils",
+    "create_output_folder": "split_data.utils.file_utils",
+    "get_file_name": "split_data.utils.file_utils",
+    "setup_logging": "split_data.utils.log_utils",
+    "log_info": "split_data.utils.log_utils",
+    "log_error": "split_data.utils.log_utils",
+    "log_split_result": "split_data.utils.log_utils",
+    "split_csv_file": "split_data.utils.split_utils",
+    "split_excel_file": "split_data.utils.split_utils",
+    "center_window": "split_data.utils.ui_utils",
+    "create_tooltip": "split_data.utils.ui_utils",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(_EXPORTS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
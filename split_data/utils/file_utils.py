@@ -1,12 +1,11 @@
 """
 文件处理工具类
 处理文件的读取和写入
+
+chardet、pandas、openpyxl在用到时才导入，避免拖慢界面启动
 """
 import os
-import chardet
 from datetime import datetime
-import pandas as pd
-from openpyxl import load_workbook
 import math
 
 
@@ -37,6 +36,8 @@ class FileUtils:
     @staticmethod
     def detect_encoding(file_path):
         """检测文件编码，更可靠的方法"""
+        import chardet
+        
         # 读取更多内容来提高检测准确性
         with open(file_path, 'rb') as f:
             raw_data = f.read(100000)  # 读取更多字节以提高准确性
@@ -92,6 +93,8 @@ class FileUtils:
     @staticmethod
     def read_csv_chunks(file_path, batch_size):
         """读取CSV文件，按块返回，增强编码处理"""
+        import pandas as pd
+        
         # 尝试多种编码
         encodings_to_try = ['utf-8', 'gb18030', 'utf-8-sig', 'latin1']
         
@@ -142,6 +145,8 @@ class FileUtils:
     @staticmethod
     def get_excel_data(file_path):
         """获取Excel工作表和头部信息"""
+        from openpyxl import load_workbook
+        
         try:
             wb = load_workbook(file_path, read_only=True, data_only=True)
             ws = wb.active
@@ -200,6 +205,7 @@ class FileUtils:
         elif ext in ['.xlsx', '.xls']:
             file_type = "Excel 文件"
             try:
+                from openpyxl import load_workbook
                 wb = load_workbook(file_path, read_only=True, data_only=True)
                 ws = wb.active
                 if ws.max_row <= 1: